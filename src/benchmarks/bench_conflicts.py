@@ -0,0 +1,42 @@
+# Conflict detection over converted and expanded synthetic calendars.
+# Run from the src directory: python -m benchmarks.bench_conflicts --events 20000 --calendars 10
+import argparse
+import datetime
+import time
+
+import pytz
+
+import ical_conflicts
+import ical_expand
+import w32a_cal
+from benchmarks.synthetic import make_synthetic_events, SYNTHETIC_START
+
+
+def main(argv=None) -> None:
+  parser = argparse.ArgumentParser(description="Sweep-line conflict detection")
+  parser.add_argument("--events", type=int, default=20000)
+  parser.add_argument("--calendars", type=int, default=10)
+  parser.add_argument("--per-source", action="store_true")
+  args = parser.parse_args(argv)
+
+  calendars: dict[str, list] = {}
+  for i, event in enumerate(make_synthetic_events(args.events)):
+    calendars.setdefault("calendar-%d" % (i % args.calendars), []).extend(w32a_cal.win32_event_to_ical(event))
+
+  window_start = pytz.utc.localize(SYNTHETIC_START)
+  window_end = window_start + datetime.timedelta(days=730)
+  t0 = time.perf_counter()
+  occurrences = []
+  for source, events in calendars.items():
+    occurrences.extend(ical_expand.expand_events(events, window_start, window_end, source=source))
+  expanded = time.perf_counter() - t0
+
+  t0 = time.perf_counter()
+  report = ical_conflicts.sweep_conflicts(occurrences, per_source=args.per_source)
+  swept = time.perf_counter() - t0
+
+  print("occurrences: %d, conflicts: %d, groups: %d" % (len(occurrences), len(report.conflicts), len(report.groups)))
+  print("expand: %.3fs, sweep: %.3fs" % (expanded, swept))
+
+if __name__ == "__main__":
+  main()
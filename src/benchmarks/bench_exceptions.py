@@ -0,0 +1,57 @@
+# Conversion time of recurring series with many exceptions.
+# Run from the src directory: python -m benchmarks.bench_exceptions --exceptions 500
+import argparse
+import datetime
+import time
+
+import pytz
+
+import w32a_cal
+from w32obj import W32Event, W32RecurrencePattern, W32Exception, LatencyProxy
+
+
+def make_series(n_exceptions: int, modified_ratio: float = 0.5, renamed: bool = True) -> W32Event:
+  # Weekly series, every n-th occurrence is moved by an hour (and renamed), the others are deleted
+  start = pytz.timezone("Europe/Berlin").localize(datetime.datetime(2020, 1, 7, 12, 30))
+  every = max(1, round(1 / modified_ratio)) if modified_ratio > 0 else 0
+  exceptions = []
+  for week in range(1, n_exceptions + 1):
+    original = start + datetime.timedelta(weeks=week)
+    if every and week % every == 0:
+      moved = original + datetime.timedelta(hours=1)
+      exceptions.append(W32Exception(original, event=W32Event(id="series", subject="Moved %d" % week if renamed else "Series", start=moved,
+                                                              end=moved + datetime.timedelta(hours=1),
+                                                              req_attendees=["a@example.com"])))
+    else:
+      exceptions.append(W32Exception(original, deleted=True))
+  pattern = W32RecurrencePattern(w32a_cal.RecurrenceType.WEEKLY, 1, no_end=True,
+                                 day_of_week_mask=w32a_cal.DayOfWeekMaskEnum.TUESDAY, exceptions=exceptions)
+  return W32Event(id="series", subject="Series", start=start, end=start + datetime.timedelta(hours=1),
+                  req_attendees=["a@example.com"], recurring=True,
+                  recurrence_state=w32a_cal.RecurrenceState.MASTER, recurrence_pattern=pattern)
+
+def main(argv=None) -> None:
+  parser = argparse.ArgumentParser(description="Conversion time of exception-heavy recurring series")
+  parser.add_argument("--exceptions", type=int, default=500)
+  parser.add_argument("--modified", type=float, default=0.5, help="ratio of modified (not deleted) exceptions")
+  parser.add_argument("--repeat", type=int, default=5)
+  parser.add_argument("--delta", action="store_true", help="convert moved occurrences relative to the master")
+  parser.add_argument("--renamed", action="store_true", help="moved occurrences get their own subject")
+  parser.add_argument("--latency", type=float, default=0.0, help="seconds per COM attribute read")
+  args = parser.parse_args(argv)
+
+  series = make_series(args.exceptions, args.modified, renamed=args.renamed)
+  exception_delta = w32a_cal.ExceptionDelta() if args.delta else None
+  best = None
+  for _ in range(args.repeat):
+    reads = {}
+    t0 = time.perf_counter()
+    events = w32a_cal.win32_event_to_ical(LatencyProxy(series, args.latency, reads), exception_delta=exception_delta)
+    seconds = time.perf_counter() - t0
+    best = seconds if best is None else min(best, seconds)
+
+  print("exceptions: %d, events: %d, seconds: %.4f, exceptions/s: %.0f, COM reads: %d"
+        % (args.exceptions, len(events), best, args.exceptions / best, sum(reads.values())))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,61 @@
+# CalendarIndex lookups compared to linear walks over the converted events.
+# Run from the src directory: python -m benchmarks.bench_index --events 20000 --queries 1000
+import argparse
+import datetime
+import random
+import time
+
+import pytz
+
+import ical_diff
+import ical_expand
+import ical_index
+import w32a_cal
+from benchmarks.synthetic import make_synthetic_events, SYNTHETIC_START
+
+
+def main(argv=None) -> None:
+  parser = argparse.ArgumentParser(description="Calendar index lookups")
+  parser.add_argument("--events", type=int, default=20000)
+  parser.add_argument("--queries", type=int, default=1000)
+  args = parser.parse_args(argv)
+
+  events = [e for item in make_synthetic_events(args.events) for e in w32a_cal.win32_event_to_ical(item)]
+  t0 = time.perf_counter()
+  index = ical_index.CalendarIndex(events)
+  print("events: %d, build: %.3fs" % (len(events), time.perf_counter() - t0))
+
+  rnd = random.Random(0)
+  base = pytz.utc.localize(SYNTHETIC_START)
+  ranges = [(base + datetime.timedelta(hours=rnd.randrange(24 * 365)),) for _ in range(args.queries)]
+  ranges = [(start, start + datetime.timedelta(days=1)) for (start,) in ranges]
+  uids = [str(rnd.choice(events)['UID']) for _ in range(args.queries)]
+  words = ["event %d" % rnd.randrange(args.events) for _ in range(args.queries)]
+
+  t0 = time.perf_counter()
+  for uid in uids:
+    index.master(uid)
+    index.exceptions(uid)
+  for start, end in ranges:
+    index.between(start, end)
+  for text in words:
+    index.search(text)
+  indexed = time.perf_counter() - t0
+
+  # Linear walks for a tenth of the queries
+  n = max(1, args.queries // 10)
+  t0 = time.perf_counter()
+  for uid in uids[:n]:
+    [e for e in events if ical_diff.event_key(e)[0] == uid]
+  for start, end in ranges[:n]:
+    for e in events:
+      event_start, duration, _all_day = ical_expand.event_times(e, pytz.utc)
+      event_start < end and event_start + duration > start
+  for text in words[:n]:
+    [e for e in events if text in str(e.get('SUMMARY', "")).lower()]
+  linear = (time.perf_counter() - t0) * args.queries / n
+
+  print("%d queries of each kind: indexed %.3fs, linear walk %.1fs (extrapolated)" % (args.queries, indexed, linear))
+
+if __name__ == "__main__":
+  main()
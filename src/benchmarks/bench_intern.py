@@ -0,0 +1,43 @@
+# Memory of snapshots and converted events with and without the intern pool.
+# Run from the src directory: python -m benchmarks.bench_intern --events 20000
+import argparse
+import gc
+import tracemalloc
+
+import w32a_cal
+import w32a_intern
+import w32obj
+from benchmarks.synthetic import make_synthetic_events
+
+
+def measure(events: list, intern_pool: w32a_intern.InternPool) -> tuple[int, int]:
+  # Bytes held by the snapshots and by the icalendar events built from them
+  gc.collect()
+  tracemalloc.start()
+  snapshots = [w32obj.make_anonymous_event(e, lazy_body=False, minimal=True, intern_pool=intern_pool) for e in events]
+  snapshot_bytes = tracemalloc.get_traced_memory()[0]
+  ical_events = []
+  for snapshot in snapshots:
+    ical_events.extend(w32a_cal.win32_event_to_ical(snapshot, intern_pool=intern_pool))
+  total_bytes = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+  return snapshot_bytes, total_bytes - snapshot_bytes
+
+def main(argv=None) -> None:
+  parser = argparse.ArgumentParser(description="Memory saved by interning repeated values")
+  parser.add_argument("--events", type=int, default=20000)
+  args = parser.parse_args(argv)
+
+  events = make_synthetic_events(args.events)
+  # maxsize=0 keeps nothing: every value is a separate object
+  plain = measure(events, w32a_intern.InternPool(maxsize=0))
+  pool = w32a_intern.InternPool()
+  interned = measure(events, pool)
+
+  print("events: %d" % args.events)
+  print("snapshots: %.1f MB -> %.1f MB" % (plain[0] / 1e6, interned[0] / 1e6))
+  print("ical events: %.1f MB -> %.1f MB" % (plain[1] / 1e6, interned[1] / 1e6))
+  print("pool: %s" % pool.as_dict())
+
+if __name__ == "__main__":
+  main()
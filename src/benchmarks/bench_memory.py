@@ -0,0 +1,56 @@
+# Memory per stage and per event kind of an export, from tracemalloc snapshots.
+# Run from the src directory: python -m benchmarks.bench_memory --events 100 --json memory.json
+import argparse
+import io
+import json
+import time
+
+import ical_emit
+import w32a_export
+import w32a_memprof
+from benchmarks.synthetic import make_synthetic_events
+from w32obj import W32Folder
+
+
+def main(argv=None) -> None:
+  parser = argparse.ArgumentParser(description="Memory per event of an export")
+  parser.add_argument("--events", type=int, default=100)
+  parser.add_argument("--frames", type=int, default=w32a_memprof.MEMPROF_FRAMES, help="Traceback depth of the sites")
+  parser.add_argument("--top", type=int, default=w32a_memprof.MEMPROF_TOP, help="Reported allocation sites")
+  parser.add_argument("--json", metavar="PATH", help="Write the report to PATH, - for stdout")
+  args = parser.parse_args(argv)
+
+  folders = {"Archive": W32Folder("Archive", make_synthetic_events(args.events))}
+  specs = [w32a_export.FolderSpec(name="Archive")]
+  # Imports and caches of the first export are not part of the profile
+  ical_emit.export_folders_to(specs, io.BytesIO(), folder_resolver=folders.get)
+
+  t0 = time.perf_counter()
+  with w32a_memprof.MemorySink(frames=args.frames, top=args.top) as sink:
+    ical_emit.export_folders_to(specs, io.BytesIO(), folder_resolver=folders.get)
+  seconds = time.perf_counter() - t0
+
+  memory = sink.as_dict()["memory"]
+  report = {
+    "items": args.events,
+    "seconds": seconds,
+    "memory_per_event": {kind: usage["allocated_mean"] for kind, usage in memory["events"].items()},
+    "memory": memory,
+  }
+  for kind, usage in sorted(memory["events"].items()):
+    print("%-9s %5d events, %7.0f bytes allocated, %7.0f retained per event"
+          % (kind, usage["count"], usage["allocated_mean"], usage["bytes_mean"]))
+  for stage, usage in sorted(memory["stages"].items()):
+    print("stage %-10s %5d x, %9d bytes allocated, %7d blocks" % (stage, usage["count"], usage["allocated"], usage["blocks"]))
+  for site in memory["sites"]:
+    print("%9d bytes %6d blocks  %s" % (site["allocated"], site["blocks"], site["site"]))
+  print("profiled in %.2fs" % seconds)
+
+  if args.json == "-":
+    print(json.dumps(report, indent=2, sort_keys=True))
+  elif args.json:
+    with open(args.json, "w") as f:
+      json.dump(report, f, indent=2, sort_keys=True)
+
+if __name__ == "__main__":
+  main()
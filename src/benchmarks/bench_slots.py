@@ -0,0 +1,43 @@
+# First free slots for several people over converted synthetic calendars.
+# Run from the src directory: python -m benchmarks.bench_slots --events 200 --people 8 --window-days 14
+import argparse
+import datetime
+import time
+
+import pytz
+
+import ical_slots
+import w32a_cal
+from benchmarks.synthetic import make_synthetic_events, SYNTHETIC_START
+
+
+def main(argv=None) -> None:
+  parser = argparse.ArgumentParser(description="Multi-attendee free-slot finder")
+  parser.add_argument("--events", type=int, default=200, help="Outlook items per person")
+  parser.add_argument("--people", type=int, default=8)
+  parser.add_argument("--window-days", type=int, default=14)
+  parser.add_argument("--minutes", type=int, default=30)
+  parser.add_argument("--slots", type=int, default=10)
+  args = parser.parse_args(argv)
+
+  calendars = {}
+  for p in range(args.people):
+    calendars["person-%d" % p] = [e for item in make_synthetic_events(args.events, seed=p)
+                                  for e in w32a_cal.win32_event_to_ical(item)]
+
+  berlin = pytz.timezone("Europe/Berlin")
+  hours = ical_slots.WorkingHours(datetime.time(9), datetime.time(17), tz=berlin)
+  window_start = pytz.utc.localize(SYNTHETIC_START) + datetime.timedelta(days=90)
+  window_end = window_start + datetime.timedelta(days=args.window_days)
+  t0 = time.perf_counter()
+  slots = ical_slots.find_free_slots(calendars, datetime.timedelta(minutes=args.minutes), window_start, window_end,
+                                     working_hours=hours, max_slots=args.slots)
+  seconds = time.perf_counter() - t0
+
+  for slot in slots:
+    print(slot.start.astimezone(berlin).isoformat())
+  print("people: %d, events: %d, slots: %d, %.3fs" % (len(calendars), sum(len(e) for e in calendars.values()),
+                                                      len(slots), seconds))
+
+if __name__ == "__main__":
+  main()
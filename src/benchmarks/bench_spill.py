@@ -0,0 +1,48 @@
+# Peak traced memory of the in-memory export compared to the spilled export with a memory budget.
+# Run from the src directory: python -m benchmarks.bench_spill --events 5000 --budget 1000000
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import ical_emit
+import ical_spill
+import w32a_export
+from benchmarks.synthetic import make_synthetic_events
+from w32obj import W32Folder
+
+
+def _measure(export) -> tuple[float, int, object]:
+  tracemalloc.start()
+  t0 = time.perf_counter()
+  result = export()
+  seconds = time.perf_counter() - t0
+  _current, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return seconds, peak, result
+
+def main(argv=None) -> None:
+  parser = argparse.ArgumentParser(description="Export with spill-to-disk segments")
+  parser.add_argument("--events", type=int, default=5000)
+  parser.add_argument("--budget", type=int, default=1000000, help="Memory budget in bytes")
+  parser.add_argument("--format", choices=ical_emit.FORMATS, default=ical_emit.FORMAT_ICS)
+  args = parser.parse_args(argv)
+
+  folders = {"Archive": W32Folder("Archive", make_synthetic_events(args.events))}
+  specs = [w32a_export.FolderSpec(name="Archive")]
+  with tempfile.TemporaryDirectory() as directory:
+    with open(os.path.join(directory, "memory.ics"), "wb") as fp:
+      seconds, peak, _reports = _measure(
+        lambda: ical_emit.export_folders_to(specs, fp, format=args.format, folder_resolver=folders.get))
+    print("in memory: %.2fs, peak %.1f MB" % (seconds, peak / 1e6))
+
+    with open(os.path.join(directory, "spilled.ics"), "wb") as fp:
+      seconds, peak, (_reports, stats) = _measure(
+        lambda: ical_spill.export_folders_spilled(specs, fp, memory_budget=args.budget, format=args.format,
+                                                  directory=directory, folder_resolver=folders.get))
+    print("spilled:   %.2fs, peak %.1f MB" % (seconds, peak / 1e6))
+    print(stats.as_dict())
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,62 @@
+# Import time of the modules loaded at startup, as measured by `python -X importtime`.
+# Run from the src directory: python -m benchmarks.bench_startup --budget 10
+import argparse
+import os
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+STARTUP_MODULES = ["w32a_cal", "w32obj"]
+
+# Import time budget in milliseconds for everything outside the standard library.
+# Standard library modules are excluded because their cost is shared with the interpreter start
+# and is too noisy to track.
+IMPORT_TIME_BUDGET_MS = 10.0
+
+
+def _is_stdlib(module: str) -> bool:
+  return module.split(".")[0] in sys.stdlib_module_names
+
+def import_time_ms(module: str, runs: int = 3) -> tuple[float, str]:
+  # Sum of the self time of all non-stdlib modules, the best of runs is used.
+  # The first run only makes sure the bytecode cache is current, so compile time is not measured.
+  env = dict(os.environ)
+  env.pop("PYTHONDONTWRITEBYTECODE", None)
+  subprocess.run([sys.executable, "-c", "import " + module], cwd=SRC_DIR, env=env, check=True)
+
+  best = None
+  stderr = ""
+  for _ in range(runs):
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                          cwd=SRC_DIR, env=env, capture_output=True, text=True, check=True)
+    stderr = proc.stderr
+    total = 0.0
+    for line in stderr.splitlines():
+      # import time: self [us] | cumulative | imported package
+      parts = line.split("|")
+      if len(parts) != 3 or not parts[1].strip().isdigit():
+        continue
+      if not _is_stdlib(parts[2].strip()):
+        total += int(parts[0].split(":")[1]) / 1000.0
+    best = total if best is None else min(best, total)
+  return best, stderr
+
+def main(argv=None) -> int:
+  parser = argparse.ArgumentParser(description="Import time of the startup modules")
+  parser.add_argument("--budget", type=float, default=IMPORT_TIME_BUDGET_MS, help="Milliseconds per module")
+  parser.add_argument("--runs", type=int, default=3)
+  parser.add_argument("--report", action="store_true", help="Print the -X importtime output")
+  args = parser.parse_args(argv)
+
+  over = 0
+  for module in STARTUP_MODULES:
+    ms, report = import_time_ms(module, args.runs)
+    print("%-10s %6.1fms%s" % (module, ms, "  over budget" if ms > args.budget else ""))
+    if args.report:
+      print(report)
+    over += ms > args.budget
+  return 1 if over else 0
+
+if __name__ == "__main__":
+  sys.exit(main())
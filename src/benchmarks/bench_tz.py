@@ -0,0 +1,52 @@
+# Compare the pytz and zoneinfo tz backends on a large synthetic calendar.
+# Run from the src directory: python -m benchmarks.bench_tz --events 10000
+import argparse
+import time
+
+import w32a_cal
+import w32a_tz
+from benchmarks.synthetic import make_synthetic_events
+
+
+def convert_all(events) -> list:
+  ical_events = []
+  for event in events:
+    ical_events.extend(w32a_cal.win32_event_to_ical(event))
+  return ical_events
+
+def bench_backend(backend: str, events, repeat: int) -> tuple[float, list[bytes]]:
+  previous = w32a_tz.set_backend(backend)
+  try:
+    best = None
+    for _ in range(repeat):
+      t0 = time.perf_counter()
+      ical_events = convert_all(events)
+      seconds = time.perf_counter() - t0
+      best = seconds if best is None else min(best, seconds)
+    return best, [e.to_ical() for e in ical_events]
+  finally:
+    w32a_tz.set_backend(previous)
+
+def main(argv=None) -> None:
+  parser = argparse.ArgumentParser(description="Compare the pytz and zoneinfo tz backends")
+  parser.add_argument("--events", type=int, default=5000)
+  parser.add_argument("--repeat", type=int, default=3)
+  parser.add_argument("--seed", type=int, default=0)
+  args = parser.parse_args(argv)
+
+  events = make_synthetic_events(args.events, seed=args.seed)
+
+  results = {}
+  for backend in w32a_tz.TZ_BACKENDS:
+    results[backend] = bench_backend(backend, events, args.repeat)
+
+  baseline = results[w32a_tz.TZ_BACKEND_DEFAULT][0]
+  print("%-10s %10s %12s %8s" % ("backend", "seconds", "events/s", "speedup"))
+  for backend, (seconds, _output) in results.items():
+    print("%-10s %10.3f %12.0f %7.2fx" % (backend, seconds, args.events / seconds, baseline / seconds))
+
+  outputs = [output for _seconds, output in results.values()]
+  print("identical output:", all(output == outputs[0] for output in outputs))
+
+if __name__ == "__main__":
+  main()
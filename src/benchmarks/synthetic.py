@@ -0,0 +1,54 @@
+import datetime
+import random
+
+import pytz
+
+import w32a_cal
+from w32obj import W32Event, W32RecurrencePattern, W32Exception
+
+SYNTHETIC_TIMEZONES = ["UTC", "Europe/Berlin", "Europe/London", "America/New_York", "Asia/Tokyo", "Australia/Sydney"]
+
+SYNTHETIC_START = datetime.datetime(2024, 1, 1, 8, 0)
+
+
+def make_synthetic_events(n: int, seed: int = 0, recurring_ratio: float = 0.2, exceptions_per_series: int = 5) -> list[W32Event]:
+  # Mock Outlook items: single events in several time zones, all-day events and weekly series with exceptions
+  rnd = random.Random(seed)
+  events: list[W32Event] = []
+  for i in range(n):
+    tz = pytz.timezone(rnd.choice(SYNTHETIC_TIMEZONES))
+    start = tz.localize(SYNTHETIC_START + datetime.timedelta(days=rnd.randrange(365), minutes=30 * rnd.randrange(20)))
+    end = start + datetime.timedelta(minutes=30 * rnd.randint(1, 4))
+    kwargs = {
+      "id": "synthetic-%d" % i,
+      "subject": "Synthetic event %d" % i,
+      "start": start,
+      "end": end,
+      "body": "Body of synthetic event %d" % i,
+      "organizer": "Organizer %d" % rnd.randrange(50),
+      "location": "Room %d" % rnd.randrange(20),
+      "busy_status": rnd.choice(list(w32a_cal.BusyStatus)),
+      "meeting_status": w32a_cal.MeetingStatus.MEETING,
+      "req_attendees": ["Attendee %d" % a for a in rnd.sample(range(200), 5)],
+    }
+
+    if rnd.random() < recurring_ratio:
+      exceptions = []
+      for week in rnd.sample(range(1, 40), exceptions_per_series):
+        original = start + datetime.timedelta(weeks=week)
+        if rnd.random() < 0.5:
+          exceptions.append(W32Exception(original, deleted=True))
+        else:
+          moved = original + datetime.timedelta(hours=1)
+          exceptions.append(W32Exception(original, event=W32Event(id=kwargs["id"], subject=kwargs["subject"] + " (moved)",
+                                                                  start=moved, end=moved + (end - start))))
+      kwargs["recurring"] = True
+      kwargs["recurrence_state"] = w32a_cal.RecurrenceState.MASTER
+      kwargs["recurrence_pattern"] = W32RecurrencePattern(w32a_cal.RecurrenceType.WEEKLY, 1, occurrences=52,
+                                                          day_of_week_mask=1 << ((start.weekday() + 1) % 7),
+                                                          exceptions=exceptions)
+    elif rnd.random() < 0.1:
+      kwargs["all_day"] = True
+
+    events.append(W32Event(**kwargs))
+  return events
@@ -2,41 +2,24 @@ from typing import Optional
 import datetime
 from tabulate import tabulate
 import w32a_cal
+import w32a_session
 import icalendar
 import logging
 
 logging.basicConfig(level=logging.DEBUG)
 
 
-def get_outlook_calendar_folder(start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None, name: Optional[str] = None) -> object:
-  import win32com.client
-
-  Outlook = win32com.client.Dispatch("Outlook.Application")
-  # https://learn.microsoft.com/en-us/office/vba/api/outlook.application.getnamespace
+def get_outlook_calendar_folder(start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None, name: Optional[str] = None,
+                                session: Optional[w32a_session.OutlookSession] = None) -> object:
+  # The session owns Outlook.Application and the MAPI namespace and indexes the calendar folders once,
+  # so repeated calls are a dictionary lookup instead of a COM dispatch and folder walk.
   # https://learn.microsoft.com/en-us/office/vba/api/outlook.namespace
-  # Use GetNameSpace ("MAPI") to return the Outlook NameSpace object from the Application object.
-  ns = Outlook.GetNamespace("MAPI")
-
-  folder = None
-
-  # You can get another folder by name
-  # for x in ns.Folders:
-  #   logging.debug("ns.Folders: %s", x.Name)
-  #   for y in x.Folders:
-  #     logging.debug(y.Name)
-  #     if y.Name == "Calendar":
-  #       for z in y.Folders:
-  #         logging.debug("z.Name: %s", z.Name)
-
-  # for x in ns.GetDefaultFolder(9).Folders:
-  #   logging.debug("default.Folders: %s", x.Name)
-
+  if session is None:
+    session = w32a_session.get_session()
 
   # https://learn.microsoft.com/en-us/office/vba/api/outlook.namespace.getdefaultfolder
   # obtains the default Calendar folder for the user who is currently logged on.
-  # https://learn.microsoft.com/en-us/office/vba/api/outlook.oldefaultfolders
-  # olFolderCalendar 	9 	The Calendar folder.
-  folder = ns.GetDefaultFolder(9)
+  folder = session.calendar_folder
 
   # https://learn.microsoft.com/en-us/office/vba/api/outlook.folder
   if folder is None:
@@ -45,11 +28,11 @@ def get_outlook_calendar_folder(start: Optional[datetime.datetime] = None, end:
   # https://learn.microsoft.com/en-us/office/vba/api/outlook.items
   if name:
     logging.debug("Looking for calendar: %s", name)
-    for cal in folder.Folders:
-      if cal.Name == name:
-        folder = cal
-        logging.debug("Found calendar: %s", cal.Name)
-        break
+    try:
+      folder = session.get_folder(name)
+      logging.debug("Found calendar: %s", folder.Name)
+    except ValueError:
+      logging.debug("Calendar %s not found, using default calendar", name)
 
   return folder
 
@@ -135,9 +118,13 @@ def dump_test_calendar(start: Optional[datetime.datetime] = None, end: Optional[
 
   return ical
 
-def get_outlook_month_events():
+def get_outlook_month_window() -> w32a_cal.Window:
   start:datetime.datetime = datetime.datetime.now()
   end:datetime.datetime = start + datetime.timedelta(days = 34)
+  return (start, end)
+
+def get_outlook_month_events():
+  start, end = get_outlook_month_window()
   appts = get_outlook_events(start, end)
   return appts
 
@@ -158,33 +145,40 @@ def print_outlook_month_events():
     calcTableBody.append(row)
   logging.info("\n%s",tabulate(calcTableBody, headers=calcTableHeader))
 
-def outlook_events_to_ical(appts):
+def outlook_events_to_ical(appts, window: Optional[w32a_cal.Window] = None):
   ical_events = []
   for a in appts:
-    ical_events.extend(w32a_cal.win32_event_to_ical(a))
+    ical_events.extend(w32a_cal.win32_event_to_ical(a, window=window))
   return ical_events
 
 
+def outlook_events_to_records(appts, window: Optional[w32a_cal.Window] = None) -> list[w32a_cal.EventRecord]:
+  records = []
+  for a in appts:
+    records.extend(w32a_cal.win32_event_to_records(a, window=window))
+  return records
+
+
 def print_outlook_month_events_to_ical():
   import logging
   appts = get_outlook_month_events()
-  ical_events = outlook_events_to_ical(appts)
+  # The table is built from the records, no icalendar.Event is created
+  records = outlook_events_to_records(appts, window=get_outlook_month_window())
   calcTableHeader: list[str] = ['Title', 'Organizer', 'Start', 'Duration', 'Recurring', 'Master', 'UID']
   calcTableBody: list[list[str]] = []
-  for e in ical_events:
-    dtstart: icalendar.vDDDTypes = e.get('DTSTART', None)
-    start_str: str = dtstart.dt.strftime(w32a_cal.OUTLOOK_DATETIME_FORMAT) if dtstart is not None else ""
-    duration = e.get('DURATION', None)
-    duration_str: str = str(duration.dt) if dtstart is not None else ""
-    recurring = e.get('RRULE', None) is not None
+  for r in records:
+    start_str: str = r.start.strftime(w32a_cal.OUTLOOK_DATETIME_FORMAT)
+    duration = r.duration if r.duration is not None else (r.end - r.start if r.end is not None else None)
+    duration_str: str = str(duration) if duration is not None else ""
 
     row: list[str] = []
-    row.append(e.get('SUMMARY', ""))
+    row.append(r.summary)
+    row.append(r.organizer or "")
     row.append(start_str)
     row.append(duration_str)
-    row.append(recurring)
-    row.append(recurring and e.get('RECURRENCE-ID', None) is None)
-    row.append(e.get('UID'))
+    row.append(r.is_master or r.is_exception)
+    row.append(r.is_master)
+    row.append(r.uid)
     calcTableBody.append(row)
 
   logging.info("\n%s",tabulate(calcTableBody, headers=calcTableHeader))
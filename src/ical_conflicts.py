@@ -0,0 +1,170 @@
+import datetime
+import heapq
+import logging
+
+import icalendar
+
+from typing import Iterable, Mapping, Optional
+
+import ical_expand
+from ical_expand import Occurrence, UTC
+from w32a_cal import BusyStatus
+
+# Occurrences shown as free in Outlook never conflict, tentative ones only if not ignored
+CONFLICT_IGNORE_DEFAULT = (BusyStatus.FREE,)
+CONFLICT_IGNORE_TENTATIVE = (BusyStatus.FREE, BusyStatus.TENTATIVE)
+
+
+class Conflict:
+  # Two overlapping occurrences, first starts first
+  __slots__ = ("first", "second", "start", "end")
+
+  def __init__(self, first: Occurrence, second: Occurrence) -> None:
+    self.first: Occurrence = first
+    self.second: Occurrence = second
+    self.start: datetime.datetime = max(first.start, second.start)
+    self.end: datetime.datetime = min(first.end, second.end)
+
+  def as_dict(self) -> dict:
+    return {
+      "first": _occurrence_dict(self.first),
+      "second": _occurrence_dict(self.second),
+      "start": self.start.isoformat(),
+      "end": self.end.isoformat(),
+    }
+
+
+class OverbookingGroup:
+  # Transitively overlapping occurrences with more than capacity of them at the same time
+  __slots__ = ("occurrences", "start", "end", "max_concurrent")
+
+  def __init__(self, occurrences: list[Occurrence], max_concurrent: int) -> None:
+    self.occurrences: list[Occurrence] = occurrences
+    self.start: datetime.datetime = occurrences[0].start
+    self.end: datetime.datetime = max(o.end for o in occurrences)
+    self.max_concurrent: int = max_concurrent
+
+  def as_dict(self) -> dict:
+    return {
+      "start": self.start.isoformat(),
+      "end": self.end.isoformat(),
+      "max_concurrent": self.max_concurrent,
+      "occurrences": [_occurrence_dict(o) for o in self.occurrences],
+    }
+
+
+class ConflictReport:
+
+  def __init__(self) -> None:
+    self.occurrences: int = 0
+    self.conflicts: list[Conflict] = []
+    self.groups: list[OverbookingGroup] = []
+    # True if max_conflicts was reached and conflicts is incomplete
+    self.truncated: bool = False
+
+  def as_dict(self) -> dict:
+    return {
+      "occurrences": self.occurrences,
+      "conflicts": [c.as_dict() for c in self.conflicts],
+      "groups": [g.as_dict() for g in self.groups],
+      "truncated": self.truncated,
+    }
+
+
+def _occurrence_dict(o: Occurrence) -> dict:
+  return {
+    "uid": o.uid,
+    "recurrence_id": o.recurrence_id.isoformat() if o.recurrence_id is not None else None,
+    "start": o.start.isoformat(),
+    "end": o.end.isoformat(),
+    "summary": o.summary,
+    "source": o.source,
+  }
+
+def _sweep(busy: list[Occurrence], capacity: int, same_uid: bool, max_conflicts: Optional[int],
+           report: ConflictReport) -> None:
+  # busy sorted by start. Heap of the active occurrences by end: O(n log n + k) for k conflicts.
+  # Occurrences that only touch (end == start) do not overlap.
+  # (end, seq, occurrence)
+  active: list[tuple[datetime.datetime, int, Occurrence]] = []
+  group: list[Occurrence] = []
+  group_max = 0
+
+  for seq, o in enumerate(busy):
+    while active and active[0][0] <= o.start:
+      heapq.heappop(active)
+    if not active:
+      if group_max > capacity:
+        report.groups.append(OverbookingGroup(group, group_max))
+      group = []
+      group_max = 0
+
+    for _end, _seq, other in active:
+      if not same_uid and other.uid == o.uid:
+        continue
+      if max_conflicts is not None and len(report.conflicts) >= max_conflicts:
+        report.truncated = True
+        break
+      report.conflicts.append(Conflict(other, o))
+
+    heapq.heappush(active, (o.end, seq, o))
+    group.append(o)
+    if len(active) > group_max:
+      group_max = len(active)
+  if group_max > capacity:
+    report.groups.append(OverbookingGroup(group, group_max))
+
+def sweep_conflicts(occurrences: Iterable[Occurrence],
+                    capacity: int = 1,
+                    ignore: Iterable[BusyStatus] = CONFLICT_IGNORE_DEFAULT,
+                    same_uid: bool = False,
+                    per_source: bool = False,
+                    max_conflicts: Optional[int] = None) -> ConflictReport:
+  # Overlapping pairs and groups of more than capacity concurrent occurrences, sorted by start.
+  # All occurrences are treated as one resource (e.g. a person's calendars), with per_source=True
+  # each Occurrence.source is a resource of its own (e.g. rooms).
+  # With same_uid=False, occurrences of the same UID never conflict and the same occurrence
+  # found in several calendars counts once.
+  if capacity < 1:
+    raise ValueError("capacity must be at least 1")
+  ignore = frozenset(ignore)
+  busy = [o for o in occurrences if o.busy_status not in ignore]
+  if not same_uid:
+    seen: set = set()
+    unique: list[Occurrence] = []
+    for o in busy:
+      key = (o.source if per_source else None, o.uid, o.start, o.end)
+      if key not in seen:
+        seen.add(key)
+        unique.append(o)
+    busy = unique
+  busy.sort(key=lambda o: (o.start, o.end))
+
+  report = ConflictReport()
+  report.occurrences = len(busy)
+  if per_source:
+    by_source: dict[Optional[str], list[Occurrence]] = {}
+    for o in busy:
+      by_source.setdefault(o.source, []).append(o)
+    for source_busy in by_source.values():
+      _sweep(source_busy, capacity, same_uid, max_conflicts, report)
+  else:
+    _sweep(busy, capacity, same_uid, max_conflicts, report)
+
+  report.conflicts.sort(key=lambda c: (c.first.start, c.second.start))
+  report.groups.sort(key=lambda g: g.start)
+  logging.debug("Conflicts: %d occurrences, %d conflicts, %d overbooked groups",
+                report.occurrences, len(report.conflicts), len(report.groups))
+  return report
+
+def find_conflicts(calendars: Mapping[str, Iterable[icalendar.Event]],
+                   window_start: datetime.datetime,
+                   window_end: datetime.datetime,
+                   default_tz: datetime.tzinfo = UTC,
+                   **kwargs) -> ConflictReport:
+  # Expands the events of each calendar within the window (Occurrence.source is the calendar name)
+  # and sweeps over all of them, see sweep_conflicts for the options
+  occurrences: list[Occurrence] = []
+  for source, events in calendars.items():
+    occurrences.extend(ical_expand.expand_events(events, window_start, window_end, default_tz=default_tz, source=source))
+  return sweep_conflicts(occurrences, **kwargs)
@@ -0,0 +1,178 @@
+import datetime
+import hashlib
+import icalendar
+
+from typing import Iterable, Optional, Union
+
+# Properties that change on every export without the event itself changing.
+# SEQUENCE and LAST-MODIFIED are compared separately.
+DIFF_IGNORE_PROPERTIES = frozenset([
+  "DTSTAMP",
+  "SEQUENCE",
+  "LAST-MODIFIED",
+  ])
+
+EventKey = tuple[str, Optional[str]]
+
+CalendarSource = Union[icalendar.Calendar, Iterable[icalendar.Event]]
+
+
+class CalendarDiff:
+
+  def __init__(self) -> None:
+    self.added: list[icalendar.Event] = []
+    # (old, new) pairs
+    self.modified: list[tuple[icalendar.Event, icalendar.Event]] = []
+    self.removed: list[icalendar.Event] = []
+    self.unchanged: int = 0
+
+  def is_empty(self) -> bool:
+    return not (self.added or self.modified or self.removed)
+
+  def __len__(self) -> int:
+    return len(self.added) + len(self.modified) + len(self.removed)
+
+  def __repr__(self) -> str:
+    return "<CalendarDiff added=%d modified=%d removed=%d unchanged=%d>" % (
+      len(self.added), len(self.modified), len(self.removed), self.unchanged)
+
+
+def iter_events(source: CalendarSource) -> Iterable[icalendar.Event]:
+  if isinstance(source, icalendar.Calendar):
+    return source.walk('VEVENT')
+  return source
+
+def event_key(event: icalendar.Event) -> EventKey:
+  # https://icalendar.org/iCalendar-RFC-5545/3-8-4-4-recurrence-id.html
+  # A recurrence instance is identified by UID and RECURRENCE-ID together
+  uid = str(event.get('UID', ""))
+  recurrence_id = event.get('RECURRENCE-ID', None)
+  if recurrence_id is None:
+    return (uid, None)
+  return (uid, _recurrence_id_key(recurrence_id))
+
+def _recurrence_id_key(recurrence_id) -> str:
+  # The same instant matches however it is written: zoned date-times are keyed in UTC, e.g. "20240305T090000Z".
+  # Floating date-times and dates keep their form; a TZID icalendar could not resolve is kept in the key.
+  dt = getattr(recurrence_id, "dt", None)
+  if isinstance(dt, datetime.datetime) and dt.tzinfo is not None:
+    return dt.astimezone(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+  value = recurrence_id.to_ical().decode()
+  tzid = getattr(recurrence_id, "params", {}).get('TZID', None)
+  if tzid is not None:
+    return "TZID=%s:%s" % (tzid, value)
+  return value
+
+def event_fingerprint(event: icalendar.Event, ignore: frozenset = DIFF_IGNORE_PROPERTIES) -> str:
+  h = hashlib.sha1()
+  for name, value in event.property_items(recursive=True, sorted=True):
+    if name in ignore:
+      continue
+    h.update(event.content_line(name, value).to_ical())
+    h.update(b"\n")
+  return h.hexdigest()
+
+def index_events(source: CalendarSource) -> dict[EventKey, icalendar.Event]:
+  index: dict[EventKey, icalendar.Event] = {}
+  for event in iter_events(source):
+    index[event_key(event)] = event
+  return index
+
+def _event_sequence(event: icalendar.Event) -> int:
+  return int(event.get('SEQUENCE', 0))
+
+def _event_last_modified(event: icalendar.Event) -> Optional[datetime.datetime]:
+  last_modified = event.get('LAST-MODIFIED', None)
+  if last_modified is None:
+    return None
+  return last_modified.dt
+
+def event_changed(old: icalendar.Event, new: icalendar.Event, compare_fingerprint: bool = True) -> bool:
+  if _event_sequence(old) != _event_sequence(new):
+    return True
+
+  old_modified = _event_last_modified(old)
+  new_modified = _event_last_modified(new)
+  if old_modified is not None and new_modified is not None and old_modified != new_modified:
+    return True
+
+  if compare_fingerprint:
+    return event_fingerprint(old) != event_fingerprint(new)
+
+  return False
+
+def diff_calendars(old: CalendarSource, new: CalendarSource, compare_fingerprint: bool = True) -> CalendarDiff:
+  # Both sides are indexed once by (UID, RECURRENCE-ID), so the diff is linear in the number of events
+  diff = CalendarDiff()
+
+  old_index = index_events(old)
+  seen: set[EventKey] = set()
+
+  for new_event in iter_events(new):
+    key = event_key(new_event)
+    seen.add(key)
+    old_event = old_index.get(key, None)
+    if old_event is None:
+      diff.added.append(new_event)
+    elif event_changed(old_event, new_event, compare_fingerprint=compare_fingerprint):
+      diff.modified.append((old_event, new_event))
+    else:
+      diff.unchanged += 1
+
+  for key, old_event in old_index.items():
+    if key not in seen:
+      diff.removed.append(old_event)
+
+  return diff
+
+
+def _new_delta_calendar(method: str, timezones: list[icalendar.Timezone], prodid: str) -> icalendar.Calendar:
+  cal = icalendar.Calendar()
+  cal.add('PRODID', prodid)
+  cal.add('VERSION', "2.0")
+  # https://datatracker.ietf.org/doc/html/rfc5546#section-3.2
+  cal.add('METHOD', method)
+  for tz in timezones:
+    cal.add_component(tz)
+  return cal
+
+def _cancel_event(event: icalendar.Event) -> icalendar.Event:
+  # https://datatracker.ietf.org/doc/html/rfc5546#section-3.2.5
+  cancel = icalendar.Event()
+  cancel.add('UID', event.get('UID'))
+  if event.get('RECURRENCE-ID', None) is not None:
+    cancel['RECURRENCE-ID'] = event.get('RECURRENCE-ID')
+  if event.get('DTSTART', None) is not None:
+    cancel['DTSTART'] = event.get('DTSTART')
+  cancel.add('DTSTAMP', datetime.datetime.now(datetime.timezone.utc))
+  cancel.add('SEQUENCE', _event_sequence(event) + 1)
+  cancel.add('STATUS', "CANCELLED")
+  return cancel
+
+def diff_to_itip(diff: CalendarDiff,
+                 timezones: Optional[CalendarSource] = None,
+                 prodid: str = "-//pyw32ical//diff//EN") -> list[icalendar.Calendar]:
+  # iTIP allows one METHOD per calendar object, so the delta is a PUBLISH calendar
+  # with added and modified events and a CANCEL calendar with removed events.
+  # Empty calendars are not returned.
+  tz_list: list[icalendar.Timezone] = []
+  if isinstance(timezones, icalendar.Calendar):
+    tz_list = timezones.walk('VTIMEZONE')
+
+  delta: list[icalendar.Calendar] = []
+
+  if diff.added or diff.modified:
+    publish = _new_delta_calendar("PUBLISH", tz_list, prodid)
+    for event in diff.added:
+      publish.add_component(event)
+    for _old, event in diff.modified:
+      publish.add_component(event)
+    delta.append(publish)
+
+  if diff.removed:
+    cancel = _new_delta_calendar("CANCEL", tz_list, prodid)
+    for event in diff.removed:
+      cancel.add_component(_cancel_event(event))
+    delta.append(cancel)
+
+  return delta
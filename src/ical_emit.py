@@ -0,0 +1,304 @@
+import contextlib
+import datetime
+import gzip
+import io
+import json
+import logging
+import time
+
+import icalendar
+
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional, Union
+
+import ical_diff
+import ical_vtimezone
+import w32a_export
+import w32a_metrics
+
+FORMAT_ICS = "ics"
+FORMAT_JCAL = "jcal"
+FORMATS = (FORMAT_ICS, FORMAT_JCAL)
+
+COMPRESSION_GZIP = "gzip"
+COMPRESSION_ZSTD = "zstd"
+COMPRESSIONS = (None, COMPRESSION_GZIP, COMPRESSION_ZSTD)
+
+FORMAT_EXTENSIONS = {
+  FORMAT_ICS: ".ics",
+  FORMAT_JCAL: ".json",
+}
+COMPRESSION_EXTENSIONS = {
+  None: "",
+  COMPRESSION_GZIP: ".gz",
+  COMPRESSION_ZSTD: ".zst",
+}
+
+EmitSource = Union[icalendar.Calendar, Iterable[icalendar.cal.Component]]
+
+_ICS_END = b"END:VCALENDAR\r\n"
+
+
+def output_extension(format: str = FORMAT_ICS, compression: Optional[str] = None) -> str:
+  if format not in FORMAT_EXTENSIONS:
+    raise ValueError("Unknown format: %s" % format)
+  if compression not in COMPRESSION_EXTENSIONS:
+    raise ValueError("Unknown compression: %s" % compression)
+  return FORMAT_EXTENSIONS[format] + COMPRESSION_EXTENSIONS[compression]
+
+def _jcal_datetime(dt: datetime.datetime) -> str:
+  # https://www.rfc-editor.org/rfc/rfc7265#section-3.5.5
+  value = dt.strftime("%Y-%m-%dT%H:%M:%S")
+  if dt.tzinfo is not None and dt.utcoffset() == datetime.timedelta(0) and dt.tzinfo.tzname(dt) in ("UTC", "Z", "GMT"):
+    value += "Z"
+  return value
+
+def _jcal_ddd(value) -> tuple[str, object]:
+  # vDDDTypes: DATE, DATE-TIME, DURATION or PERIOD
+  dt = value.dt if hasattr(value, 'dt') else value
+  if isinstance(dt, datetime.datetime):
+    return "date-time", _jcal_datetime(dt)
+  if isinstance(dt, datetime.date):
+    return "date", dt.isoformat()
+  if isinstance(dt, datetime.timedelta):
+    return "duration", icalendar.vDuration(dt).to_ical().decode()
+  if isinstance(dt, tuple):
+    start, end = dt
+    return "period", "%s/%s" % (_jcal_ddd(start)[1], _jcal_ddd(end)[1])
+  return "unknown", value.to_ical().decode()
+
+def _jcal_recur(value: icalendar.vRecur) -> dict:
+  # https://www.rfc-editor.org/rfc/rfc7265#section-3.6.10
+  recur: dict = {}
+  for key, values in value.items():
+    if not isinstance(values, list):
+      values = [values]
+    values = [_jcal_ddd(v)[1] if isinstance(v, (datetime.date, datetime.datetime)) else v for v in values]
+    recur[key.lower()] = values[0] if len(values) == 1 else values
+  return recur
+
+def property_to_jcal(name: str, value) -> list:
+  # [name, parameters, type, value, ...]
+  # https://www.rfc-editor.org/rfc/rfc7265#section-3.4
+  params = {k.lower(): v for k, v in getattr(value, 'params', {}).items() if k.upper() != 'VALUE'}
+
+  if isinstance(value, icalendar.prop.vDDDLists):
+    values = [_jcal_ddd(v) for v in value.dts]
+    value_type = values[0][0] if values else "date-time"
+    return [name.lower(), params, value_type] + [v for _t, v in values]
+  if isinstance(value, icalendar.vDDDTypes):
+    value_type, jcal_value = _jcal_ddd(value)
+    return [name.lower(), params, value_type, jcal_value]
+  if isinstance(value, icalendar.vRecur):
+    return [name.lower(), params, "recur", _jcal_recur(value)]
+  if isinstance(value, icalendar.prop.vCategory):
+    return [name.lower(), params, "text"] + [str(c) for c in value.cats]
+  if isinstance(value, icalendar.vCalAddress):
+    return [name.lower(), params, "cal-address", str(value)]
+  if isinstance(value, icalendar.vUri):
+    return [name.lower(), params, "uri", str(value)]
+  if isinstance(value, icalendar.vBoolean):
+    return [name.lower(), params, "boolean", bool(value)]
+  if isinstance(value, int):
+    return [name.lower(), params, "integer", int(value)]
+  if isinstance(value, icalendar.vUTCOffset):
+    offset = value.to_ical()
+    return [name.lower(), params, "utc-offset", offset[:3] + ":" + offset[3:5]]
+  if isinstance(value, icalendar.vGeo):
+    return [name.lower(), params, "float", [value.latitude, value.longitude]]
+  if isinstance(value, icalendar.vText) or isinstance(value, str):
+    return [name.lower(), params, "text", str(value)]
+  return [name.lower(), params, "unknown", value.to_ical().decode()]
+
+def component_to_jcal(component: icalendar.cal.Component) -> list:
+  # [name, properties, components]
+  # https://www.rfc-editor.org/rfc/rfc7265#section-3.3
+  properties = []
+  for name, values in component.items():
+    for value in (values if isinstance(values, list) else [values]):
+      properties.append(property_to_jcal(name, value))
+  return [component.name.lower(), properties, [component_to_jcal(c) for c in component.subcomponents]]
+
+def _iter_components(source: EmitSource, timezones: Optional[Iterable[icalendar.Timezone]]) -> Iterator[icalendar.cal.Component]:
+  if isinstance(source, icalendar.Calendar):
+    source = source.subcomponents
+  if timezones:
+    yield from timezones
+  yield from source
+
+def _frame_calendar(prodid: str, calendar: Optional[icalendar.Calendar] = None) -> icalendar.Calendar:
+  # VCALENDAR without components: the properties of calendar (METHOD, X-WR-CALNAME, its PRODID, ...)
+  # or a new calendar with prodid
+  if calendar is None:
+    return w32a_export.new_calendar(prodid)
+  frame = icalendar.Calendar()
+  frame.update(calendar)
+  if 'PRODID' not in frame:
+    frame.add('PRODID', prodid)
+  if 'VERSION' not in frame:
+    frame.add('VERSION', "2.0")
+  return frame
+
+def _ics_frame(prodid: str, calendar: Optional[icalendar.Calendar] = None) -> tuple[bytes, bytes, bytes]:
+  # (head, separator, tail) around the serialized components
+  head = _frame_calendar(prodid, calendar).to_ical()
+  return head[:-len(_ICS_END)], b"", _ICS_END
+
+def _jcal_frame(prodid: str, calendar: Optional[icalendar.Calendar] = None) -> tuple[bytes, bytes, bytes]:
+  head = component_to_jcal(_frame_calendar(prodid, calendar))
+  return json.dumps(head[:2], ensure_ascii=False, separators=(",", ":"))[:-1].encode("utf-8") + b",[", b",", b"]]"
+
+def _jcal_bytes(component: icalendar.cal.Component) -> bytes:
+  return json.dumps(component_to_jcal(component), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+FRAMES = {
+  FORMAT_ICS: _ics_frame,
+  FORMAT_JCAL: _jcal_frame,
+}
+
+SERIALIZERS = {
+  FORMAT_ICS: lambda component: component.to_ical(),
+  FORMAT_JCAL: _jcal_bytes,
+}
+
+def serialize_component(component: icalendar.cal.Component, format: str = FORMAT_ICS) -> bytes:
+  # One component as it appears in the output of the format, see write_serialized
+  if format not in SERIALIZERS:
+    raise ValueError("Unknown format: %s" % format)
+  return SERIALIZERS[format](component)
+
+def write_serialized(chunks: Iterable[bytes], fp: BinaryIO,
+                     format: str = FORMAT_ICS,
+                     prodid: str = w32a_export.ICAL_PRODID,
+                     calendar: Optional[icalendar.Calendar] = None) -> int:
+  # Writes components that were already serialized with serialize_component, e.g. spilled to disk.
+  # The VCALENDAR gets the properties of calendar if given, its components are not written.
+  if format not in FRAMES:
+    raise ValueError("Unknown format: %s" % format)
+  head, separator, tail = FRAMES[format](prodid, calendar)
+  fp.write(head)
+  count = 0
+  for chunk in chunks:
+    if count and separator:
+      fp.write(separator)
+    fp.write(chunk)
+    count += 1
+  fp.write(tail)
+  return count
+
+def write_ics(source: EmitSource, fp: BinaryIO,
+              prodid: str = w32a_export.ICAL_PRODID,
+              timezones: Optional[Iterable[icalendar.Timezone]] = None) -> int:
+  # Writes the calendar component by component instead of serializing it as a whole.
+  # A Calendar keeps its own properties, prodid is used for other sources.
+  return write_serialized((c.to_ical() for c in _iter_components(source, timezones)), fp, FORMAT_ICS, prodid,
+                          calendar=source if isinstance(source, icalendar.Calendar) else None)
+
+def write_jcal(source: EmitSource, fp: BinaryIO,
+               prodid: str = w32a_export.ICAL_PRODID,
+               timezones: Optional[Iterable[icalendar.Timezone]] = None) -> int:
+  # Streaming jCal (RFC 7265): one JSON array per component, written as it is converted
+  return write_serialized((_jcal_bytes(c) for c in _iter_components(source, timezones)), fp, FORMAT_JCAL, prodid,
+                          calendar=source if isinstance(source, icalendar.Calendar) else None)
+
+EMITTERS = {
+  FORMAT_ICS: write_ics,
+  FORMAT_JCAL: write_jcal,
+}
+
+def _zstd_open(fp: BinaryIO):
+  # zstd is optional: the standard library module of Python 3.14 or the zstandard package
+  try:
+    from compression import zstd
+    return zstd.ZstdFile(fp, mode="wb")
+  except ImportError:
+    pass
+  try:
+    import zstandard
+  except ImportError:
+    raise ImportError("zstd compression requires Python 3.14 or the zstandard package")
+  return zstandard.ZstdCompressor().stream_writer(fp, closefd=False)
+
+@contextlib.contextmanager
+def compressed_writer(fp: BinaryIO, compression: Optional[str] = None) -> Iterator[BinaryIO]:
+  if compression not in COMPRESSIONS:
+    raise ValueError("Unknown compression: %s" % compression)
+  if compression is None:
+    yield fp
+    return
+  if compression == COMPRESSION_GZIP:
+    # mtime=0 keeps the output reproducible, e.g. for content hashes
+    writer = gzip.GzipFile(fileobj=fp, mode="wb", mtime=0)
+  else:
+    writer = _zstd_open(fp)
+  try:
+    yield writer
+  finally:
+    writer.close()
+
+def emit(source: EmitSource, fp: BinaryIO,
+         format: str = FORMAT_ICS,
+         compression: Optional[str] = None,
+         prodid: str = w32a_export.ICAL_PRODID,
+         timezones: Optional[Iterable[icalendar.Timezone]] = None) -> int:
+  # Writes events (or a whole calendar) in the given format to a binary stream, returns the number of components
+  if format not in EMITTERS:
+    raise ValueError("Unknown format: %s" % format)
+  with compressed_writer(fp, compression) as writer:
+    return EMITTERS[format](source, writer, prodid=prodid, timezones=timezones)
+
+def emit_bytes(source: EmitSource,
+               format: str = FORMAT_ICS,
+               compression: Optional[str] = None,
+               prodid: str = w32a_export.ICAL_PRODID,
+               timezones: Optional[Iterable[icalendar.Timezone]] = None) -> bytes:
+  buf = io.BytesIO()
+  emit(source, buf, format=format, compression=compression, prodid=prodid, timezones=timezones)
+  return buf.getvalue()
+
+def export_folders_to(specs: Iterable[w32a_export.FolderSpec], fp: BinaryIO,
+                      format: str = FORMAT_ICS,
+                      compression: Optional[str] = None,
+                      prodid: str = w32a_export.ICAL_PRODID,
+                      folder_resolver: Callable[[Optional[str]], object] = w32a_export.get_outlook_calendar_folder,
+                      pipeline_workers: Optional[int] = None) -> list[w32a_export.SourceReport]:
+  # Streaming variant of w32a_export.export_folders: every event is written as soon as it is converted,
+  # only the (UID, RECURRENCE-ID) keys for de-duplication and the time zones in use are kept.
+  # Sources are exported one after another (pipeline_workers converts the items of a source in parallel);
+  # the first source wins on duplicates and a failing source is reported, not raised.
+  # The VTIMEZONEs follow the events, RFC 5545 does not order the components of a calendar.
+  if format not in SERIALIZERS:
+    raise ValueError("Unknown format: %s" % format)
+  serializer = SERIALIZERS[format]
+  sink = w32a_metrics.get_sink()
+  reports: list[w32a_export.SourceReport] = []
+
+  def _chunks() -> Iterator[bytes]:
+    seen: set[ical_diff.EventKey] = set()
+    timezones = ical_vtimezone.TimezoneCollector()
+    for spec in specs:
+      report = w32a_export.SourceReport(spec.label)
+      reports.append(report)
+      t0 = time.perf_counter()
+      try:
+        for event in w32a_export.iter_source_events(spec, folder_resolver, report, pipeline_workers):
+          key = ical_diff.event_key(event)
+          if key in seen:
+            report.duplicates += 1
+            continue
+          seen.add(key)
+          timezones.add(event)
+          with sink.stage(w32a_metrics.STAGE_SERIALIZE):
+            chunk = serializer(event)
+          report.events += 1
+          yield chunk
+      except Exception as e:
+        # Events of the source that were already written stay in the output
+        logging.exception("Export of calendar %s failed", spec.label)
+        report.error = e
+      report.seconds = time.perf_counter() - t0
+    for timezone in timezones.timezones():
+      yield serializer(timezone)
+
+  with compressed_writer(fp, compression) as writer:
+    write_serialized(_chunks(), writer, format=format, prodid=prodid)
+  return reports
@@ -0,0 +1,248 @@
+import collections
+import datetime
+import re
+
+import icalendar
+
+from dateutil import rrule as dateutil_rrule
+from typing import Iterable, Optional
+
+import w32a_cal
+import w32a_tz
+from w32a_cal import BusyStatus, ICAL_BUSYSTATUS
+
+UTC = datetime.timezone.utc
+
+_UNTIL_RE = re.compile(r";?UNTIL=[^;]*")
+
+# Upper bound of the time between two occurrences per FREQ, for the span of series with COUNT
+_FREQ_PERIOD = {
+  "SECONDLY": datetime.timedelta(seconds=1),
+  "MINUTELY": datetime.timedelta(minutes=1),
+  "HOURLY": datetime.timedelta(hours=1),
+  "DAILY": datetime.timedelta(days=1),
+  "WEEKLY": datetime.timedelta(weeks=1),
+  "MONTHLY": datetime.timedelta(days=31),
+  "YEARLY": datetime.timedelta(days=366),
+}
+
+
+class Occurrence:
+  # One concrete occurrence of an event, start and end in UTC
+  __slots__ = ("uid", "recurrence_id", "start", "end", "all_day", "busy_status", "summary", "location",
+               "categories", "source")
+
+  def __init__(self, uid: str, recurrence_id: Optional[datetime.datetime],
+               start: datetime.datetime, end: datetime.datetime,
+               all_day: bool = False,
+               busy_status: BusyStatus = BusyStatus.BUSY,
+               summary: str = "",
+               location: str = "",
+               categories: tuple = (),
+               source: Optional[str] = None) -> None:
+    self.uid: str = uid
+    # Original start of a recurring occurrence, None for single events
+    self.recurrence_id: Optional[datetime.datetime] = recurrence_id
+    self.start: datetime.datetime = start
+    self.end: datetime.datetime = end
+    self.all_day: bool = all_day
+    self.busy_status: BusyStatus = busy_status
+    self.summary: str = summary
+    self.location: str = location
+    self.categories: tuple = categories
+    # Calendar the occurrence belongs to, set by the caller
+    self.source: Optional[str] = source
+
+  def __repr__(self) -> str:
+    return "<Occurrence %s %s - %s>" % (self.uid, self.start.isoformat(), self.end.isoformat())
+
+
+def event_busy_status(event: icalendar.Event) -> BusyStatus:
+  return w32a_cal.ical_busy_status(event)
+
+def event_categories(event: icalendar.Event) -> tuple:
+  categories = event.get('CATEGORIES', None)
+  if categories is None:
+    return ()
+  names: list[str] = []
+  for prop in as_list(categories):
+    for name in getattr(prop, 'cats', [prop]):
+      # the converter adds Outlook's ", " separated string as one value
+      names.extend(n.strip() for n in str(name).split(",") if n.strip())
+  return tuple(names)
+
+def as_list(value) -> list:
+  if value is None:
+    return []
+  if isinstance(value, list):
+    return value
+  return [value]
+
+def _localize(tz: datetime.tzinfo, naive: datetime.datetime) -> datetime.datetime:
+  return w32a_tz.localize(tz, naive)
+
+def to_datetime(value, default_tz: datetime.tzinfo) -> datetime.datetime:
+  # DATE and floating DATE-TIME values are interpreted in default_tz
+  if not isinstance(value, datetime.datetime):
+    value = datetime.datetime(value.year, value.month, value.day)
+  if value.tzinfo is None:
+    value = _localize(default_tz, value)
+  return value
+
+def event_times(event: icalendar.Event, default_tz: datetime.tzinfo) -> tuple[datetime.datetime, datetime.timedelta, bool]:
+  dtstart = event.get('DTSTART').dt
+  all_day = not isinstance(dtstart, datetime.datetime)
+  start = to_datetime(dtstart, default_tz)
+  dtend = event.get('DTEND', None)
+  if dtend is not None:
+    duration = to_datetime(dtend.dt, default_tz) - start
+  elif event.get('DURATION', None) is not None:
+    duration = event.get('DURATION').dt
+  else:
+    duration = datetime.timedelta(days=1) if all_day else datetime.timedelta()
+  return start, duration, all_day
+
+def series_end(event: icalendar.Event, start: datetime.datetime, duration: datetime.timedelta,
+               default_tz: datetime.tzinfo) -> Optional[datetime.datetime]:
+  # Latest possible end of a series: its UNTIL, an upper bound from COUNT, or None if it never ends
+  rrule = event.get('RRULE', None)
+  if isinstance(rrule, list):
+    rrule = rrule[0] if len(rrule) == 1 else None
+  if rrule is None:
+    return None
+  until = as_list(rrule.get('UNTIL', None))
+  if until:
+    return to_datetime(until[0], default_tz) + duration + datetime.timedelta(days=1)
+  count = as_list(rrule.get('COUNT', None))
+  freq = as_list(rrule.get('FREQ', None))
+  if count and freq and freq[0] in _FREQ_PERIOD:
+    interval = as_list(rrule.get('INTERVAL', None)) or [1]
+    return start + _FREQ_PERIOD[freq[0]] * int(interval[0]) * int(count[0]) + duration
+  return None
+
+def _occurrence_keys(dt: datetime.datetime) -> tuple:
+  # The converter writes RECURRENCE-ID and EXDATE as the wall-clock time of the master marked as UTC,
+  # Outlook exports write the real instant with a TZID: both are matched
+  return (dt.astimezone(UTC), dt.replace(tzinfo=None))
+
+def _date_keys(values, default_tz: datetime.tzinfo) -> set:
+  keys: set = set()
+  for value in values:
+    keys.update(_occurrence_keys(to_datetime(value, default_tz)))
+  return keys
+
+def _event_attributes(event: icalendar.Event) -> dict:
+  # Attributes shared by all occurrences of an event
+  return {
+    "busy_status": event_busy_status(event),
+    "summary": str(event.get('SUMMARY', "")),
+    "location": str(event.get('LOCATION', "")),
+    "categories": event_categories(event),
+  }
+
+def _make_occurrence(attributes: dict, uid: str, recurrence_id: Optional[datetime.datetime],
+                     start: datetime.datetime, duration: datetime.timedelta, all_day: bool,
+                     source: Optional[str]) -> Occurrence:
+  return Occurrence(uid, recurrence_id.astimezone(UTC) if recurrence_id is not None else None,
+                    start.astimezone(UTC), (start + duration).astimezone(UTC),
+                    all_day=all_day, source=source, **attributes)
+
+def _overlaps(start: datetime.datetime, end: datetime.datetime,
+              window_start: Optional[datetime.datetime], window_end: Optional[datetime.datetime]) -> bool:
+  if window_start is not None and end <= window_start and start < window_start:
+    return False
+  if window_end is not None and start >= window_end:
+    return False
+  return True
+
+def _expand_master(master: icalendar.Event, overrides: dict, uid: str,
+                   window_start: Optional[datetime.datetime], window_end: Optional[datetime.datetime],
+                   default_tz: datetime.tzinfo, source: Optional[str], max_occurrences: int) -> list[Occurrence]:
+  start, duration, all_day = event_times(master, default_tz)
+  tz = start.tzinfo
+
+  # Expanded in wall-clock time of DTSTART, so occurrences keep their local time across DST changes
+  naive_start = start.replace(tzinfo=None)
+  rrule_text = master.get('RRULE').to_ical().decode()
+  rule = dateutil_rrule.rrulestr(_UNTIL_RE.sub("", rrule_text), dtstart=naive_start)
+  until = master.get('RRULE').get('UNTIL', None)
+  if until:
+    until = as_list(until)[0]
+    if not isinstance(until, datetime.datetime):
+      # UNTIL as DATE includes the whole day
+      until = datetime.datetime.combine(until, datetime.time.max)
+    until = to_datetime(until, tz)
+    rule = rule.replace(until=until.astimezone(tz).replace(tzinfo=None))
+
+  excluded: set = set()
+  for exdate in as_list(master.get('EXDATE', None)):
+    excluded |= _date_keys([d.dt for d in exdate.dts], tz)
+  excluded |= overrides.keys()
+
+  lower = (window_start - duration).astimezone(tz).replace(tzinfo=None) if window_start is not None else naive_start
+  if window_end is not None:
+    naive_occurrences = rule.between(lower, window_end.astimezone(tz).replace(tzinfo=None), inc=True)
+  else:
+    naive_occurrences = []
+    for naive in rule.xafter(lower, inc=True):
+      if len(naive_occurrences) >= max_occurrences:
+        break
+      naive_occurrences.append(naive)
+
+  attributes = _event_attributes(master)
+  occurrences: list[Occurrence] = []
+  for naive in naive_occurrences:
+    occurrence_start = _localize(tz, naive)
+    if excluded and not excluded.isdisjoint(_occurrence_keys(occurrence_start)):
+      continue
+    if _overlaps(occurrence_start, occurrence_start + duration, window_start, window_end):
+      occurrences.append(_make_occurrence(attributes, uid, occurrence_start, occurrence_start, duration, all_day, source))
+  return occurrences
+
+def expand_events(events: Iterable[icalendar.Event],
+                  window_start: Optional[datetime.datetime] = None,
+                  window_end: Optional[datetime.datetime] = None,
+                  default_tz: datetime.tzinfo = UTC,
+                  source: Optional[str] = None,
+                  max_occurrences: int = 10000) -> list[Occurrence]:
+  # Occurrences of converted events overlapping the window, sorted by start.
+  # RRULE series are expanded, EXDATE and RECURRENCE-ID events replace their occurrences.
+  # Without window_end a series without end is cut after max_occurrences.
+  masters: collections.OrderedDict[str, icalendar.Event] = collections.OrderedDict()
+  overrides: dict[str, dict] = collections.defaultdict(dict)
+  singles: list[icalendar.Event] = []
+  for event in events:
+    if event.get('DTSTART', None) is None:
+      continue
+    uid = str(event.get('UID', ""))
+    if event.get('RECURRENCE-ID', None) is not None:
+      recurrence_id = to_datetime(event.get('RECURRENCE-ID').dt, default_tz)
+      for key in _occurrence_keys(recurrence_id):
+        overrides[uid][key] = (recurrence_id, event)
+    elif event.get('RRULE', None) is not None:
+      masters[uid] = event
+    else:
+      singles.append(event)
+
+  occurrences: list[Occurrence] = []
+  for event in singles:
+    start, duration, all_day = event_times(event, default_tz)
+    if _overlaps(start, start + duration, window_start, window_end):
+      occurrences.append(_make_occurrence(_event_attributes(event), str(event.get('UID', "")), None, start, duration, all_day, source))
+
+  for uid, master in masters.items():
+    occurrences.extend(_expand_master(master, overrides.get(uid, {}), uid, window_start, window_end,
+                                      default_tz, source, max_occurrences))
+
+  for uid, uid_overrides in overrides.items():
+    seen: set[int] = set()
+    for recurrence_id, event in uid_overrides.values():
+      if id(event) in seen:
+        continue
+      seen.add(id(event))
+      start, duration, all_day = event_times(event, default_tz)
+      if _overlaps(start, start + duration, window_start, window_end):
+        occurrences.append(_make_occurrence(_event_attributes(event), uid, recurrence_id, start, duration, all_day, source))
+
+  occurrences.sort(key=lambda o: (o.start, o.end, o.uid))
+  return occurrences
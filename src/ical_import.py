@@ -0,0 +1,430 @@
+from typing import Callable, Iterable, Iterator, Optional
+import collections
+import datetime
+import logging
+
+import icalendar
+
+import w32a_cal
+import w32a_tz
+from w32a_cal import BusyStatus, ICAL_BUSYSTATUS, MeetingStatus, Importance, RecurrenceState, RecurrenceType, DayOfWeekMaskEnum
+from w32obj import W32Event, W32RecurrencePattern, W32Exception
+
+IMPORT_BATCH_SIZE = 1000
+# Recurring masters are held back until their exceptions have been seen, at most this many at a time
+IMPORT_MAX_PENDING = 10000
+
+# https://learn.microsoft.com/en-us/office/vba/api/outlook.olitemtype
+OL_APPOINTMENT_ITEM = 1
+
+ICAL_WEEKDAY_MASK = {
+  "MO": DayOfWeekMaskEnum.MONDAY,
+  "TU": DayOfWeekMaskEnum.TUESDAY,
+  "WE": DayOfWeekMaskEnum.WEDNESDAY,
+  "TH": DayOfWeekMaskEnum.THURSDAY,
+  "FR": DayOfWeekMaskEnum.FRIDAY,
+  "SA": DayOfWeekMaskEnum.SATURDAY,
+  "SU": DayOfWeekMaskEnum.SUNDAY,
+}
+
+ICAL_MEETINGSTATUS = {
+  "CONFIRMED": MeetingStatus.MEETING,
+  "TENTATIVE": MeetingStatus.RECEIVED,
+  "CANCELLED": MeetingStatus.CANCELED,
+}
+
+
+class ImportContext:
+  # Caches shared by all events of an import, and statistics
+
+  def __init__(self) -> None:
+    self.tz_cache: dict[str, Optional[datetime.tzinfo]] = {}
+    # RRULE text -> W32RecurrencePattern keyword arguments, series often share the same rule
+    self.rrule_cache: dict[bytes, dict] = {}
+    self.events: int = 0
+    self.masters: int = 0
+    self.exceptions: int = 0
+    self.orphans: int = 0
+    self.batches: int = 0
+    self.errors: int = 0
+
+  def timezone(self, tzid: str) -> Optional[datetime.tzinfo]:
+    if tzid not in self.tz_cache:
+      tz = w32a_cal.win32_tz_name_to_tz(tzid)
+      if tz is None:
+        try:
+          tz = w32a_tz.get_backend().timezone(tzid)
+        except Exception:
+          logging.warning("Unknown TZID: %s", tzid)
+          tz = None
+      self.tz_cache[tzid] = tz
+    return self.tz_cache[tzid]
+
+  def as_dict(self) -> dict:
+    return {
+      "events": self.events,
+      "masters": self.masters,
+      "exceptions": self.exceptions,
+      "orphans": self.orphans,
+      "batches": self.batches,
+      "errors": self.errors,
+    }
+
+
+def iter_vevent_blocks(lines: Iterable[str]) -> Iterator[str]:
+  # Yields the raw text of every VEVENT without parsing the whole calendar
+  block: Optional[list[str]] = None
+  for line in lines:
+    stripped = line.rstrip("\r\n")
+    if block is None:
+      if stripped == "BEGIN:VEVENT":
+        block = [stripped]
+      continue
+    block.append(stripped)
+    if stripped == "END:VEVENT":
+      yield "\r\n".join(block) + "\r\n"
+      block = None
+
+
+def _to_datetime(value, params, context: ImportContext) -> datetime.datetime:
+  if not isinstance(value, datetime.datetime):
+    # DATE values of all day events
+    return datetime.datetime.combine(value, datetime.time(), tzinfo=w32a_tz.get_backend().utc)
+  if value.tzinfo is None:
+    tzid = params.get('TZID', None) if params is not None else None
+    tz = context.timezone(tzid) if tzid else None
+    if tz is None:
+      tz = w32a_tz.get_backend().utc
+    value = w32a_tz.get_backend().localize(tz, value)
+  return value
+
+def _prop_datetime(ical_event: icalendar.Event, name: str, context: ImportContext) -> Optional[datetime.datetime]:
+  prop = ical_event.get(name, None)
+  if prop is None:
+    return None
+  return _to_datetime(prop.dt, getattr(prop, 'params', None), context)
+
+def _cal_address_name(address) -> str:
+  cn = address.params.get('CN', None) if hasattr(address, 'params') else None
+  if cn:
+    return str(cn)
+  value = str(address)
+  if value.lower().startswith("mailto:"):
+    value = value[len("mailto:"):]
+  return value
+
+def _as_list(value) -> list:
+  if value is None:
+    return []
+  if isinstance(value, list):
+    return value
+  return [value]
+
+def _categories(ical_event: icalendar.Event) -> str:
+  names: list[str] = []
+  for prop in _as_list(ical_event.get('CATEGORIES', None)):
+    names.extend(str(c) for c in getattr(prop, 'cats', [prop]))
+  # Outlook separates categories by ", "
+  return ", ".join(names)
+
+def _importance(priority: Optional[int]) -> Importance:
+  # Inverse of w32a_cal._win32_importance_to_ical
+  if priority is None or priority == 0 or priority == 5:
+    return Importance.NORMAL
+  if priority < 5:
+    return Importance.HIGH
+  return Importance.LOW
+
+def _byday(values: list[str]) -> tuple[int, Optional[int]]:
+  # "MO", "2TU", "-1SU" -> day of week mask and Outlook instance (1-4, 5 is the last)
+  mask = 0
+  instance = None
+  for value in values:
+    value = str(value)
+    day = value[-2:]
+    prefix = value[:-2]
+    mask |= ICAL_WEEKDAY_MASK[day]
+    if prefix:
+      n = int(prefix)
+      instance = 5 if n < 0 else n
+  return mask, instance
+
+def _first(rrule: icalendar.vRecur, name: str):
+  values = rrule.get(name, None)
+  if not values:
+    return None
+  return values[0]
+
+def rrule_to_pattern_kwargs(rrule: icalendar.vRecur, context: ImportContext) -> dict:
+  # Inverse of w32a_cal._win32_event_recurrence_to_rrule_dict
+  key = rrule.to_ical()
+  cached = context.rrule_cache.get(key, None)
+  if cached is not None:
+    return cached
+
+  freq = _first(rrule, 'FREQ')
+  kwargs: dict = {
+    'interval': _first(rrule, 'INTERVAL') or 1,
+  }
+  mask, instance = _byday(rrule.get('BYDAY', []))
+  setpos = _first(rrule, 'BYSETPOS')
+  if setpos is not None:
+    instance = 5 if setpos < 0 else setpos
+
+  if freq == "DAILY":
+    kwargs['recurrence_type'] = RecurrenceType.DAILY
+  elif freq == "WEEKLY":
+    kwargs['recurrence_type'] = RecurrenceType.WEEKLY
+    kwargs['day_of_week_mask'] = mask or None
+  elif freq == "MONTHLY":
+    if mask:
+      kwargs['recurrence_type'] = RecurrenceType.MONTHLY_NTH
+      kwargs['day_of_week_mask'] = mask
+      kwargs['instance'] = instance
+    else:
+      kwargs['recurrence_type'] = RecurrenceType.MONTHLY
+    kwargs['day_of_month'] = _first(rrule, 'BYMONTHDAY')
+  elif freq == "YEARLY":
+    if mask:
+      kwargs['recurrence_type'] = RecurrenceType.YEARLY_NTH
+      kwargs['day_of_week_mask'] = mask
+      kwargs['instance'] = instance
+    else:
+      kwargs['recurrence_type'] = RecurrenceType.YEARLY
+    kwargs['day_of_month'] = _first(rrule, 'BYMONTHDAY')
+    kwargs['month_of_year'] = _first(rrule, 'BYMONTH')
+  else:
+    raise ValueError("Unsupported RRULE frequency: %s" % freq)
+
+  count = _first(rrule, 'COUNT')
+  until = _first(rrule, 'UNTIL')
+  if count:
+    kwargs['occurrences'] = count
+  elif until is not None:
+    kwargs['end'] = _to_datetime(until, None, context)
+  else:
+    kwargs['no_end'] = True
+
+  context.rrule_cache[key] = kwargs
+  return kwargs
+
+def ical_event_to_w32(ical_event: icalendar.Event, context: Optional[ImportContext] = None) -> W32Event:
+  # Single VEVENT -> W32Event. RRULE and EXDATE become the recurrence pattern,
+  # RECURRENCE-ID events are attached by ical_to_w32_batches.
+  if context is None:
+    context = ImportContext()
+
+  start = _prop_datetime(ical_event, 'DTSTART', context)
+  end = _prop_datetime(ical_event, 'DTEND', context)
+  duration = None
+  if end is None and ical_event.get('DURATION', None) is not None:
+    duration = int(ical_event.get('DURATION').dt.total_seconds() // 60)
+
+  req_attendees: list[str] = []
+  opt_attendees: list[str] = []
+  for attendee in _as_list(ical_event.get('ATTENDEE', None)):
+    if attendee.params.get('ROLE', "REQ-PARTICIPANT") == "OPT-PARTICIPANT":
+      opt_attendees.append(_cal_address_name(attendee))
+    else:
+      req_attendees.append(_cal_address_name(attendee))
+
+  organizer = ical_event.get('ORGANIZER', None)
+  priority = ical_event.get('PRIORITY', None)
+
+  kwargs = {
+    'id': str(ical_event.get('UID', "")),
+    'subject': str(ical_event.get('SUMMARY', "")),
+    'start': start,
+    'end': end,
+    'duration': duration,
+    'creation_time': _prop_datetime(ical_event, 'CREATED', context),
+    'modification_time': _prop_datetime(ical_event, 'LAST-MODIFIED', context),
+    'all_day': not isinstance(ical_event.get('DTSTART').dt, datetime.datetime),
+    'body': str(ical_event.get('DESCRIPTION', "")),
+    'organizer': _cal_address_name(organizer) if organizer is not None else "",
+    'busy_status': w32a_cal.ical_busy_status(ical_event),
+    'meeting_status': ICAL_MEETINGSTATUS.get(str(ical_event.get('STATUS', "")), MeetingStatus.NON_MEETING),
+    'importance': _importance(int(priority) if priority is not None else None),
+    'location': str(ical_event.get('LOCATION', "")),
+    'categories': _categories(ical_event),
+    'req_attendees': req_attendees,
+    'opt_attendees': opt_attendees,
+  }
+
+  rrule = ical_event.get('RRULE', None)
+  if rrule is not None:
+    exceptions: list[W32Exception] = []
+    for exdate in _as_list(ical_event.get('EXDATE', None)):
+      for dt in exdate.dts:
+        exceptions.append(W32Exception(_to_datetime(dt.dt, exdate.params, context), deleted=True))
+    kwargs['recurring'] = True
+    kwargs['recurrence_state'] = RecurrenceState.MASTER
+    kwargs['recurrence_pattern'] = W32RecurrencePattern(exceptions=exceptions, **rrule_to_pattern_kwargs(rrule, context))
+  elif ical_event.get('RECURRENCE-ID', None) is not None:
+    kwargs['recurring'] = True
+    kwargs['recurrence_state'] = RecurrenceState.EXCEPTION
+
+  return W32Event(**kwargs)
+
+
+def ical_to_w32_batches(lines: Iterable[str],
+                        batch_size: int = IMPORT_BATCH_SIZE,
+                        max_pending: int = IMPORT_MAX_PENDING,
+                        context: Optional[ImportContext] = None) -> Iterator[list[W32Event]]:
+  # Streams an ICS feed (any iterable of lines, e.g. an open file) into batches of W32Event.
+  # Memory is bounded by batch_size plus max_pending held back recurring masters and early exceptions.
+  if context is None:
+    context = ImportContext()
+
+  batch: list[W32Event] = []
+  # UID -> master, waiting for its exceptions
+  pending: collections.OrderedDict[str, W32Event] = collections.OrderedDict()
+  # UID -> exceptions seen before their master
+  early: collections.OrderedDict[str, list[W32Exception]] = collections.OrderedDict()
+
+  def _emit(event: W32Event) -> Iterator[list[W32Event]]:
+    nonlocal batch
+    batch.append(event)
+    context.events += 1
+    if len(batch) >= batch_size:
+      context.batches += 1
+      yield batch
+      batch = []
+
+  def _emit_orphans(exceptions: list[W32Exception]) -> Iterator[list[W32Event]]:
+    for ex in exceptions:
+      context.orphans += 1
+      yield from _emit(ex.AppointmentItem)
+
+  for block in iter_vevent_blocks(lines):
+    try:
+      ical_event = icalendar.Event.from_ical(block)
+      event = ical_event_to_w32(ical_event, context)
+    except Exception:
+      logging.exception("Cannot import event")
+      context.errors += 1
+      continue
+
+    recurrence_id = _prop_datetime(ical_event, 'RECURRENCE-ID', context)
+    if recurrence_id is not None:
+      context.exceptions += 1
+      ex = W32Exception(recurrence_id, event=event)
+      master = pending.get(event.EntryID, None)
+      if master is not None:
+        master.GetRecurrencePattern().Exceptions.append(ex)
+        continue
+      early.setdefault(event.EntryID, []).append(ex)
+      if len(early) > max_pending:
+        _uid, orphans = early.popitem(last=False)
+        logging.warning("Recurrence exception without master: %s", _uid)
+        yield from _emit_orphans(orphans)
+      continue
+
+    if event.GetRecurrencePattern() is None:
+      yield from _emit(event)
+      continue
+
+    context.masters += 1
+    event.GetRecurrencePattern().Exceptions.extend(early.pop(event.EntryID, []))
+    pending[event.EntryID] = event
+    if len(pending) > max_pending:
+      _uid, master = pending.popitem(last=False)
+      yield from _emit(master)
+
+  for master in pending.values():
+    yield from _emit(master)
+  for uid, orphans in early.items():
+    logging.warning("Recurrence exception without master: %s", uid)
+    yield from _emit_orphans(orphans)
+
+  if batch:
+    context.batches += 1
+    yield batch
+
+def import_ical(lines: Iterable[str],
+                save: Callable[[list[W32Event]], None],
+                batch_size: int = IMPORT_BATCH_SIZE,
+                max_pending: int = IMPORT_MAX_PENDING) -> ImportContext:
+  context = ImportContext()
+  for batch in ical_to_w32_batches(lines, batch_size=batch_size, max_pending=max_pending, context=context):
+    save(batch)
+  return context
+
+
+def _outlook_timezone(time_zones, w32_tz) -> Optional[object]:
+  # TimeZone of the Outlook session for the Windows zone ID of a W32Event (from its TZID)
+  # https://learn.microsoft.com/en-us/office/vba/api/outlook.timezones.item
+  if time_zones is None or w32_tz is None or not getattr(w32_tz, 'ID', None):
+    return None
+  try:
+    return time_zones.Item(w32_tz.ID)
+  except Exception:
+    logging.warning("Unknown Outlook time zone: %s", w32_tz.ID)
+    return None
+
+def _set_times(item, event, time_zones) -> None:
+  # The time zones are set before the times, Start and End are interpreted in them
+  # https://learn.microsoft.com/en-us/office/vba/api/outlook.appointmentitem.starttimezone
+  start_tz = _outlook_timezone(time_zones, getattr(event, 'StartTimeZone', None))
+  end_tz = _outlook_timezone(time_zones, getattr(event, 'EndTimeZone', None))
+  if start_tz is not None:
+    item.StartTimeZone = start_tz
+  if end_tz is not None or start_tz is not None:
+    item.EndTimeZone = end_tz if end_tz is not None else start_tz
+  item.Start = event.Start
+  if event.End is not None:
+    item.End = event.End
+  elif event.Duration:
+    item.Duration = event.Duration
+
+def make_outlook_saver(folder, time_zones=None) -> Callable[[list[W32Event]], None]:
+  # Save step for a real Outlook folder: creates one AppointmentItem per W32Event.
+  # time_zones is the TimeZones collection of the session, by default the one of the folder's application.
+  # https://learn.microsoft.com/en-us/office/vba/api/outlook.items.add
+  if time_zones is None:
+    application = getattr(folder, 'Application', None)
+    time_zones = getattr(application, 'TimeZones', None) if application is not None else None
+
+  def _save(batch: list[W32Event]) -> None:
+    for event in batch:
+      item = folder.Items.Add(OL_APPOINTMENT_ITEM)
+      item.Subject = event.Subject
+      _set_times(item, event, time_zones)
+      item.AllDayEvent = event.AllDayEvent
+      item.Body = event.Body
+      item.Location = event.Location
+      item.Categories = event.Categories
+      item.BusyStatus = event.BusyStatus
+      item.Importance = event.Importance
+      item.RequiredAttendees = event.RequiredAttendees
+      item.OptionalAttendees = event.OptionalAttendees
+
+      pattern = event.GetRecurrencePattern()
+      if pattern is not None:
+        # https://learn.microsoft.com/en-us/office/vba/api/outlook.recurrencepattern
+        item_pattern = item.GetRecurrencePattern()
+        item_pattern.RecurrenceType = pattern.RecurrenceType
+        item_pattern.Interval = pattern.Interval
+        for name in ('DayOfWeekMask', 'DayOfMonth', 'MonthOfYear', 'Instance'):
+          if getattr(pattern, name, None) is not None:
+            setattr(item_pattern, name, getattr(pattern, name))
+        if pattern.NoEndDate:
+          item_pattern.NoEndDate = True
+        elif pattern.Occurrences:
+          item_pattern.Occurrences = pattern.Occurrences
+        elif pattern.PatternEndDate is not None:
+          item_pattern.PatternEndDate = pattern.PatternEndDate
+      item.Save()
+
+      if pattern is not None:
+        for ex in pattern.Exceptions:
+          # https://learn.microsoft.com/en-us/office/vba/api/outlook.recurrencepattern.getoccurrence
+          occurrence = item_pattern.GetOccurrence(ex.OriginalDate)
+          if ex.Deleted:
+            occurrence.Delete()
+          elif ex.AppointmentItem is not None:
+            occurrence.Subject = ex.AppointmentItem.Subject
+            _set_times(occurrence, ex.AppointmentItem, time_zones)
+            occurrence.Save()
+
+  return _save
@@ -0,0 +1,232 @@
+import bisect
+import datetime
+import re
+
+import icalendar
+
+from typing import Iterable, Optional, Union
+
+import ical_diff
+import ical_expand
+from ical_diff import EventKey
+from ical_expand import UTC
+
+INDEX_FIELDS = ("SUMMARY", "DESCRIPTION", "LOCATION")
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(text: str) -> list[str]:
+  return _TOKEN_RE.findall(text.lower())
+
+
+class _Entry:
+  __slots__ = ("seq", "key", "event", "start", "end", "recurring", "tokens")
+
+  def __init__(self, seq: int, key: EventKey, event: icalendar.Event,
+               start: Optional[datetime.datetime], end: Optional[datetime.datetime], recurring: bool,
+               tokens: dict[str, set[str]]) -> None:
+    self.seq: int = seq
+    self.key: EventKey = key
+    self.event: icalendar.Event = event
+    self.start: Optional[datetime.datetime] = start
+    # None: open ended series
+    self.end: Optional[datetime.datetime] = end
+    self.recurring: bool = recurring
+    self.tokens: dict[str, set[str]] = tokens
+
+  def overlaps(self, start: datetime.datetime, end: datetime.datetime) -> bool:
+    if self.start is None or self.start >= end:
+      return False
+    if self.end is None or self.end > start:
+      return True
+    # Events without duration are found at their start
+    return self.start == self.end and self.start >= start
+
+  def sort_key(self) -> tuple:
+    return (self.start is None, self.start or datetime.datetime.min, self.seq)
+
+
+class CalendarIndex:
+  # In-memory lookups over the VEVENTs of a converted or exported calendar:
+  # - by UID: the master (or single event) and its RECURRENCE-ID exceptions
+  # - by time: events overlapping a range, from a start-sorted list; a series is found over
+  #   its whole span, use ical_expand for its occurrences
+  # - by text: inverted index of the words of SUMMARY, DESCRIPTION and LOCATION
+  # Events are added, replaced (same UID and RECURRENCE-ID) and removed incrementally.
+  # Indexed events must not be modified, replace them instead.
+
+  def __init__(self, source: Optional[Union[icalendar.Calendar, Iterable[icalendar.Event]]] = None,
+               fields: Iterable[str] = INDEX_FIELDS,
+               default_tz: datetime.tzinfo = UTC) -> None:
+    self.fields: tuple[str, ...] = tuple(f.upper() for f in fields)
+    self.default_tz: datetime.tzinfo = default_tz
+    self._seq: int = 0
+    self._entries: dict[EventKey, _Entry] = {}
+    self._by_seq: dict[int, _Entry] = {}
+    # UID -> RECURRENCE-ID (None for the master or single event) -> key
+    self._uids: dict[str, dict[Optional[str], EventKey]] = {}
+    # Single events and exceptions sorted by (start, seq), series as well. Events without DTSTART
+    # are in neither, they are never in a range.
+    self._starts: list[tuple[datetime.datetime, int]] = []
+    self._series: list[tuple[datetime.datetime, int]] = []
+    # Longest indexed duration, bounds the range scan; not lowered on remove
+    self._max_duration: datetime.timedelta = datetime.timedelta()
+    # field -> token -> seqs
+    self._postings: dict[str, dict[str, set[int]]] = {field: {} for field in self.fields}
+    if source is not None:
+      self.update(source)
+
+  def __len__(self) -> int:
+    return len(self._entries)
+
+  def __contains__(self, key: EventKey) -> bool:
+    return key in self._entries
+
+  def update(self, source: Union[icalendar.Calendar, Iterable[icalendar.Event]]) -> None:
+    for event in ical_diff.iter_events(source):
+      self.add(event)
+
+  def _make_entry(self, key: EventKey, event: icalendar.Event) -> _Entry:
+    self._seq += 1
+    start = end = None
+    recurring = False
+    if event.get('DTSTART', None) is not None:
+      start, duration, _all_day = ical_expand.event_times(event, self.default_tz)
+      start = start.astimezone(UTC)
+      recurring = event.get('RRULE', None) is not None and key[1] is None
+      end = ical_expand.series_end(event, start, duration, self.default_tz) if recurring else start + duration
+    tokens = {field: set(tokenize(str(event.get(field, "")))) for field in self.fields}
+    return _Entry(self._seq, key, event, start, end, recurring, tokens)
+
+  def add(self, event: icalendar.Event) -> None:
+    key = ical_diff.event_key(event)
+    if key in self._entries:
+      self.remove(key)
+    entry = self._make_entry(key, event)
+    self._entries[key] = entry
+    self._by_seq[entry.seq] = entry
+    self._uids.setdefault(key[0], {})[key[1]] = key
+
+    if entry.start is None:
+      pass
+    elif entry.recurring:
+      bisect.insort(self._series, (entry.start, entry.seq))
+    else:
+      bisect.insort(self._starts, (entry.start, entry.seq))
+      if entry.end - entry.start > self._max_duration:
+        self._max_duration = entry.end - entry.start
+
+    for field, tokens in entry.tokens.items():
+      postings = self._postings[field]
+      for token in tokens:
+        postings.setdefault(token, set()).add(entry.seq)
+
+  def remove(self, key: Union[EventKey, icalendar.Event]) -> bool:
+    # Returns False if the event is not indexed
+    if isinstance(key, icalendar.cal.Component):
+      key = ical_diff.event_key(key)
+    entry = self._entries.pop(key, None)
+    if entry is None:
+      return False
+    del self._by_seq[entry.seq]
+    recurrences = self._uids[key[0]]
+    del recurrences[key[1]]
+    if not recurrences:
+      del self._uids[key[0]]
+
+    if entry.start is not None:
+      starts = self._series if entry.recurring else self._starts
+      del starts[bisect.bisect_left(starts, (entry.start, entry.seq))]
+
+    for field, tokens in entry.tokens.items():
+      postings = self._postings[field]
+      for token in tokens:
+        seqs = postings[token]
+        seqs.discard(entry.seq)
+        if not seqs:
+          del postings[token]
+    return True
+
+  def remove_uid(self, uid: str) -> int:
+    # Removes the master and all exceptions of uid, returns the number of removed events
+    keys = list(self._uids.get(uid, {}).values())
+    for key in keys:
+      self.remove(key)
+    return len(keys)
+
+  def replace_uid(self, uid: str, events: Iterable[icalendar.Event]) -> None:
+    # The events converted from one changed Outlook item: master and exceptions replace the old ones
+    self.remove_uid(uid)
+    for event in events:
+      self.add(event)
+
+  def uids(self) -> list[str]:
+    return list(self._uids)
+
+  def get(self, uid: str, recurrence_id: Optional[str] = None) -> Optional[icalendar.Event]:
+    # recurrence_id as in ical_diff.event_key, e.g. "20240305T090000Z"
+    entry = self._entries.get((uid, recurrence_id), None)
+    return entry.event if entry is not None else None
+
+  def master(self, uid: str) -> Optional[icalendar.Event]:
+    return self.get(uid, None)
+
+  def exceptions(self, uid: str) -> list[icalendar.Event]:
+    # RECURRENCE-ID events of uid, by RECURRENCE-ID
+    recurrences = self._uids.get(uid, {})
+    return [self._entries[recurrences[r]].event for r in sorted(r for r in recurrences if r is not None)]
+
+  def _sorted_events(self, entries: Iterable[_Entry], limit: Optional[int] = None) -> list[icalendar.Event]:
+    entries = sorted(entries, key=_Entry.sort_key)
+    if limit is not None:
+      entries = entries[:limit]
+    return [entry.event for entry in entries]
+
+  def between(self, start: datetime.datetime, end: datetime.datetime,
+              limit: Optional[int] = None) -> list[icalendar.Event]:
+    # Events overlapping [start, end), by start. Series are included if their span overlaps.
+    start = ical_expand.to_datetime(start, self.default_tz).astimezone(UTC)
+    end = ical_expand.to_datetime(end, self.default_tz).astimezone(UTC)
+    lo = bisect.bisect_left(self._starts, (start - self._max_duration,))
+    hi = bisect.bisect_left(self._starts, (end,))
+    found = [self._by_seq[seq] for _start, seq in self._starts[lo:hi]]
+    found = [entry for entry in found if entry.overlaps(start, end)]
+    # The span of a series is unbounded by its start, only those starting after end are skipped
+    hi = bisect.bisect_left(self._series, (end,))
+    found.extend(entry for entry in (self._by_seq[seq] for _start, seq in self._series[:hi]) if entry.overlaps(start, end))
+    return self._sorted_events(found, limit)
+
+  def _matching_seqs(self, token: str, fields: tuple[str, ...], substring: bool) -> set[int]:
+    seqs: set[int] = set()
+    for field in fields:
+      postings = self._postings[field]
+      if not substring:
+        seqs.update(postings.get(token, ()))
+        continue
+      # The vocabulary is much smaller than the events
+      for candidate, candidate_seqs in postings.items():
+        if token in candidate:
+          seqs.update(candidate_seqs)
+    return seqs
+
+  def search(self, query: str,
+             fields: Optional[Iterable[str]] = None,
+             substring: bool = False,
+             limit: Optional[int] = None) -> list[icalendar.Event]:
+    # Events containing all words of query (case-insensitive) in the given fields, by start.
+    # With substring=True, a query word also matches words that contain it, e.g. "room" finds "Boardroom".
+    fields = tuple(f.upper() for f in fields) if fields is not None else self.fields
+    for field in fields:
+      if field not in self._postings:
+        raise ValueError("Field is not indexed: %s" % field)
+    tokens = tokenize(query)
+    if not tokens:
+      return []
+    result: Optional[set[int]] = None
+    # Longer words are usually rarer, intersecting them first keeps the sets small
+    for token in sorted(set(tokens), key=len, reverse=True):
+      seqs = self._matching_seqs(token, fields, substring)
+      result = seqs if result is None else result & seqs
+      if not result:
+        return []
+    return self._sorted_events((self._by_seq[seq] for seq in result), limit)
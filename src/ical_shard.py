@@ -0,0 +1,305 @@
+import collections
+import concurrent.futures
+import datetime
+import hashlib
+import json
+import logging
+import os
+
+import icalendar
+
+from typing import Iterable, Optional, Union
+
+import ical_emit
+import ical_expand
+import w32a_export
+import w32a_metrics
+
+SHARD_BY_MONTH = "month"
+SHARD_BY_YEAR = "year"
+SHARD_BY_HASH = "hash"
+
+SHARD_BY = (SHARD_BY_MONTH, SHARD_BY_YEAR, SHARD_BY_HASH)
+
+SHARD_HASH_COUNT = 16
+SHARD_BASENAME = "calendar"
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+ShardSource = Union[icalendar.Calendar, Iterable[icalendar.Event]]
+
+
+class ShardInfo:
+  # One shard file as described in the manifest
+
+  def __init__(self, key: str, name: str) -> None:
+    self.key: str = key
+    self.name: str = name
+    self.events: int = 0
+    self.masters: int = 0
+    self.exceptions: int = 0
+    self.start: Optional[str] = None
+    self.end: Optional[str] = None
+    self.sha256: Optional[str] = None
+    self.bytes: int = 0
+    # False if the file content was identical to the previous manifest and it was not rewritten
+    self.written: bool = False
+
+  def as_dict(self) -> dict:
+    return {
+      "key": self.key,
+      "name": self.name,
+      "events": self.events,
+      "masters": self.masters,
+      "exceptions": self.exceptions,
+      "start": self.start,
+      "end": self.end,
+      "sha256": self.sha256,
+      "bytes": self.bytes,
+    }
+
+
+def as_datetime(value) -> datetime.datetime:
+  # Comparable form of DATE, naive and aware DATE-TIME values
+  if not isinstance(value, datetime.datetime):
+    return datetime.datetime(value.year, value.month, value.day, tzinfo=datetime.timezone.utc)
+  if value.tzinfo is None:
+    return value.replace(tzinfo=datetime.timezone.utc)
+  return value
+
+def event_start(event: icalendar.Event):
+  dtstart = event.get('DTSTART', None)
+  return dtstart.dt if dtstart is not None else None
+
+def _event_end(event: icalendar.Event):
+  dtend = event.get('DTEND', None)
+  if dtend is not None:
+    return dtend.dt
+  start = event_start(event)
+  duration = event.get('DURATION', None)
+  if start is not None and duration is not None:
+    return start + duration.dt
+  return start
+
+def shard_key(event: icalendar.Event, by: str = SHARD_BY_MONTH, hash_count: int = SHARD_HASH_COUNT) -> str:
+  if by == SHARD_BY_HASH:
+    digest = hashlib.sha1(str(event.get('UID', "")).encode("utf-8")).digest()
+    return "h%03d" % (int.from_bytes(digest[:4], "big") % hash_count)
+
+  start = event_start(event)
+  if start is None:
+    return "undated"
+  if by == SHARD_BY_YEAR:
+    return "%04d" % start.year
+  if by == SHARD_BY_MONTH:
+    return "%04d-%02d" % (start.year, start.month)
+  raise ValueError("Unknown shard mode: %s" % by)
+
+def _period_keys(start: datetime.datetime, end: datetime.datetime, by: str) -> list[str]:
+  # Keys of the month or year shards from start to end (inclusive)
+  keys = []
+  year, month = start.year, start.month
+  while (year, month) <= (end.year, end.month):
+    if by == SHARD_BY_YEAR:
+      keys.append("%04d" % year)
+      year += 1
+    else:
+      keys.append("%04d-%02d" % (year, month))
+      year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+  return keys
+
+def _series_span(master: icalendar.Event) -> tuple[Optional[datetime.datetime], bool]:
+  # Latest end of a series and whether it is known; open ended series have none
+  start, duration, _ = ical_expand.event_times(master, ical_expand.UTC)
+  end = ical_expand.series_end(master, start, duration, ical_expand.UTC)
+  return end, end is not None
+
+def partition_events(events: Iterable[icalendar.Event],
+                     by: str = SHARD_BY_MONTH,
+                     hash_count: int = SHARD_HASH_COUNT,
+                     span_series: bool = True) -> dict[str, list[icalendar.Event]]:
+  # Events are grouped by UID first: a recurring master and its RECURRENCE-ID events always end up
+  # together, so every shard is self-consistent.
+  # With span_series, month and year shards get a copy of every series (master and exceptions) whose span
+  # they cover, so a shard has all occurrences of its period. Series with UNTIL or COUNT are copied up to
+  # their last occurrence, open ended series up to the last shard of the other events.
+  # Without it, a series is only in the shard of its DTSTART.
+  by_uid: collections.OrderedDict[str, list[icalendar.Event]] = collections.OrderedDict()
+  for event in events:
+    by_uid.setdefault(str(event.get('UID', "")), []).append(event)
+
+  shards: dict[str, list[icalendar.Event]] = {}
+  # Series without end, copied once the last shard is known
+  open_series: list[tuple[datetime.datetime, list[icalendar.Event]]] = []
+  for uid_events in by_uid.values():
+    masters = [e for e in uid_events if e.get('RECURRENCE-ID', None) is None]
+    anchor = masters[0] if masters else uid_events[0]
+    key = shard_key(anchor, by, hash_count)
+    keys = [key]
+    if span_series and by != SHARD_BY_HASH and masters and anchor.get('RRULE', None) is not None:
+      start = as_datetime(event_start(anchor))
+      end, bounded = _series_span(anchor)
+      if not bounded:
+        open_series.append((start, uid_events))
+        continue
+      keys = _period_keys(start, as_datetime(end), by)
+    for key in keys:
+      shards.setdefault(key, []).extend(uid_events)
+
+  if open_series:
+    last = max((k for k in shards if k != "undated"), default=None)
+    for start, uid_events in open_series:
+      keys = _period_keys(start, start, by)
+      if last is not None and last > keys[0]:
+        year, month = (int(last), 12) if by == SHARD_BY_YEAR else (int(last[:4]), int(last[5:7]))
+        keys = _period_keys(start, datetime.datetime(year, month, 1, tzinfo=datetime.timezone.utc), by)
+      for key in keys:
+        shards.setdefault(key, []).extend(uid_events)
+  return dict(sorted(shards.items()))
+
+def _referenced_tzids(events: list[icalendar.Event]) -> set[str]:
+  tzids: set[str] = set()
+  for event in events:
+    for name in ('DTSTART', 'DTEND', 'RECURRENCE-ID', 'EXDATE'):
+      values = event.get(name, None)
+      if values is None:
+        continue
+      for value in (values if isinstance(values, list) else [values]):
+        tzid = value.params.get('TZID', None)
+        if tzid:
+          tzids.add(str(tzid))
+  return tzids
+
+def serialize_shard(events: list[icalendar.Event],
+                    timezones: Optional[dict[str, icalendar.Timezone]] = None,
+                    prodid: str = w32a_export.ICAL_PRODID,
+                    format: str = ical_emit.FORMAT_ICS,
+                    compression: Optional[str] = None) -> bytes:
+  # A shard is a complete calendar with the VTIMEZONEs its events refer to
+  shard_timezones = []
+  if timezones:
+    shard_timezones = [timezones[tzid] for tzid in sorted(_referenced_tzids(events)) if tzid in timezones]
+  with w32a_metrics.get_sink().stage(w32a_metrics.STAGE_SERIALIZE):
+    return ical_emit.emit_bytes(events, format=format, compression=compression, prodid=prodid, timezones=shard_timezones)
+
+def _shard_info(key: str, name: str, events: list[icalendar.Event]) -> ShardInfo:
+  info = ShardInfo(key, name)
+  info.events = len(events)
+  starts = []
+  ends = []
+  for event in events:
+    if event.get('RECURRENCE-ID', None) is not None:
+      info.exceptions += 1
+    elif event.get('RRULE', None) is not None:
+      info.masters += 1
+    start = event_start(event)
+    if start is not None:
+      starts.append(as_datetime(start))
+      ends.append(as_datetime(_event_end(event)))
+  if starts:
+    info.start = min(starts).isoformat()
+    info.end = max(ends).isoformat()
+  return info
+
+def _write_shard(path: str, info: ShardInfo, events: list[icalendar.Event],
+                 timezones: Optional[dict[str, icalendar.Timezone]], prodid: str,
+                 format: str, compression: Optional[str],
+                 previous: Optional[dict]) -> ShardInfo:
+  data = serialize_shard(events, timezones, prodid, format, compression)
+  info.sha256 = hashlib.sha256(data).hexdigest()
+  info.bytes = len(data)
+  if previous is not None and previous.get("sha256") == info.sha256 and os.path.exists(path):
+    return info
+  with open(path, "wb") as f:
+    f.write(data)
+  info.written = True
+  return info
+
+def load_manifest(directory: str, manifest_name: str = MANIFEST_NAME) -> Optional[dict]:
+  path = os.path.join(directory, manifest_name)
+  if not os.path.exists(path):
+    return None
+  with open(path, "r", encoding="utf-8") as f:
+    return json.load(f)
+
+def write_shards(source: ShardSource,
+                 directory: str,
+                 by: str = SHARD_BY_MONTH,
+                 hash_count: int = SHARD_HASH_COUNT,
+                 basename: str = SHARD_BASENAME,
+                 prodid: str = w32a_export.ICAL_PRODID,
+                 timezones: Optional[dict[str, icalendar.Timezone]] = None,
+                 max_workers: Optional[int] = None,
+                 executor: Optional[concurrent.futures.Executor] = None,
+                 manifest_name: str = MANIFEST_NAME,
+                 prune: bool = True,
+                 format: str = ical_emit.FORMAT_ICS,
+                 compression: Optional[str] = None,
+                 span_series: bool = True) -> list[ShardInfo]:
+  # Splits a calendar into one ICS file per shard and writes a JSON manifest next to them.
+  # Shards whose content hash matches the previous manifest are not rewritten.
+  # Series are copied into every shard of their span, see partition_events.
+  # Serialization of several shards runs in a process pool (max_workers, one process per core by default)
+  # so it uses several cores, max_workers=1 serializes in this thread. Pass executor to use another pool;
+  # with a process pool on Windows, call write_shards from code guarded by if __name__ == "__main__".
+  if by not in SHARD_BY:
+    raise ValueError("Unknown shard mode: %s" % by)
+
+  if isinstance(source, icalendar.Calendar):
+    if timezones is None:
+      timezones = {str(tz.get('TZID')): tz for tz in source.walk('VTIMEZONE')}
+    events = source.walk('VEVENT')
+  else:
+    events = source
+
+  os.makedirs(directory, exist_ok=True)
+  previous_manifest = load_manifest(directory, manifest_name) or {}
+  previous = {shard["name"]: shard for shard in previous_manifest.get("shards", [])}
+
+  shards = partition_events(events, by, hash_count, span_series=span_series)
+  event_count = len(set(id(e) for shard_events in shards.values() for e in shard_events))
+
+  own_executor = executor is None and max_workers != 1 and len(shards) > 1
+  if own_executor:
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+  try:
+    futures = []
+    infos = []
+    for key, shard_events in shards.items():
+      name = "%s-%s%s" % (basename, key, ical_emit.output_extension(format, compression))
+      info = _shard_info(key, name, shard_events)
+      args = (os.path.join(directory, name), info, shard_events, timezones, prodid, format, compression,
+              previous.get(name, None))
+      if executor is None:
+        infos.append(_write_shard(*args))
+      else:
+        futures.append(executor.submit(_write_shard, *args))
+    infos += [f.result() for f in futures]
+  finally:
+    if own_executor:
+      executor.shutdown()
+
+  if prune:
+    names = set(info.name for info in infos)
+    for name in previous:
+      # Only plain file names of the manifest are removed
+      if name in names or os.path.basename(name) != name:
+        continue
+      if os.path.exists(os.path.join(directory, name)):
+        os.remove(os.path.join(directory, name))
+
+  manifest = {
+    "version": MANIFEST_VERSION,
+    "prodid": prodid,
+    "by": by,
+    "format": format,
+    "compression": compression,
+    # Distinct events, series copied into several shards are counted once
+    "events": event_count,
+    "shards": [info.as_dict() for info in infos],
+  }
+  with open(os.path.join(directory, manifest_name), "w", encoding="utf-8") as f:
+    json.dump(manifest, f, indent=2)
+
+  logging.debug("Wrote %d of %d shards to %s", sum(1 for info in infos if info.written), len(infos), directory)
+  return infos
@@ -0,0 +1,153 @@
+import datetime
+import heapq
+import logging
+
+import icalendar
+
+from typing import Iterable, Iterator, Mapping, Optional
+
+import ical_expand
+import w32a_tz
+from ical_expand import Occurrence, UTC
+from w32a_cal import BusyStatus
+
+Interval = tuple[datetime.datetime, datetime.datetime]
+
+# Occurrences that do not block a slot, like the Outlook scheduling assistant shows them
+SLOTS_IGNORE_DEFAULT = (BusyStatus.FREE,)
+SLOTS_IGNORE_TENTATIVE = (BusyStatus.FREE, BusyStatus.TENTATIVE)
+
+SLOT_ALIGN = datetime.timedelta(minutes=15)
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=UTC)
+
+
+class WorkingHours:
+  # Daily working time in a time zone, e.g. WorkingHours(datetime.time(9), datetime.time(17), tz=berlin)
+
+  def __init__(self, start: datetime.time, end: datetime.time,
+               weekdays: Iterable[int] = (0, 1, 2, 3, 4),
+               tz: datetime.tzinfo = UTC) -> None:
+    if end <= start:
+      raise ValueError("Working hours must end after they start")
+    self.start: datetime.time = start
+    self.end: datetime.time = end
+    # datetime.weekday(): Monday is 0
+    self.weekdays: frozenset = frozenset(weekdays)
+    self.tz: datetime.tzinfo = tz
+
+  def intervals(self, window_start: datetime.datetime, window_end: datetime.datetime) -> Iterator[Interval]:
+    # Working intervals in UTC within the window, each day localized on its own for DST changes
+    day = window_start.astimezone(self.tz).date() - datetime.timedelta(days=1)
+    last = window_end.astimezone(self.tz).date()
+    while day <= last:
+      if day.weekday() in self.weekdays:
+        start = w32a_tz.localize(self.tz, datetime.datetime.combine(day, self.start)).astimezone(UTC)
+        end = w32a_tz.localize(self.tz, datetime.datetime.combine(day, self.end)).astimezone(UTC)
+        start = max(start, window_start)
+        end = min(end, window_end)
+        if start < end:
+          yield start, end
+      day += datetime.timedelta(days=1)
+
+
+class Slot:
+  __slots__ = ("start", "end")
+
+  def __init__(self, start: datetime.datetime, end: datetime.datetime) -> None:
+    self.start: datetime.datetime = start
+    self.end: datetime.datetime = end
+
+  def __eq__(self, other) -> bool:
+    return isinstance(other, Slot) and (self.start, self.end) == (other.start, other.end)
+
+  def __repr__(self) -> str:
+    return "<Slot %s - %s>" % (self.start.isoformat(), self.end.isoformat())
+
+  def as_dict(self) -> dict:
+    return {"start": self.start.isoformat(), "end": self.end.isoformat()}
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> list[Interval]:
+  # intervals sorted by start; overlapping and touching intervals are joined
+  merged: list[list[datetime.datetime]] = []
+  for start, end in intervals:
+    if merged and start <= merged[-1][1]:
+      if end > merged[-1][1]:
+        merged[-1][1] = end
+    else:
+      merged.append([start, end])
+  return [(start, end) for start, end in merged]
+
+def busy_intervals(occurrences: Iterable[Occurrence],
+                   ignore: Iterable[BusyStatus] = SLOTS_IGNORE_DEFAULT) -> list[Interval]:
+  # Merged busy time of one person in UTC
+  ignore = frozenset(ignore)
+  return merge_intervals(sorted((o.start, o.end) for o in occurrences if o.busy_status not in ignore))
+
+def calendar_busy_intervals(events: Iterable[icalendar.Event],
+                            window_start: datetime.datetime,
+                            window_end: datetime.datetime,
+                            default_tz: datetime.tzinfo = UTC,
+                            ignore: Iterable[BusyStatus] = SLOTS_IGNORE_DEFAULT) -> list[Interval]:
+  # Busy intervals of converted events, recurring series are expanded within the window
+  return busy_intervals(ical_expand.expand_events(events, window_start, window_end, default_tz=default_tz), ignore)
+
+def _ceil(dt: datetime.datetime, align: datetime.timedelta) -> datetime.datetime:
+  remainder = (dt - _EPOCH) % align
+  return dt if not remainder else dt + (align - remainder)
+
+def free_intervals(busy: list[Interval], available: Iterable[Interval]) -> Iterator[Interval]:
+  # Parts of the available intervals (sorted, disjoint) not covered by busy (merged)
+  i = 0
+  for start, end in available:
+    while i < len(busy) and busy[i][1] <= start:
+      i += 1
+    j = i
+    cursor = start
+    while j < len(busy) and busy[j][0] < end:
+      if busy[j][0] > cursor:
+        yield cursor, busy[j][0]
+      cursor = max(cursor, busy[j][1])
+      j += 1
+    if cursor < end:
+      yield cursor, end
+
+def find_free_slots(calendars: Mapping[str, Iterable[icalendar.Event]],
+                    duration: datetime.timedelta,
+                    window_start: datetime.datetime,
+                    window_end: datetime.datetime,
+                    working_hours: Optional[WorkingHours] = None,
+                    max_slots: int = 10,
+                    step: Optional[datetime.timedelta] = None,
+                    align: datetime.timedelta = SLOT_ALIGN,
+                    ignore: Iterable[BusyStatus] = SLOTS_IGNORE_DEFAULT,
+                    default_tz: datetime.tzinfo = UTC) -> list[Slot]:
+  # First max_slots slots of the given duration in which every person of calendars is free, earliest first.
+  # Slots start on multiples of align and follow each other by step (default: duration) within a free interval.
+  if duration <= datetime.timedelta(0):
+    raise ValueError("duration must be positive")
+  step = step or duration
+  window_start = window_start.astimezone(UTC)
+  window_end = window_end.astimezone(UTC)
+
+  per_person = [calendar_busy_intervals(events, window_start, window_end, default_tz=default_tz, ignore=ignore)
+                for events in calendars.values()]
+  # The per-person lists are sorted, a k-way merge keeps the union O(n log k)
+  busy = merge_intervals(heapq.merge(*per_person))
+
+  if working_hours is not None:
+    available: Iterable[Interval] = working_hours.intervals(window_start, window_end)
+  else:
+    available = [(window_start, window_end)]
+
+  slots: list[Slot] = []
+  for free_start, free_end in free_intervals(busy, available):
+    start = _ceil(free_start, align)
+    while start + duration <= free_end:
+      slots.append(Slot(start, start + duration))
+      if len(slots) >= max_slots:
+        return slots
+      start += step
+  logging.debug("Found %d free slots for %d calendars", len(slots), len(per_person))
+  return slots
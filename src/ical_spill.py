@@ -0,0 +1,273 @@
+import heapq
+import itertools
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+import icalendar
+
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional
+
+import ical_diff
+import ical_emit
+import ical_shard
+import ical_vtimezone
+import w32a_export
+import w32a_metrics
+
+# Serialized events kept in memory before they are written to a segment
+SPILL_BUDGET_DEFAULT = 64 * 1024 * 1024
+
+SPILL_ORDER_INSERTION = "insertion"
+SPILL_ORDER_START = "start"
+SPILL_ORDERS = (SPILL_ORDER_INSERTION, SPILL_ORDER_START)
+
+# Segments merged at once: one open file and one buffered event per segment
+SPILL_MERGE_FAN_IN = 64
+
+# Approximate memory per buffered event besides its bytes: bytes object, index tuple and key
+_RECORD_OVERHEAD = 160
+
+SortKey = tuple
+
+
+class SpillStats:
+
+  def __init__(self) -> None:
+    self.events: int = 0
+    self.bytes: int = 0
+    self.segments: int = 0
+    self.spilled_events: int = 0
+    self.spilled_bytes: int = 0
+    # Highest accounted memory of the buffered events
+    self.peak_buffered: int = 0
+    self.spill_seconds: float = 0.0
+    self.merge_seconds: float = 0.0
+    # Intermediate merges of SPILL_MERGE_FAN_IN segments into one
+    self.merge_passes: int = 0
+
+  def as_dict(self) -> dict:
+    return {
+      "events": self.events,
+      "bytes": self.bytes,
+      "segments": self.segments,
+      "spilled_events": self.spilled_events,
+      "spilled_bytes": self.spilled_bytes,
+      "peak_buffered": self.peak_buffered,
+      "spill_seconds": self.spill_seconds,
+      "merge_seconds": self.merge_seconds,
+      "merge_passes": self.merge_passes,
+    }
+
+
+class _Segment:
+  # Sorted run on disk: a pickled (key, length) header followed by the serialized event, for every event
+  __slots__ = ("path", "events")
+
+  def __init__(self, path: str, events: int) -> None:
+    self.path: str = path
+    self.events: int = events
+
+  @classmethod
+  def write(cls, path: str, records: Iterable[tuple[SortKey, bytes]]) -> '_Segment':
+    events = 0
+    with open(path, "wb") as f:
+      for key, chunk in records:
+        pickle.dump((key, len(chunk)), f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.write(chunk)
+        events += 1
+    return cls(path, events)
+
+  def records(self) -> Iterator[tuple[SortKey, bytes]]:
+    # Read sequentially, only one event per segment is in memory during the merge
+    with open(self.path, "rb") as f:
+      for _ in range(self.events):
+        key, length = pickle.load(f)
+        yield key, f.read(length)
+
+  def remove(self) -> None:
+    os.remove(self.path)
+
+
+def _merge_records(runs: list[Iterator[tuple[SortKey, bytes]]]) -> Iterator[tuple[SortKey, bytes]]:
+  return heapq.merge(*runs, key=lambda record: record[0])
+
+
+def _start_key(component: icalendar.cal.Component) -> tuple:
+  start = ical_shard.event_start(component)
+  if start is None:
+    return (1, None)
+  return (0, ical_shard.as_datetime(start))
+
+
+class SpillBuffer:
+  # Serialized components within a memory budget. When the buffered events exceed memory_budget,
+  # they are sorted and written to a temporary segment; write() merges the segments and the buffer
+  # into the output stream. Components are serialized on add(), so the icalendar objects can be freed.
+  # order is the output order: insertion order, or DTSTART (then insertion order).
+  # At most merge_fan_in segments are open at once, more are first merged into larger segments.
+
+  def __init__(self, memory_budget: int = SPILL_BUDGET_DEFAULT,
+               format: str = ical_emit.FORMAT_ICS,
+               order: str = SPILL_ORDER_INSERTION,
+               directory: Optional[str] = None,
+               merge_fan_in: int = SPILL_MERGE_FAN_IN) -> None:
+    if memory_budget < 1:
+      raise ValueError("memory_budget must be positive")
+    if merge_fan_in < 2:
+      raise ValueError("merge_fan_in must be at least 2")
+    if order not in SPILL_ORDERS:
+      raise ValueError("Unknown order: %s" % order)
+    if format not in ical_emit.SERIALIZERS:
+      raise ValueError("Unknown format: %s" % format)
+    self.memory_budget: int = memory_budget
+    self.format: str = format
+    self.order: str = order
+    self.directory: Optional[str] = directory
+    self.merge_fan_in: int = merge_fan_in
+    self.stats = SpillStats()
+    self._records: list[tuple[SortKey, bytes]] = []
+    self._buffered: int = 0
+    self._segments: list[_Segment] = []
+    self._segment_number: int = -1
+    self._tempdir: Optional[str] = None
+
+  def __enter__(self) -> 'SpillBuffer':
+    return self
+
+  def __exit__(self, *exc) -> None:
+    self.close()
+
+  def add(self, component: icalendar.cal.Component) -> None:
+    start = _start_key(component) if self.order == SPILL_ORDER_START else None
+    self.add_serialized(ical_emit.serialize_component(component, self.format), start)
+
+  def add_serialized(self, data: bytes, start: Optional[tuple] = None) -> None:
+    # data serialized by ical_emit.serialize_component in the format of the buffer, e.g. from an ExportState.
+    # With SPILL_ORDER_START, events without start are written last.
+    seq = self.stats.events
+    if self.order == SPILL_ORDER_START:
+      key = (start if start is not None else (1, None), seq)
+    else:
+      key = (seq,)
+    self._records.append((key, data))
+    self._buffered += len(data) + _RECORD_OVERHEAD
+    self.stats.events += 1
+    self.stats.bytes += len(data)
+    if self._buffered > self.stats.peak_buffered:
+      self.stats.peak_buffered = self._buffered
+    if self._buffered > self.memory_budget:
+      self.spill()
+
+  def spill(self) -> None:
+    # Writes the buffered events to a new segment
+    if not self._records:
+      return
+    t0 = time.perf_counter()
+    if self._tempdir is None:
+      self._tempdir = tempfile.mkdtemp(prefix="pyw32ical-spill-", dir=self.directory)
+    self._records.sort(key=lambda record: record[0])
+    self._segments.append(_Segment.write(self._segment_path(), self._records))
+    self.stats.segments += 1
+    self.stats.spilled_events += len(self._records)
+    self.stats.spilled_bytes += sum(len(chunk) for _key, chunk in self._records)
+    self._records = []
+    self._buffered = 0
+    self.stats.spill_seconds += time.perf_counter() - t0
+    logging.debug("Spilled segment %d: %d events", self.stats.segments, self._segments[-1].events)
+
+  def _segment_path(self) -> str:
+    # Merged segments are numbered on after the spilled ones
+    self._segment_number += 1
+    return os.path.join(self._tempdir, "segment-%05d" % self._segment_number)
+
+  def _merge_segments(self, max_segments: int) -> None:
+    # Merges the oldest merge_fan_in segments into one until at most max_segments are left.
+    # Each pass reads and writes the spilled events once more, with 64 runs per pass that is
+    # one extra pass per 64x more segments.
+    while len(self._segments) > max_segments:
+      count = min(self.merge_fan_in, len(self._segments) - max_segments + 1)
+      runs, self._segments = self._segments[:count], self._segments[count:]
+      self._segments.append(_Segment.write(self._segment_path(),
+                                           _merge_records([segment.records() for segment in runs])))
+      for segment in runs:
+        segment.remove()
+      self.stats.merge_passes += 1
+      logging.debug("Merged %d segments: %d events", count, self._segments[-1].events)
+
+  def chunks(self) -> Iterator[bytes]:
+    # All serialized events in output order: k-way merge of the segments and the buffer
+    self._records.sort(key=lambda record: record[0])
+    self._merge_segments(self.merge_fan_in - 1 if self._records else self.merge_fan_in)
+    runs = [segment.records() for segment in self._segments] + [iter(self._records)]
+    for _key, chunk in _merge_records(runs):
+      yield chunk
+
+  def write(self, fp: BinaryIO,
+            compression: Optional[str] = None,
+            prodid: str = w32a_export.ICAL_PRODID,
+            timezones: Optional[Iterable[icalendar.Timezone]] = None) -> int:
+    # timezones (VTIMEZONEs) are written after the events, returns the number of components
+    t0 = time.perf_counter()
+    chunks = self.chunks()
+    if timezones:
+      chunks = itertools.chain(chunks, (ical_emit.serialize_component(tz, self.format) for tz in timezones))
+    with ical_emit.compressed_writer(fp, compression) as writer:
+      count = ical_emit.write_serialized(chunks, writer, format=self.format, prodid=prodid)
+    self.stats.merge_seconds += time.perf_counter() - t0
+    return count
+
+  def close(self) -> None:
+    # Removes the segments
+    if self._tempdir is not None:
+      shutil.rmtree(self._tempdir, ignore_errors=True)
+      self._tempdir = None
+    self._segments = []
+    self._records = []
+    self._buffered = 0
+
+
+def export_folders_spilled(specs: Iterable[w32a_export.FolderSpec], fp: BinaryIO,
+                           memory_budget: int = SPILL_BUDGET_DEFAULT,
+                           format: str = ical_emit.FORMAT_ICS,
+                           compression: Optional[str] = None,
+                           prodid: str = w32a_export.ICAL_PRODID,
+                           order: str = SPILL_ORDER_INSERTION,
+                           directory: Optional[str] = None,
+                           folder_resolver: Callable[[Optional[str]], object] = w32a_export.get_outlook_calendar_folder,
+                           pipeline_workers: Optional[int] = None) -> tuple[list[w32a_export.SourceReport], SpillStats]:
+  # Memory bounded variant of ical_emit.export_folders_to. Sources are exported one after another and
+  # every event is serialized into a SpillBuffer as soon as it is converted, so only the buffer,
+  # the (UID, RECURRENCE-ID) keys for de-duplication and the items in flight are held in memory.
+  # Like export_folders, the first source wins on duplicates and a failing source is reported, not raised.
+  seen: set[ical_diff.EventKey] = set()
+  timezones = ical_vtimezone.TimezoneCollector()
+  reports: list[w32a_export.SourceReport] = []
+  with SpillBuffer(memory_budget, format=format, order=order, directory=directory) as buffer:
+    for spec in specs:
+      report = w32a_export.SourceReport(spec.label)
+      t0 = time.perf_counter()
+      try:
+        for event in w32a_export.iter_source_events(spec, folder_resolver, report, pipeline_workers):
+          key = ical_diff.event_key(event)
+          if key in seen:
+            report.duplicates += 1
+            continue
+          seen.add(key)
+          timezones.add(event)
+          with w32a_metrics.get_sink().stage(w32a_metrics.STAGE_SERIALIZE):
+            buffer.add(event)
+          report.events += 1
+      except Exception as e:
+        # Events of the source that were already buffered stay in the output
+        logging.exception("Export of calendar %s failed", spec.label)
+        report.error = e
+      report.seconds = time.perf_counter() - t0
+      reports.append(report)
+
+    buffer.write(fp, compression=compression, prodid=prodid, timezones=timezones.timezones())
+    logging.debug("Spilled export: %s", buffer.stats.as_dict())
+    return reports, buffer.stats
@@ -0,0 +1,251 @@
+import collections
+import datetime
+import hashlib
+import logging
+import sqlite3
+import threading
+
+import icalendar
+
+from typing import Iterable, Optional
+
+import ical_diff
+import ical_expand
+from ical_expand import Occurrence, UTC
+from w32a_cal import BusyStatus
+
+# Occurrences are stored with start and end as UTC epoch seconds, so range queries compare integers
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+  key TEXT PRIMARY KEY,
+  value TEXT
+);
+CREATE TABLE IF NOT EXISTS events (
+  source TEXT NOT NULL,
+  uid TEXT NOT NULL,
+  fingerprint TEXT NOT NULL,
+  PRIMARY KEY (source, uid)
+);
+CREATE TABLE IF NOT EXISTS occurrences (
+  id INTEGER PRIMARY KEY,
+  uid TEXT NOT NULL,
+  recurrence_id INTEGER,
+  start INTEGER NOT NULL,
+  end INTEGER NOT NULL,
+  all_day INTEGER NOT NULL,
+  busy_status INTEGER NOT NULL,
+  summary TEXT NOT NULL,
+  location TEXT NOT NULL,
+  categories TEXT NOT NULL,
+  source TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS occurrence_categories (
+  occurrence_id INTEGER NOT NULL,
+  category TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS occurrences_start ON occurrences (start);
+CREATE INDEX IF NOT EXISTS occurrences_location_start ON occurrences (location, start);
+CREATE INDEX IF NOT EXISTS occurrences_busy_start ON occurrences (busy_status, start);
+CREATE INDEX IF NOT EXISTS occurrences_source_uid ON occurrences (source, uid);
+CREATE INDEX IF NOT EXISTS occurrence_categories_category ON occurrence_categories (category, occurrence_id);
+CREATE INDEX IF NOT EXISTS occurrence_categories_occurrence ON occurrence_categories (occurrence_id);
+"""
+
+# Categories are stored joined like Outlook does
+CATEGORY_SEPARATOR = ", "
+
+
+class RefreshReport:
+
+  def __init__(self) -> None:
+    self.added: int = 0
+    self.updated: int = 0
+    self.removed: int = 0
+    self.unchanged: int = 0
+    self.occurrences: int = 0
+
+  def as_dict(self) -> dict:
+    return {
+      "added": self.added,
+      "updated": self.updated,
+      "removed": self.removed,
+      "unchanged": self.unchanged,
+      "occurrences": self.occurrences,
+    }
+
+
+def _epoch(dt: datetime.datetime) -> int:
+  return int(dt.timestamp())
+
+def _from_epoch(value: Optional[int]) -> Optional[datetime.datetime]:
+  if value is None:
+    return None
+  return datetime.datetime.fromtimestamp(value, tz=UTC)
+
+def series_fingerprint(events: list[icalendar.Event]) -> str:
+  # Fingerprint of a master together with its recurrence exceptions
+  h = hashlib.sha1()
+  for fingerprint in sorted(ical_diff.event_fingerprint(event) for event in events):
+    h.update(fingerprint.encode("ascii"))
+  return h.hexdigest()
+
+
+class OccurrenceStore:
+  # SQLite materialization of converted events and their occurrences within a window.
+  # refresh() only re-expands series whose content changed, query() answers range and attribute queries
+  # from indexes instead of re-converting and re-expanding.
+
+  def __init__(self, path: str = ":memory:",
+               window_start: Optional[datetime.datetime] = None,
+               window_end: Optional[datetime.datetime] = None,
+               default_tz: datetime.tzinfo = UTC) -> None:
+    self.path: str = path
+    self.default_tz: datetime.tzinfo = default_tz
+    self._lock = threading.Lock()
+    self.connection = sqlite3.connect(path, check_same_thread=False)
+    self.connection.executescript(_SCHEMA)
+    self.window_start: Optional[datetime.datetime] = window_start
+    self.window_end: Optional[datetime.datetime] = window_end
+
+    stored_window = (self._get_meta("window_start"), self._get_meta("window_end"))
+    window = (str(_epoch(window_start)) if window_start is not None else None,
+              str(_epoch(window_end)) if window_end is not None else None)
+    if stored_window != window:
+      # Occurrences of another window cannot be reused
+      self.clear()
+      self._set_meta("window_start", window[0])
+      self._set_meta("window_end", window[1])
+      self.connection.commit()
+
+  def close(self) -> None:
+    self.connection.close()
+
+  def _get_meta(self, key: str) -> Optional[str]:
+    row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row is not None else None
+
+  def _set_meta(self, key: str, value: Optional[str]) -> None:
+    self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+  @property
+  def max_duration(self) -> int:
+    # Longest stored occurrence in seconds, bounds the range scan over the start index
+    value = self._get_meta("max_duration")
+    return int(value) if value is not None else 0
+
+  def clear(self) -> None:
+    with self._lock:
+      self.connection.execute("DELETE FROM occurrence_categories")
+      self.connection.execute("DELETE FROM occurrences")
+      self.connection.execute("DELETE FROM events")
+      self.connection.execute("DELETE FROM meta WHERE key = 'max_duration'")
+      self.connection.commit()
+
+  def _delete_uids(self, uids: Iterable[str], source: str) -> None:
+    for uid in uids:
+      self.connection.execute("DELETE FROM occurrence_categories WHERE occurrence_id IN"
+                              " (SELECT id FROM occurrences WHERE source = ? AND uid = ?)", (source, uid))
+      self.connection.execute("DELETE FROM occurrences WHERE source = ? AND uid = ?", (source, uid))
+      self.connection.execute("DELETE FROM events WHERE source = ? AND uid = ?", (source, uid))
+
+  def _insert_series(self, uid: str, events: list[icalendar.Event], source: str, fingerprint: str) -> int:
+    self.connection.execute("INSERT OR REPLACE INTO events (source, uid, fingerprint) VALUES (?, ?, ?)",
+                            (source, uid, fingerprint))
+    occurrences = ical_expand.expand_events(events, self.window_start, self.window_end,
+                                            default_tz=self.default_tz, source=source)
+    max_duration = self.max_duration
+    for o in occurrences:
+      cursor = self.connection.execute(
+        "INSERT INTO occurrences (uid, recurrence_id, start, end, all_day, busy_status, summary, location, categories, source)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (o.uid, _epoch(o.recurrence_id) if o.recurrence_id is not None else None, _epoch(o.start), _epoch(o.end),
+         int(o.all_day), int(o.busy_status), o.summary, o.location, CATEGORY_SEPARATOR.join(o.categories), source))
+      if o.categories:
+        self.connection.executemany("INSERT INTO occurrence_categories (occurrence_id, category) VALUES (?, ?)",
+                                    [(cursor.lastrowid, c) for c in o.categories])
+      max_duration = max(max_duration, _epoch(o.end) - _epoch(o.start))
+    self._set_meta("max_duration", str(max_duration))
+    return len(occurrences)
+
+  def refresh(self, events: Iterable[icalendar.Event], source: str = "", complete: bool = True) -> RefreshReport:
+    # Synchronizes the store with the converted events of one source calendar.
+    # Series are compared by fingerprint, only added and changed series are expanded again.
+    # With complete=True, series of the source that are not in events are removed.
+    by_uid: collections.OrderedDict[str, list[icalendar.Event]] = collections.OrderedDict()
+    for event in events:
+      by_uid.setdefault(str(event.get('UID', "")), []).append(event)
+
+    report = RefreshReport()
+    with self._lock:
+      stored = dict(self.connection.execute("SELECT uid, fingerprint FROM events WHERE source = ?", (source,)).fetchall())
+      for uid, uid_events in by_uid.items():
+        fingerprint = series_fingerprint(uid_events)
+        old_fingerprint = stored.get(uid, None)
+        if old_fingerprint == fingerprint:
+          report.unchanged += 1
+          continue
+        if old_fingerprint is None:
+          report.added += 1
+        else:
+          report.updated += 1
+        self._delete_uids([uid], source)
+        report.occurrences += self._insert_series(uid, uid_events, source, fingerprint)
+
+      if complete:
+        removed = [uid for uid in stored if uid not in by_uid]
+        self._delete_uids(removed, source)
+        report.removed += len(removed)
+      self.connection.commit()
+
+    logging.debug("Refreshed occurrence store %s: %s", source, report.as_dict())
+    return report
+
+  def remove(self, uids: Iterable[str], source: str = "") -> None:
+    with self._lock:
+      self._delete_uids(uids, source)
+      self.connection.commit()
+
+  def query(self, start: datetime.datetime, end: datetime.datetime,
+            location: Optional[str] = None,
+            busy_status: Optional[Iterable[BusyStatus]] = None,
+            category: Optional[str] = None,
+            source: Optional[str] = None,
+            limit: Optional[int] = None) -> list[Occurrence]:
+    # Occurrences overlapping [start, end), sorted by start
+    start_epoch = _epoch(start)
+    end_epoch = _epoch(end)
+    with self._lock:
+      max_duration = self.max_duration
+    # start >= start - max_duration keeps the scan on the start index
+    clauses = ["o.start < ?", "o.start >= ?", "o.end > ?"]
+    params: list = [end_epoch, start_epoch - max_duration, start_epoch]
+    joins = ""
+    if location is not None:
+      clauses.append("o.location = ?")
+      params.append(location)
+    if busy_status is not None:
+      statuses = [int(s) for s in busy_status]
+      clauses.append("o.busy_status IN (%s)" % ", ".join("?" * len(statuses)))
+      params.extend(statuses)
+    if category is not None:
+      joins = " JOIN occurrence_categories c ON c.occurrence_id = o.id"
+      clauses.append("c.category = ?")
+      params.append(category)
+    if source is not None:
+      clauses.append("o.source = ?")
+      params.append(source)
+    sql = ("SELECT o.uid, o.recurrence_id, o.start, o.end, o.all_day, o.busy_status, o.summary, o.location, o.categories, o.source"
+           " FROM occurrences o" + joins + " WHERE " + " AND ".join(clauses) + " ORDER BY o.start, o.end, o.uid")
+    if limit is not None:
+      sql += " LIMIT %d" % int(limit)
+
+    with self._lock:
+      rows = self.connection.execute(sql, params).fetchall()
+    return [Occurrence(uid, _from_epoch(recurrence_id), _from_epoch(o_start), _from_epoch(o_end),
+                       all_day=bool(all_day), busy_status=BusyStatus(busy), summary=summary, location=o_location,
+                       categories=tuple(categories.split(CATEGORY_SEPARATOR)) if categories else (), source=o_source)
+            for uid, recurrence_id, o_start, o_end, all_day, busy, summary, o_location, categories, o_source in rows]
+
+  def count(self) -> int:
+    with self._lock:
+      return self.connection.execute("SELECT COUNT(*) FROM occurrences").fetchone()[0]
@@ -0,0 +1,141 @@
+import datetime
+import logging
+
+import icalendar
+
+from typing import Iterable, Optional
+
+import w32a_tz
+
+# Years of observances written for series that never end
+VTIMEZONE_SERIES_YEARS = 10
+
+_DAY = datetime.timedelta(days=1)
+
+
+def _offset_state(tz: datetime.tzinfo, utc_dt: datetime.datetime) -> tuple:
+  local = utc_dt.astimezone(tz)
+  return (local.utcoffset(), local.dst(), local.tzname())
+
+def _transitions(tz: datetime.tzinfo, start: datetime.datetime, end: datetime.datetime) -> list[datetime.datetime]:
+  # UTC instants in [start, end) where the offset or name of tz changes; daily steps, then bisected to the second
+  found: list[datetime.datetime] = []
+  t = start
+  state = _offset_state(tz, t)
+  while t < end:
+    t_next = min(t + _DAY, end)
+    next_state = _offset_state(tz, t_next)
+    if next_state != state:
+      lo, hi = t, t_next
+      while hi - lo > datetime.timedelta(seconds=1):
+        mid = lo + (hi - lo) / 2
+        mid = mid.replace(microsecond=0)
+        if _offset_state(tz, mid) == state:
+          lo = mid
+        else:
+          hi = mid
+      found.append(hi)
+    t, state = t_next, next_state
+  return found
+
+def _observance(tz: datetime.tzinfo, utc_dt: datetime.datetime,
+                offset_from: datetime.timedelta) -> icalendar.cal.Component:
+  offset, dst, name = _offset_state(tz, utc_dt)
+  component = icalendar.TimezoneDaylight() if dst else icalendar.TimezoneStandard()
+  # https://icalendar.org/iCalendar-RFC-5545/3-6-5-time-zone-component.html
+  # DTSTART of an observance is the local time before the transition
+  component.add('DTSTART', (utc_dt + offset_from).replace(tzinfo=None))
+  component.add('TZOFFSETFROM', offset_from)
+  component.add('TZOFFSETTO', offset)
+  if name:
+    component.add('TZNAME', name)
+  return component
+
+def make_vtimezone(tzid: str, tz: datetime.tzinfo, first_year: int, last_year: int) -> icalendar.Timezone:
+  # VTIMEZONE with one observance per transition of tz from first_year to last_year (inclusive)
+  start = datetime.datetime(first_year, 1, 1, tzinfo=datetime.timezone.utc)
+  end = datetime.datetime(last_year + 1, 1, 1, tzinfo=datetime.timezone.utc)
+  vtimezone = icalendar.Timezone()
+  vtimezone.add('TZID', tzid)
+  offset = _offset_state(tz, start)[0]
+  vtimezone.add_component(_observance(tz, start, offset))
+  for transition in _transitions(tz, start, end):
+    vtimezone.add_component(_observance(tz, transition, offset))
+    offset = _offset_state(tz, transition)[0]
+  return vtimezone
+
+def _zoned_values(event: icalendar.Event) -> Iterable[tuple[str, datetime.datetime]]:
+  for name in ('DTSTART', 'DTEND', 'RECURRENCE-ID', 'EXDATE'):
+    values = event.get(name, None)
+    if values is None:
+      continue
+    for value in values if isinstance(values, list) else [values]:
+      for dt in [d.dt for d in value.dts] if hasattr(value, 'dts') else [getattr(value, 'dt', None)]:
+        if isinstance(dt, datetime.datetime) and dt.tzinfo is not None:
+          tzid = value.params.get('TZID', None) if hasattr(value, 'params') else None
+          yield tzid, dt
+
+def _series_last_year(event: icalendar.Event, year: int) -> int:
+  rrule = event.get('RRULE', None)
+  if rrule is None:
+    return year
+  until = rrule.get('UNTIL', None)
+  if until:
+    return max(year, until[0].year)
+  return year + VTIMEZONE_SERIES_YEARS
+
+# (TZID, first year, last year) of a time zone used by an event, see event_zones
+ZoneUse = tuple[str, int, int]
+
+def event_zones(event: icalendar.Event) -> list[tuple[ZoneUse, datetime.tzinfo]]:
+  # The TZIDs referenced by event with the years they are used in and their tzinfo.
+  # Every TZID needs a VTIMEZONE, also UTC zones like the converter's Etc/UTC; UTC values ("Z") have none.
+  zones: list[tuple[ZoneUse, datetime.tzinfo]] = []
+  for tzid, dt in _zoned_values(event):
+    if tzid is None:
+      continue
+    zones.append(((str(tzid), dt.year, _series_last_year(event, dt.year)), dt.tzinfo))
+  return zones
+
+class TimezoneCollector:
+  # Collects the TZIDs referenced by events one at a time, for writers that stream the events
+  # and add the VTIMEZONEs afterwards
+
+  def __init__(self) -> None:
+    self._zones: dict[str, tuple[Optional[datetime.tzinfo], int, int]] = {}
+
+  def add(self, event: icalendar.Event) -> None:
+    for zone, tz in event_zones(event):
+      self.add_zone(zone, tz)
+
+  def add_zone(self, zone: ZoneUse, tz: Optional[datetime.tzinfo] = None) -> None:
+    # Without tz, e.g. for events that were serialized earlier, the TZID is looked up by name
+    tzid, first, last = zone
+    known_tz, first_year, last_year = self._zones.get(tzid, (tz, first, last))
+    self._zones[tzid] = (known_tz or tz, min(first_year, first), max(last_year, last))
+
+  def timezones(self) -> list[icalendar.Timezone]:
+    result: list[icalendar.Timezone] = []
+    for tzid, (tz, first, last) in sorted(self._zones.items()):
+      if tz is None:
+        try:
+          tz = w32a_tz.get_backend().timezone(tzid)
+        except Exception:
+          logging.warning("No VTIMEZONE for unknown TZID %s", tzid)
+          continue
+      result.append(make_vtimezone(tzid, tz, first, last))
+    return result
+
+def calendar_timezones(events: Iterable[icalendar.Event]) -> list[icalendar.Timezone]:
+  # VTIMEZONEs for the TZIDs referenced by events, covering the years they are used in
+  collector = TimezoneCollector()
+  for event in events:
+    collector.add(event)
+  return collector.timezones()
+
+def add_timezones(cal: icalendar.Calendar, timezones: Optional[Iterable[icalendar.Timezone]] = None) -> None:
+  # Puts the VTIMEZONEs for the events of cal in front of them, unless cal already defines the TZID
+  if timezones is None:
+    timezones = calendar_timezones(cal.walk('VEVENT'))
+  defined = set(str(tz.get('TZID')) for tz in cal.walk('VTIMEZONE'))
+  cal.subcomponents[0:0] = [tz for tz in timezones if str(tz.get('TZID')) not in defined]
@@ -153,7 +153,21 @@ class ConvertWin32ToIcalTest(unittest.TestCase):
         pass
 
     def test_attendees(self):
-        pass
+        event_args = self.event_with_end_args.copy()
+        event_args['req_attendees'] = ["jane@example.com", "Doe, John"]
+        event_args['opt_attendees'] = ["Max Mustermann"]
+        event = W32Event(**event_args)
+
+        ical_events: list[icalendar.Event] = w32a_cal.win32_event_to_ical(event)
+        self.assertEqual(len(ical_events), 1)
+        attendees = ical_events[0].get('ATTENDEE')
+        self.assertEqual(len(attendees), 3)
+        self.assertEqual(attendees[0], "mailto:jane@example.com")
+        self.assertEqual(attendees[0].params['ROLE'], "REQ-PARTICIPANT")
+        self.assertEqual(attendees[1], "invalid:nomail")
+        self.assertEqual(attendees[1].params['CN'], "Doe, John")
+        self.assertEqual(attendees[2].params['CN'], "Max Mustermann")
+        self.assertEqual(attendees[2].params['ROLE'], "OPT-PARTICIPANT")
 
     def test_recurring_daily(self):
         event_args = self.event_with_end_args.copy()
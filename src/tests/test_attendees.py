@@ -0,0 +1,73 @@
+import unittest
+import datetime
+import threading
+import pytz
+import w32a_cal
+import w32a_attendees
+from w32obj import W32Event, W32RecurrencePattern, W32Exception
+
+
+class AttendeeCacheTest(unittest.TestCase):
+
+    def test_directory_resolver(self):
+        calls = []
+        directory = w32a_attendees.DirectoryResolver({"Doe, John": "john.doe@example.com"})
+
+        def resolver(name):
+            calls.append(name)
+            return directory(name)
+
+        cache = w32a_attendees.AttendeeCache(resolver, maxsize=16)
+        attendees = cache.attendees("doe, john; jane@example.com", "Unknown")
+        self.assertEqual([address for address, _name, _role in attendees], ["mailto:john.doe@example.com", "mailto:jane@example.com", "invalid:nomail"])
+
+        self.assertIs(cache.attendees("doe, john; jane@example.com", "Unknown"), attendees)
+        cache.attendees("jane@example.com", "")
+        self.assertEqual(calls, ["doe, john", "jane@example.com", "Unknown"])
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_lru_bound(self):
+        cache = w32a_attendees.AttendeeCache(maxsize=16)
+        for i in range(100):
+            cache.cal_address("user%d@example.com" % i, "REQ-PARTICIPANT")
+        self.assertEqual(len(cache._addresses.data), 16)
+
+    def test_series_shares_attendees(self):
+        start = datetime.datetime(2024, 2, 13, 12, 30, tzinfo=pytz.utc)
+        attendees = ["user%d@example.com" % i for i in range(50)]
+        exception_event = W32Event(id="1", subject="Moved", start=start + datetime.timedelta(days=1, hours=1),
+                                   duration=30, req_attendees=attendees)
+        pattern = W32RecurrencePattern(w32a_cal.RecurrenceType.DAILY, 1, 10,
+                                       exceptions=[W32Exception(start + datetime.timedelta(days=1), event=exception_event)])
+        master = W32Event(id="1", subject="Daily", start=start, duration=30, req_attendees=attendees,
+                          recurring=True, recurrence_state=w32a_cal.RecurrenceState.MASTER, recurrence_pattern=pattern)
+
+        cache = w32a_attendees.AttendeeCache()
+        ical_events = w32a_cal.win32_event_to_ical(master, attendee_cache=cache)
+        self.assertEqual(len(ical_events), 2)
+        self.assertEqual(len(ical_events[0].get('ATTENDEE')), 50)
+        self.assertEqual(ical_events[0].get('ATTENDEE'), ical_events[1].get('ATTENDEE'))
+        self.assertIsNot(ical_events[0].get('ATTENDEE'), ical_events[1].get('ATTENDEE'))
+        self.assertEqual(cache.misses, 1)
+
+    def test_attendees_not_shared(self):
+        cache = w32a_attendees.AttendeeCache()
+        start = datetime.datetime(2024, 2, 13, 12, 30, tzinfo=pytz.utc)
+        first, second = [w32a_cal.win32_event_to_ical(W32Event(id=id, subject=id, start=start, duration=30,
+                                                                req_attendees=["jane@example.com"]),
+                                                       attendee_cache=cache)[0] for id in ("1", "2")]
+        first.get('ATTENDEE').params['PARTSTAT'] = "ACCEPTED"
+        self.assertNotIn('PARTSTAT', second.get('ATTENDEE').params)
+        self.assertEqual(str(second.get('ATTENDEE')), "mailto:jane@example.com")
+        self.assertIsNot(cache.cal_address("Jane", "CHAIR"), cache.cal_address("Jane", "CHAIR"))
+
+    def test_recipient_resolver_thread(self):
+        class Namespace:
+            def CreateRecipient(self, name):
+                raise AssertionError("not resolved")
+        resolver = w32a_attendees.OutlookRecipientResolver(Namespace())
+        errors = []
+        thread = threading.Thread(target=lambda: errors.append(self.assertRaises(RuntimeError, resolver, "Jane")))
+        thread.start()
+        thread.join()
+        self.assertEqual(len(errors), 1)
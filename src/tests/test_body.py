@@ -0,0 +1,102 @@
+import unittest
+import datetime
+import pytz
+import w32a_cal
+import w32a_body
+import w32obj
+from w32obj import W32Event
+
+
+class CountingEvent(W32Event):
+    # Counts reads of the large body fields
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.RTFBody = b"{\\rtf1}"
+        self.reads = []
+
+    def __getattribute__(self, name):
+        if name in w32a_body.LAZY_BODY_PROPERTIES:
+            object.__getattribute__(self, "reads").append(name)
+        return object.__getattribute__(self, name)
+
+
+class BodyBudgetTest(unittest.TestCase):
+
+    def make_event(self, body: str) -> CountingEvent:
+        start = datetime.datetime(2024, 2, 13, 12, 30, tzinfo=pytz.utc)
+        return CountingEvent(id="1", subject="Test", start=start, duration=30, body=body)
+
+    def test_policies(self):
+        text = "x" * 100
+        budget = w32a_body.BodyBudget(max_chars=10)
+        self.assertEqual(budget.apply("short"), "short")
+        self.assertEqual(budget.apply(text), "x" * 10 + "\n[... 90 characters omitted ...]")
+        self.assertIsNone(w32a_body.BodyBudget(10, w32a_body.BODY_POLICY_DROP).apply(text))
+        self.assertEqual(w32a_body.BodyBudget(10, w32a_body.BODY_POLICY_SUMMARY).apply(text), "[... 100 characters omitted ...]")
+        self.assertEqual(budget.as_dict()["bytes_skipped"], 90)
+        self.assertEqual(budget.as_dict()["truncated"], 1)
+        with self.assertRaises(ValueError):
+            w32a_body.BodyBudget(10, "compress")
+
+    def test_lazy_snapshot(self):
+        event = self.make_event("body")
+        snapshot = w32obj.make_anonymous_event(event, lazy_body=True)
+        self.assertEqual(event.reads, [])
+        self.assertEqual(snapshot.Subject, "Test")
+
+        ical_event = w32a_cal.win32_event_to_ical(snapshot, filter=w32a_cal.ICAL_FILTER_SAFE)[0]
+        self.assertIsNone(ical_event.get('DESCRIPTION'))
+        self.assertEqual(event.reads, [])
+
+        self.assertEqual(snapshot.Body, "body")
+        self.assertEqual(snapshot.Body, "body")
+        self.assertEqual(event.reads, ["Body"])
+
+    def test_eager_snapshot(self):
+        # The default snapshot is a detached copy, it keeps no reference to the item
+        event = self.make_event("body")
+        snapshot = w32obj.make_anonymous_event(event)
+        self.assertEqual(sorted(event.reads), ["Body", "RTFBody"])
+        self.assertEqual(snapshot.RTFBody, b"{\\rtf1}")
+        self.assertEqual(snapshot._lazy_properties, {})
+
+    def test_max_bytes(self):
+        budget = w32a_body.BodyBudget(max_bytes=10)
+        self.assertEqual(budget.apply("\u00e4" * 5), "\u00e4" * 5)
+        self.assertEqual(budget.apply("\u00e4" * 8), "\u00e4" * 5 + "\n[... 3 characters omitted ...]")
+        self.assertEqual(budget.apply("\u20ac" * 4), "\u20ac" * 3 + "\n[... 1 characters omitted ...]")
+        self.assertEqual(budget.apply(b"x" * 10), b"x" * 10)
+        self.assertIsNone(budget.apply(b"x" * 11))
+        self.assertEqual(budget.as_dict()["dropped"], 1)
+        self.assertEqual(budget.as_dict()["truncated"], 2)
+
+    def test_snapshot_budget(self):
+        event = self.make_event("z" * 100)
+        event.RTFBody = b"{\\rtf1 " + b"z" * 100 + b"}"
+        budget = w32a_body.BodyBudget(max_chars=10, max_bytes=50)
+        snapshot = w32obj.make_anonymous_event(event, body_budget=budget)
+        self.assertEqual(snapshot.Body, "z" * 10 + "\n[... 90 characters omitted ...]")
+        self.assertIsNone(snapshot.RTFBody)
+        self.assertEqual(budget.as_dict()["dropped"], 1)
+
+    def test_converter_budget(self):
+        event = self.make_event("y" * 1000)
+        budget = w32a_body.BodyBudget(max_chars=100, policy=w32a_body.BODY_POLICY_DROP)
+        ical_event = w32a_cal.win32_event_to_ical(event, body_budget=budget)[0]
+        self.assertIsNone(ical_event.get('DESCRIPTION'))
+        self.assertEqual(event.reads, ["Body"])
+        self.assertEqual(budget.as_dict()["bytes_skipped"], 1000)
+
+    def test_snapshot_converts_like_item(self):
+        start = datetime.datetime(2024, 2, 13, 12, 30, tzinfo=pytz.utc)
+        moved = W32Event(id="1", subject="Moved", start=start + datetime.timedelta(days=1, hours=1), duration=30)
+        pattern = w32obj.W32RecurrencePattern(w32a_cal.RecurrenceType.DAILY, 1, 10, exceptions=[
+            w32obj.W32Exception(start + datetime.timedelta(days=1), event=moved),
+            w32obj.W32Exception(start + datetime.timedelta(days=2), deleted=True),
+        ])
+        event = W32Event(id="1", subject="Daily", start=start, duration=30, body="body",
+                         recurring=True, recurrence_state=w32a_cal.RecurrenceState.MASTER, recurrence_pattern=pattern)
+        expected = [e.to_ical() for e in w32a_cal.win32_event_to_ical(event)]
+        snapshot = w32obj.make_anonymous_event(event)
+        self.assertEqual([e.to_ical() for e in w32a_cal.win32_event_to_ical(snapshot)], expected)
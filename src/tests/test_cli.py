@@ -0,0 +1,137 @@
+import unittest
+import argparse
+import gzip
+import io
+import json
+import os
+import tempfile
+import icalendar
+import ical_emit
+import w32a_cli
+import w32a_export
+import w32a_state
+from w32obj import W32Folder
+from tests.test_export import make_event, make_berlin_event, calendar_tzids
+
+SAMPLE_ICS = os.path.join(os.path.dirname(__file__), "..", "samples", "test.ics")
+
+
+class CliTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folders = {
+            "Team": W32Folder("Team", [make_event(str(i), day=1 + i % 28) for i in range(12)]),
+            "Rooms": W32Folder("Rooms", [make_event("3", day=4), make_event("room", day=20)]),
+        }
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_parse_size(self):
+        self.assertEqual(w32a_cli.parse_size("512K"), 512 * 1024)
+        self.assertEqual(w32a_cli.parse_size("64mb"), 64 * 1024 ** 2)
+        self.assertEqual(w32a_cli.parse_size("1000"), 1000)
+        with self.assertRaises(argparse.ArgumentTypeError):
+            w32a_cli.parse_size("lots")
+
+    def test_export(self):
+        expected = io.BytesIO()
+        specs = [w32a_export.FolderSpec(name="Team"), w32a_export.FolderSpec(name="Rooms")]
+        ical_emit.export_folders_to(specs, expected, folder_resolver=self.folders.get)
+
+        for workers in (1, 3):
+            buf = io.BytesIO()
+            progress, spill_stats = w32a_cli.export(["Team", "Rooms"], buf, folder_resolver=self.folders.get,
+                                                    workers=workers, memory_budget=2048)
+            self.assertEqual(buf.getvalue(), expected.getvalue())
+            self.assertEqual((progress.folders, progress.items, progress.events, progress.duplicates), (2, 14, 13, 1))
+            self.assertEqual(progress.written, len(expected.getvalue()))
+            self.assertGreater(spill_stats.segments, 0)
+
+    def test_missing_folder(self):
+        buf = io.BytesIO()
+        progress, _stats = w32a_cli.export(["Team", "Missing"], buf, folder_resolver=lambda name: self.folders[name])
+        self.assertEqual(progress.failed, 1)
+        self.assertEqual(len(icalendar.Calendar.from_ical(buf.getvalue()).walk('VEVENT')), 12)
+
+    def test_state(self):
+        path = os.path.join(self.directory.name, "state.db")
+        settings = {"format": ical_emit.FORMAT_JCAL}
+        first = io.BytesIO()
+        state = w32a_state.ExportState.load(path, settings)
+        w32a_cli.export(["Team"], first, folder_resolver=self.folders.get, format=ical_emit.FORMAT_JCAL, state=state)
+        state.save(path)
+        self.assertEqual((state.hits, state.misses), (0, 12))
+
+        self.folders["Team"].Items[0].LastModificationTime = "03/01/2024 10:00"
+        self.folders["Team"].Items[0].Subject = "Changed"
+        second = io.BytesIO()
+        state = w32a_state.ExportState.load(path, settings)
+        self.assertEqual(state.previous, 12)
+        progress, _stats = w32a_cli.export(["Team"], second, folder_resolver=self.folders.get,
+                                           format=ical_emit.FORMAT_JCAL, state=state, workers=2)
+        self.assertEqual((state.hits, state.misses), (11, 1))
+        self.assertEqual(progress.cached, 11)
+        summaries = [p[3] for c in json.loads(second.getvalue())[2] for p in c[1] if p[0] == "summary"]
+        self.assertEqual(summaries.count("Changed"), 1)
+
+        # Saved with other settings: nothing is reused
+        state.save(path)
+        self.assertEqual(len(state), 12)
+        other = w32a_state.ExportState.load(path, {"format": ical_emit.FORMAT_ICS})
+        self.assertEqual((len(other), other.previous), (0, 0))
+        other.close()
+
+        # Items removed from the folder are dropped, the state is not changed by an export that is not saved
+        self.folders["Team"].Items.Remove(1)
+        state = w32a_state.ExportState.load(path, settings)
+        w32a_cli.export(["Team"], io.BytesIO(), folder_resolver=self.folders.get, format=ical_emit.FORMAT_JCAL, state=state)
+        state.close()
+        state = w32a_state.ExportState.load(path, settings)
+        self.assertEqual(state.previous, 12)
+        w32a_cli.export(["Team"], io.BytesIO(), folder_resolver=self.folders.get, format=ical_emit.FORMAT_JCAL, state=state)
+        state.save(path)
+        state = w32a_state.ExportState.load(path, settings)
+        self.assertEqual(state.previous, 11)
+        state.close()
+
+        # A state file of the JSON format is ignored
+        with open(path, "w") as f:
+            f.write("{}")
+        state = w32a_state.ExportState.load(path, settings)
+        self.assertEqual(state.previous, 0)
+        state.close()
+        self.assertEqual(sorted(os.listdir(self.directory.name)), ["state.db"])
+
+    def test_timezones(self):
+        # Also for the items taken from the state of the previous export
+        self.folders["Team"].Items.Add(make_berlin_event("berlin"))
+        path = os.path.join(self.directory.name, "state.db")
+        for hits in (0, 13):
+            buf = io.BytesIO()
+            state = w32a_state.ExportState.load(path, {})
+            w32a_cli.export(["Team"], buf, folder_resolver=self.folders.get, state=state)
+            state.save(path)
+            self.assertEqual(state.hits, hits)
+            referenced, defined = calendar_tzids(icalendar.Calendar.from_ical(buf.getvalue()))
+            self.assertEqual(referenced, {"Etc/UTC", "Europe/Berlin"})
+            self.assertEqual(defined, referenced)
+
+    def test_main_mock(self):
+        output = os.path.join(self.directory.name, "calendar.ics.gz")
+        code = w32a_cli.main(["--mock", SAMPLE_ICS, "--filter", "safe", "--compression", "gzip", "-w", "2",
+                              "-q", "-o", output])
+        with open(output, "rb") as f:
+            cal = icalendar.Calendar.from_ical(gzip.decompress(f.read()))
+        # The sample contains a series the converter rejects, the exit code reports it
+        self.assertEqual(code, 1)
+        self.assertEqual(len(cal.walk('VEVENT')), 9)
+        self.assertEqual(set(str(e.get('SUMMARY')) for e in cal.walk('VEVENT')), {"Event"})
+        referenced, defined = calendar_tzids(cal)
+        self.assertEqual(referenced, {"Europe/Berlin"})
+        self.assertEqual(defined, referenced)
+        self.assertNotIn('LOCATION', cal.walk('VEVENT')[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+import datetime
+import itertools
+import random
+import pytz
+import w32a_cal
+import ical_conflicts
+from ical_expand import Occurrence, UTC
+from w32a_cal import BusyStatus
+from w32obj import W32Event, W32RecurrencePattern
+
+
+def at(hour: int, minute: int = 0) -> datetime.datetime:
+    return datetime.datetime(2024, 3, 4, hour, minute, tzinfo=UTC)
+
+
+class ConflictsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.occurrences = [
+            Occurrence("a", None, at(9), at(10), source="alice"),
+            Occurrence("b", None, at(9, 30), at(10, 30), source="bob"),
+            Occurrence("c", None, at(10, 30), at(11), source="alice"),
+            Occurrence("d", None, at(9), at(12), busy_status=BusyStatus.FREE, source="alice"),
+            Occurrence("e", None, at(10, 45), at(11, 15), busy_status=BusyStatus.TENTATIVE, source="alice"),
+        ]
+
+    def pairs(self, report):
+        return [(c.first.uid, c.second.uid) for c in report.conflicts]
+
+    def test_sweep(self):
+        report = ical_conflicts.sweep_conflicts(self.occurrences)
+        self.assertEqual(self.pairs(report), [("a", "b"), ("c", "e")])
+        self.assertEqual([[o.uid for o in g.occurrences] for g in report.groups], [["a", "b"], ["c", "e"]])
+        self.assertEqual(report.conflicts[0].start, at(9, 30))
+        self.assertEqual(report.conflicts[0].end, at(10))
+
+        report = ical_conflicts.sweep_conflicts(self.occurrences, ignore=ical_conflicts.CONFLICT_IGNORE_TENTATIVE)
+        self.assertEqual(self.pairs(report), [("a", "b")])
+        self.assertEqual(ical_conflicts.sweep_conflicts(self.occurrences, capacity=2).groups, [])
+
+    def test_per_source(self):
+        report = ical_conflicts.sweep_conflicts(self.occurrences, per_source=True)
+        self.assertEqual(self.pairs(report), [("c", "e")])
+
+    def test_same_uid(self):
+        shared = [Occurrence("m", None, at(9), at(10), source="alice"), Occurrence("m", None, at(9), at(10), source="bob")]
+        self.assertEqual(ical_conflicts.sweep_conflicts(shared).conflicts, [])
+        self.assertEqual(len(ical_conflicts.sweep_conflicts(shared, same_uid=True).conflicts), 1)
+
+    def test_brute_force(self):
+        rnd = random.Random(1)
+        occurrences = []
+        for i in range(300):
+            start = at(0) + datetime.timedelta(minutes=15 * rnd.randrange(400))
+            occurrences.append(Occurrence(str(i), None, start, start + datetime.timedelta(minutes=15 * rnd.randint(1, 8))))
+        expected = set()
+        for a, b in itertools.combinations(occurrences, 2):
+            if a.start < b.end and b.start < a.end:
+                expected.add(frozenset((a.uid, b.uid)))
+        report = ical_conflicts.sweep_conflicts(occurrences)
+        self.assertEqual(set(frozenset(p) for p in self.pairs(report)), expected)
+        self.assertEqual(sum(len(g.occurrences) for g in report.groups),
+                         len(set(uid for pair in expected for uid in pair)))
+
+    def test_find_conflicts(self):
+        start_dt = datetime.datetime(2024, 3, 4, 9, 0, tzinfo=pytz.utc)
+        pattern = W32RecurrencePattern(w32a_cal.RecurrenceType.WEEKLY, 1, occurrences=4,
+                                       day_of_week_mask=w32a_cal.DayOfWeekMaskEnum.MONDAY)
+        series = W32Event(id="weekly", subject="Weekly", start=start_dt, end=start_dt + datetime.timedelta(hours=1),
+                          busy_status=BusyStatus.BUSY, recurring=True, recurrence_state=w32a_cal.RecurrenceState.MASTER,
+                          recurrence_pattern=pattern)
+        single_start = start_dt + datetime.timedelta(weeks=2, minutes=30)
+        single = W32Event(id="single", subject="Single", start=single_start, end=single_start + datetime.timedelta(hours=1),
+                          busy_status=BusyStatus.BUSY)
+        calendars = {
+            "team": w32a_cal.win32_event_to_ical(series),
+            "me": w32a_cal.win32_event_to_ical(single),
+        }
+        report = ical_conflicts.find_conflicts(calendars, start_dt, start_dt + datetime.timedelta(weeks=8))
+        self.assertEqual(report.occurrences, 5)
+        self.assertEqual(self.pairs(report), [("weekly", "single")])
+        self.assertEqual(report.conflicts[0].first.start, start_dt + datetime.timedelta(weeks=2))
+        self.assertEqual(report.as_dict()["conflicts"][0]["second"]["source"], "me")
+
+    def test_converted_busy_status(self):
+        def convert(id, hour, busy_status):
+            start = at(hour)
+            return w32a_cal.win32_event_to_ical(W32Event(id=id, subject=id, start=start, end=start + datetime.timedelta(hours=1),
+                                                         busy_status=busy_status))
+        calendar = (convert("busy", 9, BusyStatus.BUSY) + convert("tentative", 9, BusyStatus.TENTATIVE)
+                    + convert("oof", 9, BusyStatus.OUT_OF_OFFICE) + convert("free", 9, BusyStatus.FREE))
+        self.assertEqual(str(calendar[1].get('TRANSP')), "OPAQUE")
+        self.assertEqual(str(calendar[2].get('X-MICROSOFT-CDO-BUSYSTATUS')), "OOF")
+
+        report = ical_conflicts.find_conflicts({"me": calendar}, at(0), at(23))
+        self.assertEqual(report.occurrences, 3)
+        self.assertEqual(set(frozenset(p) for p in self.pairs(report)),
+                         {frozenset(("busy", "tentative")), frozenset(("busy", "oof")), frozenset(("tentative", "oof"))})
+        self.assertEqual({o.uid: o.busy_status for c in report.conflicts for o in (c.first, c.second)},
+                         {"busy": BusyStatus.BUSY, "tentative": BusyStatus.TENTATIVE, "oof": BusyStatus.OUT_OF_OFFICE})
+        report = ical_conflicts.find_conflicts({"me": calendar}, at(0), at(23),
+                                               ignore=ical_conflicts.CONFLICT_IGNORE_TENTATIVE)
+        self.assertEqual(self.pairs(report), [("busy", "oof")])
+
+if __name__ == '__main__':
+    unittest.main()
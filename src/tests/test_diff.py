@@ -0,0 +1,85 @@
+import unittest
+import datetime
+import os
+import icalendar
+import pytz
+import w32a_cal
+import ical_diff
+from w32obj import W32Event
+
+SAMPLE_ICS = os.path.join(os.path.dirname(__file__), "..", "samples", "test.ics")
+
+class CalendarDiffTest(unittest.TestCase):
+
+    def make_events(self, event_id: str, subject: str = "Test") -> list[icalendar.Event]:
+        start_dt = datetime.datetime(year=2024, month=2, day=13, hour=12, minute=30, tzinfo=pytz.utc)
+        event = W32Event(id=event_id, subject=subject, start=start_dt, end=start_dt + datetime.timedelta(hours=1))
+        return w32a_cal.win32_event_to_ical(event)
+
+    def test_identical(self):
+        with open(SAMPLE_ICS, "r") as f:
+            data = f.read()
+        diff = ical_diff.diff_calendars(icalendar.Calendar.from_ical(data), icalendar.Calendar.from_ical(data))
+        self.assertTrue(diff.is_empty())
+        self.assertEqual(diff.unchanged, 10)
+        self.assertEqual(ical_diff.diff_to_itip(diff), [])
+
+    def test_added_modified_removed(self):
+        old = self.make_events("1") + self.make_events("2") + self.make_events("3")
+        new = self.make_events("1") + self.make_events("2", subject="Moved") + self.make_events("4")
+
+        diff = ical_diff.diff_calendars(old, new)
+        self.assertEqual([str(e.get('UID')) for e in diff.added], ["4"])
+        self.assertEqual([str(n.get('UID')) for o, n in diff.modified], ["2"])
+        self.assertEqual([str(e.get('UID')) for e in diff.removed], ["3"])
+        self.assertEqual(diff.unchanged, 1)
+
+    def test_sequence_bump(self):
+        old = self.make_events("1")
+        new = self.make_events("1")
+        new[0]['SEQUENCE'] = 2
+        diff = ical_diff.diff_calendars(old, new, compare_fingerprint=False)
+        self.assertEqual(len(diff.modified), 1)
+
+    def test_recurrence_id_key(self):
+        master = self.make_events("1")[0]
+        exception = self.make_events("1", subject="Exception")[0]
+        exception.add('RECURRENCE-ID', datetime.datetime(2024, 2, 14, 12, 30, tzinfo=pytz.utc))
+        self.assertNotEqual(ical_diff.event_key(master), ical_diff.event_key(exception))
+
+        diff = ical_diff.diff_calendars([master], [master, exception])
+        self.assertEqual(diff.added, [exception])
+        self.assertEqual(diff.unchanged, 1)
+
+    def test_recurrence_id_zones(self):
+        def exception(value):
+            event = icalendar.Event()
+            event.add('UID', "1")
+            event.add('RECURRENCE-ID', value)
+            return event
+        berlin = pytz.timezone("Europe/Berlin")
+        tokyo = pytz.timezone("Asia/Tokyo")
+        local = datetime.datetime(2024, 2, 14, 13, 30)
+        # Same instant written in UTC and in Berlin time
+        self.assertEqual(ical_diff.event_key(exception(berlin.localize(local))),
+                         ical_diff.event_key(exception(datetime.datetime(2024, 2, 14, 12, 30, tzinfo=pytz.utc))))
+        self.assertEqual(ical_diff.event_key(exception(berlin.localize(local))), ("1", "20240214T123000Z"))
+        # Same local time in two zones
+        self.assertNotEqual(ical_diff.event_key(exception(berlin.localize(local))),
+                            ical_diff.event_key(exception(tokyo.localize(local))))
+        # Round trip through the serialized form
+        parsed = icalendar.Event.from_ical(exception(berlin.localize(local)).to_ical())
+        self.assertEqual(ical_diff.event_key(parsed), ("1", "20240214T123000Z"))
+        self.assertEqual(ical_diff.event_key(exception(local)), ("1", "20240214T133000"))
+
+    def test_itip(self):
+        old = self.make_events("1") + self.make_events("3")
+        new = self.make_events("1", subject="Moved") + self.make_events("4")
+        delta = ical_diff.diff_to_itip(ical_diff.diff_calendars(old, new))
+        self.assertEqual([str(c.get('METHOD')) for c in delta], ["PUBLISH", "CANCEL"])
+        self.assertEqual(len(delta[0].walk('VEVENT')), 2)
+        cancelled = delta[1].walk('VEVENT')
+        self.assertEqual(len(cancelled), 1)
+        self.assertEqual(str(cancelled[0].get('UID')), "3")
+        self.assertEqual(str(cancelled[0].get('STATUS')), "CANCELLED")
+        self.assertEqual(cancelled[0].get('SEQUENCE'), 2)
@@ -0,0 +1,92 @@
+import unittest
+import datetime
+import gzip
+import io
+import json
+import os
+import icalendar
+import pytz
+import ical_emit
+import w32a_export
+from w32obj import W32Event, W32Folder
+from tests.test_export import make_event
+
+SAMPLE_ICS = os.path.join(os.path.dirname(__file__), "..", "samples", "test.ics")
+
+class EmitTest(unittest.TestCase):
+
+    def setUp(self):
+        with open(SAMPLE_ICS, "rb") as f:
+            self.cal = icalendar.Calendar.from_ical(f.read())
+
+    def test_ics(self):
+        data = ical_emit.emit_bytes(self.cal.walk('VEVENT'))
+        cal = icalendar.Calendar.from_ical(data)
+        self.assertEqual(str(cal.get('PRODID')), w32a_export.ICAL_PRODID)
+        self.assertEqual([e.to_ical() for e in cal.walk('VEVENT')], [e.to_ical() for e in self.cal.walk('VEVENT')])
+
+    def test_jcal(self):
+        jcal = json.loads(ical_emit.emit_bytes(self.cal, format=ical_emit.FORMAT_JCAL))
+        self.assertEqual(jcal[0], "vcalendar")
+        self.assertIn(["version", {}, "text", "2.0"], jcal[1])
+        self.assertEqual([c[0] for c in jcal[2]], ["vtimezone"] + ["vevent"] * 10)
+
+        properties = {p[0]: p for c in jcal[2] if c[0] == "vevent" for p in c[1]}
+        self.assertEqual(properties["dtstamp"][2:], ["date-time", "2024-02-19T09:42:24Z"])
+        self.assertEqual(properties["sequence"][2:], ["integer", 0])
+        rrules = [p for c in jcal[2] for p in c[1] if p[0] == "rrule"]
+        self.assertIn(["rrule", {}, "recur", {"freq": "WEEKLY", "count": 25, "byday": "TU"}], rrules)
+
+    def test_compression(self):
+        for format in ical_emit.FORMATS:
+            plain = ical_emit.emit_bytes(self.cal, format=format)
+            compressed = ical_emit.emit_bytes(self.cal, format=format, compression=ical_emit.COMPRESSION_GZIP)
+            self.assertEqual(gzip.decompress(compressed), plain)
+            self.assertLess(len(compressed), len(plain))
+        self.assertEqual(ical_emit.output_extension(ical_emit.FORMAT_JCAL, ical_emit.COMPRESSION_GZIP), ".json.gz")
+        with self.assertRaises(ValueError):
+            ical_emit.emit_bytes(self.cal, compression="lzma")
+
+    def test_calendar_properties(self):
+        # A calendar keeps its own PRODID, METHOD and X- properties
+        cal = icalendar.Calendar.from_ical(ical_emit.emit_bytes(self.cal))
+        self.assertEqual(str(cal.get('PRODID')), "-//Microsoft Corporation//Outlook 16.0 MIMEDIR//EN")
+        self.assertEqual(str(cal.get('METHOD')), "PUBLISH")
+        self.assertEqual(cal.get('X-CALSTART'), self.cal.get('X-CALSTART'))
+        jcal = json.loads(ical_emit.emit_bytes(self.cal, format=ical_emit.FORMAT_JCAL))
+        self.assertIn(["method", {}, "text", "PUBLISH"], jcal[1])
+
+    def test_export_folders_streamed(self):
+        berlin = pytz.timezone("Europe/Berlin")
+        start = berlin.localize(datetime.datetime(2024, 7, 1, 9, 0))
+        folders = {"Team": W32Folder("Team", [make_event("1"), W32Event(id="2", subject="Berlin", start=start,
+                                                                        end=start + datetime.timedelta(hours=1))])}
+        buf = io.BytesIO()
+
+        def resolve(name):
+            if name == "Missing":
+                # The events of the first source are already written
+                self.assertIn(b"UID:2", buf.getvalue())
+                raise KeyError(name)
+            return folders[name]
+
+        reports = ical_emit.export_folders_to([w32a_export.FolderSpec(name="Team"), w32a_export.FolderSpec(name="Missing")],
+                                              buf, folder_resolver=resolve)
+        self.assertEqual([r.events for r in reports], [2, 0])
+        self.assertIsInstance(reports[1].error, KeyError)
+        cal = icalendar.Calendar.from_ical(buf.getvalue())
+        self.assertEqual([c.name for c in cal.subcomponents], ["VEVENT", "VEVENT", "VTIMEZONE", "VTIMEZONE"])
+        self.assertEqual([str(tz.get('TZID')) for tz in cal.walk('VTIMEZONE')], ["Etc/UTC", "Europe/Berlin"])
+
+    def test_export_folders_to(self):
+        folders = {"Team": W32Folder("Team", [make_event("1"), make_event("2", day=14)])}
+        buf = io.BytesIO()
+        reports = ical_emit.export_folders_to([w32a_export.FolderSpec(name="Team")], buf, format=ical_emit.FORMAT_JCAL,
+                                              folder_resolver=folders.get)
+        self.assertEqual(reports[0].events, 2)
+        jcal = json.loads(buf.getvalue())
+        # Two events and the VTIMEZONE of their Etc/UTC TZID
+        self.assertEqual([c[0] for c in jcal[2]], ["vevent", "vevent", "vtimezone"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+import datetime
+import logging
+import pytz
+import w32a_cal
+from w32a_cal import RecurrenceType, RecurrenceState, DayOfWeekMaskEnum
+from w32obj import W32Event, W32RecurrencePattern, W32Exception, LatencyProxy
+
+class ExceptionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.start_dt = datetime.datetime(year=2024, month=1, day=2, hour=12, minute=30, tzinfo=pytz.utc)
+
+    def make_series(self, exceptions: list[W32Exception]) -> W32Event:
+        pattern = W32RecurrencePattern(RecurrenceType.WEEKLY, 1, occurrences=20, day_of_week_mask=DayOfWeekMaskEnum.TUESDAY,
+                                       exceptions=exceptions)
+        return W32Event(id="series", subject="Series", start=self.start_dt, end=self.start_dt + datetime.timedelta(hours=1),
+                        recurring=True, recurrence_state=RecurrenceState.MASTER, recurrence_pattern=pattern)
+
+    def test_deleted_exdate(self):
+        moved = self.start_dt + datetime.timedelta(weeks=3, hours=2)
+        exceptions = [
+            W32Exception(self.start_dt + datetime.timedelta(weeks=1), deleted=True),
+            W32Exception(self.start_dt + datetime.timedelta(weeks=2), deleted=True),
+            W32Exception(self.start_dt + datetime.timedelta(weeks=3),
+                         event=W32Event(id="series", subject="Moved", start=moved, end=moved + datetime.timedelta(hours=1))),
+        ]
+        events = w32a_cal.win32_event_to_ical(self.make_series(exceptions))
+        self.assertEqual(len(events), 2)
+        # All deleted occurrences in one EXDATE property
+        exdate = events[0].get('EXDATE')
+        self.assertEqual([d.dt for d in exdate.dts], [self.start_dt + datetime.timedelta(weeks=1),
+                                                      self.start_dt + datetime.timedelta(weeks=2)])
+        self.assertEqual(events[1].get('RECURRENCE-ID').dt, self.start_dt + datetime.timedelta(weeks=3))
+        self.assertEqual(events[0].get('SEQUENCE'), 4)
+
+    def test_uid_of_master(self):
+        moved = self.start_dt + datetime.timedelta(weeks=1, hours=2)
+        exceptions = [W32Exception(self.start_dt + datetime.timedelta(weeks=1),
+                                   event=W32Event(id="other", subject="Moved", start=moved, end=moved + datetime.timedelta(hours=1)))]
+        with self.assertNoLogs(level=logging.WARNING):
+            events = w32a_cal.win32_event_to_ical(self.make_series(exceptions))
+        self.assertEqual([str(e.get('UID')) for e in events], ["series", "series"])
+
+    def test_index(self):
+        exceptions = [W32Exception(self.start_dt + datetime.timedelta(weeks=w), deleted=True) for w in (5, 1, 3)]
+        index = w32a_cal.index_win32_exceptions(self.make_series(exceptions).GetRecurrencePattern())
+        self.assertEqual(list(index.keys()), [(self.start_dt + datetime.timedelta(weeks=w)).replace(tzinfo=None) for w in (5, 1, 3)])
+        self.assertIs(index[(self.start_dt + datetime.timedelta(weeks=3)).replace(tzinfo=None)], exceptions[2])
+
+    def test_same_day_exceptions(self):
+        # Two exceptions of one day are kept apart by their original time
+        morning = self.start_dt + datetime.timedelta(weeks=1)
+        evening = morning + datetime.timedelta(hours=6)
+        exceptions = [W32Exception(morning, deleted=True), W32Exception(evening, deleted=True)]
+        series = self.make_series(exceptions)
+        self.assertEqual(len(w32a_cal.index_win32_exceptions(series.GetRecurrencePattern())), 2)
+        events = w32a_cal.win32_event_to_ical(series)
+        self.assertEqual([d.dt for d in events[0].get('EXDATE').dts], [morning, evening])
+
+    def make_moved_series(self, subjects: list[str]) -> W32Event:
+        # Berlin series with a body and attendees, occurrence w moved by one hour and renamed to subjects[w]
+        tz = pytz.timezone("Europe/Berlin")
+        start = tz.localize(datetime.datetime(2024, 1, 2, 12, 30))
+        created = datetime.datetime(2023, 12, 1, 9, 0, tzinfo=pytz.utc)
+        details = dict(creation_time=created, body="Agenda", location="Room 1", organizer="a@example.com",
+                       req_attendees=["b@example.com"], busy_status=w32a_cal.BusyStatus.BUSY)
+        exceptions = []
+        for w, subject in enumerate(subjects, 1):
+            moved = tz.localize(datetime.datetime(2024, 1, 2, 13, 30) + datetime.timedelta(weeks=w))
+            exceptions.append(W32Exception(start + datetime.timedelta(weeks=w),
+                                           event=W32Event(id="ex%d" % w, subject=subject, start=moved, duration=30,
+                                                          end=moved + datetime.timedelta(minutes=30), **details)))
+        pattern = W32RecurrencePattern(RecurrenceType.WEEKLY, 1, occurrences=20, day_of_week_mask=DayOfWeekMaskEnum.TUESDAY,
+                                       exceptions=exceptions)
+        return W32Event(id="series", subject="Series", start=start, duration=60, end=start + datetime.timedelta(hours=1),
+                        recurring=True, recurrence_state=RecurrenceState.MASTER, recurrence_pattern=pattern, **details)
+
+    def test_exception_delta(self):
+        series = self.make_moved_series(["Series"] * 6 + ["Renamed"])
+        expected = [e.to_ical() for e in w32a_cal.win32_event_to_ical(series)]
+        delta = w32a_cal.ExceptionDelta()
+        self.assertEqual([e.to_ical() for e in w32a_cal.win32_event_to_ical(series, exception_delta=delta)], expected)
+
+        # An exception whose subject is not compared keeps the master's
+        delta = w32a_cal.ExceptionDelta(properties=())
+        events = w32a_cal.win32_event_to_ical(series, exception_delta=delta)
+        self.assertEqual([str(e['SUMMARY']) for e in events], ["Series"] * 8)
+        self.assertEqual(events[7]['DURATION'].dt, datetime.timedelta(minutes=30))
+
+        # compare forces the full conversion
+        delta = w32a_cal.ExceptionDelta(properties=(), compare=lambda master, ex: ex.Location != master.Location)
+        series.GetRecurrencePattern().Exceptions[0].AppointmentItem.Location = "Room 2"
+        events = w32a_cal.win32_event_to_ical(series, exception_delta=delta)
+        self.assertEqual([str(e['LOCATION']) for e in events[:3]], ["Room 1", "Room 2", "Room 1"])
+
+    def test_exception_delta_reads(self):
+        series = self.make_moved_series(["Series"] * 10)
+        full, delta = {}, {}
+        w32a_cal.win32_event_to_ical(LatencyProxy(series, 0, full))
+        w32a_cal.win32_event_to_ical(LatencyProxy(series, 0, delta), exception_delta=w32a_cal.ExceptionDelta())
+        # Per exception: Start, End, LastModificationTime and Subject instead of every property
+        self.assertLess(delta["W32Event"], full["W32Event"] / 2)
+
+    def test_dates_to_datetimes(self):
+        self.assertEqual(w32a_cal.win32_dates_to_datetimes(["02/13/2024 12:30", "13/02/2024", "02/13/2024 12:30"]),
+                         [datetime.datetime(2024, 2, 13, 12, 30), datetime.datetime(2024, 2, 13), datetime.datetime(2024, 2, 13, 12, 30)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+import datetime
+import icalendar
+import pytz
+import w32a_cal
+import w32a_export
+from w32obj import W32Event, W32Folder
+
+
+def make_event(event_id: str, day: int = 13, subject: str = "Test") -> W32Event:
+    start_dt = datetime.datetime(year=2024, month=2, day=day, hour=12, minute=30, tzinfo=pytz.utc)
+    return W32Event(id=event_id, subject=subject, start=start_dt, end=start_dt + datetime.timedelta(hours=1),
+                    busy_status=w32a_cal.BusyStatus.BUSY)
+
+
+def make_berlin_event(event_id: str) -> W32Event:
+    start = pytz.timezone("Europe/Berlin").localize(datetime.datetime(2024, 7, 1, 9, 0))
+    return W32Event(id=event_id, subject="Summer", start=start, end=start + datetime.timedelta(hours=1))
+
+
+def calendar_tzids(cal: icalendar.Calendar) -> tuple[set, set]:
+    # TZIDs referenced by the events and TZIDs of the VTIMEZONEs
+    referenced = set()
+    for event in cal.walk('VEVENT'):
+        for name in ('DTSTART', 'DTEND', 'RECURRENCE-ID'):
+            prop = event.get(name)
+            if prop is not None and 'TZID' in prop.params:
+                referenced.add(str(prop.params['TZID']))
+    return referenced, set(str(tz.get('TZID')) for tz in cal.walk('VTIMEZONE'))
+
+
+class ExportFoldersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folders = {
+            "Team": W32Folder("Team", [make_event("1"), make_event("2", day=14)]),
+            "Rooms": W32Folder("Rooms", [make_event("2", day=14), make_event("3", day=20)]),
+        }
+
+    def resolve(self, name):
+        return self.folders[name]
+
+    def test_merge_and_dedupe(self):
+        specs = [w32a_export.FolderSpec(name="Team"), w32a_export.FolderSpec(name="Rooms")]
+        cal, reports = w32a_export.export_folders(specs, max_workers=2, folder_resolver=self.resolve)
+
+        uids = sorted(str(e.get('UID')) for e in cal.walk('VEVENT'))
+        self.assertEqual(uids, ["1", "2", "3"])
+        self.assertEqual([r.label for r in reports], ["Team", "Rooms"])
+        self.assertEqual([r.items for r in reports], [2, 2])
+        self.assertEqual([r.events for r in reports], [2, 1])
+        self.assertEqual([r.duplicates for r in reports], [0, 1])
+
+    def test_per_source_filter_and_window(self):
+        specs = [
+            w32a_export.FolderSpec(name="Team", filter=w32a_cal.ICAL_FILTER_SAFE),
+            w32a_export.FolderSpec(folder=self.folders["Rooms"],
+                                   start=datetime.datetime(2024, 2, 15), end=datetime.datetime(2024, 2, 28)),
+        ]
+        cal, reports = w32a_export.export_folders(specs, folder_resolver=self.resolve)
+        events = {str(e.get('UID')): e for e in cal.walk('VEVENT')}
+        self.assertEqual(sorted(events), ["1", "2", "3"])
+        self.assertEqual(events["1"].get('SUMMARY'), "Event")
+        self.assertEqual(events["3"].get('SUMMARY'), "Test")
+        self.assertEqual(reports[1].items, 1)
+
+    def test_source_error(self):
+        specs = [w32a_export.FolderSpec(name="Team"), w32a_export.FolderSpec(name="Missing")]
+        cal, reports = w32a_export.export_folders(specs, folder_resolver=self.resolve)
+        self.assertEqual(len(cal.walk('VEVENT')), 2)
+        self.assertIsNone(reports[0].error)
+        self.assertIsInstance(reports[1].error, KeyError)
+
+    def test_timezones(self):
+        folder = W32Folder("Berlin", [make_event("1"), make_berlin_event("berlin")])
+        cal, _reports = w32a_export.export_folders([w32a_export.FolderSpec(folder=folder)])
+        timezones = cal.walk('VTIMEZONE')
+        # The UTC events are written with TZID=Etc/UTC, which needs a VTIMEZONE as well
+        self.assertEqual([str(tz['TZID']) for tz in timezones], ["Etc/UTC", "Europe/Berlin"])
+        self.assertIs(cal.subcomponents[0], timezones[0])
+        referenced, defined = calendar_tzids(cal)
+        self.assertEqual(defined, referenced)
+        self.assertEqual(timezones[0].walk('DAYLIGHT'), [])
+        daylight = timezones[1].walk('DAYLIGHT')[0]
+        self.assertEqual(daylight['DTSTART'].dt, datetime.datetime(2024, 3, 31, 2, 0))
+        self.assertEqual(daylight['TZOFFSETTO'].td, datetime.timedelta(hours=2))
+
+        parsed = icalendar.Calendar.from_ical(cal.to_ical())
+        event = [e for e in parsed.walk('VEVENT') if str(e['UID']) == "berlin"][0]
+        self.assertEqual(event['DTSTART'].dt, pytz.timezone("Europe/Berlin").localize(datetime.datetime(2024, 7, 1, 9, 0)))
+
+    def test_folder_source(self):
+        # Mock folders are not COM objects and are passed to the workers as they are
+        spec = w32a_export.FolderSpec(folder=self.folders["Team"])
+        self.assertEqual(w32a_export._folder_source(spec, self.resolve), (spec, self.resolve))
@@ -0,0 +1,149 @@
+import unittest
+import datetime
+import os
+import icalendar
+import pytz
+import w32a_cal
+import ical_import
+from w32a_cal import RecurrenceType, RecurrenceState, DayOfWeekMaskEnum
+from w32obj import W32Event, W32RecurrencePattern, W32Exception
+
+SAMPLE_ICS = os.path.join(os.path.dirname(__file__), "..", "samples", "test.ics")
+
+class RecordingItem:
+    # AppointmentItem stand-in that records the order of the property writes
+
+    def __init__(self):
+        object.__setattr__(self, "writes", [])
+
+    def __setattr__(self, name, value):
+        self.writes.append(name)
+        object.__setattr__(self, name, value)
+
+    def GetRecurrencePattern(self):
+        return None
+
+    def Save(self):
+        pass
+
+
+class RecordingFolder:
+
+    def __init__(self, time_zones):
+        self.added = []
+        self.Items = self
+        self.Application = type("Application", (), {"TimeZones": time_zones})()
+
+    def Add(self, item_type):
+        self.added.append(RecordingItem())
+        return self.added[-1]
+
+
+class TimeZones:
+
+    def Item(self, tz_id):
+        if tz_id not in ("W. Europe Standard Time", "UTC"):
+            raise KeyError(tz_id)
+        return "TimeZone(%s)" % tz_id
+
+
+class ImportTest(unittest.TestCase):
+
+    def to_lines(self, events: list[icalendar.Event]) -> list[str]:
+        cal = icalendar.Calendar()
+        for event in events:
+            cal.add_component(event)
+        return cal.to_ical().decode("utf-8").splitlines(True)
+
+    def test_sample(self):
+        context = ical_import.ImportContext()
+        with open(SAMPLE_ICS, "r") as f:
+            batches = list(ical_import.ical_to_w32_batches(f, batch_size=4, context=context))
+        self.assertEqual([len(b) for b in batches], [4, 4, 2])
+        self.assertEqual(context.events, 10)
+        self.assertEqual(context.batches, 3)
+        self.assertEqual(context.errors, 0)
+
+        patterns = {e.Subject: e.GetRecurrencePattern() for batch in batches for e in batch}
+        monthly_nth = [p for p in patterns.values() if p is not None and p.RecurrenceType == RecurrenceType.MONTHLY_NTH]
+        self.assertEqual(len(monthly_nth), 1)
+        self.assertEqual(monthly_nth[0].DayOfWeekMask, DayOfWeekMaskEnum.SUNDAY)
+        self.assertEqual(monthly_nth[0].Instance, 4)
+        self.assertEqual(monthly_nth[0].Occurrences, 2)
+
+    def test_round_trip(self):
+        start_dt = datetime.datetime(year=2024, month=2, day=13, hour=12, minute=30, tzinfo=pytz.utc)
+        moved = start_dt + datetime.timedelta(weeks=2, hours=1)
+        exceptions = [W32Exception(start_dt + datetime.timedelta(weeks=2), event=W32Event(
+            id="series", subject="Moved", start=moved, end=moved + datetime.timedelta(hours=1)))]
+        pattern = W32RecurrencePattern(RecurrenceType.WEEKLY, 2, occurrences=10,
+                                       day_of_week_mask=DayOfWeekMaskEnum.TUESDAY, exceptions=exceptions)
+        series = W32Event(id="series", subject="Series", start=start_dt, end=start_dt + datetime.timedelta(hours=1),
+                          location="Room", req_attendees=["a@example.com"], recurring=True,
+                          recurrence_state=RecurrenceState.MASTER, recurrence_pattern=pattern)
+        single = W32Event(id="single", subject="Single", start=start_dt, end=start_dt + datetime.timedelta(hours=1))
+
+        # Exception first: it has to wait for its master
+        ical_events = w32a_cal.win32_event_to_ical(series)
+        lines = self.to_lines(ical_events[1:] + w32a_cal.win32_event_to_ical(single) + ical_events[:1])
+
+        saved = []
+        context = ical_import.import_ical(lines, saved.append)
+        events = [e for batch in saved for e in batch]
+        self.assertEqual([e.Subject for e in events], ["Single", "Series"])
+        self.assertEqual(context.masters, 1)
+        self.assertEqual(context.exceptions, 1)
+
+        imported = events[1]
+        self.assertEqual(imported.Start, series.Start)
+        self.assertEqual(imported.Location, "Room")
+        self.assertEqual(imported.RequiredAttendees, "a@example.com")
+        imported_pattern = imported.GetRecurrencePattern()
+        self.assertEqual(imported_pattern.RecurrenceType, RecurrenceType.WEEKLY)
+        self.assertEqual(imported_pattern.Interval, 2)
+        self.assertEqual(imported_pattern.Occurrences, 10)
+        self.assertEqual(imported_pattern.DayOfWeekMask, DayOfWeekMaskEnum.TUESDAY)
+        self.assertEqual(len(imported_pattern.Exceptions), 1)
+        self.assertEqual(imported_pattern.Exceptions[0].OriginalDate, exceptions[0].OriginalDate)
+        self.assertEqual(imported_pattern.Exceptions[0].AppointmentItem.Subject, "Moved")
+
+        # The imported objects convert back to the same events
+        self.assertEqual([e.to_ical() for e in w32a_cal.win32_event_to_ical(imported)],
+                         [e.to_ical() for e in ical_events])
+
+    def test_bounded_pending(self):
+        start_dt = datetime.datetime(year=2024, month=2, day=13, hour=12, minute=30, tzinfo=pytz.utc)
+        ical_events = []
+        for i in range(5):
+            pattern = W32RecurrencePattern(RecurrenceType.DAILY, 1, no_end=True, exceptions=[])
+            ical_events += w32a_cal.win32_event_to_ical(W32Event(
+                id="series-%d" % i, subject="Series", start=start_dt, end=start_dt + datetime.timedelta(hours=1),
+                recurring=True, recurrence_state=RecurrenceState.MASTER, recurrence_pattern=pattern))
+
+        batches = list(ical_import.ical_to_w32_batches(self.to_lines(ical_events), batch_size=1, max_pending=2))
+        # Masters beyond max_pending are flushed while the feed is still being read
+        self.assertEqual([b[0].EntryID for b in batches], ["series-%d" % i for i in range(5)])
+        self.assertTrue(all(b[0].GetRecurrencePattern().NoEndDate for b in batches))
+
+    def test_outlook_saver_timezones(self):
+        event = icalendar.Event()
+        event.add('UID', "berlin")
+        event.add('SUMMARY', "Berlin")
+        event.add('DTSTART', datetime.datetime(2024, 7, 1, 9, 0), parameters={'TZID': "Europe/Berlin"})
+        event.add('DTEND', datetime.datetime(2024, 7, 1, 10, 0), parameters={'TZID': "Europe/Berlin"})
+        folder = RecordingFolder(TimeZones())
+        ical_import.import_ical(self.to_lines([event]), ical_import.make_outlook_saver(folder))
+        item = folder.added[0]
+        self.assertEqual(item.StartTimeZone, "TimeZone(W. Europe Standard Time)")
+        self.assertEqual(item.EndTimeZone, "TimeZone(W. Europe Standard Time)")
+        # Start and End are interpreted in the time zones set before them
+        self.assertLess(item.writes.index("EndTimeZone"), item.writes.index("Start"))
+        self.assertEqual(item.Start, "07/01/2024 09:00")
+
+        # Without a TimeZones collection the times are set alone
+        folder = RecordingFolder(None)
+        ical_import.import_ical(self.to_lines([event]), ical_import.make_outlook_saver(folder))
+        self.assertNotIn("StartTimeZone", folder.added[0].writes)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import unittest
+import datetime
+import os
+import random
+import icalendar
+import ical_diff
+import ical_expand
+import ical_index
+import w32a_cal
+from ical_expand import UTC
+from w32obj import W32Event, W32RecurrencePattern
+
+SAMPLE_ICS = os.path.join(os.path.dirname(__file__), "..", "samples", "test.ics")
+
+WORDS = ["Planning", "Review", "Boardroom", "Lunch", "Standup", "Budget", "Room", "Offsite"]
+
+
+def make_ical_event(uid, start, minutes, summary="", location="", recurrence_id=None):
+    event = icalendar.Event()
+    event.add('UID', uid)
+    event.add('DTSTART', start)
+    event.add('DTEND', start + datetime.timedelta(minutes=minutes))
+    event.add('SUMMARY', summary)
+    event.add('LOCATION', location)
+    if recurrence_id is not None:
+        event.add('RECURRENCE-ID', recurrence_id)
+    return event
+
+
+class CalendarIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        with open(SAMPLE_ICS, "rb") as f:
+            self.cal = icalendar.Calendar.from_ical(f.read())
+
+    def test_uid_lookup(self):
+        index = ical_index.CalendarIndex(self.cal)
+        events = self.cal.walk('VEVENT')
+        self.assertEqual(len(index), len(events))
+        for event in events:
+            key = ical_diff.event_key(event)
+            self.assertIn(key, index)
+            self.assertIs(index.get(*key), event)
+        series = [e for e in events if e.get('RRULE') is not None]
+        self.assertTrue(series)
+        for event in series:
+            self.assertIs(index.master(str(event['UID'])), event)
+            self.assertEqual(index.exceptions(str(event['UID'])), [])
+
+    def test_series_span(self):
+        start = datetime.datetime(2024, 3, 4, 9, 0, tzinfo=UTC)
+        pattern = W32RecurrencePattern(w32a_cal.RecurrenceType.WEEKLY, 1, occurrences=4,
+                                       day_of_week_mask=w32a_cal.DayOfWeekMaskEnum.MONDAY)
+        series = W32Event(id="weekly", subject="Weekly sync", start=start, end=start + datetime.timedelta(hours=1),
+                          recurring=True, recurrence_state=w32a_cal.RecurrenceState.MASTER, recurrence_pattern=pattern)
+        index = ical_index.CalendarIndex(w32a_cal.win32_event_to_ical(series))
+        self.assertEqual(len(index.between(start + datetime.timedelta(weeks=2), start + datetime.timedelta(weeks=3))), 1)
+        self.assertEqual(index.between(start + datetime.timedelta(weeks=10), start + datetime.timedelta(weeks=11)), [])
+        self.assertEqual(index.between(start - datetime.timedelta(days=2), start), [])
+
+    def test_series_brute_force(self):
+        rnd = random.Random(7)
+        base = datetime.datetime(2024, 1, 1, 9, 0, tzinfo=UTC)
+        index = ical_index.CalendarIndex()
+        spans = {}
+        for i in range(200):
+            start = base + datetime.timedelta(days=rnd.randrange(365))
+            event = make_ical_event(str(i), start, 60)
+            event.add('RRULE', {'FREQ': 'DAILY', 'COUNT': rnd.randint(1, 30)})
+            index.add(event)
+            spans[str(i)] = (start, ical_expand.series_end(event, start, datetime.timedelta(hours=1), UTC))
+        for uid in list(spans)[::4]:
+            self.assertTrue(index.remove((uid, None)))
+            del spans[uid]
+
+        for _ in range(50):
+            start = base + datetime.timedelta(days=rnd.randrange(400))
+            end = start + datetime.timedelta(days=rnd.randint(1, 10))
+            expected = set(uid for uid, (s, e) in spans.items() if s < end and e > start)
+            self.assertEqual(set(str(e['UID']) for e in index.between(start, end)), expected)
+
+    def test_incremental(self):
+        start = datetime.datetime(2024, 3, 4, 9, 0, tzinfo=UTC)
+        index = ical_index.CalendarIndex()
+        index.add(make_ical_event("a", start, 60, "Budget review", "Boardroom"))
+        index.add(make_ical_event("b", start, 30, "Lunch"))
+        index.add(make_ical_event("a", start + datetime.timedelta(days=7), 60, "Budget review moved",
+                                  recurrence_id=start + datetime.timedelta(days=7)))
+        self.assertEqual(len(index.exceptions("a")), 1)
+        self.assertEqual([str(e['UID']) for e in index.search("budget")], ["a", "a"])
+        self.assertEqual([str(e['SUMMARY']) for e in index.search("room", substring=True)], ["Budget review"])
+        self.assertEqual(index.search("room"), [])
+        self.assertEqual(index.search("moved budget", fields=["summary"])[0]['SUMMARY'], "Budget review moved")
+
+        # Replaced event: the old words are gone
+        index.add(make_ical_event("b", start + datetime.timedelta(hours=3), 30, "Team lunch"))
+        self.assertEqual(len(index), 3)
+        self.assertEqual([str(e['SUMMARY']) for e in index.search("lunch team")], ["Team lunch"])
+        self.assertEqual(index.between(start + datetime.timedelta(hours=2), start + datetime.timedelta(hours=4))[0]['UID'], "b")
+
+        self.assertEqual(index.remove_uid("a"), 2)
+        self.assertFalse(index.remove(("a", None)))
+        self.assertEqual(index.search("budget"), [])
+        self.assertEqual(index.uids(), ["b"])
+        with self.assertRaises(ValueError):
+            index.search("x", fields=["CATEGORIES"])
+
+    def test_brute_force(self):
+        rnd = random.Random(5)
+        base = datetime.datetime(2024, 1, 1, tzinfo=UTC)
+        events = []
+        index = ical_index.CalendarIndex()
+        for i in range(400):
+            start = base + datetime.timedelta(minutes=30 * rnd.randrange(2000))
+            event = make_ical_event(str(i), start, 30 * rnd.randint(0, 20), " ".join(rnd.sample(WORDS, 2)),
+                                    rnd.choice(WORDS))
+            events.append(event)
+            index.add(event)
+        for event in events[::3]:
+            index.remove(event)
+        events = [e for i, e in enumerate(events) if i % 3]
+
+        for _ in range(50):
+            start = base + datetime.timedelta(minutes=30 * rnd.randrange(2000))
+            end = start + datetime.timedelta(minutes=30 * rnd.randint(1, 50))
+            expected = set(str(e['UID']) for e in events
+                           if e['DTSTART'].dt < end and (e['DTEND'].dt > start
+                                                         or e['DTSTART'].dt == e['DTEND'].dt >= start))
+            self.assertEqual(set(str(e['UID']) for e in index.between(start, end)), expected)
+
+        for word in WORDS:
+            expected = set(str(e['UID']) for e in events
+                           if word.lower() in ical_index.tokenize(str(e['SUMMARY']) + " " + str(e['LOCATION'])))
+            self.assertEqual(set(str(e['UID']) for e in index.search(word)), expected)
+            expected = set(str(e['UID']) for e in events
+                           if word.lower() in (str(e['SUMMARY']) + " " + str(e['LOCATION'])).lower())
+            self.assertEqual(set(str(e['UID']) for e in index.search(word, substring=True)), expected)
+
+if __name__ == '__main__':
+    unittest.main()
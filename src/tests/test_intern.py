@@ -0,0 +1,84 @@
+import unittest
+import datetime
+import pytz
+import w32a_cal
+import w32a_intern
+import w32obj
+from w32obj import W32Event, W32RecurrencePattern
+
+
+class InternTest(unittest.TestCase):
+
+    def make_series(self, event_id: str) -> W32Event:
+        start_dt = datetime.datetime(2024, 2, 13, 9, 0, tzinfo=pytz.utc)
+        pattern = W32RecurrencePattern(w32a_cal.RecurrenceType.WEEKLY, 1, occurrences=10,
+                                       day_of_week_mask=w32a_cal.DayOfWeekMaskEnum.TUESDAY)
+        return W32Event(id=event_id, subject="Stand-up", start=start_dt, end=start_dt + datetime.timedelta(minutes=15),
+                        location="Room " + "1", organizer="Team Lead", categories="Team",
+                        recurring=True, recurrence_state=w32a_cal.RecurrenceState.MASTER, recurrence_pattern=pattern)
+
+    def test_pool(self):
+        pool = w32a_intern.InternPool()
+        a = "".join(["Ro", "om"])
+        b = "".join(["Roo", "m"])
+        self.assertIsNot(a, b)
+        self.assertIs(pool.intern(a), a)
+        self.assertIs(pool.intern(b), a)
+        self.assertIsNone(pool.intern(None))
+        stats = pool.as_dict()
+        self.assertEqual((stats["values"], stats["hits"], stats["misses"]), (1, 1, 1))
+        self.assertGreater(stats["bytes_saved"], 0)
+
+        full = w32a_intern.InternPool(maxsize=0)
+        self.assertIs(full.intern(b), b)
+        self.assertEqual(len(full), 0)
+
+    def test_eviction(self):
+        # The least recently used values are dropped
+        pool = w32a_intern.InternPool(maxsize=2)
+        for value in ("a", "b", "a", "c"):
+            pool.intern(value)
+        self.assertEqual(len(pool), 2)
+        self.assertEqual(pool.as_dict()["hits"], 1)
+        pool.intern("a")
+        self.assertEqual(pool.as_dict()["hits"], 2)
+        pool.intern("b")
+        self.assertEqual(pool.as_dict()["misses"], 4)
+
+    def test_default_pool(self):
+        # Without a pool, icalendar values are not shared between events: they are mutable
+        first = w32a_cal.win32_event_to_ical(self.make_series("1"))[0]
+        second = w32a_cal.win32_event_to_ical(self.make_series("2"))[0]
+        self.assertIsNot(first.get('RRULE'), second.get('RRULE'))
+        self.assertIsNot(first.get('LOCATION'), second.get('LOCATION'))
+        first.get('RRULE')['COUNT'] = [3]
+        self.assertIn(b"COUNT=10", second.get('RRULE').to_ical())
+
+        pool = w32a_intern.get_intern_pool()
+        self.assertFalse(pool.share_objects)
+        self.assertIsNot(pool.ical_value('LOCATION', "Room 1"), pool.ical_value('LOCATION', "Room 1"))
+        self.assertIsNot(w32obj.make_anonymous_event(self.make_series("1")).StartTimeZone,
+                         w32obj.make_anonymous_event(self.make_series("2")).StartTimeZone)
+
+    def test_converter(self):
+        pool = w32a_intern.InternPool()
+        first = w32a_cal.win32_event_to_ical(self.make_series("1"), intern_pool=pool)[0]
+        second = w32a_cal.win32_event_to_ical(self.make_series("2"), intern_pool=pool)[0]
+        for name in ('SUMMARY', 'LOCATION', 'ORGANIZER', 'RRULE'):
+            self.assertIs(first.get(name), second.get(name))
+
+        plain = w32a_cal.win32_event_to_ical(self.make_series("2"), intern_pool=w32a_intern.InternPool(maxsize=0))[0]
+        self.assertIsNot(plain.get('LOCATION'), first.get('LOCATION'))
+        self.assertEqual(plain.to_ical(), second.to_ical())
+
+    def test_snapshot(self):
+        pool = w32a_intern.InternPool()
+        first = w32obj.make_anonymous_event(self.make_series("1"), intern_pool=pool)
+        second = w32obj.make_anonymous_event(self.make_series("2"), intern_pool=pool)
+        self.assertIs(first.Location, second.Location)
+        self.assertIs(first.StartTimeZone, second.StartTimeZone)
+        self.assertEqual(w32a_cal.win32_event_to_ical(second, intern_pool=pool)[0].to_ical(),
+                         w32a_cal.win32_event_to_ical(self.make_series("2"))[0].to_ical())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import datetime
+import json
+import os
+import tempfile
+import tracemalloc
+import pytz
+import w32a_cal
+import w32a_cli
+import w32a_memprof
+import w32a_metrics
+from w32a_cal import RecurrenceType, RecurrenceState, DayOfWeekMaskEnum
+from w32obj import W32Event, W32RecurrencePattern, W32Exception
+
+SAMPLE_ICS = os.path.join(os.path.dirname(__file__), "..", "samples", "test.ics")
+
+
+class MemoryProfileTest(unittest.TestCase):
+
+    def setUp(self):
+        start = datetime.datetime(2024, 1, 2, 12, 30, tzinfo=pytz.utc)
+        self.singles = [W32Event(id="single-%d" % i, subject="Single %d" % i, body="Body %d" % i,
+                                 start=start + datetime.timedelta(days=i), end=start + datetime.timedelta(days=i, hours=1))
+                        for i in range(5)]
+        exceptions = []
+        for w in (1, 2, 3):
+            moved = start + datetime.timedelta(weeks=w, hours=2)
+            exceptions.append(W32Exception(start + datetime.timedelta(weeks=w),
+                                           event=W32Event(id="series", subject="Moved %d" % w, start=moved,
+                                                          end=moved + datetime.timedelta(hours=1))))
+        exceptions.append(W32Exception(start + datetime.timedelta(weeks=4), deleted=True))
+        pattern = W32RecurrencePattern(RecurrenceType.WEEKLY, 1, occurrences=10, day_of_week_mask=DayOfWeekMaskEnum.TUESDAY,
+                                       exceptions=exceptions)
+        self.series = W32Event(id="series", subject="Series", start=start, end=start + datetime.timedelta(hours=1),
+                               recurring=True, recurrence_state=RecurrenceState.MASTER, recurrence_pattern=pattern)
+        # Imports and caches of the first conversion are not part of the profiles
+        for event in self.singles + [self.series]:
+            w32a_cal.win32_event_to_ical(event)
+
+    def tearDown(self):
+        w32a_metrics.set_sink(None)
+
+    def test_event_kinds(self):
+        results = []
+        with w32a_memprof.MemorySink(top=3) as sink:
+            self.assertTrue(tracemalloc.is_tracing())
+            for event in self.singles + [self.series]:
+                results.append(w32a_cal.win32_event_to_ical(event))
+        self.assertIs(w32a_metrics.get_sink(), w32a_metrics.NULL_SINK)
+        self.assertFalse(tracemalloc.is_tracing())
+
+        memory = json.loads(sink.to_json())["memory"]
+        self.assertEqual({kind: usage["count"] for kind, usage in memory["events"].items()},
+                         {w32a_metrics.EVENT_SINGLE: 5, w32a_metrics.EVENT_MASTER: 1, w32a_metrics.EVENT_EXCEPTION: 3})
+        # The converted events are kept, so they are still allocated at the end of each conversion
+        self.assertGreater(memory["events"][w32a_metrics.EVENT_SINGLE]["bytes"], 0)
+        self.assertGreater(memory["events"][w32a_metrics.EVENT_EXCEPTION]["blocks"], 0)
+        self.assertEqual(memory["stages"][w32a_metrics.STAGE_EVENT]["count"], 6)
+        self.assertEqual(memory["stages"][w32a_metrics.STAGE_EXCEPTIONS]["count"], 1)
+        self.assertNotIn(w32a_metrics.STAGE_PARSE_DATE, memory["stages"])
+        # A master does not include its exceptions, the exceptions stage does
+        self.assertGreaterEqual(memory["stages"][w32a_metrics.STAGE_EXCEPTIONS]["allocated"],
+                                memory["events"][w32a_metrics.EVENT_EXCEPTION]["allocated"])
+        self.assertEqual(len(memory["sites"]), 3)
+        self.assertGreaterEqual(memory["sites"][0]["allocated"], memory["sites"][1]["allocated"])
+        self.assertGreater(memory["peak"], 0)
+        self.assertEqual(sink.counters["events"], 9)
+
+    def test_stages(self):
+        with w32a_memprof.MemorySink(stages=[w32a_metrics.STAGE_TZ]) as sink:
+            for event in self.singles:
+                w32a_cal.win32_event_to_ical(event)
+        memory = sink.as_dict()["memory"]
+        self.assertEqual(list(memory["stages"]), [w32a_metrics.STAGE_TZ])
+        self.assertEqual(memory["events"][w32a_metrics.EVENT_SINGLE]["count"], 5)
+
+    def test_cli(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "memory.json")
+            w32a_cli.main(["--mock", SAMPLE_ICS, "-q", "--memory-profile", path, "-o", os.path.join(directory, "out.ics")])
+            with open(path) as f:
+                memory = json.load(f)["memory"]
+        self.assertIn(w32a_metrics.EVENT_SINGLE, memory["events"])
+        self.assertIn(w32a_metrics.STAGE_SERIALIZE, memory["stages"])
+        self.assertIs(w32a_metrics.get_sink(), w32a_metrics.NULL_SINK)
+
+if __name__ == '__main__':
+    unittest.main()
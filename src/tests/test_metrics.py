@@ -0,0 +1,58 @@
+import unittest
+import datetime
+import pytz
+import w32a_cal
+import w32a_metrics
+import w32a_export
+from w32obj import W32Event, W32RecurrencePattern, W32Folder
+
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        start_dt = datetime.datetime(year=2024, month=2, day=13, hour=12, minute=30, tzinfo=pytz.utc)
+        self.events = [
+            W32Event(id="1", subject="Single", start=start_dt, end=start_dt + datetime.timedelta(hours=1)),
+            W32Event(id="2", subject="Daily", start=start_dt, end=start_dt + datetime.timedelta(hours=1),
+                     recurring=True, recurrence_state=w32a_cal.RecurrenceState.MASTER,
+                     recurrence_pattern=W32RecurrencePattern(w32a_cal.RecurrenceType.DAILY, 1, 10)),
+        ]
+
+    def tearDown(self):
+        w32a_metrics.set_sink(None)
+
+    def test_disabled_by_default(self):
+        self.assertIs(w32a_metrics.get_sink(), w32a_metrics.NULL_SINK)
+        self.assertFalse(w32a_metrics.get_sink().enabled)
+        self.assertEqual(len(w32a_cal.win32_event_to_ical(self.events[0])), 1)
+
+    def test_stats(self):
+        sink = w32a_metrics.StatsSink(slowest=1)
+        w32a_metrics.set_sink(sink)
+        cal, reports = w32a_export.export_folders([w32a_export.FolderSpec(folder=W32Folder("Test", self.events))])
+        w32a_export.serialize_calendar(cal)
+
+        stats = sink.as_dict()
+        self.assertEqual(stats["counters"]["items"], 2)
+        self.assertEqual(stats["counters"]["events"], 2)
+        for stage in (w32a_metrics.STAGE_FETCH, w32a_metrics.STAGE_PARSE_DATE, w32a_metrics.STAGE_TZ,
+                      w32a_metrics.STAGE_RECURRENCE, w32a_metrics.STAGE_EXCEPTIONS,
+                      w32a_metrics.STAGE_SERIALIZE, w32a_metrics.STAGE_EVENT):
+            self.assertIn(stage, stats["stages"])
+        self.assertEqual(stats["stages"][w32a_metrics.STAGE_EVENT]["count"], 2)
+        self.assertEqual(len(stats["slowest_events"]), 1)
+
+        text = sink.to_prometheus()
+        self.assertIn("# TYPE w32ical_items_total counter\nw32ical_items_total 2\n", text)
+        self.assertIn('w32ical_stage_seconds_bucket{stage="event",le="+Inf"} 2\n', text)
+        self.assertIn('w32ical_stage_seconds_count{stage="event"} 2\n', text)
+
+    def test_profiling(self):
+        sink = w32a_metrics.ProfilingSink(slowest=2, profile_lines=5)
+        w32a_metrics.set_sink(sink)
+        for event in self.events:
+            w32a_cal.win32_event_to_ical(event)
+        slowest = sink.slowest_events()
+        self.assertEqual(sorted(e["event_id"] for e in slowest), ["1", "2"])
+        self.assertGreaterEqual(slowest[0]["seconds"], slowest[1]["seconds"])
+        self.assertIn("function calls", slowest[0]["profile"])
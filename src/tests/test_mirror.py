@@ -0,0 +1,117 @@
+import unittest
+import os
+import threading
+import ical_import
+import w32a_mirror
+import w32obj
+from w32obj import W32Folder
+from tests.test_export import make_event, make_berlin_event, calendar_tzids
+
+SAMPLE_ICS = os.path.join(os.path.dirname(__file__), "..", "samples", "test.ics")
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class MirrorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = W32Folder("Calendar", [make_event("1"), make_event("2", day=14)])
+        self.clock = FakeClock()
+        self.mirror = w32a_mirror.CalendarMirror(self.folder, coalesce_seconds=1.0, with_events=w32obj.WithEvents,
+                                                 clock=self.clock)
+        self.mirror.load()
+        self.mirror.subscribe()
+
+    def uids(self):
+        return sorted(str(e.get('UID')) for e in self.mirror.events())
+
+    def test_add_and_coalesce(self):
+        self.assertEqual(self.mirror.version, 1)
+        self.assertEqual(self.mirror.conversions, 2)
+
+        item = self.folder.Items.Add(make_event("3", day=20))
+        for subject in ("a", "b", "c"):
+            item.Subject = subject
+            self.folder.Items.Change(item)
+        self.assertFalse(self.mirror.flush())
+        self.assertEqual(self.uids(), ["1", "2"])
+
+        self.clock.now += 1.5
+        self.assertTrue(self.mirror.flush())
+        self.assertEqual(self.mirror.version, 2)
+        # Four notifications, one conversion
+        self.assertEqual(self.mirror.conversions, 3)
+        self.assertEqual(self.uids(), ["1", "2", "3"])
+        self.assertEqual([str(e.get('SUMMARY')) for e in self.mirror.events() if str(e.get('UID')) == "3"], ["c"])
+        self.assertFalse(self.mirror.flush())
+
+    def test_remove(self):
+        self.folder.Items.Remove(1)
+        self.assertTrue(self.mirror.flush(force=True))
+        self.assertEqual(self.uids(), ["2"])
+        self.assertEqual(self.mirror.conversions, 2)
+        self.assertEqual(len(self.mirror.calendar().walk('VEVENT')), 1)
+
+    def test_timezones(self):
+        self.folder.Items.Add(make_berlin_event("berlin"))
+        self.assertTrue(self.mirror.flush(force=True))
+        referenced, defined = calendar_tzids(self.mirror.calendar())
+        self.assertEqual(referenced, {"Etc/UTC", "Europe/Berlin"})
+        self.assertEqual(defined, referenced)
+
+    def sample_items(self):
+        with open(SAMPLE_ICS, "r") as f:
+            return [event for batch in ical_import.ical_to_w32_batches(f) for event in batch]
+
+    def test_conversion_errors(self):
+        # The MONTHLY_NTH series of the sample cannot be converted, the other items are mirrored
+        items = self.sample_items()
+        mirror = w32a_mirror.CalendarMirror(W32Folder("Sample", items), with_events=w32obj.WithEvents)
+        with self.assertLogs(level="ERROR"):
+            mirror.load()
+        self.assertEqual(mirror.errors, 1)
+        self.assertEqual(len(set(str(e.get('UID')) for e in mirror.events())), len(items) - 1)
+
+        # A failing change keeps the previous events of the item and does not lose the other changes
+        broken = [item for item in items if item.Subject == "EventRecurringMonthlyNthNumOccurences"][0]
+        broken.EntryID = "1"
+        self.mirror.notify_change(broken)
+        self.folder.Items.Add(make_event("3", day=20))
+        with self.assertLogs(level="ERROR"):
+            self.assertTrue(self.mirror.flush(force=True))
+        self.assertEqual(self.mirror.errors, 1)
+        self.assertEqual(self.uids(), ["1", "2", "3"])
+        self.assertEqual([str(e.get('SUMMARY')) for e in self.mirror.events() if str(e.get('UID')) == "1"], ["Test"])
+
+        # A later load keeps them as well
+        self.folder.Items.Remove(1)
+        self.folder.Items.Add(broken)
+        with self.assertLogs(level="ERROR"):
+            self.mirror.load()
+        self.assertEqual(self.uids(), ["1", "2", "3"])
+
+    def test_run(self):
+        mirror = w32a_mirror.CalendarMirror(self.folder, coalesce_seconds=0.01, with_events=w32obj.WithEvents)
+        mirror.load()
+        mirror.subscribe()
+        stop = threading.Event()
+        thread = threading.Thread(target=mirror.run, args=(stop,), kwargs={"poll_interval": 0.01, "pump": lambda: None})
+        thread.start()
+        try:
+            version = mirror.version
+            self.folder.Items.Add(make_event("4", day=21))
+            self.assertGreater(mirror.wait_for_version(version, timeout=5), version)
+            self.assertIn("4", [str(e.get('UID')) for e in mirror.events()])
+        finally:
+            stop.set()
+            thread.join()
+
+if __name__ == '__main__':
+    unittest.main()
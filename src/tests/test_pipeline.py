@@ -0,0 +1,127 @@
+import unittest
+import datetime
+import time
+import pytz
+import w32a_cal
+import w32a_export
+import w32a_pipeline
+from w32obj import W32Event, W32Exception, W32Folder, W32RecurrencePattern, LatencyProxy
+from tests.test_export import make_event
+
+
+class BrokenEvent(W32Event):
+
+    @property
+    def Subject(self):
+        raise RuntimeError("item is gone")
+
+    @Subject.setter
+    def Subject(self, value):
+        pass
+
+
+class PipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.events = [make_event(str(i), day=1 + i % 28, subject="Event %d" % i) for i in range(20)]
+
+    def expected(self, events):
+        return [e.to_ical() for item in events for e in w32a_cal.win32_event_to_ical(item)]
+
+    def test_order(self):
+        items = [LatencyProxy(e, 0.0001) for e in self.events]
+        events, failed, report = w32a_pipeline.convert_items_pipelined(items, max_workers=4, queue_size=2)
+        self.assertEqual([e.to_ical() for e in events], self.expected(self.events))
+        self.assertEqual(failed, [])
+        self.assertEqual(report.items, 20)
+        self.assertEqual(report.events, 20)
+
+    def test_serialize(self):
+        results = list(w32a_pipeline.iter_pipeline(lambda: iter(self.events[:3]), max_workers=2, serialize=True))
+        self.assertEqual([r.index for r in results], [0, 1, 2])
+        self.assertEqual(b"".join(r.data for r in results), b"".join(self.expected(self.events[:3])))
+
+    def test_error_isolation(self):
+        start_dt = datetime.datetime(2024, 2, 13, 12, 30, tzinfo=pytz.utc)
+        items = self.events[:2] + [BrokenEvent(id="broken", subject="", start=start_dt, duration=30)] + self.events[2:4]
+
+        def convert(snapshot, **kwargs):
+            if snapshot.EntryID == "3":
+                raise ValueError("cannot convert")
+            return w32a_pipeline.convert_snapshot(snapshot, **kwargs)
+
+        results = list(w32a_pipeline.iter_pipeline(items, max_workers=2, convert=convert))
+        self.assertEqual([r.entry_id for r in results], ["0", "1", "broken", "2", "3"])
+        self.assertIsInstance(results[2].error, RuntimeError)
+        self.assertIsInstance(results[4].error, ValueError)
+        self.assertEqual([len(r.events) for r in results], [1, 1, 0, 1, 0])
+
+    def test_filtered_fetch_time(self):
+        # Items skipped by item_filter are counted in fetch_seconds once, also after the last converted item
+        def item_filter(item):
+            if item.EntryID != "0":
+                time.sleep(0.01)
+                return False
+            return True
+
+        report = w32a_pipeline.PipelineReport()
+        results = list(w32a_pipeline.iter_pipeline(self.events[:6], max_workers=2, item_filter=item_filter, report=report))
+        self.assertEqual([r.entry_id for r in results], ["0"])
+        self.assertGreaterEqual(report.fetch_seconds, 0.05)
+        self.assertLess(report.fetch_seconds, report.seconds + 0.05)
+
+    def test_source_error(self):
+        def source():
+            yield self.events[0]
+            raise KeyError("folder")
+
+        with self.assertRaises(KeyError):
+            list(w32a_pipeline.iter_pipeline(source, max_workers=2))
+
+    def test_overlap(self):
+        # Fetching sleeps per attribute read, converting sleeps per item: the pipeline overlaps both
+        items = [LatencyProxy(e, 0.0002) for e in self.events]
+
+        def convert(snapshot, **kwargs):
+            time.sleep(0.01)
+            return w32a_pipeline.convert_snapshot(snapshot, **kwargs)
+
+        t0 = time.perf_counter()
+        expected = [convert(w32a_pipeline.snapshot_item(item))[0] for item in items]
+        sequential = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        events, failed, report = w32a_pipeline.convert_items_pipelined(items, max_workers=4, convert=convert)
+        pipelined = time.perf_counter() - t0
+        self.assertEqual([e.to_ical() for e in events], [e.to_ical() for es in expected for e in es])
+        self.assertLess(pipelined, sequential * 0.75)
+
+    def test_export_folders(self):
+        folders = {"Team": W32Folder("Team", self.events)}
+        specs = [w32a_export.FolderSpec(name="Team")]
+        cal, reports = w32a_export.export_folders(specs, folder_resolver=folders.get)
+        pipelined_cal, pipelined_reports = w32a_export.export_folders(specs, folder_resolver=folders.get, pipeline_workers=2)
+        self.assertEqual(pipelined_cal.to_ical(), cal.to_ical())
+        self.assertEqual(pipelined_reports[0].items, 20)
+        self.assertEqual(pipelined_reports[0].failed, 0)
+
+    def test_export_exception_delta(self):
+        start = datetime.datetime(2024, 1, 2, 12, 30, tzinfo=pytz.utc)
+        moved = start + datetime.timedelta(weeks=1, hours=1)
+        pattern = W32RecurrencePattern(w32a_cal.RecurrenceType.WEEKLY, 1, occurrences=4,
+                                       day_of_week_mask=w32a_cal.DayOfWeekMaskEnum.TUESDAY,
+                                       exceptions=[W32Exception(start + datetime.timedelta(weeks=1),
+                                                                event=W32Event(id="ex", subject="Renamed", start=moved,
+                                                                               end=moved + datetime.timedelta(hours=1)))])
+        series = W32Event(id="series", subject="Series", start=start, end=start + datetime.timedelta(hours=1),
+                          recurring=True, recurrence_state=w32a_cal.RecurrenceState.MASTER, recurrence_pattern=pattern)
+        folders = {"Team": W32Folder("Team", [series])}
+        # The subject is not compared, the exception keeps the master's
+        specs = [w32a_export.FolderSpec(name="Team", exception_delta=w32a_cal.ExceptionDelta(properties=()))]
+        cal, _reports = w32a_export.export_folders(specs, folder_resolver=folders.get)
+        pipelined_cal, _reports = w32a_export.export_folders(specs, folder_resolver=folders.get, pipeline_workers=2)
+        self.assertEqual([str(e['SUMMARY']) for e in pipelined_cal.walk('VEVENT')], ["Series", "Series"])
+        self.assertEqual(pipelined_cal.to_ical(), cal.to_ical())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import datetime
+import pytz
+import w32a_cal
+from w32a_cal import RecurrenceType, RecurrenceState, DayOfWeekMaskEnum
+from w32obj import W32Event, W32RecurrencePattern, W32Exception
+
+class RecordTest(unittest.TestCase):
+
+    def setUp(self):
+        self.start_dt = datetime.datetime(year=2024, month=1, day=2, hour=12, minute=30, tzinfo=pytz.utc)
+        moved = self.start_dt + datetime.timedelta(weeks=3, hours=2)
+        exceptions = [
+            W32Exception(self.start_dt + datetime.timedelta(weeks=1), deleted=True),
+            W32Exception(self.start_dt + datetime.timedelta(weeks=3),
+                         event=W32Event(id="other", subject="Moved", start=moved, end=moved + datetime.timedelta(hours=1))),
+        ]
+        pattern = W32RecurrencePattern(RecurrenceType.WEEKLY, 1, occurrences=20, day_of_week_mask=DayOfWeekMaskEnum.TUESDAY,
+                                       exceptions=exceptions)
+        self.series = W32Event(id="series", subject="Series", start=self.start_dt, end=self.start_dt + datetime.timedelta(hours=1),
+                               location="Room", categories="A, B", req_attendees="a@example.com",
+                               recurring=True, recurrence_state=RecurrenceState.MASTER, recurrence_pattern=pattern)
+
+    def test_records(self):
+        records = w32a_cal.win32_event_to_records(self.series)
+        self.assertEqual(len(records), 2)
+        master, exception = records
+        self.assertFalse(hasattr(master, "__dict__"))
+        self.assertTrue(master.is_master)
+        self.assertEqual(dict(master.rrule)["byday"], ("TU",))
+        hash(master.rrule)
+        self.assertEqual(master.exdates, (self.start_dt + datetime.timedelta(weeks=1),))
+        self.assertEqual(master.sequence, 3)
+        self.assertTrue(exception.is_exception)
+        self.assertEqual(exception.uid, "series")
+        self.assertEqual(exception.recurrence_id, self.start_dt + datetime.timedelta(weeks=3))
+
+    def test_lowering(self):
+        for filter in (None, w32a_cal.ICAL_FILTER_SAFE):
+            records = w32a_cal.win32_event_to_records(self.series, filter=filter)
+            self.assertEqual([r.to_bytes() for r in records],
+                             [e.to_ical() for e in w32a_cal.win32_event_to_ical(self.series, filter=filter)])
+
+    def test_filter(self):
+        master = w32a_cal.win32_event_to_records(self.series, filter=w32a_cal.ICAL_FILTER_SAFE)[0]
+        self.assertEqual(master.summary, "Event")
+        self.assertIsNone(master.location)
+        self.assertIsNone(master.attendees)
+        self.assertIsNone(master.to_ical().get('LOCATION'))
+
+if __name__ == '__main__':
+    unittest.main()
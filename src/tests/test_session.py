@@ -0,0 +1,89 @@
+import unittest
+import w32a_session
+from w32obj import W32Folder, W32Namespace, W32Application
+
+
+class OutlookSessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rooms = W32Folder("Rooms")
+        self.team = W32Folder("Team", folders=[self.rooms])
+        self.calendar = W32Folder("Calendar", folders=[self.team])
+        self.app = W32Application(W32Namespace({w32a_session.OL_FOLDER_CALENDAR: self.calendar}))
+
+    def test_paths(self):
+        session = w32a_session.OutlookSession(application=self.app)
+        self.assertEqual(session.folder_paths(), ["Calendar", "Calendar/Team", "Calendar/Team/Rooms"])
+        self.assertIs(session.get_folder(), self.calendar)
+        self.assertIs(session.get_folder("Calendar/Team/Rooms"), self.rooms)
+        self.assertIs(session.get_folder("Team"), self.team)
+        self.assertIs(session.get_folder("Team/Rooms"), self.rooms)
+        with self.assertRaises(ValueError):
+            session.get_folder("Missing")
+        self.assertEqual(self.app.namespace_calls, 1)
+
+    def test_index_cached(self):
+        session = w32a_session.OutlookSession(application=self.app)
+        index = session.folder_index
+        session.get_folder("Team")
+        self.assertIs(session.folder_index, index)
+
+        session.invalidate()
+        self.assertIsNot(session.folder_index, index)
+
+        session.ttl = 0
+        index = session.folder_index
+        self.assertIsNot(session.folder_index, index)
+
+    def test_new_folder_rebuilds_index(self):
+        session = w32a_session.OutlookSession(application=self.app)
+        session.folder_index
+        projects = W32Folder("Projects")
+        self.calendar.Folders.append(projects)
+        self.assertIs(session.get_folder("Projects"), projects)
+
+    def test_missing_folder_rate_limited(self):
+        session = w32a_session.OutlookSession(application=self.app)
+        with self.assertRaises(ValueError):
+            session.get_folder("Missing")
+        index = session.folder_index
+        # Further misses within miss_interval do not walk the folders again
+        self.calendar.Folders.append(W32Folder("Missing"))
+        for _ in range(3):
+            with self.assertRaises(ValueError):
+                session.get_folder("Missing")
+        self.assertIs(session.folder_index, index)
+        session.miss_interval = 0
+        self.assertIs(session.get_folder("Missing"), self.calendar.Folders[-1])
+
+    def test_watch_folder_changes(self):
+        watchers = []
+
+        def with_events(source, events_class):
+            watcher = events_class()
+            watcher.source = source
+            watchers.append(watcher)
+            return watcher
+
+        session = w32a_session.OutlookSession(application=self.app)
+        session.watch_folder_changes(with_events)
+        self.assertEqual([w.source for w in watchers], [self.calendar.Folders, self.team.Folders, self.rooms.Folders])
+        index = session.folder_index
+
+        # A subfolder added later is watched too
+        archive = W32Folder("Archive")
+        projects = W32Folder("Projects", folders=[archive])
+        self.rooms.Folders.append(projects)
+        watchers[2].OnFolderAdd(projects)
+        self.assertIsNot(session.folder_index, index)
+        self.assertEqual([w.source for w in watchers[3:]], [projects.Folders, archive.Folders])
+        self.assertIs(session.get_folder("Team/Rooms/Projects/Archive"), archive)
+
+        index = session.folder_index
+        watchers[4].OnFolderRemove(None)
+        self.assertIsNot(session.folder_index, index)
+        # Watched sessions rely on the events, a miss does not rebuild the index
+        index = session.folder_index
+        with self.assertRaises(ValueError):
+            session.get_folder("Missing")
+        self.assertIs(session.folder_index, index)
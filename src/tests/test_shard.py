@@ -0,0 +1,117 @@
+import unittest
+import concurrent.futures
+import datetime
+import gzip
+import json
+import os
+import tempfile
+import icalendar
+import pytz
+import w32a_cal
+import ical_emit
+import ical_shard
+from w32a_cal import RecurrenceType, RecurrenceState, DayOfWeekMaskEnum
+from w32obj import W32Event, W32RecurrencePattern, W32Exception
+
+SAMPLE_ICS = os.path.join(os.path.dirname(__file__), "..", "samples", "test.ics")
+
+class ShardTest(unittest.TestCase):
+
+    def make_events(self) -> list[icalendar.Event]:
+        start_dt = datetime.datetime(year=2024, month=1, day=30, hour=12, minute=30, tzinfo=pytz.utc)
+        moved = start_dt + datetime.timedelta(weeks=5, hours=1)
+        exceptions = [W32Exception(start_dt + datetime.timedelta(weeks=5), event=W32Event(
+            id="series", subject="Moved", start=moved, end=moved + datetime.timedelta(hours=1)))]
+        pattern = W32RecurrencePattern(RecurrenceType.WEEKLY, 1, occurrences=10,
+                                       day_of_week_mask=DayOfWeekMaskEnum.TUESDAY, exceptions=exceptions)
+        events = w32a_cal.win32_event_to_ical(W32Event(
+            id="series", subject="Series", start=start_dt, end=start_dt + datetime.timedelta(hours=1),
+            recurring=True, recurrence_state=RecurrenceState.MASTER, recurrence_pattern=pattern))
+        for i, month in enumerate((1, 2, 2, 3)):
+            single = start_dt.replace(month=month, day=1 + i)
+            events += w32a_cal.win32_event_to_ical(W32Event(id="single-%d" % i, subject="Single", start=single,
+                                                            end=single + datetime.timedelta(hours=1)))
+        return events
+
+    def test_partition(self):
+        shards = ical_shard.partition_events(self.make_events(), span_series=False)
+        self.assertEqual({k: len(v) for k, v in shards.items()}, {"2024-01": 3, "2024-02": 2, "2024-03": 1})
+        # The exception (March) stays with its master (January)
+        self.assertEqual([str(e.get('UID')) for e in shards["2024-01"]], ["series", "series", "single-0"])
+
+        # The series (January 30 to April 2) is copied with its exception into every month it covers
+        shards = ical_shard.partition_events(self.make_events())
+        self.assertEqual({k: len(v) for k, v in shards.items()}, {"2024-01": 3, "2024-02": 4, "2024-03": 3, "2024-04": 2})
+        self.assertEqual([str(e.get('UID')) for e in shards["2024-03"]], ["series", "series", "single-3"])
+        shards = ical_shard.partition_events(self.make_events(), by=ical_shard.SHARD_BY_YEAR)
+        self.assertEqual({k: len(v) for k, v in shards.items()}, {"2024": 6})
+
+        shards = ical_shard.partition_events(self.make_events(), by=ical_shard.SHARD_BY_HASH, hash_count=4)
+        self.assertTrue(all(k.startswith("h") for k in shards))
+        self.assertEqual(sum(len(v) for v in shards.values()), 6)
+
+    def test_write_shards(self):
+        with tempfile.TemporaryDirectory() as directory:
+            infos = ical_shard.write_shards(self.make_events(), directory)
+            self.assertEqual([i.name for i in infos], ["calendar-2024-01.ics", "calendar-2024-02.ics",
+                                                       "calendar-2024-03.ics", "calendar-2024-04.ics"])
+            self.assertTrue(all(i.written for i in infos))
+            self.assertEqual((infos[0].masters, infos[0].exceptions), (1, 1))
+            self.assertEqual((infos[3].masters, infos[3].exceptions), (1, 1))
+            self.assertEqual(infos[0].start, "2024-01-01T12:30:00+00:00")
+
+            with open(os.path.join(directory, ical_shard.MANIFEST_NAME)) as f:
+                manifest = json.load(f)
+            # Copies of the series are counted once
+            self.assertEqual(manifest["events"], 6)
+            with open(os.path.join(directory, infos[1].name), "rb") as f:
+                cal = icalendar.Calendar.from_ical(f.read())
+            self.assertEqual(len(cal.walk('VEVENT')), 4)
+
+            # Only the changed shard is written
+            events = [e for e in self.make_events() if str(e.get('UID')) != "single-3"]
+            infos = ical_shard.write_shards(events, directory)
+            self.assertEqual([i.written for i in infos], [False, False, True, False])
+
+            # Removed shards are deleted
+            infos = ical_shard.write_shards(events, directory, span_series=False, max_workers=1)
+            self.assertEqual([i.name for i in infos], ["calendar-2024-01.ics", "calendar-2024-02.ics"])
+            self.assertFalse(os.path.exists(os.path.join(directory, "calendar-2024-03.ics")))
+            self.assertFalse(os.path.exists(os.path.join(directory, "calendar-2024-04.ics")))
+
+    def test_open_series(self):
+        # A series without end is copied up to the last shard of the other events
+        events = self.make_events()
+        start_dt = datetime.datetime(year=2024, month=2, day=6, hour=9, tzinfo=pytz.utc)
+        pattern = W32RecurrencePattern(RecurrenceType.WEEKLY, 1, no_end=True, day_of_week_mask=DayOfWeekMaskEnum.TUESDAY)
+        events += w32a_cal.win32_event_to_ical(W32Event(
+            id="open", subject="Open", start=start_dt, end=start_dt + datetime.timedelta(hours=1),
+            recurring=True, recurrence_state=RecurrenceState.MASTER, recurrence_pattern=pattern))
+        shards = ical_shard.partition_events(events)
+        self.assertEqual([k for k, v in shards.items() if "open" in [str(e.get('UID')) for e in v]],
+                         ["2024-02", "2024-03", "2024-04"])
+
+    def test_format(self):
+        with tempfile.TemporaryDirectory() as directory:
+            infos = ical_shard.write_shards(self.make_events(), directory, format=ical_emit.FORMAT_JCAL,
+                                            compression=ical_emit.COMPRESSION_GZIP)
+            self.assertEqual(infos[0].name, "calendar-2024-01.json.gz")
+            with gzip.open(os.path.join(directory, infos[0].name)) as f:
+                self.assertEqual(len(json.load(f)[2]), 3)
+
+    def test_timezones(self):
+        with open(SAMPLE_ICS, "rb") as f:
+            cal = icalendar.Calendar.from_ical(f.read())
+        with tempfile.TemporaryDirectory() as directory:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
+                infos = ical_shard.write_shards(cal, directory, by=ical_shard.SHARD_BY_YEAR, executor=executor)
+            with open(os.path.join(directory, ical_shard.MANIFEST_NAME)) as f:
+                self.assertEqual(json.load(f)["events"], 10)
+            for info in infos:
+                with open(os.path.join(directory, info.name), "rb") as f:
+                    shard = icalendar.Calendar.from_ical(f.read())
+                tzids = set(str(tz.get('TZID')) for tz in shard.walk('VTIMEZONE'))
+                self.assertEqual(tzids, ical_shard._referenced_tzids(shard.walk('VEVENT')))
+
+if __name__ == '__main__':
+    unittest.main()
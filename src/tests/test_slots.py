@@ -0,0 +1,102 @@
+import unittest
+import datetime
+import random
+import pytz
+import w32a_cal
+import ical_slots
+from ical_expand import Occurrence, UTC
+from ical_slots import Slot, WorkingHours
+from w32a_cal import BusyStatus
+from w32obj import W32Event, W32RecurrencePattern
+
+
+def at(hour: int, minute: int = 0, day: int = 4) -> datetime.datetime:
+    return datetime.datetime(2024, 3, day, hour, minute, tzinfo=UTC)
+
+
+def make_event(id, start, minutes, busy_status=BusyStatus.BUSY, **kwargs):
+    return W32Event(id=id, subject=id, start=start, end=start + datetime.timedelta(minutes=minutes),
+                    busy_status=busy_status, **kwargs)
+
+
+class SlotsTest(unittest.TestCase):
+
+    def test_merge_intervals(self):
+        intervals = [(at(9), at(10)), (at(9, 30), at(9, 45)), (at(10), at(11)), (at(12), at(13))]
+        self.assertEqual(ical_slots.merge_intervals(intervals), [(at(9), at(11)), (at(12), at(13))])
+
+        occurrences = [Occurrence("a", None, at(12), at(13)), Occurrence("b", None, at(9), at(10)),
+                       Occurrence("c", None, at(10), at(12), busy_status=BusyStatus.FREE)]
+        self.assertEqual(ical_slots.busy_intervals(occurrences), [(at(9), at(10)), (at(12), at(13))])
+
+    def test_free_intervals(self):
+        busy = [(at(8), at(9, 30)), (at(11), at(12)), (at(16), at(20))]
+        available = [(at(9), at(17)), (at(9, day=5), at(17, day=5))]
+        self.assertEqual(list(ical_slots.free_intervals(busy, available)),
+                         [(at(9, 30), at(11)), (at(12), at(16)), (at(9, day=5), at(17, day=5))])
+
+    def test_working_hours(self):
+        berlin = pytz.timezone("Europe/Berlin")
+        hours = WorkingHours(datetime.time(9), datetime.time(17), tz=berlin)
+        # Friday to Tuesday over the switch to summer time on Sunday 2024-03-31
+        intervals = list(hours.intervals(at(0, day=29), at(23, day=31) + datetime.timedelta(days=2)))
+        self.assertEqual(intervals, [
+            (at(8, day=29), at(16, day=29)),
+            (datetime.datetime(2024, 4, 1, 7, tzinfo=UTC), datetime.datetime(2024, 4, 1, 15, tzinfo=UTC)),
+            (datetime.datetime(2024, 4, 2, 7, tzinfo=UTC), datetime.datetime(2024, 4, 2, 15, tzinfo=UTC)),
+        ])
+        with self.assertRaises(ValueError):
+            WorkingHours(datetime.time(17), datetime.time(9))
+
+    def test_find_free_slots(self):
+        pattern = W32RecurrencePattern(w32a_cal.RecurrenceType.DAILY, 1, occurrences=5)
+        calendars = {
+            "alice": w32a_cal.win32_event_to_ical(make_event("daily", at(9), 30, recurring=True,
+                                                             recurrence_state=w32a_cal.RecurrenceState.MASTER,
+                                                             recurrence_pattern=pattern)),
+            "bob": (w32a_cal.win32_event_to_ical(make_event("review", at(10), 60))
+                    + w32a_cal.win32_event_to_ical(make_event("lunch", at(12), 60, BusyStatus.FREE))
+                    + w32a_cal.win32_event_to_ical(make_event("maybe", at(11, 30), 30, BusyStatus.TENTATIVE))),
+        }
+        hours = WorkingHours(datetime.time(9), datetime.time(17))
+        duration = datetime.timedelta(minutes=30)
+        slots = ical_slots.find_free_slots(calendars, duration, at(0), at(0, day=9), working_hours=hours, max_slots=4)
+        self.assertEqual(slots, [Slot(at(9, 30), at(10)), Slot(at(11), at(11, 30)),
+                                 Slot(at(12), at(12, 30)), Slot(at(12, 30), at(13))])
+
+        slots = ical_slots.find_free_slots(calendars, duration, at(0), at(0, day=9), working_hours=hours, max_slots=2,
+                                           ignore=ical_slots.SLOTS_IGNORE_TENTATIVE)
+        self.assertEqual(slots, [Slot(at(9, 30), at(10)), Slot(at(11), at(11, 30))])
+
+        # The daily series blocks the next morning as well
+        slots = ical_slots.find_free_slots(calendars, datetime.timedelta(hours=8), at(0), at(0, day=9),
+                                           working_hours=hours)
+        self.assertEqual(slots, [])
+        slots = ical_slots.find_free_slots(calendars, datetime.timedelta(hours=7), at(0), at(0, day=9),
+                                           working_hours=hours, step=datetime.timedelta(minutes=15))
+        self.assertEqual([s.start for s in slots[:4]], [at(9, 30, day=5), at(9, 45, day=5), at(10, day=5), at(9, 30, day=6)])
+        self.assertEqual(len(slots), 10)
+
+    def test_brute_force(self):
+        rnd = random.Random(3)
+        people = []
+        for p in range(8):
+            occurrences = []
+            for i in range(40):
+                start = at(0) + datetime.timedelta(minutes=15 * rnd.randrange(96 * 5))
+                occurrences.append(Occurrence("%d-%d" % (p, i), None, start,
+                                              start + datetime.timedelta(minutes=15 * rnd.randint(1, 6))))
+            people.append(ical_slots.busy_intervals(occurrences))
+        busy = ical_slots.merge_intervals(sorted(i for person in people for i in person))
+        free = list(ical_slots.free_intervals(busy, [(at(0), at(0, day=9))]))
+
+        # Every 15 minute step is free in the result exactly if nobody is busy then
+        step = datetime.timedelta(minutes=15)
+        t = at(0)
+        while t < at(0, day=9):
+            nobody_busy = all(not (s < t + step and t < e) for person in people for s, e in person)
+            self.assertEqual(any(s <= t and t + step <= e for s, e in free), nobody_busy, t)
+            t += step
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+import gzip
+import io
+import json
+import os
+import tempfile
+import icalendar
+import ical_emit
+import ical_spill
+import w32a_export
+from w32obj import W32Folder
+from tests.test_export import make_event, make_berlin_event, calendar_tzids
+
+SAMPLE_ICS = os.path.join(os.path.dirname(__file__), "..", "samples", "test.ics")
+
+
+class SpillTest(unittest.TestCase):
+
+    def setUp(self):
+        with open(SAMPLE_ICS, "rb") as f:
+            self.events = icalendar.Calendar.from_ical(f.read()).walk('VEVENT')
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        os.rmdir(self.directory)
+
+    def test_insertion_order(self):
+        for format in ical_emit.FORMATS:
+            with ical_spill.SpillBuffer(memory_budget=1000, format=format, directory=self.directory) as buffer:
+                for event in self.events:
+                    buffer.add(event)
+                buf = io.BytesIO()
+                self.assertEqual(buffer.write(buf), len(self.events))
+                self.assertGreater(buffer.stats.segments, 1)
+                self.assertEqual(len(os.listdir(self.directory)), 1)
+            self.assertEqual(buf.getvalue(), ical_emit.emit_bytes(self.events, format=format))
+            self.assertLessEqual(buffer.stats.spilled_events, buffer.stats.events)
+            self.assertEqual(os.listdir(self.directory), [])
+
+    def test_start_order(self):
+        with ical_spill.SpillBuffer(memory_budget=1500, order=ical_spill.SPILL_ORDER_START,
+                                    directory=self.directory) as buffer:
+            for event in reversed(self.events):
+                buffer.add(event)
+            buf = io.BytesIO()
+            buffer.write(buf, compression=ical_emit.COMPRESSION_GZIP)
+        cal = icalendar.Calendar.from_ical(gzip.decompress(buf.getvalue()))
+        starts = [ical_spill._start_key(e) for e in cal.walk('VEVENT')]
+        self.assertEqual(len(starts), len(self.events))
+        self.assertEqual(starts, sorted(starts))
+
+    def test_merge_fan_in(self):
+        for order in ical_spill.SPILL_ORDERS:
+            with ical_spill.SpillBuffer(memory_budget=1, order=order, directory=self.directory, merge_fan_in=3) as buffer:
+                for event in self.events:
+                    buffer.add(event)
+                self.assertEqual(buffer.stats.segments, len(self.events))
+                chunks = buffer.chunks()
+                first = next(chunks)
+                # Merged in passes until at most merge_fan_in segments are open
+                self.assertLessEqual(len(os.listdir(os.path.join(self.directory, os.listdir(self.directory)[0]))), 3)
+                self.assertGreater(buffer.stats.merge_passes, 1)
+                chunks = [first] + list(chunks)
+            expected = sorted(self.events, key=ical_spill._start_key) if order == ical_spill.SPILL_ORDER_START else self.events
+            self.assertEqual(chunks, [ical_emit.serialize_component(e) for e in expected])
+
+    def test_no_spill(self):
+        with ical_spill.SpillBuffer(directory=self.directory) as buffer:
+            for event in self.events:
+                buffer.add(event)
+            buf = io.BytesIO()
+            buffer.write(buf)
+        self.assertEqual(buffer.stats.segments, 0)
+        self.assertEqual(buf.getvalue(), ical_emit.emit_bytes(self.events))
+
+    def test_export_folders_spilled(self):
+        folders = {
+            "Team": W32Folder("Team", [make_event(str(i), day=1 + i % 28) for i in range(30)]),
+            "Rooms": W32Folder("Rooms", [make_event("2", day=3), make_event("room", day=20)]),
+        }
+        specs = [w32a_export.FolderSpec(name="Team"), w32a_export.FolderSpec(name="Rooms")]
+        expected = io.BytesIO()
+        ical_emit.export_folders_to(specs, expected, format=ical_emit.FORMAT_JCAL, folder_resolver=folders.get)
+
+        buf = io.BytesIO()
+        reports, stats = ical_spill.export_folders_spilled(specs, buf, memory_budget=4096, format=ical_emit.FORMAT_JCAL,
+                                                           directory=self.directory, folder_resolver=folders.get,
+                                                           pipeline_workers=2)
+        self.assertEqual(buf.getvalue(), expected.getvalue())
+        # 31 events and the VTIMEZONE of their Etc/UTC TZID
+        self.assertEqual(len(json.loads(buf.getvalue())[2]), 32)
+        self.assertEqual([r.duplicates for r in reports], [0, 1])
+        self.assertEqual(stats.events, 31)
+        self.assertGreater(stats.segments, 1)
+        self.assertEqual(stats.as_dict()["segments"], stats.segments)
+
+    def test_export_timezones(self):
+        folders = {"Team": W32Folder("Team", [make_event("1"), make_berlin_event("berlin")])}
+        specs = [w32a_export.FolderSpec(name="Team")]
+        expected = io.BytesIO()
+        ical_emit.export_folders_to(specs, expected, folder_resolver=folders.get)
+        for order in ical_spill.SPILL_ORDERS:
+            buf = io.BytesIO()
+            _reports, stats = ical_spill.export_folders_spilled(specs, buf, memory_budget=1, order=order,
+                                                                directory=self.directory, folder_resolver=folders.get)
+            referenced, defined = calendar_tzids(icalendar.Calendar.from_ical(buf.getvalue()))
+            self.assertEqual(referenced, {"Etc/UTC", "Europe/Berlin"})
+            self.assertEqual(defined, referenced)
+            self.assertEqual(stats.events, 2)
+            if order == ical_spill.SPILL_ORDER_INSERTION:
+                self.assertEqual(buf.getvalue(), expected.getvalue())
+
+if __name__ == '__main__':
+    unittest.main()
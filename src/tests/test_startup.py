@@ -0,0 +1,37 @@
+import unittest
+import os
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Dependencies that must only be imported on first use
+HEAVY_MODULES = ["icalendar", "pytz", "dateutil.parser", "tzlocal", "tzlocal.windows_tz"]
+
+
+def imported_modules(module: str) -> set[str]:
+    proc = subprocess.run([sys.executable, "-c", "import sys, %s; print('\\n'.join(sys.modules))" % module],
+                          cwd=SRC_DIR, capture_output=True, text=True, check=True)
+    return set(proc.stdout.split())
+
+
+class StartupTest(unittest.TestCase):
+
+    def check_module(self, module: str):
+        # Only which modules get imported is checked here, wall-clock budgets are too noisy for the unit suite.
+        # The import time is measured by benchmarks/bench_startup.py.
+        loaded = imported_modules(module)
+        for heavy in HEAVY_MODULES:
+            self.assertNotIn(heavy, loaded, "importing %s eagerly imports %s" % (module, heavy))
+
+    def test_w32a_cal(self):
+        self.check_module("w32a_cal")
+
+    def test_w32obj(self):
+        self.check_module("w32obj")
+
+    def test_lazy_use(self):
+        proc = subprocess.run([sys.executable, "-c",
+                               "import w32a_cal; print(w32a_cal.win32_tz_name_to_tz('W. Europe Standard Time'))"],
+                              cwd=SRC_DIR, capture_output=True, text=True, check=True)
+        self.assertEqual(proc.stdout.strip(), "Europe/Berlin")
@@ -0,0 +1,79 @@
+import unittest
+import datetime
+import os
+import tempfile
+import pytz
+import w32a_cal
+import ical_expand
+import ical_store
+from w32a_cal import BusyStatus, RecurrenceType, RecurrenceState, DayOfWeekMaskEnum
+from w32obj import W32Event, W32RecurrencePattern, W32Exception
+
+UTC = datetime.timezone.utc
+
+class StoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tz = pytz.timezone("Europe/Berlin")
+        self.start_dt = self.tz.localize(datetime.datetime(2024, 3, 5, 12, 30))
+
+    def make_events(self, location: str = "Room 1") -> list:
+        moved = self.start_dt + datetime.timedelta(weeks=2, hours=2)
+        exceptions = [
+            W32Exception(self.start_dt + datetime.timedelta(weeks=1), deleted=True),
+            W32Exception(self.start_dt + datetime.timedelta(weeks=2), event=W32Event(
+                id="series", subject="Moved", start=moved, end=moved + datetime.timedelta(hours=1), location=location)),
+        ]
+        pattern = W32RecurrencePattern(RecurrenceType.WEEKLY, 1, occurrences=6, day_of_week_mask=DayOfWeekMaskEnum.TUESDAY,
+                                       exceptions=exceptions)
+        events = w32a_cal.win32_event_to_ical(W32Event(
+            id="series", subject="Series", start=self.start_dt, end=self.start_dt + datetime.timedelta(hours=1),
+            location=location, categories="Team, Weekly", busy_status=BusyStatus.BUSY,
+            recurring=True, recurrence_state=RecurrenceState.MASTER, recurrence_pattern=pattern))
+        single = self.start_dt + datetime.timedelta(days=1)
+        events += w32a_cal.win32_event_to_ical(W32Event(id="single", subject="Single", start=single,
+                                                        end=single + datetime.timedelta(hours=1),
+                                                        location="Room 2", busy_status=BusyStatus.FREE))
+        return events
+
+    def test_expand(self):
+        occurrences = ical_expand.expand_events(self.make_events())
+        series = [o for o in occurrences if o.uid == "series"]
+        self.assertEqual(len(series), 5)
+        # Local time is kept across the DST change on March 31st
+        self.assertEqual([o.start.astimezone(self.tz).hour for o in series], [12, 14, 12, 12, 12])
+        self.assertEqual(series[1].summary, "Moved")
+        self.assertEqual(series[0].categories, ("Team", "Weekly"))
+
+        window = ical_expand.expand_events(self.make_events(), datetime.datetime(2024, 3, 18, tzinfo=UTC),
+                                           datetime.datetime(2024, 3, 25, tzinfo=UTC))
+        self.assertEqual([o.summary for o in window], ["Moved"])
+
+    def test_refresh_and_query(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "occurrences.sqlite")
+            window = (datetime.datetime(2024, 1, 1, tzinfo=UTC), datetime.datetime(2025, 1, 1, tzinfo=UTC))
+            store = ical_store.OccurrenceStore(path, *window)
+            report = store.refresh(self.make_events(), source="team")
+            self.assertEqual((report.added, report.occurrences), (2, 6))
+
+            week = (datetime.datetime(2024, 3, 4, tzinfo=UTC), datetime.datetime(2024, 3, 11, tzinfo=UTC))
+            self.assertEqual([o.summary for o in store.query(*week)], ["Series", "Single"])
+            self.assertEqual([o.summary for o in store.query(*week, location="Room 2")], ["Single"])
+            self.assertEqual([o.summary for o in store.query(*week, busy_status=[BusyStatus.BUSY])], ["Series"])
+            self.assertEqual(len(store.query(window[0], window[1], category="Weekly")), 4)
+            store.close()
+
+            # Reopened with the same window: only changed series are expanded again
+            store = ical_store.OccurrenceStore(path, *window)
+            report = store.refresh(self.make_events(location="Room 3"), source="team")
+            self.assertEqual((report.updated, report.unchanged, report.occurrences), (1, 1, 5))
+            self.assertEqual(len(store.query(*window, location="Room 3")), 5)
+
+            report = store.refresh([e for e in self.make_events(location="Room 3") if str(e.get('UID')) == "series"], source="team")
+            self.assertEqual((report.removed, report.unchanged), (1, 1))
+            self.assertEqual(store.count(), 5)
+            store.close()
+
+if __name__ == '__main__':
+    unittest.main()
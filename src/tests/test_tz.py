@@ -0,0 +1,77 @@
+import unittest
+import unittest.mock
+import os
+import datetime
+import pytz
+import w32a_cal
+import w32a_tz
+from w32obj import W32Event, W32RecurrencePattern, W32Exception
+
+
+class TzBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = w32a_tz.get_backend()
+
+    def tearDown(self):
+        w32a_tz.set_backend(self.backend)
+
+    def make_events(self) -> list[W32Event]:
+        berlin = pytz.timezone("Europe/Berlin")
+        utc_start = datetime.datetime(year=2024, month=2, day=13, hour=12, minute=30, tzinfo=pytz.utc)
+        local_start = berlin.localize(datetime.datetime(year=2024, month=7, day=1, hour=9, minute=0))
+        pattern = W32RecurrencePattern(w32a_cal.RecurrenceType.WEEKLY, 1,
+                                       end=local_start + datetime.timedelta(days=60),
+                                       day_of_week_mask=w32a_cal.DayOfWeekMaskEnum.MONDAY,
+                                       exceptions=[W32Exception(local_start + datetime.timedelta(days=7), deleted=True)])
+        return [
+            W32Event(id="1", subject="UTC", start=utc_start, end=utc_start + datetime.timedelta(hours=1)),
+            W32Event(id="2", subject="Berlin", start=local_start, duration=30),
+            W32Event(id="3", subject="Weekly", start=local_start, end=local_start + datetime.timedelta(hours=1),
+                     recurring=True, recurrence_state=w32a_cal.RecurrenceState.MASTER, recurrence_pattern=pattern),
+        ]
+
+    def convert(self, backend: str) -> list[bytes]:
+        w32a_tz.set_backend(backend)
+        ical = []
+        for event in self.make_events():
+            ical.extend(e.to_ical() for e in w32a_cal.win32_event_to_ical(event))
+        return ical
+
+    def test_backends_identical(self):
+        self.assertEqual(self.convert("pytz"), self.convert("zoneinfo"))
+
+    def test_zone_name(self):
+        backend = w32a_tz.set_backend("zoneinfo")
+        self.assertEqual(backend.zone_name(pytz.timezone("Europe/Berlin")), "Europe/Berlin")
+        self.assertEqual(w32a_tz.get_backend().zone_name(w32a_tz.get_backend().timezone("Europe/Berlin")), "Europe/Berlin")
+        self.assertEqual(w32a_tz.get_backend().zone_name(datetime.timezone.utc), "UTC")
+        self.assertEqual(w32a_cal.win32_tz_name_to_tz("W. Europe Standard Time").key, "Europe/Berlin")
+
+    def test_dst_transitions(self):
+        # Ambiguous (autumn) and non-existent (spring) local times resolve like pytz' localize(is_dst=False)
+        pytz_backend = w32a_tz.PytzBackend()
+        zoneinfo_backend = w32a_tz.ZoneInfoBackend()
+        for name in ("Europe/Berlin", "Australia/Sydney", "America/New_York"):
+            for local in (datetime.datetime(2024, 10, 27, 2, 30), datetime.datetime(2024, 3, 31, 2, 30),
+                          datetime.datetime(2024, 4, 7, 2, 30), datetime.datetime(2024, 10, 6, 2, 30),
+                          datetime.datetime(2024, 11, 3, 1, 30), datetime.datetime(2024, 3, 10, 2, 30),
+                          datetime.datetime(2024, 7, 1, 9, 0)):
+                expected = pytz_backend.localize(pytz_backend.timezone(name), local)
+                actual = zoneinfo_backend.localize(zoneinfo_backend.timezone(name), local)
+                self.assertEqual(actual.astimezone(pytz.utc), expected.astimezone(pytz.utc), (name, local))
+        berlin = zoneinfo_backend.localize(zoneinfo_backend.timezone("Europe/Berlin"), datetime.datetime(2024, 10, 27, 2, 30))
+        self.assertEqual(berlin.astimezone(pytz.utc), datetime.datetime(2024, 10, 27, 1, 30, tzinfo=pytz.utc))
+        self.assertIs(zoneinfo_backend.timezone("Europe/Berlin"), zoneinfo_backend.timezone("Europe/Berlin"))
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            w32a_tz.set_backend("dateutil")
+        with self.assertRaises(TypeError):
+            w32a_tz.TzBackend()
+
+    def test_unknown_env_backend(self):
+        w32a_tz.set_backend(None)
+        with unittest.mock.patch.dict(os.environ, {w32a_tz.TZ_BACKEND_ENV: "dateutil"}):
+            with self.assertRaisesRegex(ValueError, "pytz, zoneinfo"):
+                w32a_tz.get_backend()
@@ -0,0 +1,103 @@
+import unittest
+import datetime
+import pytz
+import w32a_cal
+from w32a_cal import RecurrenceType, RecurrenceState, DayOfWeekMaskEnum
+from w32obj import W32Event, W32RecurrencePattern, W32Exception
+
+class CountingException(W32Exception):
+    # Counts reads of AppointmentItem, a COM round-trip for real Outlook items
+
+    reads = 0
+
+    @property
+    def AppointmentItem(self):
+        CountingException.reads += 1
+        return self._item
+
+    @AppointmentItem.setter
+    def AppointmentItem(self, item):
+        self._item = item
+
+class WindowTest(unittest.TestCase):
+
+    def setUp(self):
+        CountingException.reads = 0
+        self.start_dt = datetime.datetime(year=2020, month=1, day=7, hour=12, minute=30, tzinfo=pytz.utc)
+
+    def make_series(self, weeks: int, **kwargs) -> W32Event:
+        exceptions = []
+        for week in range(1, weeks):
+            original = self.start_dt + datetime.timedelta(weeks=week)
+            moved = original + datetime.timedelta(hours=1)
+            exceptions.append(CountingException(original, event=W32Event(
+                id="series", subject="Moved %d" % week, start=moved, end=moved + datetime.timedelta(hours=1))))
+        pattern = W32RecurrencePattern(RecurrenceType.WEEKLY, 1, day_of_week_mask=DayOfWeekMaskEnum.TUESDAY,
+                                       exceptions=exceptions, **kwargs)
+        return W32Event(id="series", subject="Series", start=self.start_dt, end=self.start_dt + datetime.timedelta(hours=1),
+                        recurring=True, recurrence_state=RecurrenceState.MASTER, recurrence_pattern=pattern)
+
+    def exdates(self, event) -> list[datetime.datetime]:
+        exdates = event.get('EXDATE', [])
+        return [d.dt for exdate in (exdates if isinstance(exdates, list) else [exdates]) for d in exdate.dts]
+
+    def test_exceptions_outside_window(self):
+        series = self.make_series(200, no_end=True)
+        window = (datetime.datetime(2022, 3, 1, tzinfo=pytz.utc), datetime.datetime(2022, 4, 1, tzinfo=pytz.utc))
+
+        events = w32a_cal.win32_event_to_ical(series, window=window)
+        self.assertEqual([str(e.get('SUMMARY')) for e in events], ["Series", "Moved 112", "Moved 113", "Moved 114", "Moved 115", "Moved 116"])
+        # Only the modified occurrences near the window are read
+        self.assertEqual(CountingException.reads, 5)
+        # The others are excluded from the unclamped RRULE of the master
+        exdates = self.exdates(events[0])
+        self.assertEqual(len(exdates), 199 - 5)
+        self.assertIn(self.start_dt + datetime.timedelta(weeks=1), exdates)
+        # SEQUENCE does not depend on the window
+        self.assertEqual(events[0].get('SEQUENCE'), w32a_cal.win32_event_to_ical(series)[0].get('SEQUENCE'))
+
+    def test_series_outside_window(self):
+        series = self.make_series(10, end=self.start_dt + datetime.timedelta(weeks=10))
+        self.assertEqual(w32a_cal.win32_event_to_ical(series, window=(datetime.datetime(2021, 1, 1, tzinfo=pytz.utc), None)), [])
+        self.assertEqual(w32a_cal.win32_event_to_ical(series, window=(None, datetime.datetime(2019, 1, 1, tzinfo=pytz.utc))), [])
+        self.assertEqual(CountingException.reads, 0)
+        # Naive window bounds are compared by day
+        self.assertEqual(len(w32a_cal.win32_event_to_ical(series, window=(datetime.datetime(2020, 3, 10), None))), 2)
+
+    def test_moved_exceptions(self):
+        # Placed by their actual times, not by the original occurrence
+        series = self.make_series(3, no_end=True)
+        series.GetRecurrencePattern().Exceptions[0].AppointmentItem = W32Event(
+            id="series", subject="Moved into", start=self.start_dt + datetime.timedelta(weeks=10),
+            end=self.start_dt + datetime.timedelta(weeks=10, hours=1))
+        window = (self.start_dt + datetime.timedelta(weeks=9), self.start_dt + datetime.timedelta(weeks=11))
+        events = w32a_cal.win32_event_to_ical(series, window=window, exception_margin=datetime.timedelta(weeks=10))
+        self.assertEqual([str(e.get('SUMMARY')) for e in events], ["Series", "Moved into"])
+        self.assertEqual(events[1].get('RECURRENCE-ID').dt, self.start_dt + datetime.timedelta(weeks=1))
+        # Further from its original date than the margin: excluded without reading it
+        CountingException.reads = 0
+        events = w32a_cal.win32_event_to_ical(series, window=window)
+        self.assertEqual([str(e.get('SUMMARY')) for e in events], ["Series"])
+        self.assertEqual(len(self.exdates(events[0])), 2)
+        self.assertEqual(CountingException.reads, 0)
+
+        # Moved out of the window: excluded, not converted
+        window = (self.start_dt + datetime.timedelta(weeks=1), self.start_dt + datetime.timedelta(weeks=1, minutes=1))
+        events = w32a_cal.win32_event_to_ical(series, window=window)
+        self.assertEqual([str(e.get('SUMMARY')) for e in events], ["Series"])
+        self.assertEqual(self.exdates(events[0]),
+                         [self.start_dt + datetime.timedelta(weeks=1), self.start_dt + datetime.timedelta(weeks=2)])
+
+    def test_series_count_outside_window(self):
+        series = self.make_series(1, occurrences=10)
+        self.assertEqual(w32a_cal.win32_event_to_ical(series, window=(datetime.datetime(2021, 1, 1, tzinfo=pytz.utc), None)), [])
+        self.assertEqual(len(w32a_cal.win32_event_to_ical(series, window=(datetime.datetime(2020, 3, 1, tzinfo=pytz.utc), None))), 1)
+
+    def test_single_event(self):
+        event = W32Event(id="1", subject="Test", start=self.start_dt, end=self.start_dt + datetime.timedelta(hours=1))
+        self.assertEqual(len(w32a_cal.win32_event_to_ical(event, window=(self.start_dt, None))), 1)
+        self.assertEqual(w32a_cal.win32_event_to_ical(event, window=(self.start_dt + datetime.timedelta(hours=2), None)), [])
+        self.assertEqual(w32a_cal.win32_event_to_ical(event, window=(None, self.start_dt - datetime.timedelta(hours=2))), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+from __future__ import annotations
+import collections
+import csv
+import json
+import threading
+
+from typing import Callable, Optional
+
+from w32a_lazy import lazy_import
+
+icalendar = lazy_import("icalendar")
+
+# Value Outlook itself writes for attendees without a known address
+UNRESOLVED_CAL_ADDRESS = "invalid:nomail"
+
+ATTENDEE_CACHE_SIZE = 4096
+
+# Maps a display name to an email address, or None if it cannot be resolved
+AttendeeResolver = Callable[[str], Optional[str]]
+
+# (CAL-ADDRESS, CN, ROLE) of one attendee, immutable so it can be shared between events
+Attendee = tuple[str, str, str]
+
+
+def split_attendees(attendees_str: Optional[str]) -> list[str]:
+  # https://learn.microsoft.com/en-us/office/vba/api/outlook.appointmentitem.requiredattendees
+  # str, semicolon delimited
+  if not attendees_str:
+    return []
+  return [name.strip() for name in attendees_str.split(";") if name.strip()]
+
+def address_resolver(name: str) -> Optional[str]:
+  # Default resolver: only names that already are addresses can be resolved
+  if "@" in name and " " not in name:
+    return name
+  return None
+
+
+class DirectoryResolver:
+  # Resolves display names from a local directory: a dict, a JSON object file or a CSV file
+  # with "name" and "email" columns
+
+  def __init__(self, directory: dict[str, str]) -> None:
+    self.directory: dict[str, str] = {name.casefold(): address for name, address in directory.items()}
+
+  @classmethod
+  def from_file(cls, path: str) -> 'DirectoryResolver':
+    with open(path, "r", encoding="utf-8") as f:
+      if path.lower().endswith(".json"):
+        return cls(json.load(f))
+      return cls({row["name"]: row["email"] for row in csv.DictReader(f)})
+
+  def __call__(self, name: str) -> Optional[str]:
+    address = self.directory.get(name.casefold(), None)
+    if address is None:
+      address = address_resolver(name)
+    return address
+
+
+class OutlookRecipientResolver:
+  # https://learn.microsoft.com/en-us/office/vba/api/outlook.namespace.createrecipient
+  # https://learn.microsoft.com/en-us/office/vba/api/outlook.addressentry
+  # Every call is a COM round-trip, so wrap it in an AttendeeCache.
+  # The namespace belongs to the COM apartment of the thread that created the resolver, it can only
+  # be called from that thread: use it for serial exports, not with pipeline_workers.
+
+  def __init__(self, namespace: object) -> None:
+    self.namespace = namespace
+    self.thread_id: int = threading.get_ident()
+
+  def __call__(self, name: str) -> Optional[str]:
+    if threading.get_ident() != self.thread_id:
+      raise RuntimeError("OutlookRecipientResolver called outside the thread that owns its namespace")
+    recipient = self.namespace.CreateRecipient(name)
+    if not recipient.Resolve():
+      return address_resolver(name)
+    entry = recipient.AddressEntry
+    exchange_user = entry.GetExchangeUser() if entry is not None else None
+    if exchange_user is not None and exchange_user.PrimarySmtpAddress:
+      return exchange_user.PrimarySmtpAddress
+    if entry is not None and entry.Type == "SMTP":
+      return entry.Address
+    return address_resolver(name)
+
+
+class _LRU:
+
+  def __init__(self, maxsize: int) -> None:
+    self.maxsize = maxsize
+    self.data: collections.OrderedDict = collections.OrderedDict()
+
+  def get(self, key):
+    value = self.data.get(key, None)
+    if value is not None:
+      self.data.move_to_end(key)
+    return value
+
+  def put(self, key, value) -> None:
+    self.data[key] = value
+    if len(self.data) > self.maxsize:
+      self.data.popitem(last=False)
+
+
+class AttendeeCache:
+  # Bounded LRU caches for display name -> CAL-ADDRESS and for whole attendee strings -> Attendee tuples.
+  # Only immutable values are cached, every event gets its own vCalAddress objects (see cal_address).
+
+  def __init__(self, resolver: AttendeeResolver = address_resolver, maxsize: int = ATTENDEE_CACHE_SIZE) -> None:
+    self.resolver: AttendeeResolver = resolver
+    self._addresses = _LRU(maxsize)
+    self._lists = _LRU(max(1, maxsize // 16))
+    self._lock = threading.Lock()
+    self.hits: int = 0
+    self.misses: int = 0
+
+  def address(self, name: str) -> str:
+    # CAL-ADDRESS of a display name
+    with self._lock:
+      address = self._addresses.get(name)
+    if address is not None:
+      return address
+
+    email = self.resolver(name)
+    # https://icalendar.org/iCalendar-RFC-5545/3-3-3-calendar-user-address.html
+    address = "mailto:" + email if email else UNRESOLVED_CAL_ADDRESS
+    with self._lock:
+      self._addresses.put(name, address)
+    return address
+
+  def attendee(self, name: str, role: str) -> Attendee:
+    return (self.address(name), name, role)
+
+  def cal_address(self, name: str, role: str) -> icalendar.vCalAddress:
+    return cal_address(self.attendee(name, role))
+
+  def attendees(self, required_str: Optional[str], optional_str: Optional[str]) -> tuple[Attendee, ...]:
+    key = (required_str or "", optional_str or "")
+    with self._lock:
+      result = self._lists.get(key)
+      if result is not None:
+        self.hits += 1
+        return result
+      self.misses += 1
+
+    result = tuple([self.attendee(name, "REQ-PARTICIPANT") for name in split_attendees(required_str)]
+                   + [self.attendee(name, "OPT-PARTICIPANT") for name in split_attendees(optional_str)])
+    with self._lock:
+      self._lists.put(key, result)
+    return result
+
+  def clear(self) -> None:
+    with self._lock:
+      self._addresses = _LRU(self._addresses.maxsize)
+      self._lists = _LRU(self._lists.maxsize)
+      self.hits = 0
+      self.misses = 0
+
+
+_default_cache: Optional[AttendeeCache] = None
+_default_cache_lock = threading.Lock()
+
+def get_attendee_cache() -> AttendeeCache:
+  # Shared by the conversion threads, created once
+  global _default_cache
+  if _default_cache is None:
+    with _default_cache_lock:
+      if _default_cache is None:
+        _default_cache = AttendeeCache()
+  return _default_cache
+
+def set_attendee_cache(cache: Optional[AttendeeCache]) -> None:
+  global _default_cache
+  with _default_cache_lock:
+    _default_cache = cache
+
+def cal_address(attendee: Attendee) -> icalendar.vCalAddress:
+  # A new vCalAddress per call, its params may be changed by the caller
+  address, name, role = attendee
+  value = icalendar.vCalAddress(address)
+  value.params['CN'] = name
+  value.params['ROLE'] = role
+  return value
+
+def set_attendee_property(ical_event: icalendar.Event, attendees: tuple[Attendee, ...]) -> None:
+  # Sets all ATTENDEE properties at once instead of one Event.add() per attendee
+  if len(attendees) == 1:
+    ical_event['ATTENDEE'] = cal_address(attendees[0])
+  elif len(attendees) > 1:
+    ical_event['ATTENDEE'] = [cal_address(attendee) for attendee in attendees]
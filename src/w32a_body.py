@@ -0,0 +1,102 @@
+from typing import Optional
+import threading
+
+# What to do with a text field that exceeds the budget
+BODY_POLICY_TRUNCATE = "truncate"  # keep the first max_chars characters (max_bytes UTF-8 bytes) and append the marker
+BODY_POLICY_DROP = "drop"          # omit the field
+BODY_POLICY_SUMMARY = "summary"    # replace the field by the marker
+
+BODY_POLICIES = (BODY_POLICY_TRUNCATE, BODY_POLICY_DROP, BODY_POLICY_SUMMARY)
+
+BODY_MARKER = "[... %d characters omitted ...]"
+
+# Large text fields of an AppointmentItem, only read when they are emitted
+# https://learn.microsoft.com/en-us/office/vba/api/outlook.appointmentitem.body
+# https://learn.microsoft.com/en-us/office/vba/api/outlook.appointmentitem.rtfbody
+LAZY_BODY_PROPERTIES = ("Body", "RTFBody")
+
+
+class BodyBudget:
+  # Size cap for large text fields (Body -> DESCRIPTION, RTFBody), with statistics of what was cut.
+  # max_chars counts characters, max_bytes the UTF-8 encoded size; a field must satisfy both.
+  # Binary fields (RTFBody) are only limited by max_bytes and dropped when they exceed it,
+  # a truncated RTF document cannot be read.
+
+  def __init__(self, max_chars: Optional[int] = None, policy: str = BODY_POLICY_TRUNCATE, marker: str = BODY_MARKER,
+               max_bytes: Optional[int] = None) -> None:
+    if policy not in BODY_POLICIES:
+      raise ValueError("Unknown body policy: %s" % policy)
+    self.max_chars: Optional[int] = max_chars
+    self.max_bytes: Optional[int] = max_bytes
+    self.policy: str = policy
+    self.marker: str = marker
+    self._lock = threading.Lock()
+    self.fields: int = 0
+    self.truncated: int = 0
+    self.dropped: int = 0
+    self.bytes_skipped: int = 0
+
+  def _keep(self, text: str) -> Optional[int]:
+    # Characters of text within the budget, None if all of it is
+    keep = len(text)
+    if self.max_chars is not None and keep > self.max_chars:
+      keep = self.max_chars
+    if self.max_bytes is not None and len(text) > self.max_bytes // 4:
+      encoded = text[:keep].encode("utf-8")
+      if len(encoded) > self.max_bytes:
+        # Cut at a character boundary
+        keep = len(encoded[:self.max_bytes].decode("utf-8", errors="ignore"))
+    return keep if keep < len(text) else None
+
+  def _apply_bytes(self, data: bytes) -> Optional[bytes]:
+    if self.max_bytes is None or len(data) <= self.max_bytes:
+      return data
+    with self._lock:
+      self.bytes_skipped += len(data)
+      self.dropped += 1
+    return None
+
+  def apply(self, text):
+    if text is None:
+      return None
+    with self._lock:
+      self.fields += 1
+    if isinstance(text, bytes):
+      return self._apply_bytes(text)
+    keep = self._keep(text)
+    if keep is None:
+      return text
+
+    if self.policy == BODY_POLICY_TRUNCATE:
+      omitted = text[keep:]
+      result = text[:keep] + "\n" + (self.marker % len(omitted))
+    elif self.policy == BODY_POLICY_SUMMARY:
+      omitted = text
+      result = self.marker % len(omitted)
+    else:
+      omitted = text
+      result = None
+
+    skipped = len(omitted.encode("utf-8"))
+    with self._lock:
+      self.bytes_skipped += skipped
+      if result is None:
+        self.dropped += 1
+      else:
+        self.truncated += 1
+    return result
+
+  def read(self, item, name: str = "Body"):
+    return self.apply(getattr(item, name, None))
+
+  def as_dict(self) -> dict:
+    with self._lock:
+      return {
+        "max_chars": self.max_chars,
+        "max_bytes": self.max_bytes,
+        "policy": self.policy,
+        "fields": self.fields,
+        "truncated": self.truncated,
+        "dropped": self.dropped,
+        "bytes_skipped": self.bytes_skipped,
+      }
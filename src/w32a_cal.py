@@ -1,14 +1,24 @@
+from __future__ import annotations
 from enum import IntEnum, IntFlag
 import datetime
-import dateutil.parser
-import pytz
-import icalendar
-
-from tzlocal.windows_tz import win_tz
 
 import logging
+import re
+
+from typing import Callable, Iterable, Optional
+
+import w32a_attendees
+import w32a_body
+import w32a_intern
+import w32a_metrics
+import w32a_tz
+from w32a_lazy import lazy_import
 
-from typing import Optional
+# Heavy dependencies are imported on first use, so importing this module stays cheap
+# for code paths that never parse dates or serialize.
+dateutil_parser = lazy_import("dateutil.parser")
+icalendar = lazy_import("icalendar")
+windows_tz = lazy_import("tzlocal.windows_tz")
 
 ICAL_FILTER_FULL={
   "summary": True, # or "subject"
@@ -31,6 +41,16 @@ OUTLOOK_DATETIME_FORMAT = '%m/%d/%Y %H:%M'
 OUTLOOK_DATE_FORMAT = '%m/%d/%Y'
 OUTLOOK_DATE_FORMAT2 = '%d/%m/%Y'
 
+# Conversion window (start, end), either bound may be None
+Window = tuple[Optional[datetime.datetime], Optional[datetime.datetime]]
+
+# How far a modified occurrence may have been moved from its original date and still be found by a window.
+# A day also covers OriginalDate values that are local time labeled as UTC.
+EXCEPTION_MARGIN_DEFAULT = datetime.timedelta(days=1)
+
+# Properties of a recurrence exception compared with its master by ExceptionDelta
+EXCEPTION_DELTA_PROPERTIES = ("Subject",)
+
 class CalendarDetail(IntEnum):
   olFreeBusyOnly = 0
   olFreeBusyAndSubject = 1
@@ -85,15 +105,36 @@ class DayOfWeekMaskEnum(IntFlag):
 
 
 def _win32_busystatus_to_ical(status: MeetingStatus) -> Optional[str]:
+  # Only free time is transparent, like Outlook's own export
   BusyStatus2Ical = {
     BusyStatus.FREE: "TRANSPARENT",
-    BusyStatus.TENTATIVE: "TRANSPARENT",
+    BusyStatus.TENTATIVE: "OPAQUE",
     BusyStatus.BUSY: "OPAQUE",
     BusyStatus.OUT_OF_OFFICE: "OPAQUE",
     BusyStatus.WORKING_ELSEWHERE: "OPAQUE",
   }
   return BusyStatus2Ical.get(status, None)
 
+# X-MICROSOFT-CDO-BUSYSTATUS values, Outlook exports carry the real busy status, TRANSP only distinguishes free and busy
+# https://learn.microsoft.com/en-us/openspecs/exchange_server_protocols/ms-oxcical/cd68eae7-ed65-4dd3-8ea7-ad585c76c736
+ICAL_BUSYSTATUS = {
+  "FREE": BusyStatus.FREE,
+  "TENTATIVE": BusyStatus.TENTATIVE,
+  "BUSY": BusyStatus.BUSY,
+  "OOF": BusyStatus.OUT_OF_OFFICE,
+  "WORKINGELSEWHERE": BusyStatus.WORKING_ELSEWHERE,
+}
+BUSYSTATUS_ICAL = {status: name for name, status in ICAL_BUSYSTATUS.items()}
+
+def ical_busy_status(ical_event) -> BusyStatus:
+  # Inverse of _win32_busystatus_to_ical: X-MICROSOFT-CDO-BUSYSTATUS, or TRANSP if it is missing
+  busy = ical_event.get('X-MICROSOFT-CDO-BUSYSTATUS', None)
+  if busy is not None and str(busy) in ICAL_BUSYSTATUS:
+    return ICAL_BUSYSTATUS[str(busy)]
+  if str(ical_event.get('TRANSP', "OPAQUE")) == "TRANSPARENT":
+    return BusyStatus.FREE
+  return BusyStatus.BUSY
+
 def _win32_meetingstatus_to_ical(status: MeetingStatus) -> Optional[str]:
   MeetingStatus2Ical = {
     MeetingStatus.NON_MEETING:   "TENTATIVE",
@@ -115,28 +156,61 @@ def _win32_recurrence_type_to_ical(rec_type: RecurrenceType) -> Optional[str]:
   }
   return RecurrenceType2Ical.get(rec_type, None)
 
+# OUTLOOK_DATETIME_FORMAT and OUTLOOK_DATE_FORMAT, month first like the dateutil default
+_OUTLOOK_DATETIME_RE = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4})(?: (\d{1,2}):(\d{2}))?")
+
+def _parse_win32_date(d, ignoretz: bool = False) -> datetime.datetime:
+  # pywin32 returns datetime objects and the mocks return Outlook formatted strings,
+  # both are handled without the generic (and slow) dateutil parser
+  if isinstance(d, datetime.datetime):
+    return d.replace(tzinfo=None) if ignoretz else d
+  d = str(d)
+  m = _OUTLOOK_DATETIME_RE.fullmatch(d)
+  if m is not None:
+    month, day, year, hour, minute = m.groups()
+    try:
+      return datetime.datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0))
+    except ValueError:
+      # e.g. day first dates, dateutil swaps day and month
+      pass
+  return dateutil_parser.parse(d, ignoretz=ignoretz)
+
 def win32_date_to_datetime(d: str, utc: bool = False, tz: Optional[datetime.tzinfo] = None) -> datetime.datetime:
-  if tz is None:
-    dt = dateutil.parser.parse(str(d))
-  else:
-    dt = dateutil.parser.parse(str(d), ignoretz=True)
-    dt = tz.localize(dt)
+  with w32a_metrics.get_sink().stage(w32a_metrics.STAGE_PARSE_DATE):
+    if tz is None:
+      dt = _parse_win32_date(d)
+    else:
+      dt = _parse_win32_date(d, ignoretz=True)
+      dt = w32a_tz.get_backend().localize(tz, dt)
 
-  if utc:
-    dt = dt.replace(tzinfo=pytz.utc)
+    if utc:
+      dt = dt.replace(tzinfo=w32a_tz.get_backend().utc)
 
   return dt
 
-def win32_tz_name_to_tz(w32_tz_name: str) -> Optional[datetime.tzinfo]:
-  tz_name: str | None = win_tz.get(w32_tz_name)
-  if tz_name is None:
-      # Nope, that didn't work. Try adding "Standard Time",
-      # it seems to work a lot of times:
-      tz_name = win_tz.get(w32_tz_name + " Standard Time")
-  if tz_name is None:
-    return None
+def win32_dates_to_datetimes(values: list) -> list[datetime.datetime]:
+  # Parses many dates at once, values that occur more than once are parsed once
+  with w32a_metrics.get_sink().stage(w32a_metrics.STAGE_PARSE_DATE):
+    parsed: dict = {}
+    result: list[datetime.datetime] = []
+    for d in values:
+      dt = parsed.get(d, None)
+      if dt is None:
+        dt = parsed[d] = _parse_win32_date(d)
+      result.append(dt)
+  return result
 
-  tz: datetime.tzinfo = pytz.timezone(tz_name)
+def win32_tz_name_to_tz(w32_tz_name: str) -> Optional[datetime.tzinfo]:
+  with w32a_metrics.get_sink().stage(w32a_metrics.STAGE_TZ):
+    tz_name: str | None = windows_tz.win_tz.get(w32_tz_name)
+    if tz_name is None:
+        # Nope, that didn't work. Try adding "Standard Time",
+        # it seems to work a lot of times:
+        tz_name = windows_tz.win_tz.get(w32_tz_name + " Standard Time")
+    if tz_name is None:
+      return None
+
+    tz: datetime.tzinfo = w32a_tz.get_backend().timezone(tz_name)
   return tz
 
 def win32_tz_to_tz(w32_tz) -> Optional[datetime.tzinfo]:
@@ -198,6 +272,51 @@ def _win32_importance_to_ical(win32_importance):
   else:
     return 6
 
+def _window_cmp(a: datetime.datetime, b: datetime.datetime) -> int:
+  # Naive Outlook dates (OriginalDate, PatternEndDate) cannot be compared with aware datetimes,
+  # compare them by day and treat the same day as equal: the window is never narrowed by a tz guess
+  if (a.tzinfo is None) != (b.tzinfo is None):
+    a, b = a.date(), b.date()
+  return (a > b) - (a < b)
+
+def window_overlaps(window: Optional[Window], start: datetime.datetime, end: Optional[datetime.datetime] = None) -> bool:
+  if window is None:
+    return True
+  window_start, window_end = window
+  if end is None:
+    end = start
+  if window_start is not None and _window_cmp(end, window_start) < 0:
+    return False
+  if window_end is not None and _window_cmp(start, window_end) > 0:
+    return False
+  return True
+
+# Longest time between two occurrences of a series with interval 1, by recurrence type
+_RECURRENCE_PERIOD = {
+  RecurrenceType.DAILY: datetime.timedelta(days=1),
+  RecurrenceType.WEEKLY: datetime.timedelta(weeks=1),
+  RecurrenceType.MONTHLY: datetime.timedelta(days=31),
+  RecurrenceType.MONTHLY_NTH: datetime.timedelta(days=31),
+  RecurrenceType.YEARLY: datetime.timedelta(days=366),
+  RecurrenceType.YEARLY_NTH: datetime.timedelta(days=366),
+}
+
+def win32_recurrence_end(win32_recurrence, start: Optional[datetime.datetime] = None) -> Optional[datetime.datetime]:
+  # Day of the last occurrence (at the latest), None if the series has no end or it is not known.
+  # A series that ends after a number of occurrences (COUNT) without PatternEndDate is bounded from start:
+  # every period of the pattern has at least one occurrence.
+  # https://learn.microsoft.com/en-us/office/vba/api/outlook.recurrencepattern.patternenddate
+  # https://learn.microsoft.com/en-us/office/vba/api/outlook.recurrencepattern.occurrences
+  if win32_recurrence.NoEndDate:
+    return None
+  if getattr(win32_recurrence, "PatternEndDate", None) is not None:
+    return win32_date_to_datetime(win32_recurrence.PatternEndDate)
+  occurrences = getattr(win32_recurrence, "Occurrences", None)
+  period = _RECURRENCE_PERIOD.get(getattr(win32_recurrence, "RecurrenceType", None), None)
+  if start is None or not occurrences or period is None:
+    return None
+  return start + period * (max(win32_recurrence.Interval or 1, 1) * occurrences)
+
 def _win32_event_recurrence_to_rrule_dict(win32_event, app_tz: Optional[datetime.tzinfo] = None) -> dict:
   # https://icalendar.org/rrule-tool.html
   # DTSTART is defined in the Event, so we do not need it here
@@ -205,7 +324,7 @@ def _win32_event_recurrence_to_rrule_dict(win32_event, app_tz: Optional[datetime
   if app_tz is None:
     app_tz = win32_tz_to_tz(win32_event.StartTimeZone)
   if app_tz is None:
-    app_tz = pytz.utc
+    app_tz = w32a_tz.get_backend().utc
 
   if not win32_event.IsRecurring or win32_event.RecurrenceState != RecurrenceState.MASTER:
     return {}
@@ -277,6 +396,14 @@ def win32_get_ical_from_ol_export(win32_calendar_folder,
   import tempfile
   cal_exporter = win32_calendar_folder.GetCalendarExporter()
   cal_exporter.CalendarDetail = calendar_details
+  # https://learn.microsoft.com/en-us/office/vba/api/outlook.calendarsharing.startdate
+  # https://learn.microsoft.com/en-us/office/vba/api/outlook.calendarsharing.includewholecalendar
+  if start is not None or end is not None:
+    cal_exporter.IncludeWholeCalendar = False
+    if start is not None:
+      cal_exporter.StartDate = start.strftime(OUTLOOK_DATETIME_FORMAT)
+    if end is not None:
+      cal_exporter.EndDate = end.strftime(OUTLOOK_DATETIME_FORMAT)
   cal_exporter.SaveAsICal(fpath)
 
   ical = None
@@ -293,116 +420,469 @@ def win32_get_ical_from_ol_export(win32_calendar_folder,
   return ical
 
 
-def win32_event_to_ical(win32_event, parse_recurrence: bool = True, filter: Optional[dict] = None,
-                        app_tz: Optional[datetime.tzinfo] = None) -> list[icalendar.Event]:
-  import pytz
-  import icalendar
-  event_list: list[icalendar.Event] = []
-  ical_event:icalendar.Event = icalendar.Event()
-
-  # Recurrences should not have different UID
-  # with GlobalAppointmentId recurrence exceptions may have different UID!
-  # GlobalAppointmentId # https://docs.microsoft.com/en-us/office/vba/api/outlook.appointmentitem.globalappointmentid
-  # https://docs.microsoft.com/en-us/office/vba/api/outlook.appointmentitem.entryid
-  ical_event.add('UID', win32_event.EntryID)
+class EventRecord:
+  # Converted Outlook item, independent of icalendar.
+  # The converter produces records, they are lowered to icalendar.Event (or bytes) only when written.
+  __slots__ = ("uid", "start", "end", "duration", "all_day", "created", "last_modified",
+               "summary", "description", "organizer", "busy_status", "meeting_status", "location", "categories",
+               "attendees", "importance", "rrule", "exdates", "recurrence_id", "sequence")
+
+  def __init__(self, uid: str, start: datetime.datetime,
+               end: Optional[datetime.datetime] = None,
+               duration: Optional[datetime.timedelta] = None,
+               all_day: bool = False,
+               created: Optional[datetime.datetime] = None,
+               last_modified: Optional[datetime.datetime] = None,
+               summary: str = "",
+               description: Optional[str] = None,
+               organizer: Optional[str] = None,
+               busy_status: Optional[BusyStatus] = None,
+               meeting_status: Optional[MeetingStatus] = None,
+               location: Optional[str] = None,
+               categories: Optional[str] = None,
+               attendees: Optional[tuple] = None,
+               importance: Optional[Importance] = None,
+               rrule: Optional[tuple] = None,
+               exdates: tuple = (),
+               recurrence_id: Optional[datetime.datetime] = None,
+               sequence: int = 1) -> None:
+    self.uid: str = uid
+    self.start: datetime.datetime = start
+    self.end: Optional[datetime.datetime] = end
+    # Outlook Duration, written as DURATION instead of DTEND if set
+    self.duration: Optional[datetime.timedelta] = duration
+    self.all_day: bool = all_day
+    self.created: Optional[datetime.datetime] = created
+    self.last_modified: Optional[datetime.datetime] = last_modified
+    self.summary: str = summary
+    # None if the property is filtered or not set on the item
+    self.description: Optional[str] = description
+    self.organizer: Optional[str] = organizer
+    self.busy_status: Optional[BusyStatus] = busy_status
+    self.meeting_status: Optional[MeetingStatus] = meeting_status
+    self.location: Optional[str] = location
+    self.categories: Optional[str] = categories
+    # w32a_attendees.Attendee tuples, each event gets its own vCalAddress objects
+    self.attendees: Optional[tuple] = attendees
+    self.importance: Optional[Importance] = importance
+    # RRULE as a tuple of (key, value) pairs, see freeze_rrule()
+    self.rrule: Optional[tuple] = rrule
+    self.exdates: tuple = exdates
+    # Original start of a recurrence exception
+    self.recurrence_id: Optional[datetime.datetime] = recurrence_id
+    self.sequence: int = sequence
+
+  @property
+  def is_master(self) -> bool:
+    return self.rrule is not None
+
+  @property
+  def is_exception(self) -> bool:
+    return self.recurrence_id is not None
+
+  def rrule_dict(self) -> Optional[dict]:
+    if self.rrule is None:
+      return None
+    return {key: list(value) if isinstance(value, tuple) else value for key, value in self.rrule}
+
+  def to_ical(self, intern_pool: Optional[w32a_intern.InternPool] = None) -> icalendar.Event:
+    # With intern_pool, repeated property values (SUMMARY, LOCATION, RRULE, ...) are shared between events
+    value = intern_pool.ical_value if intern_pool is not None else _ical_value
+    ical_event: icalendar.Event = icalendar.Event()
+    ical_event.add('UID', self.uid)
+
+    if self.all_day:
+      ical_event.add("DTSTART", self.start.date())
+    else:
+      ical_event.add("DTSTART", self.start)
+
+    if self.created is not None:
+      ical_event.add('DTSTAMP', self.created)
+      ical_event.add('CREATED', self.created)
+    if self.last_modified is not None:
+      ical_event.add('LAST-MODIFIED', self.last_modified)
+
+    # DTEND and DURATION properties must not occur in the same VEVENT Reference: RFC 5545 3.6.1. Event Component
+    # http://icalendar.org/iCalendar-RFC-5545/3-6-1-event-component.html
+    if self.duration is not None:
+      ical_event.add('DURATION', self.duration)
+    elif self.all_day:
+      # TODO: set it https://github.com/icalendar/icalendar/issues/71
+      ical_event.add("DTEND", self.end.date())
+    else:
+      ical_event.add("DTEND", self.end)
+
+    ical_event.add('SUMMARY', value('SUMMARY', self.summary))
+    if self.description is not None:
+      ical_event.add('DESCRIPTION', self.description)
+    if self.organizer is not None:
+      ical_event.add('ORGANIZER', value('ORGANIZER', self.organizer))
+    if self.busy_status is not None:
+      ical_event.add('TRANSP', value('TRANSP', _win32_busystatus_to_ical(self.busy_status)))
+      if self.busy_status in BUSYSTATUS_ICAL:
+        ical_event.add('X-MICROSOFT-CDO-BUSYSTATUS', value('X-MICROSOFT-CDO-BUSYSTATUS', BUSYSTATUS_ICAL[self.busy_status]))
+    if self.meeting_status is not None:
+      ical_event.add('STATUS', value('STATUS', _win32_meetingstatus_to_ical(self.meeting_status)))
+    if self.location is not None:
+      ical_event.add('LOCATION', value('LOCATION', self.location))
+    if self.categories is not None:
+      ical_event.add('CATEGORIES', value('CATEGORIES', self.categories))
+    if self.attendees is not None:
+      w32a_attendees.set_attendee_property(ical_event, self.attendees)
+    if self.importance is not None:
+      ical_event.add('PRIORITY', _win32_importance_to_ical(self.importance))
+
+    if self.rrule is not None:
+      ical_event.add("RRULE", value("RRULE", self.rrule, lambda: icalendar.vRecur(self.rrule_dict())))
+    if self.exdates:
+      ical_event.add("EXDATE", list(self.exdates), parameters={'VALUE':'DATE-TIME'})
+
+    ical_event.add('SEQUENCE', self.sequence)
+
+    if self.recurrence_id is not None:
+      ical_event.add("RECURRENCE-ID", icalendar.vDatetime(self.recurrence_id))
+    return ical_event
+
+  def to_bytes(self, intern_pool: Optional[w32a_intern.InternPool] = None) -> bytes:
+    return self.to_ical(intern_pool).to_ical()
+
+  def __repr__(self) -> str:
+    return "<EventRecord %s %s>" % (self.uid, self.start.isoformat())
+
+
+def _ical_value(name: str, value, factory=None):
+  # EventRecord.to_ical without intern pool: Event.add() encodes the plain value
+  return factory() if factory is not None else value
+
+def freeze_rrule(rrule_dict: dict) -> tuple:
+  # Hashable form of an RRULE dict: lists become tuples
+  return tuple((key, tuple(value) if isinstance(value, list) else value) for key, value in rrule_dict.items())
+
+def records_to_ical(records: list[EventRecord], intern_pool: Optional[w32a_intern.InternPool] = None) -> list[icalendar.Event]:
+  return [record.to_ical(intern_pool) for record in records]
+
+def win32_event_to_records(win32_event, parse_recurrence: bool = True, filter: Optional[dict] = None,
+                           app_tz: Optional[datetime.tzinfo] = None,
+                           attendee_cache: Optional[w32a_attendees.AttendeeCache] = None,
+                           body_budget: Optional[w32a_body.BodyBudget] = None,
+                           window: Optional[Window] = None,
+                           intern_pool: Optional[w32a_intern.InternPool] = None,
+                           exception_delta: Optional[ExceptionDelta] = None,
+                           exception_margin: datetime.timedelta = EXCEPTION_MARGIN_DEFAULT) -> list[EventRecord]:
+  # window=(start, end) skips items, series and recurrence exceptions outside of it,
+  # so the cost scales with the requested range instead of the calendar's lifetime.
+  # The RRULE of an emitted master is not clamped: it keeps every deleted and modified occurrence as
+  # EXDATE or RECURRENCE-ID, modified occurrences outside of the window become EXDATEs.
+  # A modified occurrence is only read if its original date is within exception_margin of the window,
+  # then it is placed by its actual times; one moved further into the window is not found.
+  # exception_delta converts modified occurrences relative to their master, see ExceptionDelta.
+  if attendee_cache is None:
+    attendee_cache = w32a_attendees.get_attendee_cache()
+  if intern_pool is None:
+    intern_pool = w32a_intern.get_intern_pool()
+
+  sink = w32a_metrics.get_sink()
+  if not sink.enabled:
+    return _win32_event_to_records(win32_event, parse_recurrence=parse_recurrence, filter=filter, app_tz=app_tz,
+                                   attendee_cache=attendee_cache, body_budget=body_budget, window=window,
+                                   intern_pool=intern_pool, exception_delta=exception_delta,
+                                   exception_margin=exception_margin)
+
+  with sink.event(str(win32_event.EntryID)) as timer:
+    records = _win32_event_to_records(win32_event, parse_recurrence=parse_recurrence, filter=filter, app_tz=app_tz,
+                                      attendee_cache=attendee_cache, body_budget=body_budget, window=window,
+                                      intern_pool=intern_pool, exception_delta=exception_delta,
+                                      exception_margin=exception_margin)
+    # Known from the result, without another COM round trip
+    if records and records[0].rrule is not None:
+      timer.kind = w32a_metrics.EVENT_MASTER
+  sink.count("items")
+  sink.count("events", len(records))
+  return records
 
-  start_tz = win32_tz_to_tz(win32_event.StartTimeZone)
+def win32_event_to_ical(win32_event, parse_recurrence: bool = True, filter: Optional[dict] = None,
+                        app_tz: Optional[datetime.tzinfo] = None,
+                        attendee_cache: Optional[w32a_attendees.AttendeeCache] = None,
+                        body_budget: Optional[w32a_body.BodyBudget] = None,
+                        window: Optional[Window] = None,
+                        intern_pool: Optional[w32a_intern.InternPool] = None,
+                        exception_delta: Optional[ExceptionDelta] = None,
+                        exception_margin: datetime.timedelta = EXCEPTION_MARGIN_DEFAULT) -> list[icalendar.Event]:
+  # Property values repeated across events (SUMMARY, RRULE, ...) are shared between the events only through
+  # an intern_pool passed by the caller; without one, the strings of the records are interned in the
+  # process-wide pool and every event gets its own property values.
+  records = win32_event_to_records(win32_event, parse_recurrence=parse_recurrence, filter=filter, app_tz=app_tz,
+                                   attendee_cache=attendee_cache, body_budget=body_budget, window=window,
+                                   intern_pool=intern_pool, exception_delta=exception_delta,
+                                   exception_margin=exception_margin)
+  return records_to_ical(records, intern_pool)
+
+def _win32_tz_to_tz_cached(w32_tz, tz_cache: dict,
+                           intern_pool: Optional[w32a_intern.InternPool] = None) -> Optional[datetime.tzinfo]:
+  tz_id = w32_tz.ID
+  if tz_id not in tz_cache:
+    tz = win32_tz_name_to_tz(tz_id)
+    if intern_pool is not None:
+      # Backends that build a new tzinfo per lookup still end up with one object per zone
+      tz = intern_pool.intern(tz)
+    tz_cache[tz_id] = tz
+  return tz_cache[tz_id]
+
+class ExceptionDelta:
+  # Converts modified occurrences relative to their master. Only Start, End, LastModificationTime and
+  # the compared properties are read from the AppointmentItem of an exception; if none of them differs
+  # from the master (and compare(master_item, exception_item) does not return True), all other values are
+  # inherited from the converted master. Otherwise the exception is converted in full.
+  # A change of a property that is not compared (e.g. only the location of one occurrence) is not seen.
+
+  def __init__(self, properties: Iterable[str] = EXCEPTION_DELTA_PROPERTIES,
+               compare: Optional[Callable[[object, object], bool]] = None) -> None:
+    self.properties: tuple[str, ...] = tuple(properties)
+    self.compare: Optional[Callable[[object, object], bool]] = compare
+
+  def master_values(self, win32_event) -> dict:
+    return {name: getattr(win32_event, name, None) for name in self.properties}
+
+  def differs(self, master_values: dict, win32_event, ex_item) -> bool:
+    for name in self.properties:
+      if getattr(ex_item, name, None) != master_values[name]:
+        return True
+    return self.compare is not None and bool(self.compare(win32_event, ex_item))
+
+def _win32_exception_delta_record(ex_item, master_record: EventRecord,
+                                  start_tz: Optional[datetime.tzinfo], end_tz: Optional[datetime.tzinfo],
+                                  intern_pool: Optional[w32a_intern.InternPool] = None) -> EventRecord:
+  # Exception record from the times of ex_item and the values of its master; the time zones are the master's
+  start = win32_date_to_datetime(ex_item.Start, tz=start_tz) if (start_tz is not None) else win32_date_to_datetime(ex_item.StartUTC, utc=True)
+  end = None
+  if master_record.end is not None:
+    end = win32_date_to_datetime(ex_item.End, tz=end_tz) if (end_tz is not None) else win32_date_to_datetime(ex_item.EndUTC, utc=True)
+
+  record = EventRecord(master_record.uid, start, end=end, all_day=master_record.all_day,
+                       created=master_record.created,
+                       last_modified=win32_date_to_datetime(ex_item.LastModificationTime, utc=True))
+  # Outlook's Duration of an occurrence is End - Start
+  if master_record.duration is not None:
+    record.duration = (end - start) if end is not None else master_record.duration
+  for name in ("summary", "description", "organizer", "busy_status", "meeting_status", "location", "categories",
+               "attendees", "importance"):
+    setattr(record, name, getattr(master_record, name))
+  if intern_pool is not None:
+    record.summary = intern_pool.intern(record.summary)
+    record.organizer = intern_pool.intern(record.organizer)
+    record.location = intern_pool.intern(record.location)
+    record.categories = intern_pool.intern(record.categories)
+  return record
+
+def index_win32_exceptions(win32_recurrence) -> dict[datetime.datetime, object]:
+  # Reads RecurrencePattern.Exceptions once and indexes the exceptions by the original date and time of the
+  # occurrence; series that recur more than once a day can have several exceptions on the same day
+  # https://learn.microsoft.com/en-us/office/vba/api/outlook.exception.originaldate
+  exceptions = list(win32_recurrence.Exceptions)
+  original_dates = win32_dates_to_datetimes([ex.OriginalDate for ex in exceptions])
+  return {original: ex for original, ex in zip(original_dates, exceptions)}
+
+def _win32_exception_times(ex_item, occurrence_length: datetime.timedelta) -> tuple[datetime.datetime, datetime.datetime]:
+  # Actual start and end of a modified occurrence in UTC, without converting it
+  start = win32_date_to_datetime(ex_item.StartUTC, utc=True)
+  end_utc = getattr(ex_item, "EndUTC", None)
+  return start, (win32_date_to_datetime(end_utc, utc=True) if end_utc is not None else start + occurrence_length)
+
+def _win32_exceptions_to_records(win32_event, win32_recurrence, occurrence_length: datetime.timedelta,
+                                 filter: Optional[dict] = None,
+                                 app_tz: Optional[datetime.tzinfo] = None,
+                                 attendee_cache: Optional[w32a_attendees.AttendeeCache] = None,
+                                 body_budget: Optional[w32a_body.BodyBudget] = None,
+                                 master_attendees: Optional[tuple[str, str, tuple]] = None,
+                                 window: Optional[Window] = None,
+                                 tz_cache: Optional[dict] = None,
+                                 intern_pool: Optional[w32a_intern.InternPool] = None,
+                                 exception_delta: Optional[ExceptionDelta] = None,
+                                 master_record: Optional[EventRecord] = None,
+                                 master_tz: tuple = (None, None),
+                                 exception_margin: datetime.timedelta = EXCEPTION_MARGIN_DEFAULT) -> tuple[list[EventRecord], list[datetime.datetime], int]:
+  # Recurrence exceptions of a master: RECURRENCE-ID records for modified occurrences and the EXDATE list
+  # of deleted occurrences. Returns the records, the EXDATE list and the number of exceptions.
+  # With exception_delta and master_record, modified occurrences are converted relative to the master.
+  index = index_win32_exceptions(win32_recurrence)
+  sink = w32a_metrics.get_sink()
+  master_values = None
+  if exception_delta is not None and master_record is not None:
+    master_values = exception_delta.master_values(win32_event)
+  uid = win32_event.EntryID
+  utc = w32a_tz.get_backend().utc
+
+  records: list[EventRecord] = []
+  exdate_list: list[datetime.datetime] = []
+  for original_date, ex in index.items():
+    # We have to add the timezone or else, the recurrence-id does not match with the original ical date
+    # -> without tz UTC, this would result in missing "Z" at the end of the datetime string
+    exdate_datetime = original_date.replace(tzinfo=utc)
+
+    # Occurrences far from the window are excluded from the RRULE of the master without reading their
+    # AppointmentItem, which would otherwise produce the original occurrence
+    if window is not None and not window_overlaps(window, original_date - exception_margin,
+                                                  original_date + occurrence_length + exception_margin):
+      exdate_list.append(exdate_datetime)
+      continue
+
+    # AppointmentItem must not be read for deleted occurrences
+    ex_item = None if ex.Deleted else ex.AppointmentItem
+    if ex_item is None:
+      exdate_list.append(exdate_datetime)
+      continue
+
+    # Near the window, a modified occurrence is placed by its actual times: it may have been moved
+    # into or out of the window
+    if window is not None and not window_overlaps(window, *_win32_exception_times(ex_item, occurrence_length)):
+      exdate_list.append(exdate_datetime)
+      continue
+
+    with sink.exception(uid):
+      if master_values is not None and not exception_delta.differs(master_values, win32_event, ex_item):
+        ex_record = _win32_exception_delta_record(ex_item, master_record, master_tz[0], master_tz[1], intern_pool)
+        sink.count("exceptions_delta")
+      else:
+        logging.debug("Parsing recurrence exception event")
+        # parse_recurrence must be False to avoid potential recursion!
+        ex_record = _win32_event_to_records(ex_item, parse_recurrence=False, filter=filter, app_tz=app_tz,
+                                            attendee_cache=attendee_cache, body_budget=body_budget,
+                                            master_attendees=master_attendees, uid=uid, tz_cache=tz_cache,
+                                            intern_pool=intern_pool)[0]
+    ex_record.recurrence_id = exdate_datetime
+    records.append(ex_record)
+
+  return records, exdate_list, len(index)
+
+def _win32_event_to_records(win32_event, parse_recurrence: bool = True, filter: Optional[dict] = None,
+                            app_tz: Optional[datetime.tzinfo] = None,
+                            attendee_cache: Optional[w32a_attendees.AttendeeCache] = None,
+                            body_budget: Optional[w32a_body.BodyBudget] = None,
+                            master_attendees: Optional[tuple[str, str, tuple]] = None,
+                            window: Optional[Window] = None,
+                            uid: Optional[str] = None,
+                            tz_cache: Optional[dict] = None,
+                            intern_pool: Optional[w32a_intern.InternPool] = None,
+                            exception_delta: Optional[ExceptionDelta] = None,
+                            exception_margin: datetime.timedelta = EXCEPTION_MARGIN_DEFAULT) -> list[EventRecord]:
+  records: list[EventRecord] = []
+
+  # Time zones by Outlook ID, shared by a master and its exceptions
+  if tz_cache is None:
+    tz_cache = {}
+
+  start_tz = _win32_tz_to_tz_cached(win32_event.StartTimeZone, tz_cache, intern_pool)
 
   if app_tz is None:
     app_tz = start_tz
 
   # TODO: raise Error perhaps?
   if app_tz is None:
-    app_tz = pytz.utc
+    app_tz = w32a_tz.get_backend().utc
 
 
   start = win32_date_to_datetime(win32_event.Start, tz=start_tz) if (start_tz is not None) else win32_date_to_datetime(win32_event.StartUTC, utc=True)
 
+  end_tz = None
   if getattr(win32_event, "End", None) is not None:
-    end_tz = win32_tz_to_tz(win32_event.EndTimeZone)
+    end_tz = _win32_tz_to_tz_cached(win32_event.EndTimeZone, tz_cache, intern_pool)
     end = win32_date_to_datetime(win32_event.End, tz=end_tz) if (end_tz is not None) else win32_date_to_datetime(win32_event.EndUTC, utc=True)
   else:
     end = None
 
-  if getattr(win32_event, "AllDayEvent", False):
-    ical_event.add("DTSTART", start.date())
+  if getattr(win32_event, "Duration", None):
+    occurrence_length = datetime.timedelta(minutes=win32_event.Duration)
   else:
-    ical_event.add("DTSTART", start)
+    occurrence_length = (end - start) if end is not None else datetime.timedelta()
+
+  # Items outside of the window are skipped before any other property is read
+  is_master = parse_recurrence and win32_event.IsRecurring and win32_event.RecurrenceState == RecurrenceState.MASTER
+  if window is not None:
+    if is_master:
+      # A series is skipped if it starts after the window or its last occurrence ends before it
+      window_start, window_end = window
+      if window_end is not None and _window_cmp(start, window_end) > 0:
+        return []
+      series_end = win32_recurrence_end(win32_event.GetRecurrencePattern(), start)
+      if series_end is not None and window_start is not None and _window_cmp(series_end + occurrence_length, window_start) < 0:
+        return []
+    elif not window_overlaps(window, start, start + occurrence_length):
+      return []
+
+  # Recurrences should not have different UID
+  # with GlobalAppointmentId recurrence exceptions may have different UID!
+  # GlobalAppointmentId # https://docs.microsoft.com/en-us/office/vba/api/outlook.appointmentitem.globalappointmentid
+  # https://docs.microsoft.com/en-us/office/vba/api/outlook.appointmentitem.entryid
+  # Recurrence exceptions are given the UID of their master
+  record = EventRecord(uid if uid is not None else win32_event.EntryID, start, end=end,
+                       all_day=bool(getattr(win32_event, "AllDayEvent", False)))
 
   # https://icalendar.org/iCalendar-RFC-5545/3-8-7-1-date-time-created.html
   # https://icalendar.org/iCalendar-RFC-5545/3-8-7-2-date-time-stamp.html
-  if getattr(win32_event, "CreationTime", None) is not None:
-    ical_event.add('DTSTAMP', win32_date_to_datetime(win32_event.CreationTime, utc=True))
-    ical_event.add('CREATED', win32_date_to_datetime(win32_event.CreationTime, utc=True))
+  creation_time = getattr(win32_event, "CreationTime", None)
+  if creation_time is not None:
+    record.created = win32_date_to_datetime(creation_time, utc=True)
 
   # https://icalendar.org/iCalendar-RFC-5545/3-8-7-3-last-modified.html
-  ical_event.add('LAST-MODIFIED', win32_date_to_datetime(win32_event.LastModificationTime, utc=True))
+  record.last_modified = win32_date_to_datetime(win32_event.LastModificationTime, utc=True)
 
-  # DTEND and DURATION properties must not occur in the same VEVENT Reference: RFC 5545 3.6.1. Event Component
-  # http://icalendar.org/iCalendar-RFC-5545/3-6-1-event-component.html
   if getattr(win32_event, "Duration", 0) is not None and win32_event.Duration > 0:
-    ical_event.add('DURATION', datetime.timedelta(minutes = win32_event.Duration))
-  else:
-    if getattr(win32_event, "AllDayEvent", False):
-      # TODO: set it https://github.com/icalendar/icalendar/issues/71
-      ical_event.add("DTEND", end.date())
-    else:
-      ical_event.add("DTEND", end)
+    record.duration = datetime.timedelta(minutes = win32_event.Duration)
 
 
   if filter is None or filter.get("summary", False) or filter.get("subject", False):
     # string
-    ical_event.add('SUMMARY', win32_event.Subject)
+    record.summary = win32_event.Subject
   else:
-    ical_event.add('SUMMARY', "Event")
+    record.summary = "Event"
 
   if filter is None or filter.get("description", False) or filter.get("body", False):
-    # string
-    if getattr(win32_event, "Body", None) is not None:
-      ical_event.add('DESCRIPTION', win32_event.Body)
+    # string, can be megabytes: read it once and cap it with the body budget
+    body = getattr(win32_event, "Body", None)
+    if body_budget is not None:
+      body = body_budget.apply(body)
+    record.description = body
 
   if filter is None or filter.get("organizer", False):
     # string
-    if getattr(win32_event, "Organizer", None) is not None:
-      ical_event.add('ORGANIZER', win32_event.Organizer)
+    record.organizer = getattr(win32_event, "Organizer", None)
 
   if filter is None or filter.get("transp", False) or filter.get("busy", False):
     # https://docs.microsoft.com/en-us/office/vba/api/outlook.olbusystatus
-    if getattr(win32_event, "BusyStatus", None) is not None:
-      ical_event.add('TRANSP', _win32_busystatus_to_ical(win32_event.BusyStatus))
+    record.busy_status = getattr(win32_event, "BusyStatus", None)
 
   if filter is None or filter.get("status", False) or filter.get("meetingstatus", False):
     # https://docs.microsoft.com/en-us/office/vba/api/outlook.olmeetingstatus
-    if getattr(win32_event, "MeetingStatus", None) is not None:
-      ical_event.add('STATUS', _win32_meetingstatus_to_ical(win32_event.MeetingStatus))
+    record.meeting_status = getattr(win32_event, "MeetingStatus", None)
 
   if filter is None or filter.get("location", False):
     # string
-    if getattr(win32_event, "Location", None) is not None:
-      ical_event.add('LOCATION', win32_event.Location)
+    record.location = getattr(win32_event, "Location", None)
 
   if filter is None or filter.get("categories", False):
     # string
-    if getattr(win32_event, "Categories", None) is not None:
-      ical_event.add('CATEGORIES', win32_event.Categories)
+    record.categories = getattr(win32_event, "Categories", None)
 
   if filter is None or filter.get("attendees", False):
     # str, semicolon delimited
     # https://learn.microsoft.com/en-us/office/vba/api/outlook.appointmentitem.requiredattendees
-    required_attendees_str = getattr(win32_event, "RequiredAttendees", "")
-    optional_attendees_str = getattr(win32_event, "OptionalAttendees", "")
+    required_attendees_str = getattr(win32_event, "RequiredAttendees", "") or ""
+    optional_attendees_str = getattr(win32_event, "OptionalAttendees", "") or ""
 
-    for attendee in required_attendees_str.split(";"):
-      if attendee:
-        ical_event.add('ATTENDEE', attendee, parameters={'ROLE':'REQ-PARTICIPANT'})
-    for attendee in optional_attendees_str.split(";"):
-      if attendee:
-        ical_event.add('ATTENDEE', attendee)
+    # Recurrence exceptions usually have the same attendees as their master, reuse its result
+    if (master_attendees is not None
+        and master_attendees[0] == required_attendees_str and master_attendees[1] == optional_attendees_str):
+      attendees = master_attendees[2]
+    else:
+      if attendee_cache is None:
+        attendee_cache = w32a_attendees.get_attendee_cache()
+      attendees = attendee_cache.attendees(required_attendees_str, optional_attendees_str)
+    master_attendees = (required_attendees_str, optional_attendees_str, attendees)
+    record.attendees = attendees
 
   if filter is None or filter.get("priority", False) or filter.get("importance", False):
     # https://learn.microsoft.com/en-us/office/vba/api/outlook.appointmentitem.importance
-    if getattr(win32_event, "Importance", None) is not None:
-      ical_event.add('PRIORITY', _win32_importance_to_ical(win32_event.Importance))
+    record.importance = getattr(win32_event, "Importance", None)
 
   # recurrence
   sequence = 1
@@ -414,37 +894,33 @@ def win32_event_to_ical(win32_event, parse_recurrence: bool = True, filter: Opti
 
     if win32_event.IsRecurring and win32_event.RecurrenceState == RecurrenceState.MASTER:
 
-      ical_event.add("RRULE", _win32_event_recurrence_to_rrule_dict(win32_event, app_tz=app_tz))
+      sink = w32a_metrics.get_sink()
+      with sink.stage(w32a_metrics.STAGE_RECURRENCE):
+        record.rrule = freeze_rrule(_win32_event_recurrence_to_rrule_dict(win32_event, app_tz=app_tz))
+        if intern_pool is not None:
+          record.rrule = intern_pool.intern(record.rrule)
 
       win32_recurrence = win32_event.GetRecurrencePattern()
       if win32_recurrence is not None:
-        exdate_list: list[datetime.datetime] = []
-        for ex in win32_recurrence.Exceptions:
-          exdate_datetime: datetime.datetime = datetime.datetime.combine(win32_date_to_datetime(ex.OriginalDate).date(),
-                                                                        win32_date_to_datetime(win32_event.Start).time(), tzinfo=app_tz)
-          # We have to add the timezone or else, the recurrence-id does not match with the original ical date
-          # -> without tz UTC, this would result in missing "Z" at the end of the datetime string
-          exdate_datetime = exdate_datetime.replace(tzinfo=pytz.utc)
-          exdate_vdate = icalendar.vDatetime(exdate_datetime)
-          if not ex.Deleted:
-            logging.debug("Parsing recurrence exception event")
-            if ex.AppointmentItem is not None:
-              # parse_recurrence must be False to avoid potential recursion!
-              ex_ical_event = win32_event_to_ical(ex.AppointmentItem, parse_recurrence=False, filter=filter, app_tz=app_tz)[0]
-              ex_ical_event.add("RECURRENCE-ID", exdate_vdate)
-              if ex_ical_event.get('UID') != ical_event.get('UID'):
-                logging.warning("Event and recurrence exception have different UID: %s <> %s", ical_event.decoded('UID').decode(), ex_ical_event.decoded('UID').decode())
-                ex_ical_event['UID'] = win32_event.EntryID
-              event_list.append(ex_ical_event)
-            else: # Deleted
-              exdate_list.append(exdate_datetime)
-          sequence += 1
-
-        if len(exdate_list) > 0:
-          ical_event.add("EXDATE", exdate_list, parameters={'VALUE':'DATE-TIME'})
-
-  ical_event.add('SEQUENCE', sequence)
-
-  event_list.insert(0, ical_event)
-
-  return event_list
\ No newline at end of file
+        with sink.stage(w32a_metrics.STAGE_EXCEPTIONS):
+          exception_records, exdate_list, exception_count = _win32_exceptions_to_records(
+            win32_event, win32_recurrence, occurrence_length, filter=filter, app_tz=app_tz,
+            attendee_cache=attendee_cache, body_budget=body_budget, master_attendees=master_attendees,
+            window=window, tz_cache=tz_cache, intern_pool=intern_pool, exception_delta=exception_delta,
+            master_record=record, master_tz=(start_tz, end_tz), exception_margin=exception_margin)
+          records.extend(exception_records)
+          sequence += exception_count
+          record.exdates = tuple(exdate_list)
+
+  record.sequence = sequence
+
+  # Repeated strings of the record are shared with the other records of the pool
+  if intern_pool is not None:
+    record.summary = intern_pool.intern(record.summary)
+    record.organizer = intern_pool.intern(record.organizer)
+    record.location = intern_pool.intern(record.location)
+    record.categories = intern_pool.intern(record.categories)
+
+  records.insert(0, record)
+
+  return records
@@ -0,0 +1,349 @@
+# Command line export of Outlook calendar folders.
+# Run from the src directory, e.g.:
+#   python -m w32a_cli --folder Calendar --folder Team/Rooms --start 2024-01-01 --workers 4 -o calendar.ics.gz
+#   python -m w32a_cli --mock samples/test.ics --format jcal -o -
+from typing import BinaryIO, Callable, Optional
+import argparse
+import contextlib
+import datetime
+import logging
+import sys
+import threading
+import time
+
+import ical_diff
+import ical_emit
+import ical_import
+import ical_spill
+import ical_vtimezone
+import w32a_cal
+import w32a_export
+import w32a_memprof
+import w32a_metrics
+import w32a_pipeline
+import w32a_state
+from w32obj import W32Folder
+
+FILTER_PRESETS = {
+  "full": w32a_cal.ICAL_FILTER_FULL,
+  "safe": w32a_cal.ICAL_FILTER_SAFE,
+}
+
+# Seconds between two progress lines
+PROGRESS_INTERVAL = 0.5
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+STAGES = (
+  w32a_metrics.STAGE_FETCH, w32a_metrics.STAGE_PARSE_DATE, w32a_metrics.STAGE_TZ, w32a_metrics.STAGE_RECURRENCE,
+  w32a_metrics.STAGE_EXCEPTIONS, w32a_metrics.STAGE_SERIALIZE,
+)
+
+
+def parse_size(value: str) -> int:
+  # 1048576, 512K, 64M, 1G
+  value = value.strip().upper().rstrip("B")
+  unit = value[-1:] if value[-1:] in SIZE_UNITS else ""
+  try:
+    size = int(float(value[:len(value) - len(unit)]) * SIZE_UNITS[unit])
+  except ValueError:
+    raise argparse.ArgumentTypeError("Invalid size: %s" % value)
+  if size < 1:
+    raise argparse.ArgumentTypeError("Size must be positive: %s" % value)
+  return size
+
+def parse_date(value: str) -> datetime.datetime:
+  # Naive, like the dates of the Outlook restriction
+  try:
+    return datetime.datetime.fromisoformat(value)
+  except ValueError:
+    raise argparse.ArgumentTypeError("Invalid date: %s" % value)
+
+def _format_bytes(n: float) -> str:
+  for unit in ("B", "KB", "MB", "GB"):
+    if n < 1024 or unit == "GB":
+      return ("%d %s" if unit == "B" else "%.1f %s") % (n, unit)
+    n /= 1024
+  return ""
+
+
+class ExportProgress:
+  # Counters of a running export, only updated by the exporting thread
+
+  def __init__(self, clock: Callable[[], float] = time.perf_counter) -> None:
+    self._clock = clock
+    self.started: float = clock()
+    self.finished: Optional[float] = None
+    self.folders: int = 0
+    self.items: int = 0
+    self.events: int = 0
+    self.duplicates: int = 0
+    self.failed: int = 0
+    self.cached: int = 0
+    # Serialized events, before compression
+    self.bytes: int = 0
+    # Output file size
+    self.written: int = 0
+
+  def finish(self) -> None:
+    self.finished = self._clock()
+
+  @property
+  def seconds(self) -> float:
+    return (self.finished if self.finished is not None else self._clock()) - self.started
+
+  def line(self) -> str:
+    seconds = self.seconds or 1e-9
+    return "%d items, %d events, %s (%.0f items/s)" % (self.items, self.events, _format_bytes(self.bytes),
+                                                       self.items / seconds)
+
+  def as_dict(self) -> dict:
+    return {
+      "folders": self.folders,
+      "items": self.items,
+      "events": self.events,
+      "duplicates": self.duplicates,
+      "failed": self.failed,
+      "cached": self.cached,
+      "bytes": self.bytes,
+      "written": self.written,
+      "seconds": self.seconds,
+    }
+
+
+class _CountingWriter:
+  # Counts the bytes written to the output stream
+
+  def __init__(self, fp: BinaryIO, progress: ExportProgress) -> None:
+    self._fp = fp
+    self._progress = progress
+
+  def write(self, data: bytes) -> int:
+    self._progress.written += len(data)
+    return self._fp.write(data)
+
+  def flush(self) -> None:
+    self._fp.flush()
+
+
+def _report_progress(progress: ExportProgress, stop: threading.Event, stream, interval: float) -> None:
+  while not stop.wait(interval):
+    stream.write("\r" + progress.line())
+    stream.flush()
+  stream.write("\r" + progress.line() + "\n")
+  stream.flush()
+
+def summary(progress: ExportProgress, sink: w32a_metrics.StatsSink,
+            spill_stats: Optional[ical_spill.SpillStats] = None,
+            state: Optional[w32a_state.ExportState] = None) -> str:
+  seconds = progress.seconds or 1e-9
+  lines = [
+    "Exported %d items from %d folders: %d events, %d duplicates, %d failed, %d unchanged, %.2fs" % (
+      progress.items, progress.folders, progress.events, progress.duplicates, progress.failed, progress.cached,
+      progress.seconds),
+    "Throughput: %.0f items/s, %.0f events/s, %s/s (%s written)" % (
+      progress.items / seconds, progress.events / seconds, _format_bytes(progress.bytes / seconds),
+      _format_bytes(progress.written)),
+  ]
+  stages = sink.as_dict()["stages"]
+  timings = ["%s %.3fs" % (stage, stages[stage]["sum"]) for stage in STAGES if stage in stages]
+  if timings:
+    lines.append("Stages: " + ", ".join(timings))
+  if spill_stats is not None and spill_stats.segments:
+    lines.append("Spilled: %d segments, %d events, %s" % (spill_stats.segments, spill_stats.spilled_events,
+                                                         _format_bytes(spill_stats.spilled_bytes)))
+  if state is not None:
+    lines.append("State: %d items, %d reused, %d converted" % (len(state), state.hits, state.misses))
+  return "\n".join(lines)
+
+
+def convert_item(item, format: str = ical_emit.FORMAT_ICS,
+                 filter: Optional[dict] = None,
+                 window: Optional[w32a_cal.Window] = None,
+                 state: Optional[w32a_state.ExportState] = None) -> list[w32a_state.StateEntry]:
+  # Serialized events of an item (or its snapshot), taken from state if the item did not change
+  if state is not None:
+    cached = state.lookup(item)
+    if cached is not None:
+      return cached
+  events, _data = w32a_pipeline.convert_snapshot(item, filter=filter, window=window)
+  with w32a_metrics.get_sink().stage(w32a_metrics.STAGE_SERIALIZE):
+    entries = [(ical_diff.event_key(event), ical_emit.serialize_component(event, format),
+                tuple(zone for zone, _tz in ical_vtimezone.event_zones(event)))
+               for event in events]
+  if state is not None:
+    state.store(item, entries)
+  return entries
+
+def _iter_folder_entries(items: Callable[[], object], workers: int, format: str, filter: Optional[dict], window: Optional[w32a_cal.Window],
+                         state: Optional[w32a_state.ExportState], progress: ExportProgress):
+  # Serialized events per item of items(). With workers, items() is called in the pipeline producer thread
+  # (COM objects belong to the thread that created them) and the items are snapshotted there,
+  # so unchanged items are only skipped in conversion, not in fetching.
+  if workers > 1:
+    def convert(snapshot, filter=None, window=None, serialize=False):
+      return convert_item(snapshot, format=format, filter=filter, window=window, state=state), None
+
+    for result in w32a_pipeline.iter_pipeline(items, max_workers=workers, convert=convert, filter=filter,
+                                              window=window, initializer=w32a_export.com_initialize):
+      progress.items += 1
+      if result.error is not None:
+        # Logged by the pipeline
+        progress.failed += 1
+      yield result.events
+    return
+
+  for item in items():
+    progress.items += 1
+    try:
+      yield convert_item(item, format=format, filter=filter, window=window, state=state)
+    except Exception as e:
+      logging.warning("Conversion of item %s failed: %r", getattr(item, 'EntryID', None), e)
+      progress.failed += 1
+
+def export(folders: list[Optional[str]], fp: BinaryIO,
+           folder_resolver: Callable[[Optional[str]], object] = w32a_export.get_outlook_calendar_folder,
+           format: str = ical_emit.FORMAT_ICS,
+           compression: Optional[str] = None,
+           filter: Optional[dict] = w32a_cal.ICAL_FILTER_FULL,
+           start: Optional[datetime.datetime] = None,
+           end: Optional[datetime.datetime] = None,
+           workers: int = 1,
+           memory_budget: int = ical_spill.SPILL_BUDGET_DEFAULT,
+           state: Optional[w32a_state.ExportState] = None,
+           progress: Optional[ExportProgress] = None,
+           prodid: str = w32a_export.ICAL_PRODID) -> tuple[ExportProgress, ical_spill.SpillStats]:
+  # Streams the folders into fp: items are converted and serialized one by one into a SpillBuffer,
+  # the first folder wins on duplicate (UID, RECURRENCE-ID). A folder that cannot be read is counted as failed.
+  if progress is None:
+    progress = ExportProgress()
+  window = (start, end) if start is not None or end is not None else None
+  seen: set[ical_diff.EventKey] = set()
+  # Collected from the entries, so items taken from state count as well
+  timezones = ical_vtimezone.TimezoneCollector()
+  with ical_spill.SpillBuffer(memory_budget, format=format) as buffer:
+    for name in folders:
+      try:
+        def items(name=name):
+          with w32a_metrics.get_sink().stage(w32a_metrics.STAGE_FETCH):
+            return w32a_export.get_folder_items(folder_resolver(name), start, end)
+
+        hits = state.hits if state is not None else 0
+        for entries in _iter_folder_entries(items, workers, format, filter, window, state, progress):
+          for key, data, zones in entries:
+            if key in seen:
+              progress.duplicates += 1
+              continue
+            seen.add(key)
+            buffer.add_serialized(data)
+            for zone in zones:
+              timezones.add_zone(zone)
+            progress.events += 1
+            progress.bytes += len(data)
+        if state is not None:
+          progress.cached += state.hits - hits
+        progress.folders += 1
+      except Exception as e:
+        logging.error("Export of calendar %s failed: %s", name or "(default)", e)
+        progress.failed += 1
+    buffer.write(_CountingWriter(fp, progress), compression=compression, prodid=prodid,
+                 timezones=timezones.timezones())
+  progress.finish()
+  return progress, buffer.stats
+
+
+def mock_folder_resolver(path: str) -> Callable[[Optional[str]], object]:
+  # Every folder name resolves to one mock folder with the events of an iCalendar file
+  events: list = []
+  with open(path, "r", encoding="utf-8") as f:
+    ical_import.import_ical(f, events.extend)
+  folder = W32Folder("Mock", events)
+  return lambda name: folder
+
+def _open_output(path: str):
+  if path == "-":
+    return contextlib.nullcontext(sys.stdout.buffer)
+  return open(path, "wb")
+
+def build_parser() -> argparse.ArgumentParser:
+  parser = argparse.ArgumentParser(prog="python -m w32a_cli", description="Export Outlook calendar folders")
+  parser.add_argument("-f", "--folder", action="append", dest="folders", metavar="PATH",
+                      help="Calendar folder path, e.g. Team/Rooms (repeatable, default: the default calendar)")
+  parser.add_argument("-o", "--output", default="-", help="Output file, - for stdout (default)")
+  parser.add_argument("--start", type=parse_date, help="Window start, e.g. 2024-01-01")
+  parser.add_argument("--end", type=parse_date, help="Window end")
+  parser.add_argument("--filter", choices=sorted(FILTER_PRESETS), default="full", help="Exported properties")
+  parser.add_argument("--format", choices=ical_emit.FORMATS, default=ical_emit.FORMAT_ICS)
+  parser.add_argument("--compression", choices=[c for c in ical_emit.COMPRESSIONS if c])
+  parser.add_argument("-w", "--workers", type=int, default=1, help="Conversion threads per folder")
+  parser.add_argument("--memory-budget", type=parse_size, default=ical_spill.SPILL_BUDGET_DEFAULT,
+                      help="Serialized events held in memory before spilling to disk, e.g. 64M")
+  parser.add_argument("--state", metavar="PATH", help="Incremental state file, unchanged items are not converted")
+  parser.add_argument("--mock", metavar="ICS", help="Export the events of an iCalendar file through the mock object model")
+  parser.add_argument("--memory-profile", metavar="PATH",
+                      help="Write memory per stage and event kind as JSON to PATH (slow, use with -w 1)")
+  parser.add_argument("-q", "--quiet", action="store_true", help="No progress and summary")
+  parser.add_argument("-v", "--verbose", action="store_true", help="Debug logging")
+  return parser
+
+def main(argv: Optional[list[str]] = None) -> int:
+  args = build_parser().parse_args(argv)
+  logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+  if args.workers < 1:
+    build_parser().error("--workers must be at least 1")
+
+  folder_resolver = mock_folder_resolver(args.mock) if args.mock else w32a_export.get_outlook_calendar_folder
+  folders = args.folders or [None]
+  settings = {
+    "format": args.format,
+    "filter": args.filter,
+    "start": args.start.isoformat() if args.start else None,
+    "end": args.end.isoformat() if args.end else None,
+    "prodid": w32a_export.ICAL_PRODID,
+  }
+  state = w32a_state.ExportState.load(args.state, settings) if args.state else None
+
+  if args.memory_profile:
+    sink = w32a_memprof.MemorySink().start()
+  else:
+    sink = w32a_metrics.StatsSink(slowest=0)
+    previous_sink = w32a_metrics.set_sink(sink)
+  progress = ExportProgress()
+  stop = threading.Event()
+  reporter = None
+  if not args.quiet and sys.stderr.isatty():
+    reporter = threading.Thread(target=_report_progress, args=(progress, stop, sys.stderr, PROGRESS_INTERVAL),
+                                daemon=True)
+    reporter.start()
+  try:
+    w32a_export.com_initialize()
+    with _open_output(args.output) as fp:
+      progress, spill_stats = export(folders, fp, folder_resolver=folder_resolver, format=args.format,
+                                     compression=args.compression, filter=FILTER_PRESETS[args.filter],
+                                     start=args.start, end=args.end, workers=args.workers,
+                                     memory_budget=args.memory_budget, state=state, progress=progress)
+      fp.flush()
+  except BaseException:
+    if state is not None:
+      state.close()
+    raise
+  finally:
+    stop.set()
+    if reporter is not None:
+      reporter.join()
+    if args.memory_profile:
+      report = sink.to_json()
+      sink.stop()
+      with open(args.memory_profile, "w") as f:
+        f.write(report)
+    else:
+      w32a_metrics.set_sink(previous_sink)
+
+  if state is not None:
+    state.save(args.state)
+  if not args.quiet:
+    sys.stderr.write(summary(progress, sink, spill_stats, state) + "\n")
+  return 1 if progress.failed else 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,234 @@
+from typing import Callable, Iterable, Iterator, Optional
+import concurrent.futures
+import copy
+import datetime
+import logging
+import time
+
+import icalendar
+
+import w32a_body
+import w32a_cal
+import w32a_metrics
+import w32a_pipeline
+import w32a_session
+import ical_diff
+import ical_vtimezone
+
+ICAL_PRODID = "-//pyw32ical//export//EN"
+
+
+class FolderSpec:
+  # One source calendar of a multi-folder export.
+  # Either a folder object or a folder name that is resolved in the worker thread.
+
+  def __init__(self,
+               name: Optional[str] = None,
+               folder: Optional[object] = None,
+               filter: Optional[dict] = None,
+               item_filter: Optional[Callable[[object], bool]] = None,
+               start: Optional[datetime.datetime] = None,
+               end: Optional[datetime.datetime] = None,
+               label: Optional[str] = None,
+               body_budget: Optional[w32a_body.BodyBudget] = None,
+               exception_delta: Optional[w32a_cal.ExceptionDelta] = None) -> None:
+    if name is None and folder is None:
+      raise ValueError("Either name or folder must be specified")
+    self.name: Optional[str] = name
+    self.folder: Optional[object] = folder
+    self.filter: Optional[dict] = filter
+    self.item_filter: Optional[Callable[[object], bool]] = item_filter
+    self.start: Optional[datetime.datetime] = start
+    self.end: Optional[datetime.datetime] = end
+    self.label: str = label or name or getattr(folder, "Name", "")
+    self.body_budget: Optional[w32a_body.BodyBudget] = body_budget
+    # With pipeline_workers, the snapshots of the pipeline read exceptions in full and only the conversion uses it
+    self.exception_delta: Optional[w32a_cal.ExceptionDelta] = exception_delta
+
+  @property
+  def window(self) -> Optional[w32a_cal.Window]:
+    if self.start is None and self.end is None:
+      return None
+    return (self.start, self.end)
+
+
+class SourceReport:
+
+  def __init__(self, label: str) -> None:
+    self.label: str = label
+    self.items: int = 0
+    self.events: int = 0
+    self.duplicates: int = 0
+    # Items whose conversion failed, only with pipeline_workers
+    self.failed: int = 0
+    self.seconds: float = 0.0
+    self.error: Optional[BaseException] = None
+
+  def as_dict(self) -> dict:
+    return {
+      "label": self.label,
+      "items": self.items,
+      "events": self.events,
+      "duplicates": self.duplicates,
+      "failed": self.failed,
+      "seconds": self.seconds,
+      "error": repr(self.error) if self.error is not None else None,
+    }
+
+
+def new_calendar(prodid: str = ICAL_PRODID) -> icalendar.Calendar:
+  cal = icalendar.Calendar()
+  cal.add('PRODID', prodid)
+  cal.add('VERSION', "2.0")
+  return cal
+
+def serialize_calendar(cal: icalendar.Calendar) -> bytes:
+  with w32a_metrics.get_sink().stage(w32a_metrics.STAGE_SERIALIZE):
+    return cal.to_ical()
+
+def com_initialize() -> None:
+  # Every thread that talks to Outlook needs its own COM apartment
+  try:
+    import pythoncom
+  except ImportError:
+    return
+  pythoncom.CoInitialize()
+
+def _marshal_folder(folder: object) -> Optional[object]:
+  # Outlook objects must not be used from another thread's apartment: a folder passed in by the caller is
+  # marshaled into a stream here and unmarshaled by the thread that reads it. Mock folders are not COM objects.
+  oleobj = getattr(folder, "_oleobj_", None)
+  if oleobj is None:
+    return None
+  import pythoncom
+  return pythoncom.CoMarshalInterThreadInterfaceInStream(pythoncom.IID_IDispatch, oleobj)
+
+def _unmarshal_folder(stream: object) -> object:
+  # Once per stream, in the thread that uses the folder
+  import pythoncom
+  import win32com.client
+  return win32com.client.Dispatch(pythoncom.CoGetInterfaceAndReleaseStream(stream, pythoncom.IID_IDispatch))
+
+def _folder_source(spec: FolderSpec,
+                   folder_resolver: Callable[[Optional[str]], object]) -> tuple[FolderSpec, Callable[[Optional[str]], object]]:
+  # spec and resolver for another thread: a COM folder of spec is replaced by a resolver that unmarshals it there
+  stream = _marshal_folder(spec.folder) if spec.folder is not None else None
+  if stream is None:
+    return spec, folder_resolver
+  spec = copy.copy(spec)
+  spec.folder = None
+  return spec, lambda _name: _unmarshal_folder(stream)
+
+def get_outlook_calendar_folder(name: Optional[str] = None) -> object:
+  # Resolved through the session of the calling worker thread, so the folder index is built once per worker
+  return w32a_session.get_session().get_folder(name)
+
+def items_restriction(start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None) -> str:
+  # https://learn.microsoft.com/en-us/office/vba/api/outlook.items.restrict
+  clauses: list[str] = []
+  if start:
+    clauses.append("[Start] >= '" + start.strftime(w32a_cal.OUTLOOK_DATE_FORMAT2) + "'")
+  if end:
+    clauses.append("[End] <= '" + end.strftime(w32a_cal.OUTLOOK_DATE_FORMAT2) + "'")
+  return " AND ".join(clauses)
+
+def get_folder_items(folder, start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None):
+  items = folder.Items
+  if items is None:
+    raise ValueError("No Outlook calendar items found")
+  items.Sort("[Start]")
+  restriction = items_restriction(start, end)
+  if restriction:
+    items = items.Restrict(restriction)
+  return items
+
+def iter_source_events(spec: FolderSpec,
+                       folder_resolver: Callable[[Optional[str]], object],
+                       report: SourceReport,
+                       pipeline_workers: Optional[int] = None) -> Iterator[icalendar.Event]:
+  # Converted events of one source as the items are read, counted in report.
+  # With pipeline_workers, a failing item is skipped and counted in report.failed.
+  if pipeline_workers:
+    yield from _iter_source_events_pipelined(spec, folder_resolver, report, pipeline_workers)
+    return
+  with w32a_metrics.get_sink().stage(w32a_metrics.STAGE_FETCH):
+    folder = spec.folder if spec.folder is not None else folder_resolver(spec.name)
+    items = get_folder_items(folder, spec.start, spec.end)
+  for item in items:
+    report.items += 1
+    if spec.item_filter is not None and not spec.item_filter(item):
+      continue
+    yield from w32a_cal.win32_event_to_ical(item, filter=spec.filter, body_budget=spec.body_budget,
+                                            window=spec.window, exception_delta=spec.exception_delta)
+
+def _iter_source_events_pipelined(spec: FolderSpec,
+                                  folder_resolver: Callable[[Optional[str]], object],
+                                  report: SourceReport,
+                                  pipeline_workers: int) -> Iterator[icalendar.Event]:
+  # The folder is resolved and its items are read in the producer thread of the pipeline,
+  # the calling worker only dispatches snapshots to the consumers
+  spec, folder_resolver = _folder_source(spec, folder_resolver)
+
+  def items():
+    folder = spec.folder if spec.folder is not None else folder_resolver(spec.name)
+    for item in get_folder_items(folder, spec.start, spec.end):
+      report.items += 1
+      yield item
+
+  for result in w32a_pipeline.iter_pipeline(
+      items, max_workers=pipeline_workers, filter=spec.filter, window=spec.window, body_budget=spec.body_budget,
+      item_filter=spec.item_filter, initializer=com_initialize, exception_delta=spec.exception_delta):
+    if result.error is not None:
+      report.failed += 1
+    yield from result.events
+
+def _export_source(spec: FolderSpec,
+                   folder_resolver: Callable[[Optional[str]], object],
+                   pipeline_workers: Optional[int] = None) -> tuple[SourceReport, list[icalendar.Event]]:
+  report = SourceReport(spec.label)
+  t0 = time.perf_counter()
+  try:
+    events = list(iter_source_events(spec, folder_resolver, report, pipeline_workers))
+  except Exception as e:
+    logging.exception("Export of calendar %s failed", spec.label)
+    report.error = e
+    events = []
+  report.seconds = time.perf_counter() - t0
+  return report, events
+
+def export_folders(specs: Iterable[FolderSpec],
+                   max_workers: Optional[int] = None,
+                   folder_resolver: Callable[[Optional[str]], object] = get_outlook_calendar_folder,
+                   prodid: str = ICAL_PRODID,
+                   pipeline_workers: Optional[int] = None) -> tuple[icalendar.Calendar, list[SourceReport]]:
+  # Each source is fetched and converted in its own worker thread, which owns its COM session.
+  # With pipeline_workers, the items of a source are read by one thread and converted by that many
+  # consumers (see w32a_pipeline), a failing item is skipped and counted in SourceReport.failed.
+  # Events are merged in the order of specs, the first source wins on duplicate (UID, RECURRENCE-ID).
+  # Folder objects of specs are marshaled to the worker threads, names are resolved there.
+  specs = list(specs)
+  cal = new_calendar(prodid)
+
+  with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, initializer=com_initialize) as executor:
+    futures = [executor.submit(_export_source, *_folder_source(spec, folder_resolver), pipeline_workers)
+               for spec in specs]
+    results = [f.result() for f in futures]
+
+  seen: set[ical_diff.EventKey] = set()
+  reports: list[SourceReport] = []
+  for report, events in results:
+    for event in events:
+      key = ical_diff.event_key(event)
+      if key in seen:
+        report.duplicates += 1
+        continue
+      seen.add(key)
+      cal.add_component(event)
+      report.events += 1
+    logging.debug("Exported %s: %d items, %d events, %d duplicates in %.3fs",
+                  report.label, report.items, report.events, report.duplicates, report.seconds)
+    reports.append(report)
+
+  # DTSTART;TZID=... of the events refer to these
+  ical_vtimezone.add_timezones(cal)
+  return cal, reports
@@ -0,0 +1,104 @@
+from typing import Callable, Hashable, Optional
+import collections
+import sys
+import threading
+
+from w32a_lazy import lazy_import
+
+icalendar = lazy_import("icalendar")
+
+# Distinct values kept per pool, the least recently used values are dropped beyond it
+INTERN_POOL_SIZE = 100000
+
+# Size of the process-wide pool, which lives as long as the process
+PROCESS_INTERN_POOL_SIZE = 10000
+
+
+class InternPool:
+  # Deduplicates immutable values that repeat across a calendar: organizer, location and category strings,
+  # time zones by Outlook ID, frozen RRULEs and the icalendar property values built from them.
+  # Pooled icalendar values and objects (get, ical_value) are shared between events and must be treated
+  # as immutable; with share_objects=False only intern() pools, the others build a new value per call.
+
+  def __init__(self, maxsize: int = INTERN_POOL_SIZE, share_objects: bool = True) -> None:
+    self.maxsize: int = maxsize
+    self.share_objects: bool = share_objects
+    self._values: collections.OrderedDict = collections.OrderedDict()
+    self._lock = threading.Lock()
+    self.hits: int = 0
+    self.misses: int = 0
+    # Approximate size of the duplicates that were replaced by a pooled value
+    self.bytes_saved: int = 0
+
+  def _get(self, key: Hashable, factory: Callable[[], object], size: Callable[[object], int]) -> object:
+    with self._lock:
+      if key in self._values:
+        value = self._values[key]
+        self._values.move_to_end(key)
+        self.hits += 1
+        self.bytes_saved += size(value)
+        return value
+      self.misses += 1
+    value = factory()
+    if self.maxsize <= 0:
+      return value
+    with self._lock:
+      value = self._values.setdefault(key, value)
+      while len(self._values) > self.maxsize:
+        self._values.popitem(last=False)
+    return value
+
+  def intern(self, value):
+    # Strings, tuples (e.g. frozen RRULEs) and other hashable immutable values
+    if value is None:
+      return None
+    return self._get((type(value), value), lambda: value, sys.getsizeof)
+
+  def get(self, key: Hashable, factory: Callable[[], object]):
+    # Value built by factory on the first request for key, e.g. a time zone snapshot by Outlook ID
+    if not self.share_objects:
+      return factory()
+    return self._get(key, factory, lambda value: 0)
+
+  def ical_value(self, name: str, value, factory: Optional[Callable[[], object]] = None):
+    # icalendar property value of name, e.g. one vText per distinct LOCATION.
+    # These are mutable (vRecur is a dict, parameters can be changed), only shared with share_objects.
+    if factory is None:
+      factory = lambda: icalendar.cal.types_factory.for_property(name)(value)
+    if not self.share_objects:
+      return factory()
+    return self._get((name, value), factory, sys.getsizeof)
+
+  def clear(self) -> None:
+    with self._lock:
+      self._values = collections.OrderedDict()
+      self.hits = 0
+      self.misses = 0
+      self.bytes_saved = 0
+
+  def __len__(self) -> int:
+    return len(self._values)
+
+  def as_dict(self) -> dict:
+    with self._lock:
+      return {
+        "values": len(self._values),
+        "hits": self.hits,
+        "misses": self.misses,
+        "bytes_saved": self.bytes_saved,
+      }
+
+
+_default_pool: Optional[InternPool] = None
+
+def get_intern_pool() -> InternPool:
+  # Process-wide pool, used when no pool is passed. It only pools immutable values (strings, tuples, tzinfo),
+  # icalendar values and other objects are shared only through a pool the caller passes.
+  global _default_pool
+  if _default_pool is None:
+    _default_pool = InternPool(PROCESS_INTERN_POOL_SIZE, share_objects=False)
+  return _default_pool
+
+def set_intern_pool(pool: Optional[InternPool]) -> None:
+  global _default_pool
+  _default_pool = pool
@@ -0,0 +1,19 @@
+import importlib
+import types
+
+
+class LazyModule(types.ModuleType):
+  # Placeholder for a module that is imported on first attribute access.
+  # After loading, the attributes of the real module are copied in, so later lookups cost nothing extra.
+
+  def __getattr__(self, name: str):
+    module = importlib.import_module(self.__name__)
+    self.__dict__.update(module.__dict__)
+    return getattr(module, name)
+
+  def __repr__(self) -> str:
+    return "<lazy module %r>" % self.__name__
+
+
+def lazy_import(name: str) -> types.ModuleType:
+  return LazyModule(name)
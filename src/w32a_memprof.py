@@ -0,0 +1,227 @@
+import json
+import threading
+import tracemalloc
+
+from typing import Iterable, Optional
+
+import w32a_metrics
+
+# Frames per allocation traceback, more frames make snapshots slower
+MEMPROF_FRAMES = 1
+
+# Allocation sites in the report
+MEMPROF_TOP = 10
+
+# Stages with snapshots. Every snapshot costs time proportional to the traced blocks;
+# parse_date and tz run several times per item and are left out.
+MEMPROF_STAGES = (w32a_metrics.STAGE_FETCH, w32a_metrics.STAGE_EXCEPTIONS, w32a_metrics.STAGE_SERIALIZE,
+                  w32a_metrics.STAGE_EVENT)
+
+
+class MemoryUsage:
+  # Memory of a stage or event kind, summed over its occurrences:
+  # bytes and blocks still allocated at the end of each (net, can be negative if memory was freed)
+  # and allocated bytes (the growth of the allocation sites, memory that was freed again is not included)
+  __slots__ = ("count", "bytes", "blocks", "allocated", "max_allocated")
+
+  def __init__(self) -> None:
+    self.count: int = 0
+    self.bytes: int = 0
+    self.blocks: int = 0
+    self.allocated: int = 0
+    self.max_allocated: int = 0
+
+  def add(self, size: int, blocks: int, allocated: int) -> None:
+    self.count += 1
+    self.bytes += size
+    self.blocks += blocks
+    self.allocated += allocated
+    if allocated > self.max_allocated:
+      self.max_allocated = allocated
+
+  def as_dict(self) -> dict:
+    return {
+      "count": self.count,
+      "bytes": self.bytes,
+      "blocks": self.blocks,
+      "allocated": self.allocated,
+      "max_allocated": self.max_allocated,
+      "bytes_mean": self.bytes / self.count if self.count else 0.0,
+      "allocated_mean": self.allocated / self.count if self.count else 0.0,
+    }
+
+
+class _MemoryTimer:
+
+  def __init__(self, sink: 'MemorySink', stage: Optional[str], kind: Optional[str] = None) -> None:
+    self.sink = sink
+    self.stage = stage
+    self.kind = kind
+    # Usage of the nested exceptions, not accounted to the kind of this event
+    self.nested: list[int] = [0, 0, 0]
+    self.before: Optional[dict] = None
+
+  def __enter__(self) -> '_MemoryTimer':
+    self.sink._enter(self)
+    return self
+
+  def __exit__(self, *exc) -> None:
+    self.sink._exit(self)
+
+
+class MemorySink(w32a_metrics.StatsSink):
+  # StatsSink that takes tracemalloc snapshots at the boundaries of the stages and events and reports
+  # the memory per stage, per event kind (single, master, exception) and the top allocation sites.
+  # Stages include their nested stages like the timings do; a master does not include its exceptions.
+  # Snapshots cover the whole process: profile exports without workers, after a first conversion
+  # (modules imported while tracing add their allocations and make every snapshot slow).
+  # No stage timings are recorded, the snapshots would dominate them.
+
+  def __init__(self, frames: int = MEMPROF_FRAMES, top: int = MEMPROF_TOP,
+               stages: Iterable[str] = MEMPROF_STAGES) -> None:
+    super().__init__(slowest=0)
+    self.frames = frames
+    self.top = top
+    self.profiled_stages: frozenset[str] = frozenset(stages)
+    self.stages: dict[str, MemoryUsage] = {}
+    self.kinds: dict[str, MemoryUsage] = {}
+    # site -> [allocated bytes, blocks], of the outermost stages and events only
+    self.sites: dict[str, list[int]] = {}
+    self._local = threading.local()
+    # Allocations of the snapshots and of the sink itself are left out
+    self._ignored = frozenset((tracemalloc.__file__, __file__))
+    self._started = False
+    self._previous_sink: Optional[w32a_metrics.MetricsSink] = None
+    # Traced and peak memory when tracing was stopped
+    self._traced: tuple[int, int] = (0, 0)
+
+  def start(self) -> 'MemorySink':
+    # Starts tracing (if not yet) and installs the sink, stop() restores the previous one
+    if not tracemalloc.is_tracing():
+      tracemalloc.start(self.frames)
+      self._started = True
+    self._previous_sink = w32a_metrics.set_sink(self)
+    return self
+
+  def stop(self) -> None:
+    w32a_metrics.set_sink(self._previous_sink)
+    self._previous_sink = None
+    if self._started:
+      self._traced = tracemalloc.get_traced_memory()
+      tracemalloc.stop()
+      self._started = False
+
+  def __enter__(self) -> 'MemorySink':
+    return self.start()
+
+  def __exit__(self, *exc) -> None:
+    self.stop()
+
+  def stage(self, stage: str):
+    if stage not in self.profiled_stages:
+      return w32a_metrics._NULL_TIMER
+    return _MemoryTimer(self, stage)
+
+  def event(self, event_id: str) -> _MemoryTimer:
+    # Events are always profiled for the per-kind report, the event stage only if selected
+    stage = w32a_metrics.STAGE_EVENT if w32a_metrics.STAGE_EVENT in self.profiled_stages else None
+    return _MemoryTimer(self, stage, w32a_metrics.EVENT_SINGLE)
+
+  def exception(self, event_id: str) -> _MemoryTimer:
+    return _MemoryTimer(self, None, w32a_metrics.EVENT_EXCEPTION)
+
+  def _stack(self) -> list[_MemoryTimer]:
+    stack = getattr(self._local, "stack", None)
+    if stack is None:
+      stack = self._local.stack = []
+    return stack
+
+  def _snapshot(self) -> Optional[dict]:
+    # traceback -> (size, blocks); nested timers keep these instead of the snapshots
+    if not tracemalloc.is_tracing():
+      return None
+    key = "traceback" if self.frames > 1 else "lineno"
+    return {stat.traceback: (stat.size, stat.count) for stat in tracemalloc.take_snapshot().statistics(key)
+            if stat.traceback[-1].filename not in self._ignored}
+
+  def _enter(self, timer: _MemoryTimer) -> None:
+    self._stack().append(timer)
+    timer.before = self._snapshot()
+
+  def _exit(self, timer: _MemoryTimer) -> None:
+    after = self._snapshot()
+    stack = self._stack()
+    stack.pop()
+    if timer.before is None or after is None:
+      return
+    before = timer.before
+    timer.before = None
+    # traceback -> (size difference, blocks difference)
+    diffs: dict[tracemalloc.Traceback, tuple[int, int]] = {}
+    for traceback, (size, count) in after.items():
+      old_size, old_count = before.get(traceback, (0, 0))
+      if size != old_size or count != old_count:
+        diffs[traceback] = (size - old_size, count - old_count)
+    for traceback, (old_size, old_count) in before.items():
+      if traceback not in after:
+        diffs[traceback] = (-old_size, -old_count)
+    size = sum(d[0] for d in diffs.values())
+    blocks = sum(d[1] for d in diffs.values())
+    allocated = sum(d[0] for d in diffs.values() if d[0] > 0)
+
+    with self._lock:
+      if timer.stage is not None:
+        self.stages.setdefault(timer.stage, MemoryUsage()).add(size, blocks, allocated)
+      if timer.kind is not None:
+        usage = self.kinds.setdefault(timer.kind, MemoryUsage())
+        usage.add(size - timer.nested[0], blocks - timer.nested[1], allocated - timer.nested[2])
+      # Nested stages are part of the outermost one
+      if not stack:
+        for traceback, (size_diff, count_diff) in diffs.items():
+          if size_diff > 0:
+            site = self.sites.setdefault(_site(traceback), [0, 0])
+            site[0] += size_diff
+            site[1] += max(count_diff, 0)
+
+    if timer.kind == w32a_metrics.EVENT_EXCEPTION:
+      for parent in reversed(stack):
+        if parent.kind is not None:
+          parent.nested[0] += size
+          parent.nested[1] += blocks
+          parent.nested[2] += allocated
+          break
+
+  def reset(self) -> None:
+    super().reset()
+    with self._lock:
+      self.stages = {}
+      self.kinds = {}
+      self.sites = {}
+
+  def top_sites(self, limit: Optional[int] = None) -> list[dict]:
+    with self._lock:
+      sites = sorted(self.sites.items(), key=lambda item: item[1][0], reverse=True)
+    return [{"site": site, "allocated": usage[0], "blocks": usage[1]}
+            for site, usage in sites[:limit if limit is not None else self.top]]
+
+  def as_dict(self) -> dict:
+    stats = super().as_dict()
+    current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else self._traced
+    with self._lock:
+      stats["memory"] = {
+        "frames": self.frames,
+        "traced": current,
+        "peak": peak,
+        "stages": {stage: usage.as_dict() for stage, usage in self.stages.items()},
+        "events": {kind: usage.as_dict() for kind, usage in self.kinds.items()},
+      }
+    stats["memory"]["sites"] = self.top_sites()
+    return stats
+
+  def to_json(self, indent: Optional[int] = 2) -> str:
+    return json.dumps(self.as_dict(), indent=indent, sort_keys=True)
+
+
+def _site(traceback: tracemalloc.Traceback) -> str:
+  # Most recent frame first, like tracemalloc
+  return " <- ".join("%s:%d" % (frame.filename, frame.lineno) for frame in reversed(traceback))
@@ -0,0 +1,256 @@
+from typing import Optional
+import bisect
+import heapq
+import threading
+import time
+
+# Pipeline stages reported by the converter and the export functions
+STAGE_FETCH = "fetch"
+STAGE_PARSE_DATE = "parse_date"
+STAGE_TZ = "tz"
+STAGE_RECURRENCE = "recurrence"
+STAGE_EXCEPTIONS = "exceptions"
+STAGE_SERIALIZE = "serialize"
+STAGE_EVENT = "event"
+
+# Kinds of converted items: single events, series masters (with their exceptions) and modified occurrences
+EVENT_SINGLE = "single"
+EVENT_MASTER = "master"
+EVENT_EXCEPTION = "exception"
+
+# https://prometheus.io/docs/concepts/metric_types/#histogram
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+PROMETHEUS_PREFIX = "w32ical"
+
+
+class _NullTimer:
+  kind: Optional[str] = None
+
+  def __enter__(self) -> '_NullTimer':
+    return self
+
+  def __exit__(self, *exc) -> None:
+    return None
+
+_NULL_TIMER = _NullTimer()
+
+
+class MetricsSink:
+  # Default sink: every hook is a no-op, so instrumentation costs one method call when disabled
+  enabled: bool = False
+
+  def count(self, name: str, n: int = 1) -> None:
+    pass
+
+  def observe(self, stage: str, seconds: float) -> None:
+    pass
+
+  def stage(self, stage: str):
+    return _NULL_TIMER
+
+  def event(self, event_id: str):
+    # The converter sets kind of the returned timer to EVENT_MASTER for series
+    return _NULL_TIMER
+
+  def exception(self, event_id: str):
+    # Conversion of one modified occurrence, nested in the event of its master
+    return _NULL_TIMER
+
+
+class _StageTimer:
+
+  def __init__(self, sink: 'StatsSink', stage: str) -> None:
+    self.sink = sink
+    self.stage = stage
+    self.t0 = 0.0
+
+  def __enter__(self) -> '_StageTimer':
+    self.t0 = time.perf_counter()
+    return self
+
+  def __exit__(self, *exc) -> None:
+    self.sink.observe(self.stage, time.perf_counter() - self.t0)
+
+
+class _EventTimer(_StageTimer):
+
+  def __init__(self, sink: 'StatsSink', event_id: str) -> None:
+    super().__init__(sink, STAGE_EVENT)
+    self.event_id = event_id
+    self.kind = EVENT_SINGLE
+
+  def __exit__(self, *exc) -> None:
+    seconds = time.perf_counter() - self.t0
+    self.sink.observe(self.stage, seconds)
+    self.sink._event_done(self.event_id, seconds, None)
+
+
+class _Histogram:
+
+  def __init__(self, buckets: tuple) -> None:
+    self.buckets = buckets
+    self.counts: list[int] = [0] * (len(buckets) + 1)
+    self.sum: float = 0.0
+    self.count: int = 0
+    self.max: float = 0.0
+
+  def observe(self, value: float) -> None:
+    self.counts[bisect.bisect_left(self.buckets, value)] += 1
+    self.sum += value
+    self.count += 1
+    if value > self.max:
+      self.max = value
+
+  def as_dict(self) -> dict:
+    return {
+      "count": self.count,
+      "sum": self.sum,
+      "max": self.max,
+      "mean": self.sum / self.count if self.count else 0.0,
+      "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts)),
+    }
+
+
+class StatsSink(MetricsSink):
+  # Counters and per-stage histograms, plus the N slowest events
+  enabled: bool = True
+
+  def __init__(self, buckets: tuple = DEFAULT_BUCKETS, slowest: int = 10) -> None:
+    self.buckets = buckets
+    self.slowest_n = slowest
+    self.counters: dict[str, int] = {}
+    self.histograms: dict[str, _Histogram] = {}
+    # min-heap of (seconds, seq, event_id, profile text)
+    self._slowest: list[tuple[float, int, str, Optional[str]]] = []
+    self._seq = 0
+    self._lock = threading.Lock()
+
+  def count(self, name: str, n: int = 1) -> None:
+    with self._lock:
+      self.counters[name] = self.counters.get(name, 0) + n
+
+  def observe(self, stage: str, seconds: float) -> None:
+    with self._lock:
+      histogram = self.histograms.get(stage, None)
+      if histogram is None:
+        histogram = self.histograms[stage] = _Histogram(self.buckets)
+      histogram.observe(seconds)
+
+  def stage(self, stage: str) -> _StageTimer:
+    return _StageTimer(self, stage)
+
+  def event(self, event_id: str) -> _EventTimer:
+    return _EventTimer(self, event_id)
+
+  def _event_done(self, event_id: str, seconds: float, profile: Optional[str]) -> None:
+    if self.slowest_n <= 0:
+      return
+    with self._lock:
+      self._seq += 1
+      entry = (seconds, self._seq, event_id, profile)
+      if len(self._slowest) < self.slowest_n:
+        heapq.heappush(self._slowest, entry)
+      elif seconds > self._slowest[0][0]:
+        heapq.heapreplace(self._slowest, entry)
+
+  def slowest_events(self) -> list[dict]:
+    with self._lock:
+      entries = sorted(self._slowest, reverse=True)
+    return [{"event_id": e[2], "seconds": e[0], "profile": e[3]} for e in entries]
+
+  def reset(self) -> None:
+    with self._lock:
+      self.counters = {}
+      self.histograms = {}
+      self._slowest = []
+
+  def as_dict(self) -> dict:
+    with self._lock:
+      stats = {
+        "counters": dict(self.counters),
+        "stages": {stage: h.as_dict() for stage, h in self.histograms.items()},
+      }
+    stats["slowest_events"] = [{"event_id": e["event_id"], "seconds": e["seconds"]} for e in self.slowest_events()]
+    return stats
+
+  def to_prometheus(self, prefix: str = PROMETHEUS_PREFIX) -> str:
+    # https://prometheus.io/docs/instrumenting/exposition_formats/#text-based-format
+    lines: list[str] = []
+    with self._lock:
+      for name in sorted(self.counters):
+        metric = "%s_%s_total" % (prefix, name)
+        lines.append("# TYPE %s counter" % metric)
+        lines.append("%s %d" % (metric, self.counters[name]))
+
+      metric = "%s_stage_seconds" % prefix
+      if self.histograms:
+        lines.append("# TYPE %s histogram" % metric)
+      for stage in sorted(self.histograms):
+        h = self.histograms[stage]
+        cumulative = 0
+        for bound, count in zip([repr(b) for b in h.buckets] + ["+Inf"], h.counts):
+          cumulative += count
+          lines.append('%s_bucket{stage="%s",le="%s"} %d' % (metric, stage, bound, cumulative))
+        lines.append('%s_sum{stage="%s"} %r' % (metric, stage, h.sum))
+        lines.append('%s_count{stage="%s"} %d' % (metric, stage, h.count))
+    return "\n".join(lines) + "\n"
+
+
+class _ProfiledEventTimer(_EventTimer):
+
+  def __enter__(self) -> '_ProfiledEventTimer':
+    import cProfile
+    self.profile = cProfile.Profile()
+    self.profile.enable()
+    return super().__enter__()
+
+  def __exit__(self, *exc) -> None:
+    seconds = time.perf_counter() - self.t0
+    self.profile.disable()
+    self.sink.observe(self.stage, seconds)
+    self.sink._event_done(self.event_id, seconds, self)
+
+  def profile_text(self, limit: int) -> str:
+    import io
+    import pstats
+    out = io.StringIO()
+    pstats.Stats(self.profile, stream=out).sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
+
+
+class ProfilingSink(StatsSink):
+  # StatsSink that runs cProfile around every event and keeps the profile of the N slowest ones.
+  # Profiling slows down the conversion noticeably, use it to find problematic items only.
+
+  def __init__(self, buckets: tuple = DEFAULT_BUCKETS, slowest: int = 10, profile_lines: int = 25) -> None:
+    super().__init__(buckets=buckets, slowest=slowest)
+    self.profile_lines = profile_lines
+
+  def event(self, event_id: str) -> _ProfiledEventTimer:
+    return _ProfiledEventTimer(self, event_id)
+
+  def _event_done(self, event_id: str, seconds: float, timer: Optional[_ProfiledEventTimer]) -> None:
+    # Only render the profile if it makes it into the slowest list
+    if self.slowest_n <= 0:
+      return
+    with self._lock:
+      if len(self._slowest) >= self.slowest_n and seconds <= self._slowest[0][0]:
+        return
+    profile = timer.profile_text(self.profile_lines) if timer is not None else None
+    super()._event_done(event_id, seconds, profile)
+
+
+NULL_SINK = MetricsSink()
+
+_sink: MetricsSink = NULL_SINK
+
+def get_sink() -> MetricsSink:
+  return _sink
+
+def set_sink(sink: Optional[MetricsSink]) -> MetricsSink:
+  # Returns the previous sink, so callers can restore it
+  global _sink
+  previous = _sink
+  _sink = sink if sink is not None else NULL_SINK
+  return previous
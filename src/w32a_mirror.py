@@ -0,0 +1,202 @@
+from typing import Callable, Optional
+import collections
+import logging
+import threading
+import time
+
+import icalendar
+
+import w32a_body
+import w32a_cal
+import w32a_export
+import ical_vtimezone
+
+# Quiet time after the last change notification before the mirror is updated,
+# a burst of notifications (e.g. a series edited in Outlook) is converted once
+MIRROR_COALESCE_SECONDS = 1.0
+
+
+class _ItemsEvents:
+  # https://learn.microsoft.com/en-us/office/vba/api/outlook.items#events
+  # Instances are created by win32com.client.WithEvents, so the mirror is attached afterwards
+  mirror: Optional['CalendarMirror'] = None
+
+  def OnItemAdd(self, item) -> None:
+    if self.mirror is not None:
+      self.mirror.notify_change(item)
+
+  def OnItemChange(self, item) -> None:
+    if self.mirror is not None:
+      self.mirror.notify_change(item)
+
+  def OnItemRemove(self) -> None:
+    # ItemRemove does not tell which item was removed
+    if self.mirror is not None:
+      self.mirror.notify_remove()
+
+
+def _with_events(obj: object, event_class: type) -> object:
+  import win32com.client
+  return win32com.client.WithEvents(obj, event_class)
+
+def _pump_waiting_messages() -> None:
+  # COM events are delivered through the message loop of the thread that subscribed
+  try:
+    import pythoncom
+  except ImportError:
+    return
+  pythoncom.PumpWaitingMessages()
+
+
+class CalendarMirror:
+  # In-memory converted calendar of one Outlook folder, kept up to date from the change notifications
+  # of its Items collection. Only changed items (a master together with its exceptions) are converted again.
+  # version is incremented on every update, consumers compare it or block in wait_for_version().
+  # Like the session, a mirror must only be used from the thread that created its COM objects,
+  # only events(), calendar() and wait_for_version() may be called from other threads.
+
+  def __init__(self, folder: object,
+               filter: Optional[dict] = None,
+               window: Optional[w32a_cal.Window] = None,
+               body_budget: Optional[w32a_body.BodyBudget] = None,
+               coalesce_seconds: float = MIRROR_COALESCE_SECONDS,
+               with_events: Callable[[object, type], object] = _with_events,
+               clock: Callable[[], float] = time.monotonic) -> None:
+    self.folder: object = folder
+    self.filter: Optional[dict] = filter
+    self.window: Optional[w32a_cal.Window] = window
+    self.body_budget: Optional[w32a_body.BodyBudget] = body_budget
+    self.coalesce_seconds: float = coalesce_seconds
+    self._with_events = with_events
+    self._clock = clock
+    # The Items object must stay referenced, otherwise Outlook stops sending its events
+    self.items: object = folder.Items
+    self._watcher: Optional[object] = None
+
+    self._events: collections.OrderedDict[str, list[icalendar.Event]] = collections.OrderedDict()
+    self._pending: collections.OrderedDict[str, object] = collections.OrderedDict()
+    self._removed: bool = False
+    self._last_notification: float = 0.0
+    self._condition = threading.Condition()
+    self.version: int = 0
+    self.conversions: int = 0
+    # Items that could not be converted, they keep their previous events
+    self.errors: int = 0
+
+  def _convert(self, item) -> list[icalendar.Event]:
+    self.conversions += 1
+    return w32a_cal.win32_event_to_ical(item, filter=self.filter, body_budget=self.body_budget, window=self.window)
+
+  def _try_convert(self, entry_id: str, item) -> Optional[list[icalendar.Event]]:
+    # None if the item fails, one broken item must not stop the mirror
+    try:
+      return self._convert(item)
+    except Exception:
+      logging.exception("Mirror of %s: conversion of item %s failed", getattr(self.folder, "Name", ""), entry_id)
+      self.errors += 1
+      return None
+
+  def _bump(self) -> None:
+    with self._condition:
+      self.version += 1
+      self._condition.notify_all()
+
+  def load(self) -> None:
+    # Full conversion of the folder, e.g. on start or after the mirror fell behind
+    events: collections.OrderedDict[str, list[icalendar.Event]] = collections.OrderedDict()
+    with self._condition:
+      previous = self._events
+    for item in self.items:
+      entry_id = item.EntryID
+      converted = self._try_convert(entry_id, item)
+      if converted is None:
+        # Failed: the events of the previous load, if any
+        converted = previous.get(entry_id, None)
+      if converted:
+        events[entry_id] = converted
+    with self._condition:
+      self._events = events
+      self._pending.clear()
+      self._removed = False
+    self._bump()
+    logging.debug("Loaded mirror of %s: %d items", getattr(self.folder, "Name", ""), len(events))
+
+  def subscribe(self) -> None:
+    watcher = self._with_events(self.items, _ItemsEvents)
+    watcher.mirror = self
+    self._watcher = watcher
+
+  def notify_change(self, item) -> None:
+    with self._condition:
+      self._pending[item.EntryID] = item
+      self._last_notification = self._clock()
+
+  def notify_remove(self) -> None:
+    with self._condition:
+      self._removed = True
+      self._last_notification = self._clock()
+
+  def _removed_entry_ids(self) -> list[str]:
+    # Only EntryID is read from each item to find the removed ones
+    current = set(item.EntryID for item in self.items)
+    return [entry_id for entry_id in self._events if entry_id not in current]
+
+  def flush(self, force: bool = False) -> bool:
+    # Applies the pending notifications once they are older than coalesce_seconds, returns True on update
+    with self._condition:
+      if not self._pending and not self._removed:
+        return False
+      if not force and self._clock() - self._last_notification < self.coalesce_seconds:
+        return False
+      pending = list(self._pending.items())
+      removed = self._removed
+      self._pending.clear()
+      self._removed = False
+
+    # A failing item keeps its previous events
+    changed = {entry_id: self._try_convert(entry_id, item) for entry_id, item in pending}
+    stale = self._removed_entry_ids() if removed else []
+
+    with self._condition:
+      for entry_id, events in changed.items():
+        if events is None:
+          continue
+        if events:
+          self._events[entry_id] = events
+        else:
+          # Moved out of the window
+          self._events.pop(entry_id, None)
+      for entry_id in stale:
+        self._events.pop(entry_id, None)
+    self._bump()
+    logging.debug("Mirror updated to version %d: %d changed, %d removed", self.version, len(changed), len(stale))
+    return True
+
+  def run(self, stop: threading.Event, poll_interval: float = 0.5,
+          pump: Callable[[], None] = _pump_waiting_messages) -> None:
+    # Event loop of the thread that owns the folder: delivers COM events and applies them
+    if self._watcher is None:
+      self.subscribe()
+    while not stop.is_set():
+      pump()
+      self.flush()
+      stop.wait(poll_interval)
+    self.flush(force=True)
+
+  def events(self) -> list[icalendar.Event]:
+    with self._condition:
+      return [event for events in self._events.values() for event in events]
+
+  def calendar(self, prodid: str = w32a_export.ICAL_PRODID) -> icalendar.Calendar:
+    cal = w32a_export.new_calendar(prodid)
+    for event in self.events():
+      cal.add_component(event)
+    # DTSTART;TZID=... of the events refer to these
+    ical_vtimezone.add_timezones(cal)
+    return cal
+
+  def wait_for_version(self, version: int, timeout: Optional[float] = None) -> int:
+    # Blocks until the mirror is newer than version, returns the current version
+    with self._condition:
+      self._condition.wait_for(lambda: self.version > version, timeout=timeout)
+      return self.version
@@ -0,0 +1,228 @@
+from typing import Callable, Iterable, Iterator, Optional, Union
+import collections
+import concurrent.futures
+import logging
+import queue
+import threading
+import time
+
+import icalendar
+
+import w32a_body
+import w32a_cal
+import w32a_metrics
+import w32obj
+
+# Snapshots waiting for a consumer, bounds the memory of a fast producer
+PIPELINE_QUEUE_SIZE = 64
+
+ItemSource = Union[Iterable[object], Callable[[], Iterable[object]]]
+
+_DONE = object()
+
+
+class ItemResult:
+  # Conversion result of one Outlook item, in the order of the source
+  __slots__ = ("index", "entry_id", "events", "data", "error")
+
+  def __init__(self, index: int, entry_id: Optional[str] = None) -> None:
+    self.index: int = index
+    self.entry_id: Optional[str] = entry_id
+    self.events: list[icalendar.Event] = []
+    # Serialized VEVENTs if the pipeline serializes
+    self.data: Optional[bytes] = None
+    # Error of the snapshot or the conversion, the other items are not affected
+    self.error: Optional[BaseException] = None
+
+
+class PipelineReport:
+
+  def __init__(self) -> None:
+    self.items: int = 0
+    self.events: int = 0
+    self.errors: int = 0
+    # Time spent in the producer reading items over COM
+    self.fetch_seconds: float = 0.0
+    # Sum over all consumers
+    self.convert_seconds: float = 0.0
+    self.seconds: float = 0.0
+
+  def as_dict(self) -> dict:
+    return {
+      "items": self.items,
+      "events": self.events,
+      "errors": self.errors,
+      "fetch_seconds": self.fetch_seconds,
+      "convert_seconds": self.convert_seconds,
+      "seconds": self.seconds,
+    }
+
+
+def snapshot_item(item, body_budget: Optional[w32a_body.BodyBudget] = None) -> object:
+  # Plain Python copy of an item, can be handed to another thread or process.
+  # The body must be read here, in the thread that owns the COM object.
+  # Only the properties the converter reads are fetched, every property is a COM round trip.
+  return w32obj.make_anonymous_event(item, lazy_body=False, body_budget=body_budget, minimal=True)
+
+def convert_snapshot(snapshot, filter: Optional[dict] = None,
+                     window: Optional[w32a_cal.Window] = None,
+                     serialize: bool = False,
+                     exception_delta: Optional[w32a_cal.ExceptionDelta] = None) -> tuple[list[icalendar.Event], Optional[bytes]]:
+  # Default consumer: a module level function, so it can also run in a ProcessPoolExecutor
+  events = w32a_cal.records_to_ical(w32a_cal.win32_event_to_records(snapshot, filter=filter, window=window,
+                                                                    exception_delta=exception_delta))
+  data = None
+  if serialize:
+    with w32a_metrics.get_sink().stage(w32a_metrics.STAGE_SERIALIZE):
+      data = b"".join(event.to_ical() for event in events)
+  return events, data
+
+def _consume(index: int, entry_id: Optional[str], snapshot, convert: Callable, kwargs: dict) -> tuple[ItemResult, float]:
+  result = ItemResult(index, entry_id)
+  t0 = time.perf_counter()
+  try:
+    result.events, result.data = convert(snapshot, **kwargs)
+  except Exception as e:
+    logging.exception("Conversion of item %s failed", entry_id)
+    result.error = e
+  return result, time.perf_counter() - t0
+
+def _produce(source: ItemSource, out: queue.Queue, stop: threading.Event, report: PipelineReport,
+             body_budget: Optional[w32a_body.BodyBudget], item_filter: Optional[Callable[[object], bool]],
+             initializer: Optional[Callable[[], None]]) -> None:
+  # Only this thread touches COM objects: the items are resolved, iterated and snapshotted here
+  def put(entry) -> bool:
+    while not stop.is_set():
+      try:
+        out.put(entry, timeout=0.1)
+        return True
+      except queue.Full:
+        continue
+    return False
+
+  try:
+    if initializer is not None:
+      initializer()
+    t0 = time.perf_counter()
+    with w32a_metrics.get_sink().stage(w32a_metrics.STAGE_FETCH):
+      items = source() if callable(source) else source
+    index = 0
+    for item in items:
+      if stop.is_set():
+        break
+      if item_filter is not None and not item_filter(item):
+        # Reading and filtering a skipped item is fetch time as well
+        t1 = time.perf_counter()
+        report.fetch_seconds += t1 - t0
+        t0 = t1
+        continue
+      entry_id = getattr(item, "EntryID", None)
+      try:
+        with w32a_metrics.get_sink().stage(w32a_metrics.STAGE_FETCH):
+          entry = (index, entry_id, snapshot_item(item, body_budget=body_budget), None)
+      except Exception as e:
+        logging.exception("Snapshot of item %s failed", entry_id)
+        entry = (index, entry_id, None, e)
+      report.fetch_seconds += time.perf_counter() - t0
+      if not put(entry):
+        return
+      index += 1
+      t0 = time.perf_counter()
+    put(_DONE)
+  except BaseException as e:
+    # Failure of the source itself ends the pipeline
+    put(e)
+
+def iter_pipeline(source: ItemSource,
+                  max_workers: Optional[int] = None,
+                  queue_size: int = PIPELINE_QUEUE_SIZE,
+                  convert: Callable = convert_snapshot,
+                  filter: Optional[dict] = None,
+                  window: Optional[w32a_cal.Window] = None,
+                  serialize: bool = False,
+                  body_budget: Optional[w32a_body.BodyBudget] = None,
+                  item_filter: Optional[Callable[[object], bool]] = None,
+                  initializer: Optional[Callable[[], None]] = None,
+                  exception_delta: Optional[w32a_cal.ExceptionDelta] = None,
+                  executor: Optional[concurrent.futures.Executor] = None,
+                  report: Optional[PipelineReport] = None) -> Iterator[ItemResult]:
+  # Overlaps COM latency with conversion: one producer thread snapshots the items of source into
+  # a bounded queue, a pool of consumers converts (and serializes) the snapshots.
+  # Results are yielded in the order of source; an item that fails has ItemResult.error set.
+  # source may be a callable, it is then called in the producer thread, e.g. to resolve the folder there.
+  # initializer runs first in the producer thread, e.g. to initialize COM.
+  # exception_delta is passed to convert; the snapshots have already read the exceptions in full,
+  # so it only gives the same events as the sequential conversion, it saves no COM reads.
+  if queue_size < 1:
+    raise ValueError("queue_size must be at least 1")
+  if report is None:
+    report = PipelineReport()
+  kwargs = {"filter": filter, "window": window, "serialize": serialize}
+  if exception_delta is not None:
+    # Only passed if set, so a convert without the parameter keeps working
+    kwargs["exception_delta"] = exception_delta
+
+  snapshots: queue.Queue = queue.Queue(maxsize=queue_size)
+  stop = threading.Event()
+  producer = threading.Thread(target=_produce, name="w32a-pipeline-producer", daemon=True,
+                              args=(source, snapshots, stop, report, body_budget, item_filter, initializer))
+
+  own_executor = executor is None
+  if own_executor:
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="w32a-pipeline")
+  # Enough submitted work to keep every consumer busy while the head of the line is awaited
+  max_pending = max(1, getattr(executor, "_max_workers", max_workers or 1)) * 2
+
+  pending: collections.deque = collections.deque()
+
+  def finish(future: concurrent.futures.Future) -> ItemResult:
+    result, seconds = future.result()
+    report.items += 1
+    report.convert_seconds += seconds
+    if result.error is not None:
+      report.errors += 1
+    report.events += len(result.events)
+    return result
+
+  t0 = time.perf_counter()
+  producer.start()
+  try:
+    while True:
+      entry = snapshots.get()
+      if entry is _DONE:
+        break
+      if isinstance(entry, BaseException):
+        raise entry
+      index, entry_id, snapshot, error = entry
+      if error is not None:
+        result = ItemResult(index, entry_id)
+        result.error = error
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        future.set_result((result, 0.0))
+      else:
+        future = executor.submit(_consume, index, entry_id, snapshot, convert, kwargs)
+      pending.append(future)
+      while len(pending) >= max_pending or (pending and pending[0].done()):
+        yield finish(pending.popleft())
+    while pending:
+      yield finish(pending.popleft())
+  finally:
+    stop.set()
+    for future in pending:
+      future.cancel()
+    if own_executor:
+      executor.shutdown(wait=True)
+    producer.join()
+    report.seconds = time.perf_counter() - t0
+    logging.debug("Pipeline: %s", report.as_dict())
+
+def convert_items_pipelined(source: ItemSource, **kwargs) -> tuple[list[icalendar.Event], list[ItemResult], PipelineReport]:
+  # iter_pipeline() collected: all events in source order, the failed items and the report
+  report = kwargs.pop("report", None) or PipelineReport()
+  events: list[icalendar.Event] = []
+  failed: list[ItemResult] = []
+  for result in iter_pipeline(source, report=report, **kwargs):
+    if result.error is not None:
+      failed.append(result)
+    events.extend(result.events)
+  return events, failed, report
@@ -0,0 +1,177 @@
+from typing import Callable, Optional
+import logging
+import threading
+import time
+
+# https://learn.microsoft.com/en-us/office/vba/api/outlook.oldefaultfolders
+OL_FOLDER_CALENDAR = 9
+
+FOLDER_PATH_SEPARATOR = "/"
+
+# Minimum seconds between two index rebuilds caused by lookups of unknown folders
+MISS_REBUILD_INTERVAL = 30.0
+
+
+class _FolderEvents:
+  # https://learn.microsoft.com/en-us/office/vba/api/outlook.folders#events
+  # Instances are created by win32com.client.WithEvents, so the session is attached afterwards
+  session: Optional['OutlookSession'] = None
+
+  def _invalidate(self, *args) -> None:
+    if self.session is not None:
+      self.session.invalidate()
+
+  def OnFolderAdd(self, folder) -> None:
+    # The new folder and its subfolders are watched as well
+    self._invalidate()
+    if self.session is not None:
+      self.session._watch_tree(folder)
+
+  OnFolderChange = _invalidate
+  OnFolderRemove = _invalidate
+
+
+class OutlookSession:
+  # Owns the Outlook Application/Namespace and an index of calendar folders by path,
+  # e.g. "Calendar", "Calendar/Team", "Calendar/Team/Rooms".
+  # COM objects are bound to the apartment of the thread that created them,
+  # so a session must only be used from one thread (see get_session).
+
+  def __init__(self, application: Optional[object] = None, ttl: Optional[float] = 300.0,
+               miss_interval: float = MISS_REBUILD_INTERVAL) -> None:
+    self._application: Optional[object] = application
+    self._namespace: Optional[object] = None
+    self._calendar_folder: Optional[object] = None
+    self._index: Optional[dict[str, object]] = None
+    self._index_time: float = 0.0
+    self._watchers: list[object] = []
+    self._with_events: Optional[Callable[[object, type], object]] = None
+    self.ttl: Optional[float] = ttl
+    self.miss_interval: float = miss_interval
+    self._miss_time: Optional[float] = None
+
+  @property
+  def application(self) -> object:
+    if self._application is None:
+      import win32com.client
+      self._application = win32com.client.Dispatch("Outlook.Application")
+    return self._application
+
+  @property
+  def namespace(self) -> object:
+    if self._namespace is None:
+      # https://learn.microsoft.com/en-us/office/vba/api/outlook.application.getnamespace
+      self._namespace = self.application.GetNamespace("MAPI")
+    return self._namespace
+
+  @property
+  def calendar_folder(self) -> object:
+    if self._calendar_folder is None:
+      # https://learn.microsoft.com/en-us/office/vba/api/outlook.namespace.getdefaultfolder
+      folder = self.namespace.GetDefaultFolder(OL_FOLDER_CALENDAR)
+      if folder is None:
+        raise ValueError("No Outlook calendar folder found")
+      self._calendar_folder = folder
+    return self._calendar_folder
+
+  def invalidate(self) -> None:
+    logging.debug("Invalidate Outlook folder index")
+    self._index = None
+
+  def _index_expired(self) -> bool:
+    if self._index is None:
+      return True
+    return self.ttl is not None and time.monotonic() - self._index_time > self.ttl
+
+  def _build_index(self) -> dict[str, object]:
+    index: dict[str, object] = {}
+    root = self.calendar_folder
+    stack: list[tuple[str, object]] = [(root.Name, root)]
+    while stack:
+      path, folder = stack.pop()
+      index[path] = folder
+      for sub in folder.Folders:
+        stack.append((path + FOLDER_PATH_SEPARATOR + sub.Name, sub))
+    logging.debug("Indexed %d Outlook calendar folders", len(index))
+    return index
+
+  @property
+  def folder_index(self) -> dict[str, object]:
+    if self._index_expired():
+      self._index = self._build_index()
+      self._index_time = time.monotonic()
+    return self._index
+
+  def folder_paths(self) -> list[str]:
+    return sorted(self.folder_index.keys())
+
+  def _lookup(self, path: str) -> Optional[object]:
+    index = self.folder_index
+    folder = index.get(path, None)
+    if folder is None:
+      # Paths may be given relative to the default calendar folder, e.g. "Team/Rooms"
+      folder = index.get(self.calendar_folder.Name + FOLDER_PATH_SEPARATOR + path, None)
+    return folder
+
+  def get_folder(self, path: Optional[str] = None) -> object:
+    if not path:
+      return self.calendar_folder
+
+    path = path.strip(FOLDER_PATH_SEPARATOR)
+    folder = self._lookup(path)
+    if folder is None and self._rebuild_on_miss():
+      # The folder may have been created since the index was built
+      self.invalidate()
+      folder = self._lookup(path)
+    if folder is None:
+      raise ValueError("No Outlook calendar folder found: %s" % path)
+    return folder
+
+  def _rebuild_on_miss(self) -> bool:
+    # Watched folders keep the index current. Otherwise lookups of missing folders rebuild it
+    # at most once per miss_interval seconds instead of walking all folders each time.
+    if self._watchers:
+      return False
+    now = time.monotonic()
+    if self._miss_time is not None and now - self._miss_time < self.miss_interval:
+      return False
+    self._miss_time = now
+    return True
+
+  def watch_folder_changes(self, with_events: Optional[Callable[[object, type], object]] = None) -> None:
+    # Drop the index when folders below the calendar are added, renamed or removed.
+    # with_events defaults to win32com.client.WithEvents.
+    if with_events is None:
+      import win32com.client
+      with_events = win32com.client.WithEvents
+    self._with_events = with_events
+    self._watch_tree(self.calendar_folder)
+
+  def _watch_tree(self, root: object) -> None:
+    if self._with_events is None:
+      return
+    if not hasattr(root, "Folders"):
+      # Event arguments are raw IDispatch objects
+      import win32com.client
+      root = win32com.client.Dispatch(root)
+    stack: list[object] = [root]
+    while stack:
+      folder = stack.pop()
+      watcher = self._with_events(folder.Folders, _FolderEvents)
+      watcher.session = self
+      self._watchers.append(watcher)
+      stack.extend(folder.Folders)
+
+
+_thread_sessions = threading.local()
+
+def get_session() -> OutlookSession:
+  # One session per thread, as COM objects cannot be shared across apartments
+  session: Optional[OutlookSession] = getattr(_thread_sessions, "session", None)
+  if session is None:
+    session = OutlookSession()
+    _thread_sessions.session = session
+  return session
+
+def set_session(session: Optional[OutlookSession]) -> None:
+  _thread_sessions.session = session
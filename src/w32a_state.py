@@ -0,0 +1,147 @@
+from typing import Optional
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+
+STATE_VERSION = 3
+
+# (UID, RECURRENCE-ID), the serialized event and the time zones it refers to,
+# see ical_diff.event_key, ical_emit.serialize_component and ical_vtimezone.event_zones
+StateEntry = tuple[tuple[str, Optional[str]], bytes, tuple[tuple[str, int, int], ...]]
+
+_SCHEMA = """
+CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE items (entry_id TEXT PRIMARY KEY, modified TEXT NOT NULL);
+CREATE TABLE entries (entry_id TEXT NOT NULL, seq INTEGER NOT NULL, uid TEXT NOT NULL, recurrence_id TEXT,
+                      data BLOB NOT NULL, zones TEXT NOT NULL, PRIMARY KEY (entry_id, seq));
+"""
+
+
+class ExportState:
+  # Serialized events of the previous export by EntryID. An item whose LastModificationTime did not
+  # change is not converted again, only EntryID and LastModificationTime are read from it.
+  # settings (format, filter, window, ...) are stored with the state, a state saved with other
+  # settings is discarded on load.
+  # The state is an SQLite file: the previous state is only queried per item, the items of this
+  # export are written to a temporary database next to it, which replaces it on save(). Neither is
+  # held in memory, so the state does not count against the memory budget of the export.
+
+  def __init__(self, settings: Optional[dict] = None, directory: Optional[str] = None) -> None:
+    self.settings: dict = dict(settings or {})
+    self._lock = threading.Lock()
+    # Previous export, read only
+    self._previous: Optional[sqlite3.Connection] = None
+    # This export, only items that were seen: removed items are dropped on save
+    fd, self._path = tempfile.mkstemp(prefix="pyw32ical-state-", suffix=".tmp", dir=directory)
+    os.close(fd)
+    self._db: Optional[sqlite3.Connection] = sqlite3.connect(self._path, check_same_thread=False)
+    # Replaced as a whole on save, no journal needed
+    self._db.execute("PRAGMA journal_mode=OFF")
+    self._db.execute("PRAGMA synchronous=OFF")
+    self._db.executescript(_SCHEMA)
+    self._items: int = 0
+    self.previous: int = 0
+    self.hits: int = 0
+    self.misses: int = 0
+
+  @staticmethod
+  def item_key(item) -> tuple[Optional[str], Optional[str]]:
+    entry_id = getattr(item, 'EntryID', None)
+    modified = getattr(item, 'LastModificationTime', None)
+    return entry_id, (str(modified) if modified is not None else None)
+
+  def lookup(self, item) -> Optional[list[StateEntry]]:
+    entry_id, modified = self.item_key(item)
+    with self._lock:
+      if entry_id is None or modified is None or self._previous is None:
+        self.misses += 1
+        return None
+      row = self._previous.execute("SELECT modified FROM items WHERE entry_id = ?", (entry_id,)).fetchone()
+      if row is None or row[0] != modified:
+        self.misses += 1
+        return None
+      entries = [((uid, recurrence_id), bytes(data), tuple(tuple(zone) for zone in json.loads(zones)))
+                 for uid, recurrence_id, data, zones in self._previous.execute(
+                   "SELECT uid, recurrence_id, data, zones FROM entries WHERE entry_id = ? ORDER BY seq", (entry_id,))]
+      self._store(entry_id, modified, entries)
+      self.hits += 1
+      return entries
+
+  def store(self, item, entries: list[StateEntry]) -> None:
+    entry_id, modified = self.item_key(item)
+    if entry_id is None or modified is None:
+      return
+    with self._lock:
+      self._store(entry_id, modified, entries)
+
+  def _store(self, entry_id: str, modified: str, entries: list[StateEntry]) -> None:
+    if self._db.execute("SELECT 1 FROM items WHERE entry_id = ?", (entry_id,)).fetchone() is None:
+      self._items += 1
+    self._db.execute("DELETE FROM entries WHERE entry_id = ?", (entry_id,))
+    self._db.execute("INSERT OR REPLACE INTO items VALUES (?, ?)", (entry_id, modified))
+    self._db.executemany("INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                         [(entry_id, seq, uid, recurrence_id, data, json.dumps(zones))
+                          for seq, ((uid, recurrence_id), data, zones) in enumerate(entries)])
+
+  def __len__(self) -> int:
+    # Items stored by this export
+    return self._items
+
+  @classmethod
+  def load(cls, path: str, settings: Optional[dict] = None) -> 'ExportState':
+    state = cls(settings, directory=os.path.dirname(os.path.abspath(path)))
+    if not os.path.exists(path):
+      return state
+    previous = sqlite3.connect(path, check_same_thread=False)
+    try:
+      meta = dict(previous.execute("SELECT name, value FROM meta"))
+      if meta.get("version") != str(STATE_VERSION) or json.loads(meta.get("settings", "null")) != state.settings:
+        logging.debug("Export state %s was saved with other settings, converting all items", path)
+        previous.close()
+        return state
+      state.previous = previous.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+    except (sqlite3.DatabaseError, ValueError):
+      logging.warning("Ignoring unreadable export state %s", path)
+      previous.close()
+      return state
+    state._previous = previous
+    return state
+
+  def save(self, path: str) -> None:
+    # Replaces the state at path with the items of this export, the state cannot be used afterwards
+    with self._lock:
+      self._db.executemany("INSERT INTO meta VALUES (?, ?)",
+                           [("version", str(STATE_VERSION)), ("settings", json.dumps(self.settings))])
+      self._db.commit()
+      tmp_path = self._path
+      self._close()
+    os.replace(tmp_path, path)
+
+  def close(self) -> None:
+    # Discards this export's state, the previous one stays
+    with self._lock:
+      tmp_path = self._path
+      self._close()
+    if tmp_path is not None and os.path.exists(tmp_path):
+      os.remove(tmp_path)
+
+  def _close(self) -> None:
+    # Both files are closed before they are replaced or removed, which Windows requires
+    if self._previous is not None:
+      self._previous.close()
+      self._previous = None
+    if self._db is not None:
+      self._db.close()
+      self._db = None
+    self._path = None
+
+  def as_dict(self) -> dict:
+    return {
+      "items": self._items,
+      "previous": self.previous,
+      "hits": self.hits,
+      "misses": self.misses,
+    }
@@ -0,0 +1,117 @@
+from __future__ import annotations
+import abc
+import datetime
+import os
+
+from typing import Optional, Union
+
+from w32a_lazy import lazy_import
+
+pytz = lazy_import("pytz")
+
+# Select the backend at startup with W32ICAL_TZ_BACKEND=pytz|zoneinfo
+TZ_BACKEND_ENV = "W32ICAL_TZ_BACKEND"
+TZ_BACKEND_DEFAULT = "pytz"
+
+
+def localize(tz: datetime.tzinfo, dt: datetime.datetime) -> datetime.datetime:
+  # Naive local time dt in tz, for pytz zones (and icalendar's VTIMEZONE zones) and PEP 495 zones alike.
+  # Same result as pytz' localize(is_dst=False): ambiguous and non-existent local times
+  # resolve to standard time, whichever fold that is.
+  if hasattr(tz, 'localize'):
+    return tz.localize(dt)
+  local = dt.replace(tzinfo=tz, fold=0)
+  other = dt.replace(tzinfo=tz, fold=1)
+  if local.utcoffset() != other.utcoffset() and local.dst() and not other.dst():
+    return other
+  return local
+
+
+class TzBackend(abc.ABC):
+  name: str = ""
+
+  @property
+  @abc.abstractmethod
+  def utc(self) -> datetime.tzinfo:
+    ...
+
+  @abc.abstractmethod
+  def timezone(self, name: str) -> datetime.tzinfo:
+    ...
+
+  def localize(self, tz: datetime.tzinfo, dt: datetime.datetime) -> datetime.datetime:
+    # tz objects of the other backend may still be passed in by callers
+    return localize(tz, dt)
+
+  def zone_name(self, tz: Optional[datetime.tzinfo], dt: Optional[datetime.datetime] = None) -> Optional[str]:
+    # IANA name of a tz object, e.g. "Europe/Berlin" rather than the "CET" abbreviation of tzname()
+    if tz is None:
+      return None
+    name = getattr(tz, 'zone', None) or getattr(tz, 'key', None)
+    if name is None and tz is datetime.timezone.utc:
+      name = "UTC"
+    if name is None:
+      name = tz.tzname(dt)
+    return name
+
+
+class PytzBackend(TzBackend):
+  name = "pytz"
+
+  @property
+  def utc(self) -> datetime.tzinfo:
+    return pytz.utc
+
+  def timezone(self, name: str) -> datetime.tzinfo:
+    return pytz.timezone(name)
+
+
+class ZoneInfoBackend(TzBackend):
+  # https://docs.python.org/3/library/zoneinfo.html
+  # ZoneInfo objects are cached by key and localize with a plain replace(),
+  # which avoids the per-call offset search of pytz' localize()
+  name = "zoneinfo"
+
+  def __init__(self) -> None:
+    import zoneinfo
+    self._zoneinfo = zoneinfo
+    self._utc = zoneinfo.ZoneInfo("UTC")
+    self._zones: dict[str, datetime.tzinfo] = {}
+
+  @property
+  def utc(self) -> datetime.tzinfo:
+    return self._utc
+
+  def timezone(self, name: str) -> datetime.tzinfo:
+    tz = self._zones.get(name, None)
+    if tz is None:
+      tz = self._zones[name] = self._zoneinfo.ZoneInfo(name)
+    return tz
+
+
+TZ_BACKENDS: dict[str, type] = {
+  PytzBackend.name: PytzBackend,
+  ZoneInfoBackend.name: ZoneInfoBackend,
+}
+
+_backend: Optional[TzBackend] = None
+
+def _make_backend(name: str, source: str = "tz backend") -> TzBackend:
+  if name not in TZ_BACKENDS:
+    raise ValueError("Unknown %s: %s, use one of %s" % (source, name, ", ".join(sorted(TZ_BACKENDS))))
+  return TZ_BACKENDS[name]()
+
+def get_backend() -> TzBackend:
+  global _backend
+  if _backend is None:
+    _backend = _make_backend(os.environ.get(TZ_BACKEND_ENV, TZ_BACKEND_DEFAULT), TZ_BACKEND_ENV)
+  return _backend
+
+def set_backend(backend: Union[str, TzBackend, None]) -> TzBackend:
+  # Returns the previous backend, so callers can restore it
+  global _backend
+  previous = get_backend()
+  if isinstance(backend, str):
+    backend = _make_backend(backend)
+  _backend = backend
+  return previous
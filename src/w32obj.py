@@ -1,8 +1,16 @@
+from __future__ import annotations
 from typing import Optional
 import datetime
-import pytz
-from tzlocal.windows_tz import tz_win
-from w32a_cal import BusyStatus, MeetingStatus, Importance, RecurrenceState, RecurrenceType, OUTLOOK_DATETIME_FORMAT, _win32_day_of_week_mask_valid_for_type
+import re
+import time
+from w32a_lazy import lazy_import
+import w32a_tz
+import w32a_body
+import w32a_intern
+from w32a_cal import BusyStatus, MeetingStatus, Importance, RecurrenceState, RecurrenceType, OUTLOOK_DATETIME_FORMAT, _win32_day_of_week_mask_valid_for_type, win32_date_to_datetime
+
+dateutil_parser = lazy_import("dateutil.parser")
+windows_tz = lazy_import("tzlocal.windows_tz")
 
 def datetime_to_w32str(dt: datetime.datetime) -> str:
     # TODO: check
@@ -32,7 +40,8 @@ class W32RecurrencePattern:
                  day_of_week_mask: Optional[int] = None,
                  month_of_year: Optional[int] = None,
                  day_of_month: Optional[int] = None,
-                 exceptions: list[W32Exception] = []) -> None:
+                 exceptions: list[W32Exception] = [],
+                 instance: Optional[int] = None) -> None:
         self.RecurrenceType: RecurrenceType = recurrence_type
         self.Interval: int = interval
         self.NoEndDate: bool = no_end
@@ -67,6 +76,13 @@ class W32RecurrencePattern:
             ):
             self.MonthOfYear = month_of_year
 
+        # https://learn.microsoft.com/en-us/office/vba/api/outlook.recurrencepattern.instance
+        self.Instance: Optional[int] = None
+        if (recurrence_type == RecurrenceType.MONTHLY_NTH
+            or recurrence_type == RecurrenceType.YEARLY_NTH
+            ):
+            self.Instance = instance
+
         self.Exceptions: list[W32Exception] = exceptions
 
 class W32TimeZone:
@@ -128,17 +144,20 @@ class W32Event:
 
         start_tz: datetime.tzinfo | None = start.tzinfo
 
+        # tz_win is keyed by IANA names, which tzname() does not return for every tz backend
+        tz_backend = w32a_tz.get_backend()
+        utc = tz_backend.utc
 
         if start_tz is not None:
-            start_tz_str = tz_win.get(start.tzname())
+            start_tz_str = windows_tz.tz_win.get(tz_backend.zone_name(start_tz, start))
         else:
-            start_tz_str = tz_win.get(pytz.utc.tzname())
-            start.replace(tzinfo=pytz.utc)
+            start_tz_str = windows_tz.tz_win.get(tz_backend.zone_name(utc))
+            start.replace(tzinfo=utc)
 
         self.StartTimeZone = W32TimeZone(id=start_tz_str)
 
         self.Start = datetime_to_w32str(start)
-        self.StartUTC: str = datetime_to_w32str(start.astimezone(pytz.utc))
+        self.StartUTC: str = datetime_to_w32str(start.astimezone(utc))
 
         self.Duration: Optional[int] = None
         self.End: Optional[str] = None
@@ -149,16 +168,16 @@ class W32Event:
         if end is not None:
             end_tz: datetime.tzinfo | None = end.tzinfo
             if end_tz is not None:
-                end_tz_str = tz_win.get(end.tzname())
+                end_tz_str = windows_tz.tz_win.get(tz_backend.zone_name(end_tz, end))
             else:
                 if start_tz is not None:
-                    end_tz_str = tz_win.get(start_tz)
+                    end_tz_str = windows_tz.tz_win.get(tz_backend.zone_name(start_tz, end))
                     end.replace(tzinfo=start_tz)
                 else:
-                    end_tz_str = tz_win.get(pytz.utc.tzname())
-                    end.replace(tzinfo=pytz.utc)
+                    end_tz_str = windows_tz.tz_win.get(tz_backend.zone_name(utc))
+                    end.replace(tzinfo=utc)
             self.End: str = datetime_to_w32str(end)
-            self.EndUTC: str = datetime_to_w32str(end.astimezone(pytz.utc))
+            self.EndUTC: str = datetime_to_w32str(end.astimezone(utc))
             self.EndTimeZone = W32TimeZone(id=end_tz_str)
 
         self.CreationTime: str = datetime_to_w32str(creation_time) if creation_time else self.StartUTC
@@ -201,6 +220,132 @@ class W32Event:
         return None
 
 
+class W32Items:
+    # https://learn.microsoft.com/en-us/office/vba/api/outlook.items
+
+    def __init__(self, items: list[object] = []) -> None:
+        self._items: list[object] = list(items)
+        # Event handlers registered with WithEvents
+        self._event_sinks: list[object] = []
+
+    def _fire(self, name: str, *args) -> None:
+        for sink in self._event_sinks:
+            handler = getattr(sink, name, None)
+            if handler is not None:
+                handler(*args)
+
+    @property
+    def Count(self) -> int:
+        return len(self._items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __getitem__(self, index: int) -> object:
+        return self._items[index]
+
+    def Add(self, item: object) -> object:
+        self._items.append(item)
+        self._fire("OnItemAdd", item)
+        return item
+
+    def Remove(self, index: int) -> None:
+        # https://learn.microsoft.com/en-us/office/vba/api/outlook.items.remove
+        # Index is one-based like in Outlook
+        del self._items[index - 1]
+        self._fire("OnItemRemove")
+
+    def Change(self, item: object) -> None:
+        # Not part of Outlook: raises ItemChange for an item that was modified in place
+        self._fire("OnItemChange", item)
+
+    def Sort(self, property: str, descending: bool = False) -> None:
+        # https://learn.microsoft.com/en-us/office/vba/api/outlook.items.sort
+        name = property.strip("[]")
+        self._items.sort(key=lambda item: win32_date_to_datetime(getattr(item, name)), reverse=descending)
+
+    def Restrict(self, restriction: str) -> 'W32Items':
+        # https://learn.microsoft.com/en-us/office/vba/api/outlook.items.restrict
+        # Only the "[Property] op 'date'" clauses joined with AND are supported
+        clauses = re.findall(r"\[(\w+)\]\s*(>=|<=|>|<|=)\s*'([^']*)'", restriction)
+        ops = {
+            ">=": lambda a, b: a >= b,
+            "<=": lambda a, b: a <= b,
+            ">": lambda a, b: a > b,
+            "<": lambda a, b: a < b,
+            "=": lambda a, b: a == b,
+        }
+
+        def _matches(item) -> bool:
+            for name, op, value in clauses:
+                if getattr(item, name, None) is None:
+                    continue
+                item_value = win32_date_to_datetime(getattr(item, name)).replace(tzinfo=None)
+                if not ops[op](item_value, dateutil_parser.parse(value, dayfirst=True)):
+                    return False
+            return True
+
+        return W32Items([item for item in self._items if _matches(item)])
+
+
+def WithEvents(obj: object, event_class: type) -> object:
+    # Mock of win32com.client.WithEvents for W32Items
+    sink = event_class()
+    obj._event_sinks.append(sink)
+    return sink
+
+
+class W32Folder:
+    # https://learn.microsoft.com/en-us/office/vba/api/outlook.folder
+
+    def __init__(self, name: str, items: list[object] = [], folders: list['W32Folder'] = []) -> None:
+        self.Name: str = name
+        self.Items: W32Items = W32Items(items)
+        self.Folders: list[W32Folder] = list(folders)
+
+
+class W32Namespace:
+    # https://learn.microsoft.com/en-us/office/vba/api/outlook.namespace
+
+    def __init__(self, default_folders: dict[int, W32Folder] = {}) -> None:
+        self._default_folders: dict[int, W32Folder] = dict(default_folders)
+
+    def GetDefaultFolder(self, folder_type: int) -> Optional[W32Folder]:
+        return self._default_folders.get(folder_type, None)
+
+
+class W32Application:
+    # https://learn.microsoft.com/en-us/office/vba/api/outlook.application
+
+    def __init__(self, namespace: W32Namespace) -> None:
+        self._namespace: W32Namespace = namespace
+        self.namespace_calls: int = 0
+
+    def GetNamespace(self, type: str) -> W32Namespace:
+        self.namespace_calls += 1
+        return self._namespace
+
+
+class LazyProperty:
+    # Placeholder for a property that is only read from the item when it is accessed on the snapshot.
+    # The item is kept referenced, so the snapshot must stay in the thread (COM apartment) of the item
+    # and is not a detached copy; only used when lazy_body=True is asked for.
+
+    def __init__(self, item: object, name: str, body_budget: Optional[w32a_body.BodyBudget] = None) -> None:
+        self.item = item
+        self.name = name
+        self.body_budget = body_budget
+
+    def __call__(self) -> object:
+        value = getattr(self.item, self.name, None)
+        if self.body_budget is not None:
+            value = self.body_budget.apply(value)
+        return value
+
+
 class AnonymousObject:
 
     @staticmethod
@@ -211,10 +356,21 @@ class AnonymousObject:
         return _callable
 
     def __init__(self, properties: dict, methods: dict, event: Optional[object] = None):
-        self.__dict__.update(properties)
+        lazy_properties = {k: v for k, v in properties.items() if isinstance(v, LazyProperty)}
+        self.__dict__.update({k: v for k, v in properties.items() if k not in lazy_properties})
+        self._lazy_properties: dict[str, LazyProperty] = lazy_properties
         # for k,v in methods.items():
         #     setattr(self, k, self.make_callable(event, v))#
 
+    def __getattr__(self, name: str) -> object:
+        # Only called for attributes that are not set yet
+        lazy_properties = self.__dict__.get('_lazy_properties', None)
+        if lazy_properties and name in lazy_properties:
+            value = lazy_properties.pop(name)()
+            setattr(self, name, value)
+            return value
+        raise AttributeError(name)
+
     def GetRecurrencePattern(self) -> object:
         return getattr(self, 'RecurrencePattern', None)
 
@@ -225,7 +381,39 @@ def make_value_callable(value):
 
     return _callable
 
-def get_win32_event_property_dict(win32_event) -> dict:
+def _body_property(win32_event, name: str, lazy_body: bool, body_budget: Optional[w32a_body.BodyBudget]) -> object:
+    prop = LazyProperty(win32_event, name, body_budget)
+    return prop if lazy_body else prop()
+
+# String properties that repeat across items and are shared through the intern pool
+INTERNED_PROPERTIES = (
+    'BillingInformation', 'Categories', 'Companies', 'ConversationTopic', 'Location', 'MessageClass',
+    'OptionalAttendees', 'Organizer', 'RequiredAttendees', 'Resources', 'Subject',
+)
+
+def _tz_object(tz_dict: dict, intern_pool: Optional[w32a_intern.InternPool]) -> AnonymousObject:
+    # Items of the same time zone share one snapshot of it
+    key = ("TimeZone",) + tuple(tz_dict.items())
+    try:
+        hash(key)
+    except TypeError:
+        intern_pool = None
+    if intern_pool is None:
+        return AnonymousObject(tz_dict, {})
+    return intern_pool.get(key, lambda: AnonymousObject(tz_dict, {}))
+
+def _intern_properties(properties: dict, intern_pool: Optional[w32a_intern.InternPool]) -> dict:
+    if intern_pool is not None:
+        for name in INTERNED_PROPERTIES:
+            value = properties.get(name, None)
+            if isinstance(value, str):
+                properties[name] = intern_pool.intern(value)
+    return properties
+
+def get_win32_event_property_dict(win32_event, lazy_body: bool = False, body_budget: Optional[w32a_body.BodyBudget] = None,
+                                  intern_pool: Optional[w32a_intern.InternPool] = None) -> dict:
+    # Body and RTFBody can be megabytes, body_budget caps both. With lazy_body they are only read over COM
+    # when accessed, the snapshot then keeps the item and must not leave its thread.
 
     w32_start_tz = getattr(win32_event, 'StartTimeZone', None)
     if (w32_start_tz is not None):
@@ -233,7 +421,7 @@ def get_win32_event_property_dict(win32_event) -> dict:
                     'StandardDate': w32_start_tz.StandardDate, 'StandardBias': w32_start_tz.StandardBias,
                     'DaylightDate': w32_start_tz.DaylightDate, 'DaylightBias': w32_start_tz.DaylightBias}
     else:
-        start_tz = {'ID': tz_win.get(pytz.utc.tzname()), 'Name': "UTC", 'Bias': 0,
+        start_tz = {'ID': windows_tz.tz_win.get("UTC"), 'Name': "UTC", 'Bias': 0,
             'StandardDate': None, 'StandardBias': 0,
             'DaylightDate': None, 'DaylightBias': 0}
 
@@ -243,7 +431,7 @@ def get_win32_event_property_dict(win32_event) -> dict:
                     'StandardDate': w32_end_tz.StandardDate, 'StandardBias': w32_end_tz.StandardBias,
                     'DaylightDate': w32_end_tz.DaylightDate, 'DaylightBias': w32_end_tz.DaylightBias}
     else:
-        end_tz = {'ID': tz_win.get(pytz.utc.tzname()), 'Name': "UTC", 'Bias': 0,
+        end_tz = {'ID': windows_tz.tz_win.get("UTC"), 'Name': "UTC", 'Bias': 0,
                     'StandardDate': None, 'StandardBias': 0,
                     'DaylightDate': None, 'DaylightBias': 0}
 
@@ -253,7 +441,7 @@ def get_win32_event_property_dict(win32_event) -> dict:
         # 'Attachments': getattr(win32_event, 'Attachments', None), # <COMObject <unknown>>
         'AutoResolvedWinner': getattr(win32_event, 'AutoResolvedWinner', None),
         'BillingInformation': getattr(win32_event, 'BillingInformation', None),
-        'Body': getattr(win32_event, 'Body', None),
+        'Body': _body_property(win32_event, 'Body', lazy_body, body_budget),
         'BusyStatus': getattr(win32_event, 'BusyStatus', None),
         'Categories': getattr(win32_event, 'Categories', None),
         'Class': getattr(win32_event, 'Class', None),
@@ -267,7 +455,7 @@ def get_win32_event_property_dict(win32_event) -> dict:
         'Duration': getattr(win32_event, 'Duration', None),
         'End': getattr(win32_event, 'End', None),
         'EndInEndTimeZone': getattr(win32_event, 'EndInEndTimeZone', None),
-        'EndTimeZone': end_tz, # https://learn.microsoft.com/en-us/office/vba/api/outlook.timezone
+        'EndTimeZone': _tz_object(end_tz, intern_pool), # https://learn.microsoft.com/en-us/office/vba/api/outlook.timezone
         'EndUTC': getattr(win32_event, 'EndUTC', None),
         'EntryID': getattr(win32_event, 'EntryID', None),
         'ForceUpdateToAllAttendees': getattr(win32_event, 'ForceUpdateToAllAttendees', None),
@@ -304,7 +492,7 @@ def get_win32_event_property_dict(win32_event) -> dict:
         'Resources': getattr(win32_event, 'Resources', None),
         'ResponseRequested': getattr(win32_event, 'ResponseRequested', None),
         'ResponseStatus': getattr(win32_event, 'ResponseStatus', None),
-        'RTFBody': getattr(win32_event, 'RTFBody', None),
+        'RTFBody': _body_property(win32_event, 'RTFBody', lazy_body, body_budget),
         'Saved': getattr(win32_event, 'Saved', None),
         # 'SendUsingAccount': getattr(win32_event, 'SendUsingAccount', None), # <COMObject <unknown>>
         'Sensitivity': getattr(win32_event, 'Sensitivity', None),
@@ -312,18 +500,41 @@ def get_win32_event_property_dict(win32_event) -> dict:
         'Size': getattr(win32_event, 'Size', None),
         'Start': getattr(win32_event, 'Start', None),
         'StartInStartTimeZone': getattr(win32_event, 'StartInStartTimeZone', None),
-        'StartTimeZone': start_tz, # https://learn.microsoft.com/en-us/office/vba/api/outlook.timezone
+        'StartTimeZone': _tz_object(start_tz, intern_pool), # https://learn.microsoft.com/en-us/office/vba/api/outlook.timezone
         'StartUTC': getattr(win32_event, 'StartUTC', None),
         'Subject': getattr(win32_event, 'Subject', None),
         'UnRead': getattr(win32_event, 'UnRead', None),
         # 'UserProperties': getattr(win32_event, 'UserProperties', None), # <COMObject <unknown>>
     }
 
-    return win32_event_properties
+    return _intern_properties(win32_event_properties, intern_pool)
 
-def get_win32_property_dict_full(win32_event) -> dict:
+# Properties read by w32a_cal.win32_event_to_ical, a minimal snapshot reads only these over COM
+CONVERSION_PROPERTIES = (
+    'AllDayEvent', 'BusyStatus', 'Categories', 'CreationTime', 'Duration', 'End', 'EndUTC', 'EntryID',
+    'Importance', 'IsRecurring', 'LastModificationTime', 'Location', 'MeetingStatus', 'OptionalAttendees',
+    'Organizer', 'RecurrenceState', 'RequiredAttendees', 'Start', 'StartUTC', 'Subject',
+)
 
-    win32_event_properties = get_win32_event_property_dict(win32_event)
+def _minimal_tz_dict(w32_tz) -> dict:
+    if w32_tz is None:
+        return {'ID': windows_tz.tz_win.get("UTC")}
+    return {'ID': w32_tz.ID}
+
+def get_win32_event_conversion_dict(win32_event, lazy_body: bool = False, body_budget: Optional[w32a_body.BodyBudget] = None,
+                                    intern_pool: Optional[w32a_intern.InternPool] = None) -> dict:
+    win32_event_properties = {name: getattr(win32_event, name, None) for name in CONVERSION_PROPERTIES}
+    win32_event_properties['Body'] = _body_property(win32_event, 'Body', lazy_body, body_budget)
+    win32_event_properties['StartTimeZone'] = _tz_object(_minimal_tz_dict(getattr(win32_event, 'StartTimeZone', None)), intern_pool)
+    win32_event_properties['EndTimeZone'] = _tz_object(_minimal_tz_dict(getattr(win32_event, 'EndTimeZone', None)), intern_pool)
+    return _intern_properties(win32_event_properties, intern_pool)
+
+def get_win32_property_dict_full(win32_event, lazy_body: bool = False, body_budget: Optional[w32a_body.BodyBudget] = None,
+                                 minimal: bool = False, intern_pool: Optional[w32a_intern.InternPool] = None) -> dict:
+    # minimal=True reads only CONVERSION_PROPERTIES of the item and its exceptions
+    property_dict = get_win32_event_conversion_dict if minimal else get_win32_event_property_dict
+
+    win32_event_properties = property_dict(win32_event, lazy_body=lazy_body, body_budget=body_budget, intern_pool=intern_pool)
 
     # r_pattern = None
     # if win32_event.IsRecurring:
@@ -336,19 +547,24 @@ def get_win32_property_dict_full(win32_event) -> dict:
         exceptions_obj_list = []
         if exceptions:
             for ex in exceptions:
-                if getattr(ex, 'AppointmentItem') is not None:
-                    ex_appItem_dict = get_win32_event_property_dict(ex.AppointmentItem)
-                    ex_appItem_obj: AnonymousObject = AnonymousObject(ex_appItem_dict, {}, event=ex.AppointmentItem)
-                    ex_dict = {
-                        # 'Application': ex.Application, #<COMObject <unknown>>
-                        'AppointmentItem': ex_appItem_obj,
-                        # 'Class': getattr(ex, 'Class', None), # <COMObject <unknown>>
-                        'Deleted': getattr(ex, 'Deleted', None),
-                        # 'Parent': getattr(ex, 'Parent', None), # <COMObject <unknown>>
-                        # 'Session': getattr(ex, 'Session', None), # <COMObject <unknown>>
-                        }
-                    ex_obj: AnonymousObject = AnonymousObject(ex_dict, {})
-                    exceptions_obj_list.append(ex_obj)
+                deleted = getattr(ex, 'Deleted', None)
+                # The AppointmentItem of a deleted occurrence cannot be accessed
+                ex_appItem = getattr(ex, 'AppointmentItem', None) if not deleted else None
+                ex_appItem_obj: Optional[AnonymousObject] = None
+                if ex_appItem is not None:
+                    ex_appItem_dict = property_dict(ex_appItem, lazy_body=lazy_body, body_budget=body_budget, intern_pool=intern_pool)
+                    ex_appItem_obj = AnonymousObject(ex_appItem_dict, {}, event=ex_appItem)
+                ex_dict = {
+                    # 'Application': ex.Application, #<COMObject <unknown>>
+                    'AppointmentItem': ex_appItem_obj,
+                    # 'Class': getattr(ex, 'Class', None), # <COMObject <unknown>>
+                    'Deleted': deleted,
+                    'OriginalDate': getattr(ex, 'OriginalDate', None),
+                    # 'Parent': getattr(ex, 'Parent', None), # <COMObject <unknown>>
+                    # 'Session': getattr(ex, 'Session', None), # <COMObject <unknown>>
+                    }
+                ex_obj: AnonymousObject = AnonymousObject(ex_dict, {})
+                exceptions_obj_list.append(ex_obj)
 
 
         r_pattern_dict = {
@@ -379,7 +595,44 @@ def get_win32_property_dict_full(win32_event) -> dict:
 
     return win32_event_properties
 
-def make_anonymous_event(win32_event) -> AnonymousObject:
-    props = get_win32_property_dict_full(win32_event)
+def make_anonymous_event(win32_event, lazy_body: bool = False, body_budget: Optional[w32a_body.BodyBudget] = None,
+                         minimal: bool = False, intern_pool: Optional[w32a_intern.InternPool] = None) -> AnonymousObject:
+    # Repeated strings are shared through intern_pool, the process-wide pool by default;
+    # time zone snapshots are shared only through a pool passed by the caller
+    if intern_pool is None:
+        intern_pool = w32a_intern.get_intern_pool()
+    props = get_win32_property_dict_full(win32_event, lazy_body=lazy_body, body_budget=body_budget, minimal=minimal,
+                                         intern_pool=intern_pool)
     ae = AnonymousObject(props, {}, event=win32_event)
-    return ae
\ No newline at end of file
+    return ae
+
+
+class LatencyProxy:
+    # Mock of a COM object with round-trip latency: every attribute read sleeps, like a call into Outlook.
+    # Nested mock objects (time zones, recurrence patterns, exceptions) are proxied as well.
+
+    # reads: optional dict, counts the attribute reads (round trips) by mock class name
+
+    def __init__(self, target: object, latency: float = 0.0005, reads: Optional[dict] = None):
+        object.__setattr__(self, '_target', target)
+        object.__setattr__(self, '_latency', latency)
+        object.__setattr__(self, '_reads', reads)
+
+    def __getattr__(self, name: str) -> object:
+        time.sleep(self._latency)
+        if self._reads is not None:
+            key = type(self._target).__name__
+            self._reads[key] = self._reads.get(key, 0) + 1
+        value = getattr(self._target, name)
+        if isinstance(value, (W32Event, W32Exception, W32RecurrencePattern, W32TimeZone)):
+            return LatencyProxy(value, self._latency, self._reads)
+        if callable(value):
+            def _call(*args, **kwargs):
+                result = value(*args, **kwargs)
+                if isinstance(result, (W32Event, W32RecurrencePattern)):
+                    return LatencyProxy(result, self._latency, self._reads)
+                return result
+            return _call
+        if isinstance(value, list) and value and isinstance(value[0], W32Exception):
+            return [LatencyProxy(v, self._latency, self._reads) for v in value]
+        return value